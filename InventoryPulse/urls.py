@@ -120,12 +120,13 @@ urlpatterns = [
         path('suppliers/', core_views.import_suppliers, name='import_suppliers'),
         path('categories/', core_views.import_categories, name='import_categories'),
         path('supplier-products/', core_views.import_supplier_products, name='import_supplier_products'),
-        path('serialnumbers/', core_views.import_serialnumbers, name='import_serialnumbers'),
+        path('serialnumbers/', core_views.serialnumber_import, name='import_serialnumbers'),
         path('warehouses/', core_views.import_warehouses, name='import_warehouses'),
         path('departments/', core_views.import_departments, name='import_departments'),
         path('warehouse-products/', core_views.import_warehouse_products, name='import_warehouse_products'),
         path('logs/', core_views.import_log_list, name='import_log_list'),
         path('logs/<int:pk>/', core_views.import_log_detail, name='import_log_detail'),
+        path('logs/<int:pk>/progress/', core_views.import_log_progress, name='import_log_progress'),
         path('logs/<int:log_id>/delete/', core_views.delete_import_log, name='delete_import_log'),
         path('logs/bulk-delete/', core_views.bulk_delete_import_logs, name='bulk_delete_import_logs'),
         path('logs/export/', core_views.export_import_logs, name='export_import_logs'),
@@ -10,5 +10,4 @@ class AccessmanagementConfig(AppConfig):
         """
         Import signals when the app is ready.
         """
-        # Import signals or perform other initialization
-        pass
\ No newline at end of file
+        import accessmanagement.signals  # noqa
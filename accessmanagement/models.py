@@ -24,34 +24,9 @@ class WarehouseAccess(models.Model):
     def has_access(cls, user, warehouse, permission_type='view'):
         """
         Check if a user has access to a specific warehouse.
-        """
-        # Admin always has access
-        if user.is_superuser:
-            return True
-
-        # Get departments from user profile
-        try:
-            if not hasattr(user, 'profile'):
-                # Fallback: Direkte Beziehung versuchen, falls Profil nicht existiert
-                try:
-                    user_departments = user.departments.all()
-                except:
-                    return False
-            else:
-                user_departments = user.profile.departments.all()
 
-            for department in user_departments:
-                try:
-                    access = cls.objects.get(warehouse=warehouse, department=department)
-                    if permission_type == 'view' and access.can_view:
-                        return True
-                    elif permission_type == 'edit' and access.can_edit:
-                        return True
-                    elif permission_type == 'manage_stock' and access.can_manage_stock:
-                        return True
-                except cls.DoesNotExist:
-                    continue
-        except Exception:
-            return False
-
-        return False
+        Uses the user's permission matrix, so repeated checks within a request
+        do not hit the database again.
+        """
+        from .permissions import get_permission_matrix
+        return get_permission_matrix(user).has_access(warehouse, permission_type)
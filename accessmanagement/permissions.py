@@ -0,0 +1,110 @@
+"""
+Berechtigungsmatrix für Lagerzugriffe.
+
+Löst die Rechte (view/edit/manage_stock) eines Benutzers für alle Lager in
+einer Abfrage auf. Die Matrix wird am Benutzerobjekt (und damit pro Request)
+gemerkt und zusätzlich je Benutzer im Cache abgelegt. Änderungen an
+WarehouseAccess, Abteilungsmitgliedschaften und Benutzerprofilen
+invalidieren den Cache (siehe accessmanagement/signals.py).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, Q
+
+from core.models import UserProfile
+from .models import WarehouseAccess
+
+PERMISSION_TYPES = ('view', 'edit', 'manage_stock')
+CACHE_VERSION_KEY = 'warehouse_permissions:version'
+DEFAULT_CACHE_TIMEOUT = 3600
+USER_ATTRIBUTE = '_warehouse_permission_matrix'
+
+
+class WarehousePermissionMatrix:
+    """Lagerrechte eines Benutzers als {warehouse_id: {'view', 'edit', ...}}."""
+
+    def __init__(self, user, rights):
+        self.is_superuser = user.is_superuser
+        self.rights = rights
+
+    @classmethod
+    def load(cls, user):
+        """Liest die Rechte aller Abteilungen des Benutzers in einer Abfrage.
+
+        Wie bisher gelten die Abteilungen des Benutzerprofils; nur Benutzer
+        ohne Profil erhalten die Rechte ihrer direkten Abteilungsmitgliedschaften.
+        """
+        rights = {}
+        if user.is_superuser or not user.is_authenticated:
+            return cls(user, rights)
+
+        has_profile = Exists(UserProfile.objects.filter(user=user))
+        rows = WarehouseAccess.objects.filter(
+            Q(department__user_profiles__user=user) | (Q(department__members=user) & ~has_profile)
+        ).values_list('warehouse_id', 'can_view', 'can_edit', 'can_manage_stock').distinct()
+
+        for warehouse_id, can_view, can_edit, can_manage_stock in rows:
+            granted = rights.setdefault(warehouse_id, set())
+            for permission_type, allowed in zip(PERMISSION_TYPES, (can_view, can_edit, can_manage_stock)):
+                if allowed:
+                    granted.add(permission_type)
+        return cls(user, rights)
+
+    def has_access(self, warehouse, permission_type='view'):
+        """Prüft ein Recht für ein Lager (Objekt oder ID)."""
+        if self.is_superuser:
+            return True
+        warehouse_id = getattr(warehouse, 'pk', warehouse)
+        return permission_type in self.rights.get(warehouse_id, ())
+
+    def warehouse_ids(self, permission_type='view'):
+        """IDs aller Lager mit dem Recht, oder None bei Vollzugriff."""
+        if self.is_superuser:
+            return None
+        return sorted(
+            warehouse_id for warehouse_id, granted in self.rights.items()
+            if permission_type in granted
+        )
+
+    def filter_warehouses(self, queryset, permission_type='view'):
+        """Schränkt einen Warehouse-QuerySet auf Lager mit dem Recht ein."""
+        if self.is_superuser:
+            return queryset
+        return queryset.filter(pk__in=self.warehouse_ids(permission_type))
+
+
+def _cache_key(user_id):
+    version = cache.get(CACHE_VERSION_KEY)
+    if version is None:
+        cache.add(CACHE_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CACHE_VERSION_KEY)
+    return f'warehouse_permissions:{version}:{user_id}'
+
+
+def get_permission_matrix(user):
+    """Berechtigungsmatrix des Benutzers (pro Request gemerkt, je Benutzer gecacht)."""
+    matrix = getattr(user, USER_ATTRIBUTE, None)
+    if matrix is not None:
+        return matrix
+
+    if user.is_superuser or not user.is_authenticated:
+        matrix = WarehousePermissionMatrix(user, {})
+    else:
+        key = _cache_key(user.pk)
+        rights = cache.get(key)
+        if rights is None:
+            matrix = WarehousePermissionMatrix.load(user)
+            cache.set(key, matrix.rights,
+                      getattr(settings, 'WAREHOUSE_PERMISSION_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT))
+        else:
+            matrix = WarehousePermissionMatrix(user, rights)
+
+    setattr(user, USER_ATTRIBUTE, matrix)
+    return matrix
+
+
+def invalidate_permission_cache():
+    """Macht die gecachten Berechtigungsmatrizen aller Benutzer ungültig."""
+    cache.set(CACHE_VERSION_KEY, time.time_ns(), None)
@@ -0,0 +1,19 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import UserProfile
+from organization.models import Department
+from .models import WarehouseAccess
+from .permissions import invalidate_permission_cache
+
+
+@receiver(post_save, sender=WarehouseAccess)
+@receiver(post_delete, sender=WarehouseAccess)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(m2m_changed, sender=Department.members.through)
+@receiver(m2m_changed, sender=UserProfile.departments.through)
+def invalidate_warehouse_permissions(sender, **kwargs):
+    """Zugriffsrechte, Abteilungsmitgliedschaften oder Profile haben sich geändert."""
+    if kwargs.get('action', 'post_').startswith('post_'):
+        invalidate_permission_cache()
@@ -1,3 +1,56 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from core.utils.access import get_accessible_warehouses
+from inventory.models import Warehouse
+from organization.models import Department
+from .models import WarehouseAccess
+from .permissions import get_permission_matrix
+
+
+class WarehousePermissionMatrixTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.main = Warehouse.objects.create(name='Hauptlager', location='Berlin')
+        self.backup = Warehouse.objects.create(name='Ausweichlager', location='Potsdam')
+        self.department = Department.objects.create(name='Lager', code='LAG')
+        self.other_department = Department.objects.create(name='Einkauf', code='EK')
+        WarehouseAccess.objects.create(warehouse=self.main, department=self.department,
+                                       can_view=True, can_manage_stock=True)
+        WarehouseAccess.objects.create(warehouse=self.backup, department=self.other_department,
+                                       can_view=True, can_edit=True)
+        self.user = User.objects.create_user('lager', 'lager@example.com', 'secret')
+        self.user.profile.departments.add(self.department)
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_rights_are_resolved_in_one_query_and_memoized(self):
+        user = self.fresh_user()
+        with self.assertNumQueries(1):
+            self.assertTrue(WarehouseAccess.has_access(user, self.main, 'view'))
+            self.assertTrue(WarehouseAccess.has_access(user, self.main, 'manage_stock'))
+            self.assertFalse(WarehouseAccess.has_access(user, self.main, 'edit'))
+            self.assertFalse(WarehouseAccess.has_access(user, self.backup, 'view'))
+
+        # Neue Request-Instanz des Benutzers: Matrix kommt aus dem Cache
+        user = self.fresh_user()
+        with self.assertNumQueries(1):
+            self.assertEqual(list(get_accessible_warehouses(user, 'manage_stock')), [self.main])
+
+    def test_membership_and_access_changes_invalidate_cache(self):
+        self.assertEqual(get_permission_matrix(self.fresh_user()).warehouse_ids(), [self.main.pk])
+
+        self.user.profile.departments.add(self.other_department)
+        self.assertEqual(get_permission_matrix(self.fresh_user()).warehouse_ids(),
+                         sorted([self.main.pk, self.backup.pk]))
+
+        WarehouseAccess.objects.filter(department=self.department).update(can_view=False)
+        WarehouseAccess.objects.get(department=self.department).save()
+        self.assertEqual(get_permission_matrix(self.fresh_user()).warehouse_ids(), [self.backup.pk])
+
+    def test_users_without_profile_use_department_membership(self):
+        self.user.profile.delete()
+        self.department.members.add(self.user)
+        self.assertTrue(WarehouseAccess.has_access(self.fresh_user(), self.main))
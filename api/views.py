@@ -1,4 +1,5 @@
 from django.contrib.auth.models import User
+from django.db.models import F
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, status, filters, permissions
 from rest_framework.decorators import action
@@ -36,14 +37,21 @@ class ReadOnlyPermission(permissions.BasePermission):
 
 
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('category', 'tax', 'stock_summary')
     permission_classes = [IsAuthenticated, DjangoModelPermissions]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'has_variants', 'has_serial_numbers', 'has_batch_tracking']
     search_fields = ['name', 'sku', 'barcode', 'description']
-    ordering_fields = ['name', 'sku', 'category__name', 'minimum_stock']
+    ordering_fields = ['name', 'sku', 'category__name', 'minimum_stock', 'stock_summary__total_quantity']
     ordering = ['name']
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # ?low_stock=true filtert auf der indizierten Bestandssumme
+        if self.request.query_params.get('low_stock') in ('1', 'true', 'True'):
+            queryset = queryset.filter(stock_summary__total_quantity__lt=F('minimum_stock'))
+        return queryset
+
     def get_serializer_class(self):
         return ProductListSerializer if self.action == 'list' else ProductDetailSerializer
 
@@ -307,10 +315,16 @@ class OrderSuggestionViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def refresh(self, request):
-        from order.services import generate_order_suggestions
+        from order.services import get_suggestion_status, request_full_refresh
         try:
-            count = generate_order_suggestions()
-            return Response({'message': f'{count} order suggestions generated', 'count': count})
+            request_full_refresh()
+            suggestion_status = get_suggestion_status()
+            return Response({
+                'message': 'order suggestion refresh requested',
+                'count': suggestion_status['count'],
+                'pending_products': suggestion_status['pending_products'],
+                'last_refreshed_at': suggestion_status['last_refreshed_at'],
+            }, status=status.HTTP_202_ACCEPTED)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
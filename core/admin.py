@@ -11,6 +11,7 @@ from .models import (
     BatchNumber,
     ImportLog,
     ImportError,
+    ImportJob,
     UserProfile, Tax, Currency
 )
 
@@ -49,6 +50,7 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'sku', 'category', 'minimum_stock', 'total_stock', 'tax', 'has_variants', 'has_serial_numbers', 'has_batch_tracking')
     list_filter = ('category', 'tax', 'has_variants', 'has_serial_numbers', 'has_batch_tracking')
     search_fields = ('name', 'sku', 'barcode', 'description')
+    list_select_related = ('category', 'tax', 'stock_summary')
     readonly_fields = ('created_at', 'updated_at')
     inlines = [ProductWarehouseInline, ProductPhotoInline, ProductAttachmentInline, ProductVariantInline, SerialNumberInline, BatchNumberInline]
     fieldsets = (
@@ -137,6 +139,12 @@ class ImportLogAdmin(admin.ModelAdmin):
     inlines = [ImportErrorInline]
 
 
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('import_log', 'status', 'worker', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
+
+
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user',)
     filter_horizontal = ('departments',)
@@ -153,6 +161,7 @@ admin.site.register(ProductVariant, ProductVariantAdmin)
 admin.site.register(SerialNumber, SerialNumberAdmin)
 admin.site.register(BatchNumber, BatchNumberAdmin)
 admin.site.register(ImportLog, ImportLogAdmin)
+admin.site.register(ImportJob, ImportJobAdmin)
 admin.site.register(UserProfile, UserProfileAdmin)
 
 # Ermöglicht Suche für bestimmte Modelle im Admin-Interface
@@ -577,6 +577,23 @@ class CurrencyForm(forms.ModelForm):
 
 class SerialNumberImportForm(forms.Form):
     file = forms.FileField(label='CSV-Datei', help_text='Bitte laden Sie eine CSV-Datei hoch.')
+    update_existing = forms.BooleanField(
+        label="Bestehende Seriennummern aktualisieren",
+        required=False,
+        help_text="Wenn aktiviert, werden vorhandene Seriennummern aktualisiert, anstatt übersprungen zu werden."
+    )
+    default_status = forms.ChoiceField(
+        label="Standard-Status",
+        choices=SerialNumber.status_choices,
+        initial='in_stock',
+        help_text="Wird verwendet, wenn in der CSV-Datei kein Status angegeben ist."
+    )
+    default_warehouse = forms.ModelChoiceField(
+        label="Standard-Lager",
+        queryset=Warehouse.objects.filter(is_active=True),
+        required=False,
+        help_text="Wird verwendet, wenn in der CSV-Datei kein Lager angegeben ist."
+    )
 
 class BatchNumberImportForm(forms.Form):
     """Form für den Import von Chargen."""
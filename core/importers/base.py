@@ -1,25 +1,82 @@
 import csv
 import io
 import logging
+import time
+from contextlib import contextmanager
+from itertools import islice
 
-from core.models import ImportLog
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import ImportError, ImportJob, ImportLog
 
 logger = logging.getLogger(__name__)
 
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+
+
+def insert_rows(model, fields, rows):
+    """Fügt Zeilen per executemany ein, ohne Modellinstanzen aufzubauen.
+
+    Die Werte in rows müssen bereits datenbankfertig sein (Zeichenketten,
+    Zahlen, Fremdschlüssel-IDs) und der Reihenfolge von fields entsprechen.
+    Nicht angegebene Felder erhalten ihren Standardwert, auto_now- und
+    auto_now_add-Felder den aktuellen Zeitpunkt.
+    """
+    if not rows:
+        return
+    opts = model._meta
+    given = [opts.get_field(name) for name in fields]
+    now = timezone.now()
+    defaults = []
+    for field in opts.concrete_fields:
+        if field.primary_key or field in given:
+            continue
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+            value = now
+        else:
+            value = field.get_default()
+        defaults.append((field, field.get_db_prep_save(value, connection)))
+
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in [*given, *(field for field, _ in defaults)])
+    placeholders = ', '.join(['%s'] * (len(given) + len(defaults)))
+    default_values = tuple(value for _, value in defaults)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {quote(opts.db_table)} ({columns}) VALUES ({placeholders})',
+            [(*row, *default_values) for row in rows]
+        )
+
 
 class BaseImporter:
-    """Base class for all importers."""
+    """Base class for all importers.
+
+    Die Datei wird zeilenweise gelesen (CSV über einen Textstrom, Excel im
+    read-only-Modus von openpyxl), sodass der Speicherbedarf unabhängig von
+    der Dateigröße bleibt. Importer, die process_chunk() implementieren,
+    verarbeiten die Zeilen blockweise mit run_chunked().
+    """
+
+    # Import-Typ im Protokoll und Schlüssel für Hintergrund-Jobs (siehe core/utils/import_jobs.py)
+    import_type = None
+
+    # Zeilen pro Block: eine Transaktion und ein Datenbankabgleich je Block
+    chunk_size = 1000
 
     def __init__(self, file_obj, delimiter=',', encoding='utf-8', skip_header=True,
-                 update_existing=True, user=None):
+                 update_existing=True, user=None, import_log=None):
         self.file_obj = file_obj
         self.delimiter = delimiter
         self.encoding = encoding
         self.skip_header = skip_header
         self.update_existing = update_existing
         self.user = user
-        self.import_log = None
+        # Vorab angelegtes Protokoll (z. B. beim Einreihen als Hintergrund-Job)
+        self.import_log = import_log
+        self.started_at = None
         self.errors = []
+        self.error_count = 0
         self.successful_rows = 0
         self.required_fields = []
 
@@ -30,79 +87,170 @@ class BaseImporter:
                 raise ValueError(f"Feld '{field}' ist erforderlich, aber leer oder nicht vorhanden.")
         return True
 
-    def read_csv(self):
-        """Read the CSV file and return a list of dictionaries."""
-        # Check if file is a string (file path) or a file object
+    @property
+    def file_name(self):
         if isinstance(self.file_obj, str):
-            with open(self.file_obj, 'r', encoding=self.encoding) as f:
-                csvreader = csv.reader(f, delimiter=self.delimiter)
-                rows = list(csvreader)
-        else:
-            # Ensure we're at the beginning of the file
-            self.file_obj.seek(0)
-            # Read the file content as text
-            content = self.file_obj.read().decode(self.encoding)
-            # Parse CSV
-            csvreader = csv.reader(io.StringIO(content), delimiter=self.delimiter)
-            rows = list(csvreader)
+            return self.file_obj
+        return getattr(self.file_obj, 'name', None) or 'Unknown file'
+
+    def is_excel(self):
+        return self.file_name.lower().endswith(EXCEL_EXTENSIONS)
+
+    @contextmanager
+    def open_text(self):
+        """Öffnet die Datei als Textstrom, ohne sie vollständig einzulesen."""
+        if isinstance(self.file_obj, str):
+            with open(self.file_obj, 'r', encoding=self.encoding, newline='') as f:
+                yield f
+            return
+
+        # Ensure we're at the beginning of the file
+        self.file_obj.seek(0)
+        stream = io.TextIOWrapper(getattr(self.file_obj, 'file', self.file_obj),
+                                  encoding=self.encoding, newline='')
+        try:
+            yield stream
+        finally:
+            # Die hochgeladene Datei bleibt für den Aufrufer geöffnet
+            stream.detach()
+
+    def iter_raw_rows(self):
+        """Liefert die Zeilen der Datei als Listen von Zeichenketten."""
+        if self.is_excel():
+            import openpyxl
+
+            workbook = openpyxl.load_workbook(self.file_obj, read_only=True, data_only=True)
+            try:
+                for row in workbook.active.iter_rows(values_only=True):
+                    yield ['' if cell is None else str(cell) for cell in row]
+            finally:
+                workbook.close()
+            return
 
-        if not rows:
-            return []
+        with self.open_text() as stream:
+            yield from csv.reader(stream, delimiter=self.delimiter)
+
+    def iter_rows(self):
+        """Liefert die Datenzeilen als Dictionaries (Schlüssel aus der Kopfzeile)."""
+        raw_rows = self.iter_raw_rows()
+        first_row = next(raw_rows, None)
+        if first_row is None:
+            return
 
         # Extract header and use it as keys for dictionaries
-        header = rows[0]
         if self.skip_header:
-            data = rows[1:]
+            header = first_row
+            data = raw_rows
         else:
-            data = rows
             # If no header, generate field names
-            header = [f"field{i}" for i in range(len(data[0]))]
+            header = [f"field{i}" for i in range(len(first_row))]
+            data = (row for rows in ([first_row], raw_rows) for row in rows)
 
-        # Convert to list of dictionaries
-        result = []
-        for i, row in enumerate(data):
+        width = len(header)
+        for row in data:
             if not row or (len(row) == 1 and not row[0]):  # Skip empty rows
                 continue
-            if len(row) < len(header):
+            if len(row) < width:
                 # Pad row with empty strings if it's shorter than the header
-                row.extend([''] * (len(header) - len(row)))
-            elif len(row) > len(header):
-                # Truncate row if it's longer than the header
-                row = row[:len(header)]
-            result.append(dict(zip(header, row)))
+                row.extend([''] * (width - len(row)))
+            yield dict(zip(header, row))
+
+    def iter_chunks(self):
+        """Liefert Blöcke aus (Zeilennummer, Zeile)-Paaren mit höchstens chunk_size Einträgen."""
+        numbered = enumerate(self.iter_rows(), start=1)
+        while True:
+            chunk = list(islice(numbered, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
 
-        return result
+    def read_csv(self):
+        """Read the CSV file and return a list of dictionaries."""
+        return list(self.iter_rows())
 
     def start_import(self, import_type):
         """Initialize the import process and create an import log."""
-        file_name = getattr(self.file_obj, 'name', 'Unknown file')
+        self.started_at = time.monotonic()
+        if self.import_log is not None:
+            self.import_log.status = 'processing'
+            self.import_log.save(update_fields=['status'])
+            return self.import_log
+
         self.import_log = ImportLog.objects.create(
             import_type=import_type,
-            file_name=file_name,
+            file_name=self.file_name,
             created_by=self.user,
             status='processing'
         )
         return self.import_log
 
+    def rows_per_second(self, rows_processed):
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0
+        return round(rows_processed / elapsed, 1) if elapsed > 0 else 0
+
     def log_error(self, row_num, error_message, row_data=None, field_name="", field_value=""):
-        """Log an error during import."""
+        """Log an error during import.
+
+        Die Fehler werden gepuffert und mit flush_errors() gesammelt gespeichert.
+        """
         if row_data and isinstance(row_data, dict):
             row_data_str = ', '.join([f"{k}: {v}" for k, v in row_data.items()])
         else:
             row_data_str = str(row_data) if row_data else ''
 
-        ImportError.objects.create(
+        self.errors.append(ImportError(
             import_log=self.import_log,
             row_number=row_num,
             error_message=str(error_message),
             row_data=row_data_str,
             field_name=field_name,
             field_value=field_value
+        ))
+        self.error_count += 1
+
+    def flush_errors(self):
+        """Speichert die gepufferten Fehler mit einem bulk_create."""
+        if self.errors:
+            ImportError.objects.bulk_create(self.errors, batch_size=self.chunk_size)
+            self.errors = []
+
+    def process_chunk(self, rows):
+        """Verarbeitet einen Block aus (Zeilennummer, Zeile)-Paaren (von Subklassen zu implementieren)."""
+        raise NotImplementedError("Subclasses must implement process_chunk method")
+
+    def report_progress(self, rows_processed):
+        """Schreibt den Zwischenstand in das Import-Protokoll und erneuert das Lebenszeichen des Jobs."""
+        ImportLog.objects.filter(pk=self.import_log.pk).update(
+            rows_processed=rows_processed,
+            rows_created=self.successful_rows,
+            rows_error=self.error_count,
+            rows_per_second=self.rows_per_second(rows_processed),
         )
-        self.errors.append((row_num, error_message, row_data_str))
+        ImportJob.objects.filter(import_log=self.import_log, status='running').update(heartbeat_at=timezone.now())
+
+    def run_chunked(self, import_type):
+        """Liest die Datei blockweise und verarbeitet jeden Block in einer eigenen Transaktion."""
+        self.start_import(import_type)
+        total_rows = 0
+        try:
+            for chunk in self.iter_chunks():
+                with transaction.atomic():
+                    self.process_chunk(chunk)
+                    self.flush_errors()
+                total_rows += len(chunk)
+                self.report_progress(total_rows)
+        except Exception as e:
+            logger.exception("Import %s fehlgeschlagen", self.import_log.pk)
+            self.import_log.status = 'failed'
+            self.import_log.error_details = str(e)
+            self.import_log.save(update_fields=['status', 'error_details'])
+            raise
+        return self.finalize_import(total_rows)
 
     def finalize_import(self, total_rows):
         """Update the import log with final statistics."""
+        self.flush_errors()
+
         self.import_log.total_rows = total_rows
         self.import_log.successful_rows = self.successful_rows
         self.import_log.failed_rows = total_rows - self.successful_rows
@@ -112,10 +260,11 @@ class BaseImporter:
         self.import_log.rows_processed = total_rows
         self.import_log.rows_created = self.successful_rows
         self.import_log.rows_error = total_rows - self.successful_rows
+        self.import_log.rows_per_second = self.rows_per_second(total_rows)
 
         self.import_log.save()
         return self.import_log
 
     def run_import(self):
-        """Run the import process (to be implemented by subclasses)."""
-        raise NotImplementedError("Subclasses must implement run_import method")
\ No newline at end of file
+        """Run the import process."""
+        return self.run_chunked(self.import_type)
@@ -2,44 +2,58 @@ from core.importers.base import BaseImporter
 from core.models import Product, BatchNumber
 from inventory.models import Warehouse
 from suppliers.models import Supplier
-from django.db import transaction
 from datetime import datetime
 
 
 class BatchNumberImporter(BaseImporter):
     """Importer für Chargen."""
 
+    import_type = 'batch'
+
+    # Artikelnummern pro Abfrage (SQLite-Parameterlimit)
+    chunk_size = 500
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.required_fields = ['product_sku', 'batch_number', 'quantity']
-
-    @transaction.atomic
-    def run_import(self):
-        """Import batches from CSV file."""
-        self.start_import('batch')
-        rows = self.read_csv()
-
-        for i, row in enumerate(rows, start=1):
+        # Lager und Lieferanten nach Namen, über alle Blöcke hinweg
+        self.warehouses = {}
+        self.suppliers = {}
+
+    def get_by_name(self, model, cache, name):
+        if name not in cache:
+            cache[name] = model.objects.filter(name=name).first()
+        return cache[name]
+
+    def process_chunk(self, rows):
+        """Import batches from a block of CSV rows."""
+        skus = {row['product_sku'] for _, row in rows if row.get('product_sku')}
+        products = {product.sku: product for product in Product.objects.filter(sku__in=skus)}
+        batches = {
+            (batch.product_id, batch.batch_number): batch
+            for batch in BatchNumber.objects.filter(product__sku__in=skus)
+        }
+        tracked_product_ids = set()
+
+        for i, row in rows:
             try:
                 # Validate required fields
                 self.validate_required_fields(row, i)
 
                 # Find the product
-                try:
-                    product = Product.objects.get(sku=row['product_sku'])
-                except Product.DoesNotExist:
+                product = products.get(row['product_sku'])
+                if product is None:
                     self.log_error(i, f"Produkt mit SKU '{row['product_sku']}' nicht gefunden.", row)
                     continue
 
                 # Check if batch exists for this product
                 batch_number = row['batch_number']
-                try:
-                    batch = BatchNumber.objects.get(product=product, batch_number=batch_number)
-                    if not self.update_existing:
-                        self.log_error(i, f"Charge '{batch_number}' für Produkt '{product.name}' existiert bereits.", row)
-                        continue
-                except BatchNumber.DoesNotExist:
+                batch = batches.get((product.pk, batch_number))
+                if batch is None:
                     batch = BatchNumber(product=product, batch_number=batch_number)
+                elif not self.update_existing:
+                    self.log_error(i, f"Charge '{batch_number}' für Produkt '{product.name}' existiert bereits.", row)
+                    continue
 
                 # Set quantity
                 try:
@@ -49,34 +63,30 @@ class BatchNumberImporter(BaseImporter):
                     continue
 
                 # Find optional warehouse
-                warehouse = None
-                if 'warehouse_name' in row and row['warehouse_name']:
-                    try:
-                        warehouse = Warehouse.objects.get(name=row['warehouse_name'])
-                        batch.warehouse = warehouse
-                    except Warehouse.DoesNotExist:
+                if row.get('warehouse_name'):
+                    warehouse = self.get_by_name(Warehouse, self.warehouses, row['warehouse_name'])
+                    if warehouse is None:
                         self.log_error(i, f"Lager '{row['warehouse_name']}' nicht gefunden.", row)
                         continue
+                    batch.warehouse = warehouse
 
                 # Find optional supplier
-                supplier = None
-                if 'supplier_name' in row and row['supplier_name']:
-                    try:
-                        supplier = Supplier.objects.get(name=row['supplier_name'])
-                        batch.supplier = supplier
-                    except Supplier.DoesNotExist:
+                if row.get('supplier_name'):
+                    supplier = self.get_by_name(Supplier, self.suppliers, row['supplier_name'])
+                    if supplier is None:
                         self.log_error(i, f"Lieferant '{row['supplier_name']}' nicht gefunden.", row)
                         continue
+                    batch.supplier = supplier
 
                 # Parse dates
-                if 'production_date' in row and row['production_date']:
+                if row.get('production_date'):
                     try:
                         batch.production_date = datetime.strptime(row['production_date'], '%Y-%m-%d').date()
                     except ValueError:
                         self.log_error(i, f"Ungültiges Produktionsdatum: '{row['production_date']}'. Format: YYYY-MM-DD", row)
                         continue
 
-                if 'expiry_date' in row and row['expiry_date']:
+                if row.get('expiry_date'):
                     try:
                         batch.expiry_date = datetime.strptime(row['expiry_date'], '%Y-%m-%d').date()
                     except ValueError:
@@ -86,16 +96,16 @@ class BatchNumberImporter(BaseImporter):
                 # Set other optional fields
                 batch.notes = row.get('notes', '')
 
-                # Ensure product is configured for batch tracking
-                if not product.has_batch_tracking:
-                    product.has_batch_tracking = True
-                    product.save()
-
                 # Save batch
                 batch.save()
+                batches[(product.pk, batch_number)] = batch
+                if not product.has_batch_tracking:
+                    tracked_product_ids.add(product.pk)
                 self.successful_rows += 1
 
             except Exception as e:
                 self.log_error(i, str(e), row)
 
-        return self.finalize_import(len(rows))
\ No newline at end of file
+        # Ensure products are configured for batch tracking
+        if tracked_product_ids:
+            Product.objects.filter(pk__in=tracked_product_ids).update(has_batch_tracking=True)
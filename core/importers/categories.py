@@ -1,5 +1,4 @@
 from core.importers.base import BaseImporter
-from django.db import transaction
 
 from core.models import Category
 
@@ -7,37 +6,39 @@ from core.models import Category
 class CategoryImporter(BaseImporter):
     """Importer for categories."""
 
+    import_type = 'category'
+
+    # Namen pro Abfrage (SQLite-Parameterlimit)
+    chunk_size = 500
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.required_fields = ['name']
 
-    @transaction.atomic
-    def run_import(self):
-        """Import categories from CSV file."""
-        self.start_import('category')
-        rows = self.read_csv()
+    def process_chunk(self, rows):
+        """Import categories from a block of CSV rows."""
+        names = {row['name'] for _, row in rows if row.get('name')}
+        existing = {category.name: category for category in Category.objects.filter(name__in=names)}
 
-        for i, row in enumerate(rows, start=1):
+        for i, row in rows:
             try:
                 # Validate required fields
                 self.validate_required_fields(row, i)
 
                 # Check if category exists
-                try:
-                    category = Category.objects.get(name=row['name'])
-                    if not self.update_existing:
-                        self.log_error(i, f"Kategorie mit Namen {row['name']} existiert bereits.", row)
-                        continue
-                except Category.DoesNotExist:
+                category = existing.get(row['name'])
+                if category is None:
                     category = Category(name=row['name'])
+                elif not self.update_existing:
+                    self.log_error(i, f"Kategorie mit Namen {row['name']} existiert bereits.", row)
+                    continue
 
                 # Update category fields
                 category.description = row.get('description', '')
 
                 category.save()
+                existing[category.name] = category
                 self.successful_rows += 1
 
             except Exception as e:
                 self.log_error(i, str(e), row)
-
-        return self.finalize_import(len(rows))
\ No newline at end of file
@@ -0,0 +1,55 @@
+from django.contrib.auth.models import User
+
+from core.importers.base import BaseImporter
+from organization.models import Department
+
+
+class DepartmentImporter(BaseImporter):
+    """Importer für Abteilungen."""
+
+    import_type = 'departments'
+
+    # Codes pro Abfrage (SQLite-Parameterlimit)
+    chunk_size = 500
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.required_fields = ['name', 'code']
+
+    def process_chunk(self, rows):
+        """Legt die Abteilungen eines Blocks an bzw. aktualisiert sie (Abgleich über den Code)."""
+        codes = {row['code'].strip() for _, row in rows if row.get('code')}
+        existing = {department.code: department for department in Department.objects.filter(code__in=codes)}
+        usernames = {row['manager_username'].strip() for _, row in rows if row.get('manager_username')}
+        managers = {user.username: user for user in User.objects.filter(username__in=usernames)}
+
+        for i, row in rows:
+            try:
+                self.validate_required_fields(row, i)
+
+                manager = None
+                manager_username = row.get('manager_username', '').strip()
+                if manager_username:
+                    manager = managers.get(manager_username)
+                    if manager is None:
+                        self.log_error(i, f'Benutzer "{manager_username}" nicht gefunden.', row,
+                                       field_name='manager_username', field_value=manager_username)
+                        continue
+
+                code = row['code'].strip()
+                department = existing.get(code)
+                if department is None:
+                    department = Department(code=code)
+                elif not self.update_existing:
+                    self.log_error(i, f"Abteilung mit Code {code} existiert bereits.", row)
+                    continue
+
+                department.name = row['name'].strip()
+                department.manager = manager
+
+                department.save()
+                existing[code] = department
+                self.successful_rows += 1
+
+            except Exception as e:
+                self.log_error(i, str(e), row)
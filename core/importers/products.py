@@ -1,149 +1,257 @@
-from core.importers.base import BaseImporter
-from core.models import Product, Category
+from decimal import Decimal, InvalidOperation
+
+from core.importers.base import BaseImporter, insert_rows
+from core.models import Product, Category, ProductStockSummary
+from core.utils.dashboard import invalidate_dashboard_cache
+from order.models import OrderSuggestionDirtyProduct
+from order.services import mark_products_dirty
 from suppliers.models import SupplierProduct, Supplier
-from django.db import transaction
+from django.db import connection
+from django.utils import timezone
+
+# Artikelnummern pro Abfrage (SQLite-Parameterlimit)
+SKU_LOOKUP_SIZE = 500
 
 
 class ProductImporter(BaseImporter):
     """Importer for products."""
 
+    import_type = 'product'
+
+    # Felder, die beim Aktualisieren bestehender Produkte geschrieben werden
+    update_fields = ['name', 'description', 'barcode', 'category', 'minimum_stock', 'unit']
+
     def __init__(self, *args, **kwargs):
         self.default_category = kwargs.pop('default_category', None)
         super().__init__(*args, **kwargs)
         self.required_fields = ['name', 'sku']
+        # Kategorien nach Namen, über alle Blöcke hinweg
+        self.categories = {}
 
     def get_category(self, category_name):
         """Get or create a category by name."""
         if not category_name:
             return self.default_category
-
+        return self.get_categories([category_name])[category_name]
+
+    def get_categories(self, names):
+        """Löst Kategorienamen gesammelt auf und legt fehlende Kategorien an."""
+        categories = self.categories
+        missing = set(names) - categories.keys()
+        if missing:
+            # Bei doppelten Namen gilt die älteste Kategorie
+            for category in Category.objects.filter(name__in=missing).order_by('-pk'):
+                categories[category.name] = category
+            new_categories = [Category(name=name) for name in sorted(missing - categories.keys())]
+            for category in Category.objects.bulk_create(new_categories):
+                categories[category.name] = category
+        return categories
+
+    @staticmethod
+    def parse_int(value):
         try:
-            return Category.objects.get(name=category_name)
-        except Category.DoesNotExist:
-            return Category.objects.create(name=category_name)
-
-    @transaction.atomic
-    def run_import(self):
-        """Import products from CSV file."""
-        self.start_import('product')
-        rows = self.read_csv()
-
-        for i, row in enumerate(rows, start=1):
+            return int(float(value))
+        except (TypeError, ValueError):
+            return 0
+
+    @staticmethod
+    def load_existing(skus, attnames):
+        """Lädt ID und aktuelle Feldwerte bestehender Produkte je Artikelnummer."""
+        skus = list(skus)
+        existing = {}
+        for start in range(0, len(skus), SKU_LOOKUP_SIZE):
+            for sku, *values in Product.objects.filter(
+                sku__in=skus[start:start + SKU_LOOKUP_SIZE]
+            ).values_list('sku', 'pk', *attnames):
+                existing[sku] = tuple(values)
+        return existing
+
+    def process_chunk(self, rows):
+        """Importiert einen Block: ein Abgleich der Artikelnummern, gesammelte Schreibzugriffe."""
+        valid_rows = []
+        for i, row in rows:
             try:
                 # Validate required fields
                 self.validate_required_fields(row, i)
-
-                # Process category
-                category = None
-                if 'category' in row and row['category']:
-                    category = self.get_category(row['category'])
-                elif self.default_category:
-                    category = self.default_category
-
-                # Check if product exists
-                try:
-                    product = Product.objects.get(sku=row['sku'])
-                    if not self.update_existing:
-                        self.log_error(i, f"Produkt mit Artikelnummer {row['sku']} existiert bereits.", row)
-                        continue
-                except Product.DoesNotExist:
-                    product = Product(sku=row['sku'])
-
-                # Update product fields
-                product.name = row['name']
-                product.description = row.get('description', '')
-                product.barcode = row.get('barcode', '')
-                product.category = category
-
-                # Handle numeric fields
-                try:
-                    product.current_stock = float(row.get('current_stock', 0))
-                except ValueError:
-                    product.current_stock = 0
-
-                try:
-                    product.minimum_stock = float(row.get('minimum_stock', 0))
-                except ValueError:
-                    product.minimum_stock = 0
-
-                product.unit = row.get('unit', 'Stück')
-
-                product.save()
-                self.successful_rows += 1
-
-            except Exception as e:
+                valid_rows.append((i, row))
+            except ValueError as e:
                 self.log_error(i, str(e), row)
-
-        return self.finalize_import(len(rows))
+        if not valid_rows:
+            return
+
+        categories = self.get_categories({row['category'] for _, row in valid_rows if row.get('category')})
+        default_category_id = self.default_category.pk if self.default_category else None
+        attnames = [Product._meta.get_field(field).attname for field in self.update_fields]
+        products = self.load_existing({row['sku'] for _, row in valid_rows}, attnames)
+
+        max_lengths = {field: Product._meta.get_field(field).max_length for field in ('sku', 'name', 'barcode', 'unit')}
+
+        # Feldwerte je Artikelnummer in der Reihenfolge von update_fields
+        values_by_sku = {}
+        for i, row in valid_rows:
+            sku = row['sku']
+            too_long = [field for field, max_length in max_lengths.items() if len(row.get(field, '')) > max_length]
+            if too_long:
+                self.log_error(i, f"Feld '{too_long[0]}' ist zu lang.", row, field_name=too_long[0],
+                               field_value=row[too_long[0]])
+                continue
+
+            # Check if product exists (auch weiter oben im selben Block)
+            if not self.update_existing and (sku in products or sku in values_by_sku):
+                self.log_error(i, f"Produkt mit Artikelnummer {sku} existiert bereits.", row)
+                continue
+
+            values_by_sku[sku] = (
+                row['name'],
+                row.get('description', ''),
+                row.get('barcode', ''),
+                categories[row['category']].pk if row.get('category') else default_category_id,
+                self.parse_int(row.get('minimum_stock', 0)),
+                row.get('unit', 'Stück'),
+            )
+            self.successful_rows += 1
+
+        # Bestehende Produkte: nur tatsächlich geänderte schreiben
+        changed_products = []
+        minimum_stock_changed = []
+        now = timezone.now()
+        minimum_stock_index = attnames.index('minimum_stock')
+        for sku, values in values_by_sku.items():
+            existing = products.get(sku)
+            if existing is None or existing[1:] == values:
+                continue
+            if existing[1 + minimum_stock_index] != values[minimum_stock_index]:
+                minimum_stock_changed.append(existing[0])
+            changed_products.append(Product(pk=existing[0], updated_at=now, **dict(zip(attnames, values))))
+        if changed_products:
+            Product.objects.bulk_update(changed_products, [*self.update_fields, 'updated_at'])
+
+        # Neue Produkte ohne Modell-Overhead einfügen, IDs anschließend per Artikelnummer laden
+        new_skus = [sku for sku in values_by_sku if sku not in products]
+        insert_rows(Product, [*attnames, 'sku'], [(*values_by_sku[sku], sku) for sku in new_skus])
+        created_ids = []
+        for start in range(0, len(new_skus), SKU_LOOKUP_SIZE):
+            created_ids.extend(Product.objects.filter(
+                sku__in=new_skus[start:start + SKU_LOOKUP_SIZE]
+            ).values_list('pk', flat=True))
+
+        # Massenoperationen lösen keine Signale aus: Bestandssumme und Vormerkung
+        # für Bestellvorschläge wie in den Signal-Handlern nachziehen
+        insert_rows(ProductStockSummary, ['product'], [(product_id,) for product_id in created_ids])
+        marked_at = connection.ops.adapt_datetimefield_value(now)
+        insert_rows(OrderSuggestionDirtyProduct, ['product', 'marked_at'],
+                    [(product_id, marked_at) for product_id in created_ids])
+        mark_products_dirty(minimum_stock_changed)
+        if created_ids or minimum_stock_changed:
+            invalidate_dashboard_cache()
 
 
 class SupplierProductImporter(BaseImporter):
     """Importer for supplier-product relationships."""
 
+    import_type = 'supplier_product'
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.required_fields = ['supplier_name', 'product_sku']
+        # Lieferanten nach Namen, über alle Blöcke hinweg
+        self.suppliers = {}
 
-    @transaction.atomic
-    def run_import(self):
-        """Import supplier-product relationships from CSV file."""
-        self.start_import('supplier_product')
-        rows = self.read_csv()
-
-        for i, row in enumerate(rows, start=1):
+    @staticmethod
+    def parse_price(value):
+        try:
+            return Decimal(str(value).strip() or 0).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            return Decimal('0.00')
+
+    def process_chunk(self, rows):
+        """Importiert einen Block mit gesammelten Abfragen für Lieferanten, Produkte und Zuordnungen."""
+        valid_rows = []
+        for i, row in rows:
             try:
                 # Validate required fields
                 self.validate_required_fields(row, i)
-
-                # Find supplier and product
-                try:
-                    supplier = Supplier.objects.get(name=row['supplier_name'])
-                except Supplier.DoesNotExist:
-                    self.log_error(i, f"Lieferant '{row['supplier_name']}' nicht gefunden.", row)
-                    continue
-
-                try:
-                    product = Product.objects.get(sku=row['product_sku'])
-                except Product.DoesNotExist:
-                    self.log_error(i, f"Produkt mit Artikelnummer '{row['product_sku']}' nicht gefunden.", row)
-                    continue
-
-                # Check if relationship exists
-                try:
-                    sp = SupplierProduct.objects.get(supplier=supplier, product=product)
-                    if not self.update_existing:
-                        self.log_error(i,
-                                       f"Zuordnung zwischen Lieferant '{supplier.name}' und Produkt '{product.name}' existiert bereits.",
-                                       row)
-                        continue
-                except SupplierProduct.DoesNotExist:
-                    sp = SupplierProduct(supplier=supplier, product=product)
-
-                # Update fields
-                sp.supplier_sku = row.get('supplier_sku', '')
-
-                try:
-                    sp.purchase_price = float(row.get('purchase_price', 0))
-                except ValueError:
-                    sp.purchase_price = 0
-
-                try:
-                    sp.lead_time_days = int(row.get('lead_time_days', 7))
-                except ValueError:
-                    sp.lead_time_days = 7
-
-                sp.is_preferred = row.get('is_preferred', '').lower() in ('true', 'yes', '1', 'ja', 'wahr', 'y', 'j')
-                sp.notes = row.get('notes', '')
-
-                # If this is marked as preferred, update other relationships for this product
-                if sp.is_preferred:
-                    SupplierProduct.objects.filter(product=product).exclude(pk=sp.pk if sp.pk else -1).update(
-                        is_preferred=False)
-
-                sp.save()
-                self.successful_rows += 1
-
-            except Exception as e:
+                valid_rows.append((i, row))
+            except ValueError as e:
                 self.log_error(i, str(e), row)
+        if not valid_rows:
+            return
+
+        supplier_names = {row['supplier_name'] for _, row in valid_rows}
+        for supplier in Supplier.objects.filter(name__in=supplier_names - self.suppliers.keys()).order_by('-pk'):
+            self.suppliers[supplier.name] = supplier
+        products = Product.objects.in_bulk({row['product_sku'] for _, row in valid_rows}, field_name='sku')
+        existing = {
+            (sp.supplier_id, sp.product_id): sp
+            for sp in SupplierProduct.objects.filter(
+                product_id__in=[product.pk for product in products.values()],
+                supplier_id__in=[self.suppliers[name].pk for name in supplier_names if name in self.suppliers],
+            )
+        }
+
+        assignments = {}
+        preferred = {}
+        for i, row in valid_rows:
+            # Find supplier and product
+            supplier = self.suppliers.get(row['supplier_name'])
+            if supplier is None:
+                self.log_error(i, f"Lieferant '{row['supplier_name']}' nicht gefunden.", row)
+                continue
+
+            product = products.get(row['product_sku'])
+            if product is None:
+                self.log_error(i, f"Produkt mit Artikelnummer '{row['product_sku']}' nicht gefunden.", row)
+                continue
+
+            # Check if relationship exists
+            key = (supplier.pk, product.pk)
+            sp = assignments.get(key) or existing.get(key)
+            if sp is None:
+                sp = SupplierProduct(supplier=supplier, product=product)
+            elif not self.update_existing:
+                self.log_error(i,
+                               f"Zuordnung zwischen Lieferant '{supplier.name}' und Produkt '{product.name}' existiert bereits.",
+                               row)
+                continue
+            assignments[key] = sp
+
+            # Update fields
+            sp.supplier_sku = row.get('supplier_sku', '')
+            sp.purchase_price = self.parse_price(row.get('purchase_price', 0))
 
-        return self.finalize_import(len(rows))
\ No newline at end of file
+            try:
+                sp.lead_time_days = int(row.get('lead_time_days', 7))
+            except ValueError:
+                sp.lead_time_days = 7
+
+            sp.is_preferred = row.get('is_preferred', '').lower() in ('true', 'yes', '1', 'ja', 'wahr', 'y', 'j')
+            sp.notes = row.get('notes', '')
+
+            # Innerhalb des Blocks gilt die letzte bevorzugte Zuordnung eines Produkts
+            if sp.is_preferred:
+                previous = preferred.get(product.pk)
+                if previous is not None and previous is not sp:
+                    previous.is_preferred = False
+                preferred[product.pk] = sp
+
+            self.successful_rows += 1
+
+        changed = [sp for sp in assignments.values() if sp.pk]
+        if changed:
+            now = timezone.now()
+            for sp in changed:
+                sp.updated_at = now
+            SupplierProduct.objects.bulk_update(
+                changed,
+                ['supplier_sku', 'purchase_price', 'lead_time_days', 'is_preferred', 'notes', 'updated_at']
+            )
+        SupplierProduct.objects.bulk_create([sp for sp in assignments.values() if not sp.pk])
+
+        # If this is marked as preferred, update other relationships for this product
+        if preferred:
+            SupplierProduct.objects.filter(product_id__in=preferred.keys(), is_preferred=True).exclude(
+                pk__in=[sp.pk for sp in preferred.values()]
+            ).update(is_preferred=False)
+
+        # bulk_create/bulk_update lösen keine Signale aus
+        mark_products_dirty({product_id for _, product_id in assignments})
@@ -1,59 +1,104 @@
-import csv
-import io
 from datetime import datetime
 
-from django.utils.timezone import make_aware
-
-from core.models import Product, SerialNumber
+from core.importers.base import BaseImporter
+from core.models import Product, ProductVariant, SerialNumber
 from inventory.models import Warehouse
 
 
-class SerialNumberImporter:
-    def __init__(self, user, file):
-        self.user = user
-        self.file = file
+class SerialNumberImporter(BaseImporter):
+    """Importer für Seriennummern."""
+
+    import_type = 'serialnumbers'
+
+    # Seriennummern pro Abfrage (SQLite-Parameterlimit)
+    chunk_size = 500
 
-    def run_import(self):
-        decoded_file = io.TextIOWrapper(self.file, encoding='utf-8')
-        reader = csv.DictReader(decoded_file)
+    def __init__(self, *args, default_status='in_stock', default_warehouse=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.required_fields = ['product_sku', 'serial_number']
+        # Werte für Zeilen ohne Status bzw. Lager
+        self.default_status = default_status or 'in_stock'
+        self.default_warehouse = default_warehouse
+        # Lager nach Namen, über alle Blöcke hinweg
+        self.warehouses = {}
 
-        successful = 0
-        failed = 0
-        total = 0
+    def get_warehouse(self, name):
+        if name not in self.warehouses:
+            self.warehouses[name] = Warehouse.objects.filter(name=name).first()
+        return self.warehouses[name]
 
-        for row in reader:
-            total += 1
+    def process_chunk(self, rows):
+        """Legt die Seriennummern eines Blocks an bzw. aktualisiert sie."""
+        skus = {row['product_sku'] for _, row in rows if row.get('product_sku')}
+        products = {product.sku: product for product in Product.objects.filter(sku__in=skus)}
+        variants = {
+            (variant.parent_product_id, variant.name): variant
+            for variant in ProductVariant.objects.filter(
+                parent_product__in=products.values(),
+                name__in={row['variant_name'] for _, row in rows if row.get('variant_name')}
+            )
+        }
+        serial_products = set()
+        existing = {
+            serial.serial_number: serial
+            for serial in SerialNumber.objects.filter(
+                serial_number__in={row['serial_number'] for _, row in rows if row.get('serial_number')}
+            )
+        }
+
+        for i, row in rows:
             try:
-                product = Product.objects.get(sku=row['product_sku'])
-                warehouse = Warehouse.objects.get(name=row['warehouse_name']) if row.get('warehouse_name') else None
-
-                SerialNumber.objects.create(
-                    product=product,
-                    serial_number=row['serial_number'],
-                    status=row.get('status', 'in_stock'),
-                    warehouse=warehouse,
-                    purchase_date=self._parse_date(row.get('purchase_date')),
-                    expiry_date=self._parse_date(row.get('expiry_date')),
-                    notes=row.get('notes', ''),
-                    created_by=self.user
-                )
-                successful += 1
+                self.validate_required_fields(row, i)
+
+                product = products.get(row['product_sku'])
+                if product is None:
+                    self.log_error(i, f"Produkt mit SKU '{row['product_sku']}' nicht gefunden.", row)
+                    continue
+
+                warehouse = self.default_warehouse
+                if row.get('warehouse_name'):
+                    warehouse = self.get_warehouse(row['warehouse_name'])
+                    if warehouse is None:
+                        self.log_error(i, f"Lager '{row['warehouse_name']}' nicht gefunden.", row)
+                        continue
+
+                variant = None
+                if row.get('variant_name'):
+                    variant = variants.get((product.pk, row['variant_name']))
+                    if variant is None:
+                        self.log_error(i, f"Variante '{row['variant_name']}' für Produkt nicht gefunden.", row)
+                        continue
+
+                serial = existing.get(row['serial_number'])
+                if serial is None:
+                    serial = SerialNumber(serial_number=row['serial_number'])
+                elif not self.update_existing:
+                    self.log_error(i, f"Seriennummer '{row['serial_number']}' existiert bereits.", row)
+                    continue
+
+                serial.product = product
+                serial.status = row.get('status') or self.default_status
+                serial.warehouse = warehouse
+                serial.variant = variant
+                serial.purchase_date = self._parse_date(row.get('purchase_date'))
+                serial.expiry_date = self._parse_date(row.get('expiry_date'))
+                serial.notes = row.get('notes', '')
+                serial.save()
+
+                existing[serial.serial_number] = serial
+                serial_products.add(product.pk)
+                self.successful_rows += 1
 
             except Exception as e:
-                failed += 1
-                # Optional: Logging für Debugging
+                self.log_error(i, str(e), row)
 
-        return type('ImportLog', (), {
-            'successful_rows': successful,
-            'failed_rows': failed,
-            'total_rows': total,
-            'pk': 0  # Falls du irgendwann echte Logs speichern willst
-        })()
+        # Produkte mit importierten Seriennummern für die Seriennummernverwaltung aktivieren
+        Product.objects.filter(pk__in=serial_products, has_serial_numbers=False).update(has_serial_numbers=True)
 
     def _parse_date(self, date_str):
         if not date_str:
             return None
         try:
-            return make_aware(datetime.strptime(date_str, '%Y-%m-%d'))
-        except Exception:
-            return None
\ No newline at end of file
+            return datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            return None
@@ -1,34 +1,36 @@
 from core.importers.base import BaseImporter
 from suppliers.models import Supplier
-from django.db import transaction
 
 
 class SupplierImporter(BaseImporter):
     """Importer for suppliers."""
 
+    import_type = 'supplier'
+
+    # Namen pro Abfrage (SQLite-Parameterlimit)
+    chunk_size = 500
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.required_fields = ['name']
 
-    @transaction.atomic
-    def run_import(self):
-        """Import suppliers from CSV file."""
-        self.start_import('supplier')
-        rows = self.read_csv()
+    def process_chunk(self, rows):
+        """Import suppliers from a block of CSV rows."""
+        names = {row['name'] for _, row in rows if row.get('name')}
+        existing = {supplier.name: supplier for supplier in Supplier.objects.filter(name__in=names)}
 
-        for i, row in enumerate(rows, start=1):
+        for i, row in rows:
             try:
                 # Validate required fields
                 self.validate_required_fields(row, i)
 
                 # Check if supplier exists
-                try:
-                    supplier = Supplier.objects.get(name=row['name'])
-                    if not self.update_existing:
-                        self.log_error(i, f"Lieferant mit Namen {row['name']} existiert bereits.", row)
-                        continue
-                except Supplier.DoesNotExist:
+                supplier = existing.get(row['name'])
+                if supplier is None:
                     supplier = Supplier(name=row['name'])
+                elif not self.update_existing:
+                    self.log_error(i, f"Lieferant mit Namen {row['name']} existiert bereits.", row)
+                    continue
 
                 # Update supplier fields
                 supplier.contact_person = row.get('contact_person', '')
@@ -37,9 +39,8 @@ class SupplierImporter(BaseImporter):
                 supplier.address = row.get('address', '')
 
                 supplier.save()
+                existing[supplier.name] = supplier
                 self.successful_rows += 1
 
             except Exception as e:
                 self.log_error(i, str(e), row)
-
-        return self.finalize_import(len(rows))
\ No newline at end of file
@@ -0,0 +1,123 @@
+from decimal import Decimal, InvalidOperation
+
+from core.importers.base import BaseImporter
+from core.models import Product, ProductWarehouse
+from core.utils.access import get_accessible_warehouses
+from core.utils.dashboard import invalidate_dashboard_cache
+from core.utils.stock import refresh_stock_summaries
+from inventory.models import StockMovement, Warehouse
+from order.services import mark_products_dirty
+
+
+class WarehouseProductImporter(BaseImporter):
+    """Importer für Produkt-Lager-Bestände.
+
+    Abweichende Bestände werden als Bestandskorrektur ('adj') gebucht. Je Block
+    werden Bewegungen und Bestandszeilen gesammelt geschrieben.
+    """
+
+    import_type = 'warehouse_products'
+
+    # Artikelnummern pro Abfrage (SQLite-Parameterlimit)
+    chunk_size = 500
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.required_fields = ['product_sku', 'warehouse_name', 'quantity']
+        self.warehouses = None
+        self.accessible_warehouse_ids = None
+
+    def load_warehouses(self):
+        """Aktive Lager nach Namen und die Lager, deren Bestand der Benutzer pflegen darf."""
+        if self.warehouses is None:
+            self.warehouses = dict(Warehouse.objects.filter(is_active=True).values_list('name', 'pk'))
+            self.accessible_warehouse_ids = set(
+                get_accessible_warehouses(self.user, 'manage_stock').values_list('pk', flat=True)
+            )
+
+    def process_chunk(self, rows):
+        """Bucht die Bestände eines Blocks."""
+        self.load_warehouses()
+        skus = {row['product_sku'].strip() for _, row in rows if row.get('product_sku')}
+        products = dict(Product.objects.filter(sku__in=skus).values_list('sku', 'pk'))
+        stock_rows = {
+            (stock_row.product_id, stock_row.warehouse_id): stock_row
+            for stock_row in ProductWarehouse.objects.filter(product_id__in=products.values())
+        }
+
+        movements = []
+        changed_rows = {}
+        new_rows = {}
+        for i, row in rows:
+            try:
+                self.validate_required_fields(row, i)
+                product_sku = row['product_sku'].strip()
+                warehouse_name = row['warehouse_name'].strip()
+
+                product_id = products.get(product_sku)
+                if product_id is None:
+                    self.log_error(i, f'Produkt mit SKU "{product_sku}" nicht gefunden.', row,
+                                   'product_sku', product_sku)
+                    continue
+
+                warehouse_id = self.warehouses.get(warehouse_name)
+                if warehouse_id is None:
+                    self.log_error(i, f'Lager "{warehouse_name}" nicht gefunden oder inaktiv.', row,
+                                   'warehouse_name', warehouse_name)
+                    continue
+
+                # Prüfen, ob der Benutzer Zugriff auf das Lager hat
+                if warehouse_id not in self.accessible_warehouse_ids:
+                    self.log_error(i, f'Keine Berechtigung für Lager "{warehouse_name}".', row,
+                                   'warehouse_name', warehouse_name)
+                    continue
+
+                quantity_str = row['quantity'].strip()
+                try:
+                    quantity = Decimal(quantity_str)
+                except InvalidOperation:
+                    quantity = None
+                if quantity is None or quantity < 0:
+                    self.log_error(i, f'Ungültige Menge "{quantity_str}".', row, 'quantity', quantity_str)
+                    continue
+
+                key = (product_id, warehouse_id)
+                stock_row = stock_rows.get(key)
+                current_quantity = stock_row.quantity if stock_row else Decimal('0')
+
+                # Bestandskorrektur nur vornehmen, wenn sich die Menge ändert
+                if stock_row is None or current_quantity != quantity:
+                    movements.append(StockMovement(
+                        product_id=product_id,
+                        warehouse_id=warehouse_id,
+                        quantity=quantity,
+                        movement_type='adj',
+                        reference=(row.get('reference') or '').strip() or 'CSV-Import',
+                        notes=f'CSV-Import: Bestand von {current_quantity} auf {quantity} angepasst',
+                        created_by=self.user
+                    ))
+                    if stock_row is None:
+                        stock_row = ProductWarehouse(product_id=product_id, warehouse_id=warehouse_id)
+                        stock_rows[key] = stock_row
+                        new_rows[key] = stock_row
+                    elif key not in new_rows:
+                        changed_rows[key] = stock_row
+                    stock_row.quantity = quantity
+
+                self.successful_rows += 1
+
+            except Exception as e:
+                self.log_error(i, str(e), row)
+
+        if not movements:
+            return
+
+        StockMovement.objects.bulk_create(movements)
+        ProductWarehouse.objects.bulk_update(list(changed_rows.values()), ['quantity'])
+        ProductWarehouse.objects.bulk_create(list(new_rows.values()))
+
+        # Massenoperationen lösen keine Signale aus: abhängige Daten direkt nachziehen
+        product_ids = list({movement.product_id for movement in movements})
+        refresh_stock_summaries(product_ids)
+        mark_products_dirty(product_ids)
+        invalidate_dashboard_cache()
@@ -0,0 +1,46 @@
+from core.importers.base import BaseImporter
+from inventory.models import Warehouse
+
+TRUE_VALUES = ('true', '1', 'yes', 'ja', 'y', 'j')
+
+
+class WarehouseImporter(BaseImporter):
+    """Importer für Lager."""
+
+    import_type = 'warehouses'
+
+    # Namen pro Abfrage (SQLite-Parameterlimit)
+    chunk_size = 500
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.required_fields = ['name', 'location']
+
+    def process_chunk(self, rows):
+        """Legt die Lager eines Blocks an bzw. aktualisiert sie (Abgleich über den Namen)."""
+        names = {row['name'].strip() for _, row in rows if row.get('name')}
+        existing = {warehouse.name: warehouse for warehouse in Warehouse.objects.filter(name__in=names)}
+
+        for i, row in rows:
+            try:
+                self.validate_required_fields(row, i)
+
+                name = row['name'].strip()
+                warehouse = existing.get(name)
+                if warehouse is None:
+                    warehouse = Warehouse(name=name)
+                elif not self.update_existing:
+                    self.log_error(i, f"Lager mit Namen {name} existiert bereits.", row)
+                    continue
+
+                warehouse.location = row['location'].strip()
+                warehouse.description = row.get('description', '').strip()
+                if row.get('is_active', '').strip():
+                    warehouse.is_active = row['is_active'].strip().lower() in TRUE_VALUES
+
+                warehouse.save()
+                existing[name] = warehouse
+                self.successful_rows += 1
+
+            except Exception as e:
+                self.log_error(i, str(e), row)
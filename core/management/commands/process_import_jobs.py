@@ -0,0 +1,75 @@
+# core/management/commands/process_import_jobs.py
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.utils.import_jobs import process_next_job, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = 'Verarbeitet eingereihte Importe (ImportJob) mit einem Pool von Worker-Threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2,
+                            help='Anzahl paralleler Worker-Threads (Standard: 2)')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Wartezeit in Sekunden zwischen zwei Durchläufen (Standard: 5)')
+        parser.add_argument('--once', action='store_true',
+                            help='Nur die aktuell wartenden Jobs verarbeiten und dann beenden')
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        if workers > 1 and connection.vendor == 'sqlite':
+            # SQLite erlaubt nur eine schreibende Transaktion gleichzeitig
+            self.stdout.write(self.style.WARNING('SQLite: Importe werden mit einem Worker verarbeitet.'))
+            workers = 1
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        names = [f'{prefix}:{index}' for index in range(workers)]
+        self.stdout.write(self.style.SUCCESS(f'Import-Worker gestartet ({workers} Threads).'))
+
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import-worker') if workers > 1 else None
+        try:
+            while True:
+                requeued = requeue_stale_jobs()
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f'{requeued} abgebrochene(r) Import(e) erneut eingereiht.'))
+                if pool:
+                    processed = sum(pool.map(self.drain_queue, names))
+                else:
+                    # Ein einzelner Worker läuft im Hauptthread
+                    processed = self.drain_queue(names[0], close_connection=False)
+                if processed:
+                    self.stdout.write(f'{processed} Import(e) verarbeitet.')
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Worker wird beendet.')
+        finally:
+            if pool:
+                pool.shutdown(wait=True)
+
+    def drain_queue(self, worker, close_connection=True):
+        """Verarbeitet Jobs, bis die Warteschlange leer ist.
+
+        Jeder Thread arbeitet mit einer eigenen Datenbankverbindung, die danach geschlossen wird.
+        """
+        processed = 0
+        try:
+            while True:
+                start_time = time.monotonic()
+                import_log = process_next_job(worker)
+                if import_log is None:
+                    return processed
+                processed += 1
+                self.stdout.write(self.style.SUCCESS(
+                    f'[{worker}] {import_log.file_name}: {import_log.rows_processed} Zeilen, '
+                    f'Status {import_log.status}, {time.monotonic() - start_time:.2f} Sekunden.'
+                ))
+        finally:
+            if close_connection:
+                connection.close()
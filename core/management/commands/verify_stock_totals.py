@@ -0,0 +1,75 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Product, ProductStockSummary
+from core.utils.stock import compute_stock_totals, refresh_stock_summaries
+
+
+class Command(BaseCommand):
+    help = 'Prüft die materialisierten Bestandssummen gegen ProductWarehouse und repariert Abweichungen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true',
+                            help='Abweichende oder fehlende Bestandssummen neu berechnen')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Anzahl der Produkte pro Prüfblock (Standard: 500)')
+        parser.add_argument('--verbose-drift', action='store_true',
+                            help='Jede Abweichung einzeln ausgeben')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        checked = 0
+        drifted = 0
+        repaired = 0
+
+        product_ids = Product.objects.order_by('pk').values_list('pk', flat=True)
+        chunk = []
+        for product_id in product_ids.iterator(chunk_size=chunk_size):
+            chunk.append(product_id)
+            if len(chunk) >= chunk_size:
+                result = self.check_chunk(chunk, options)
+                checked += len(chunk)
+                drifted += result[0]
+                repaired += result[1]
+                chunk = []
+
+        if chunk:
+            result = self.check_chunk(chunk, options)
+            checked += len(chunk)
+            drifted += result[0]
+            repaired += result[1]
+
+        message = f'{checked} Produkte geprüft, {drifted} Abweichungen gefunden, {repaired} repariert.'
+        if drifted and not options['repair']:
+            self.stdout.write(self.style.WARNING(message + ' Mit --repair beheben.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+
+    def check_chunk(self, chunk, options):
+        id_range = (chunk[0], chunk[-1])
+        live = compute_stock_totals(id_range=id_range)
+        stored = {
+            product_id: (total, active, warehouses)
+            for product_id, total, active, warehouses in ProductStockSummary.objects.filter(
+                product_id__gte=id_range[0], product_id__lte=id_range[1]
+            ).values_list('product_id', 'total_quantity', 'active_quantity', 'warehouse_count')
+        }
+
+        empty = (Decimal('0'), Decimal('0'), 0)
+        drifted_ids = []
+        for product_id in chunk:
+            expected = live.get(product_id, empty)
+            actual = stored.get(product_id)
+            if actual is None or (Decimal(actual[0]), Decimal(actual[1]), actual[2]) != expected:
+                drifted_ids.append(product_id)
+                if options['verbose_drift']:
+                    self.stdout.write(f'Produkt {product_id}: gespeichert {actual}, erwartet {expected}')
+
+        if drifted_ids and options['repair']:
+            with transaction.atomic():
+                refresh_stock_summaries(drifted_ids)
+            return len(drifted_ids), len(drifted_ids)
+
+        return len(drifted_ids), 0
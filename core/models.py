@@ -7,9 +7,10 @@ from datetime import datetime
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
-from django.db import models
+from django.db import models, transaction
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, render
+from model_utils import FieldTracker
 
 from core.utils.pagination import paginate_queryset
 from inventory.models import Warehouse
@@ -80,15 +81,19 @@ class Product(models.Model):
     tax = models.ForeignKey(Tax, on_delete=models.SET_NULL, null=True, blank=True,
                             verbose_name="Mehrwertsteuersatz",
                             help_text="Der auf dieses Produkt anzuwendende Mehrwertsteuersatz")
+    tracker = FieldTracker(['minimum_stock'])
 
     def __str__(self):
         return self.name
     
     @property
     def total_stock(self):
-        """Berechnet den Gesamtbestand über alle Lager."""
-        from django.db.models import Sum
-        return self.productwarehouse_set.aggregate(Sum('quantity'))['quantity__sum'] or 0
+        """Gesamtbestand über alle Lager aus der materialisierten Bestandssumme."""
+        try:
+            return self.stock_summary.total_quantity
+        except ProductStockSummary.DoesNotExist:
+            from django.db.models import Sum
+            return self.productwarehouse_set.aggregate(Sum('quantity'))['quantity__sum'] or 0
 
     @property
     def get_tax_rate(self):
@@ -110,9 +115,48 @@ class ProductWarehouse(models.Model):
 
     class Meta:
         unique_together = ('product', 'warehouse')
+        indexes = [
+            # Deckender Index für die Produktanzahl je Lager (Dashboard)
+            models.Index(fields=['warehouse', 'quantity']),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Bestandssumme wird per Signal in derselben Transaktion aktualisiert
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+
+class ProductStockSummary(models.Model):
+    """Materialisierte Bestandssummen je Produkt.
+
+    Wird bei jedem Schreiben von ProductWarehouse in derselben Transaktion
+    aktualisiert (siehe core/signals.py) und kann mit verify_stock_totals
+    geprüft und repariert werden.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='stock_summary')
+    total_quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0, db_index=True,
+                                         verbose_name="Gesamtbestand")
+    active_quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0, db_index=True,
+                                          verbose_name="Bestand in aktiven Lagern")
+    warehouse_count = models.IntegerField(default=0, verbose_name="Lager mit Bestand")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Bestandssumme"
+        verbose_name_plural = "Bestandssummen"
+
+    def __str__(self):
+        return f"{self.product_id}: {self.total_quantity}"
+
 
 class ImportLog(models.Model):
     STATUS_CHOICES = (
+        ('queued', 'Queued'),
         ('completed', 'Completed'),
         ('completed_with_errors', 'Completed with Errors'),
         ('processing', 'Processing'),
@@ -143,6 +187,7 @@ class ImportLog(models.Model):
     rows_created = models.IntegerField(default=0)
     rows_updated = models.IntegerField(default=0)
     rows_error = models.IntegerField(default=0)
+    rows_per_second = models.FloatField(default=0)
 
     error_file = models.FileField(upload_to='import_errors/', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -399,6 +444,35 @@ class ImportError(models.Model):
         ordering = ['row_number']
 
 
+class ImportJob(models.Model):
+    """Warteschlangeneintrag für einen Import, den process_import_jobs im Hintergrund ausführt."""
+    STATUS_CHOICES = (
+        ('queued', 'Wartend'),
+        ('running', 'Läuft'),
+        ('finished', 'Abgeschlossen'),
+        ('failed', 'Fehlgeschlagen'),
+    )
+
+    import_log = models.OneToOneField(ImportLog, on_delete=models.CASCADE, related_name='job')
+    file = models.FileField(upload_to='import_jobs/')
+    options = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', db_index=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Wird vom Importer nach jedem Block erneuert; ein veralteter Wert zeigt einen abgestürzten Worker an
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Import-Job {self.pk} ({self.get_status_display()})"
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = "Import-Job"
+        verbose_name_plural = "Import-Jobs"
+
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     departments = models.ManyToManyField(Department, related_name='user_profiles', blank=True)
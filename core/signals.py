@@ -0,0 +1,78 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from inventory.models import Warehouse
+from .models import Product, ProductStockSummary, ProductWarehouse
+from .utils.dashboard import invalidate_dashboard_cache
+from .utils.stock import refresh_stock_summaries
+
+
+@receiver(post_save, sender=ProductWarehouse)
+@receiver(post_delete, sender=ProductWarehouse)
+def update_stock_summary(sender, instance, **kwargs):
+    """Hält die materialisierte Bestandssumme des Produkts aktuell.
+
+    ProductWarehouse.save()/delete() laufen in einer Transaktion, die diesen
+    Handler einschließt; Löschungen per Kaskade laufen in der Transaktion des Collectors.
+    """
+    refresh_stock_summaries([instance.product_id])
+
+
+@receiver(post_save, sender=Product)
+def create_stock_summary(sender, instance, created, **kwargs):
+    """Neue Produkte erhalten sofort eine (leere) Bestandssumme."""
+    if created:
+        ProductStockSummary.objects.get_or_create(product_id=instance.pk)
+
+
+@receiver(pre_save, sender=Warehouse)
+def track_warehouse_activation(sender, instance, **kwargs):
+    """Merkt sich, ob sich der Aktiv-Status eines Lagers ändert."""
+    instance._activation_changed = False
+    if not instance.pk:
+        return
+
+    old_is_active = Warehouse.objects.filter(pk=instance.pk).values_list('is_active', flat=True).first()
+    instance._activation_changed = old_is_active is not None and old_is_active != instance.is_active
+
+
+@receiver(post_save, sender=Warehouse)
+def update_summaries_after_warehouse_activation(sender, instance, **kwargs):
+    """Der Bestand in aktiven Lagern ändert sich für alle Produkte dieses Lagers."""
+    if not getattr(instance, '_activation_changed', False):
+        return
+
+    product_ids = list(ProductWarehouse.objects.filter(warehouse=instance).values_list('product_id', flat=True))
+    for start in range(0, len(product_ids), 500):
+        refresh_stock_summaries(product_ids[start:start + 500])
+
+
+# Dashboard-Snapshots invalidieren, sobald sich Bestände, Inventuren oder Bestellungen ändern
+
+@receiver(post_save, sender=ProductWarehouse)
+@receiver(post_delete, sender=ProductWarehouse)
+@receiver(post_save, sender='inventory.StockMovement')
+@receiver(post_delete, sender='inventory.StockMovement')
+@receiver(post_save, sender='inventory.StockTake')
+@receiver(post_delete, sender='inventory.StockTake')
+@receiver(post_save, sender=Warehouse)
+@receiver(post_delete, sender=Warehouse)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender='order.OrderSuggestionRefreshState')
+@receiver(post_delete, sender='order.PurchaseOrder')
+def invalidate_dashboard(sender, **kwargs):
+    invalidate_dashboard_cache()
+
+
+@receiver(post_save, sender=Product)
+def invalidate_dashboard_on_product_change(sender, instance, created, **kwargs):
+    """Neue Produkte und geänderte Mindestbestände betreffen die Kennzahlen."""
+    if created or instance.tracker.has_changed('minimum_stock'):
+        invalidate_dashboard_cache()
+
+
+@receiver(post_save, sender='order.PurchaseOrder')
+def invalidate_dashboard_on_order_change(sender, instance, created, **kwargs):
+    """Neue Bestellungen und Statuswechsel betreffen die Bestellkennzahlen."""
+    if created or instance.tracker.has_changed('status'):
+        invalidate_dashboard_cache()
@@ -0,0 +1,16 @@
+import shutil
+import tempfile
+
+from django.test import override_settings
+
+
+class TemporaryMediaMixin:
+    """Legt MEDIA_ROOT für jeden Test in ein eigenes temporäres Verzeichnis, das danach gelöscht wird."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
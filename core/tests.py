@@ -1,3 +1,251 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accessmanagement.models import WarehouseAccess
+from inventory.models import StockMovement, Warehouse
+from organization.models import Department
+from suppliers.models import Supplier, SupplierProduct
+from .importers.products import ProductImporter, SupplierProductImporter
+from .models import Category, ImportJob, ImportLog, Product, ProductStockSummary, ProductWarehouse, SerialNumber
+from .test_utils import TemporaryMediaMixin
+from .utils.dashboard import build_dashboard_snapshot, get_dashboard_snapshot
+from .utils.import_jobs import requeue_stale_jobs, submit_import
+
+
+class ProductStockSummaryTest(TestCase):
+    def setUp(self):
+        self.main = Warehouse.objects.create(name='Hauptlager', location='Berlin')
+        self.backup = Warehouse.objects.create(name='Ausweichlager', location='Potsdam')
+        self.product = Product.objects.create(name='Schraube', sku='SCR-1', minimum_stock=10)
+
+    def summary(self):
+        return ProductStockSummary.objects.get(product=self.product)
+
+    def test_summary_follows_product_warehouse_writes(self):
+        self.assertEqual(self.summary().total_quantity, Decimal('0'))
+
+        stock = ProductWarehouse.objects.create(product=self.product, warehouse=self.main, quantity=5)
+        ProductWarehouse.objects.create(product=self.product, warehouse=self.backup, quantity=3)
+        self.assertEqual(self.summary().total_quantity, Decimal('8'))
+        self.assertEqual(self.summary().warehouse_count, 2)
+
+        stock.quantity = 1
+        stock.save()
+        self.assertEqual(self.summary().total_quantity, Decimal('4'))
+
+        stock.delete()
+        self.assertEqual(self.summary().total_quantity, Decimal('3'))
+        self.assertEqual(Product.objects.get(pk=self.product.pk).total_stock, Decimal('3'))
+
+    def test_inactive_warehouses_are_excluded_from_active_quantity(self):
+        ProductWarehouse.objects.create(product=self.product, warehouse=self.main, quantity=5)
+        ProductWarehouse.objects.create(product=self.product, warehouse=self.backup, quantity=3)
+
+        self.backup.is_active = False
+        self.backup.save()
+
+        self.assertEqual(self.summary().total_quantity, Decimal('8'))
+        self.assertEqual(self.summary().active_quantity, Decimal('5'))
+
+    def test_verify_stock_totals_repairs_drift(self):
+        ProductWarehouse.objects.create(product=self.product, warehouse=self.main, quantity=5)
+        # Schreibzugriff ohne Signale erzeugt eine Abweichung
+        ProductWarehouse.objects.filter(product=self.product).update(quantity=7)
+
+        out = StringIO()
+        call_command('verify_stock_totals', stdout=out)
+        self.assertIn('1 Abweichungen gefunden, 0 repariert', out.getvalue())
+        self.assertEqual(self.summary().total_quantity, Decimal('5'))
+
+        call_command('verify_stock_totals', '--repair', stdout=out)
+        self.assertEqual(self.summary().total_quantity, Decimal('7'))
+
+
+class DashboardSnapshotTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.main = Warehouse.objects.create(name='Hauptlager', location='Berlin')
+        self.backup = Warehouse.objects.create(name='Ausweichlager', location='Potsdam')
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.user = User.objects.create_user('lager', 'lager@example.com', 'secret')
+        department = Department.objects.create(name='Lager', code='LAG')
+        self.user.profile.departments.add(department)
+        WarehouseAccess.objects.create(warehouse=self.main, department=department, can_view=True)
+
+        for index in range(12):
+            product = Product.objects.create(name=f'Artikel {index:02d}', sku=f'ART-{index}', minimum_stock=10)
+            ProductWarehouse.objects.create(product=product, warehouse=self.main, quantity=index)
+            ProductWarehouse.objects.create(product=product, warehouse=self.backup, quantity=20)
+
+    def test_snapshot_respects_accessible_warehouses(self):
+        snapshot = get_dashboard_snapshot(self.user)
+        self.assertEqual(snapshot['total_products'], 12)
+        self.assertEqual(snapshot['total_warehouses'], 1)
+        self.assertEqual(snapshot['low_stock_count'], 10)
+        self.assertEqual(len(snapshot['low_stock_items']), 10)
+        self.assertEqual(snapshot['low_stock_items'][0].warehouse, self.main)
+        self.assertEqual(snapshot['warehouses'][0].product_count, 11)
+
+        # Im Ausweichlager sind alle Artikel ausreichend vorhanden
+        self.assertEqual(get_dashboard_snapshot(self.admin)['low_stock_count'], 0)
+
+    def test_snapshot_query_budget_and_cache(self):
+        with self.assertNumQueries(6):
+            build_dashboard_snapshot(self.admin)
+
+        get_dashboard_snapshot(self.user)
+        with self.assertNumQueries(0):
+            get_dashboard_snapshot(self.user)
+
+    def test_stock_movement_invalidates_snapshot(self):
+        self.assertEqual(get_dashboard_snapshot(self.admin)['recent_movements'], [])
+
+        StockMovement.objects.create(
+            product=Product.objects.first(), warehouse=self.main, quantity=1, movement_type='in'
+        )
+        self.assertEqual(len(get_dashboard_snapshot(self.admin)['recent_movements']), 1)
+
+
+class StreamingImportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('import', 'import@example.com', 'secret')
+        Product.objects.create(name='Alt', sku='SCR-1', minimum_stock=1)
+
+    def upload(self, content, name='import.csv'):
+        return SimpleUploadedFile(name, content.encode('utf-8'))
+
+    def test_product_import_in_chunks(self):
+        content = 'sku;name;category;minimum_stock\n' + ''.join(
+            f'SCR-{index};Schraube {index};Schrauben;{index}\n' for index in range(1, 8)
+        ) + ';ohne Artikelnummer;;\n\n'
+
+        importer = ProductImporter(file_obj=self.upload(content), delimiter=';', user=self.user)
+        importer.chunk_size = 3
+        import_log = importer.run_import()
+
+        self.assertEqual((import_log.total_rows, import_log.successful_rows, import_log.failed_rows), (8, 7, 1))
+        self.assertEqual(import_log.errors.get().row_number, 8)
+        self.assertEqual(Product.objects.get(sku='SCR-1').name, 'Schraube 1')
+        self.assertEqual(Product.objects.get(sku='SCR-7').minimum_stock, 7)
+        self.assertEqual(Category.objects.filter(name='Schrauben').count(), 1)
+        self.assertEqual(ProductStockSummary.objects.count(), 7)
+
+    def test_existing_products_are_not_updated_on_request(self):
+        importer = ProductImporter(file_obj=self.upload('sku,name\nSCR-1,Neu\nSCR-2,Neu\n'),
+                                   update_existing=False, user=self.user)
+        import_log = importer.run_import()
+
+        self.assertEqual(import_log.failed_rows, 1)
+        self.assertEqual(Product.objects.get(sku='SCR-1').name, 'Alt')
+        self.assertTrue(Product.objects.filter(sku='SCR-2').exists())
+
+    def test_supplier_product_import_keeps_single_preferred_supplier(self):
+        product = Product.objects.get(sku='SCR-1')
+        first = Supplier.objects.create(name='Schrauben GmbH')
+        second = Supplier.objects.create(name='Muttern AG')
+        SupplierProduct.objects.create(supplier=first, product=product, purchase_price=2, is_preferred=True)
+
+        content = ('supplier_name,product_sku,purchase_price,is_preferred\n'
+                   'Muttern AG,SCR-1,1.50,ja\n'
+                   'Unbekannt,SCR-1,1,\n')
+        import_log = SupplierProductImporter(file_obj=self.upload(content), user=self.user).run_import()
+
+        self.assertEqual(import_log.successful_rows, 1)
+        self.assertEqual(list(SupplierProduct.objects.filter(is_preferred=True).values_list('supplier', flat=True)),
+                         [second.pk])
+        self.assertEqual(SupplierProduct.objects.get(supplier=second).purchase_price, Decimal('1.50'))
+
+
+class ImportJobTest(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+
+    @override_settings(IMPORT_SYNC_MAX_FILE_SIZE=0)
+    def test_upload_is_processed_by_worker(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('products.csv', b'sku;name\nSCR-1;Schraube\nSCR-2;Mutter\n')
+        response = self.client.post(reverse('import_products'), {
+            'file': upload, 'delimiter': ';', 'encoding': 'utf-8', 'skip_header': 'on', 'update_existing': 'on',
+        })
+
+        import_log = ImportLog.objects.get()
+        self.assertRedirects(response, reverse('import_log_detail', args=[import_log.pk]))
+        self.assertEqual(import_log.status, 'queued')
+        self.assertFalse(Product.objects.exists())
+
+        call_command('process_import_jobs', '--once', '--workers', '1', stdout=StringIO())
+
+        progress = self.client.get(reverse('import_log_progress', args=[import_log.pk])).json()
+        self.assertEqual(progress['status'], 'completed')
+        self.assertTrue(progress['finished'])
+        self.assertEqual(progress['rows_processed'], 2)
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertEqual(ImportJob.objects.get().status, 'finished')
+
+    @override_settings(IMPORT_SYNC_MAX_FILE_SIZE=0, IMPORT_JOB_TIMEOUT=60)
+    def test_stale_job_is_requeued_and_processed(self):
+        upload = SimpleUploadedFile('products.csv', b'sku;name\nSCR-1;Schraube\n')
+        import_log = submit_import(ProductImporter, upload, self.user, delimiter=';')
+        # Ein lange laufender Import mit aktuellem Lebenszeichen bleibt beim Worker
+        ImportJob.objects.update(status='running', worker='lebt', started_at=timezone.now() - timedelta(minutes=5),
+                                 heartbeat_at=timezone.now())
+        ImportLog.objects.update(status='processing')
+        self.assertEqual(requeue_stale_jobs(), 0)
+        # Worker ist während des Imports abgestürzt
+        ImportJob.objects.update(heartbeat_at=timezone.now() - timedelta(minutes=5))
+
+        call_command('process_import_jobs', '--once', '--workers', '1', stdout=StringIO())
+
+        import_log.refresh_from_db()
+        self.assertEqual(import_log.status, 'completed')
+        self.assertEqual(ImportJob.objects.get().status, 'finished')
+        self.assertTrue(Product.objects.filter(sku='SCR-1').exists())
+
+    def test_warehouse_department_and_serial_imports_use_importers(self):
+        self.client.force_login(self.user)
+        Product.objects.create(name='Bohrmaschine', sku='BM-1')
+        uploads = {
+            'import_warehouses': b'name,location,description,is_active\nHauptlager,Berlin,Zentrale,true\n',
+            'import_departments': b'name,code,manager_username\nVertrieb,VT01,admin\nEinkauf,EK01,unbekannt\n',
+            'import_serialnumbers': b'product_sku,serial_number,warehouse_name\nBM-1,SN-1,Hauptlager\n',
+        }
+        for url_name, content in uploads.items():
+            response = self.client.post(reverse(url_name), {
+                'file': SimpleUploadedFile('import.csv', content), 'delimiter': ',', 'encoding': 'utf-8',
+                'skip_header': 'on', 'update_existing': 'on', 'default_status': 'in_stock',
+            })
+            import_log = ImportLog.objects.latest('pk')
+            self.assertRedirects(response, reverse('import_log_detail', args=[import_log.pk]))
+
+        self.assertEqual(
+            list(ImportLog.objects.order_by('pk').values_list('import_type', 'status')),
+            [('warehouses', 'completed'), ('departments', 'completed_with_errors'), ('serialnumbers', 'completed')]
+        )
+        self.assertEqual(Warehouse.objects.get().location, 'Berlin')
+        self.assertEqual(Department.objects.get().manager, self.user)
+        serial = SerialNumber.objects.get()
+        self.assertEqual((serial.warehouse.name, serial.product.has_serial_numbers), ('Hauptlager', True))
+
+    def test_warehouse_stock_import_books_adjustments(self):
+        warehouse = Warehouse.objects.create(name='Hauptlager', location='Berlin')
+        product = Product.objects.create(name='Schraube', sku='SCR-1')
+        ProductWarehouse.objects.create(product=product, warehouse=warehouse, quantity=5)
+        upload = SimpleUploadedFile('stock.csv', b'product_sku,warehouse_name,quantity\n'
+                                                 b'SCR-1,Hauptlager,12\nSCR-1,Nebenlager,3\n')
+
+        import_log = submit_import('warehouse_products', upload, self.user)
+
+        self.assertEqual((import_log.status, import_log.successful_rows), ('completed_with_errors', 1))
+        self.assertEqual(ProductWarehouse.objects.get().quantity, 12)
+        self.assertEqual(ProductStockSummary.objects.get(product=product).total_quantity, 12)
+        self.assertEqual(StockMovement.objects.get().movement_type, 'adj')
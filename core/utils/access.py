@@ -1,10 +1,10 @@
-from accessmanagement.models import WarehouseAccess
+from accessmanagement.permissions import get_permission_matrix
 from inventory.models import Warehouse
 
-def get_accessible_warehouses(user):
-    if user.is_superuser:
-        return Warehouse.objects.filter(is_active=True)
-    return Warehouse.objects.filter(
-        is_active=True,
-        id__in=WarehouseAccess.objects.filter(user=user).values_list('warehouse_id', flat=True)
+
+def get_accessible_warehouses(user, permission_type='view'):
+    """Aktive Lager, für die der Benutzer das angegebene Recht besitzt."""
+    return get_permission_matrix(user).filter_warehouses(
+        Warehouse.objects.filter(is_active=True),
+        permission_type
     )
@@ -0,0 +1,186 @@
+"""
+Dashboard-Snapshot: alle Kennzahlen und Tabellen des Dashboards in wenigen
+gruppierten Abfragen, zwischengespeichert je Menge zugänglicher Lager.
+
+Der Cache wird über eine Versionsnummer invalidiert, die bei Bestandsbewegungen,
+Bestandsänderungen, Inventuren und Statuswechseln von Bestellungen erhöht wird
+(siehe core/signals.py).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, Count, DateTimeField, F, IntegerField, Max, OuterRef, Q, Subquery, Value, Window
+
+from accessmanagement.permissions import get_permission_matrix
+from inventory.models import StockMovement, StockTake
+from order.models import OrderSuggestion, OrderSuggestionRefreshState, PurchaseOrder
+from organization.models import Department
+from suppliers.models import Supplier
+from core.models import Category, Product, ProductWarehouse
+from core.utils.access import get_accessible_warehouses
+from core.utils.stock import annotate_accessible_stock
+
+CACHE_VERSION_KEY = 'dashboard:version'
+DEFAULT_CACHE_TIMEOUT = 300
+
+ORDER_STATUS_COUNTERS = {
+    'pending': 'pending_count',
+    'sent': 'sent_count',
+    'partially_received': 'partial_count',
+}
+
+
+class LowStockItem:
+    """Zeile der Tabelle "Kritische Bestände" (Produkt mit Hauptlager und dessen Menge)."""
+
+    def __init__(self, product, warehouse, quantity):
+        self.product = product
+        self.warehouse = warehouse
+        self.quantity = quantity
+
+
+def invalidate_dashboard_cache():
+    """Macht alle zwischengespeicherten Dashboard-Snapshots ungültig."""
+    cache.set(CACHE_VERSION_KEY, time.time_ns(), None)
+
+
+def _cache_key(warehouse_ids):
+    version = cache.get(CACHE_VERSION_KEY)
+    if version is None:
+        cache.add(CACHE_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CACHE_VERSION_KEY)
+
+    if warehouse_ids is None:
+        scope = 'all'
+    else:
+        scope = hashlib.sha1(','.join(map(str, sorted(warehouse_ids))).encode()).hexdigest()
+    return f'dashboard:snapshot:{version}:{scope}'
+
+
+def _counter_row(queryset, key=None, ref=None, at=None):
+    """Gruppierte Zählzeile (key, ref, n, at), die per UNION mit anderen kombiniert wird."""
+    return queryset.order_by().values(
+        key=key if key is not None else Value(None, output_field=CharField()),
+        ref=ref if ref is not None else Value(None, output_field=IntegerField()),
+    ).annotate(
+        n=Count('pk'),
+        at=at if at is not None else Value(None, output_field=DateTimeField()),
+    ).values_list('key', 'ref', 'n', 'at')
+
+
+def _load_counters(warehouse_ids):
+    """Alle Zählerkacheln, Produktanzahlen je Lager und das Alter der
+    Bestellvorschläge in einer einzigen UNION-Abfrage.
+
+    Args:
+        warehouse_ids: IDs der angezeigten Lager (ohne Join auf Warehouse zählbar)
+    """
+    stocked = ProductWarehouse.objects.filter(quantity__gt=0, warehouse_id__in=warehouse_ids)
+
+    rows = _counter_row(Product.objects.all(), Value('total_products')).union(
+        _counter_row(Category.objects.all(), Value('total_categories')),
+        _counter_row(Supplier.objects.all(), Value('total_suppliers')),
+        _counter_row(Department.objects.all(), Value('total_departments')),
+        _counter_row(StockTake.objects.filter(status='in_progress'), Value('active_stock_takes_count')),
+        _counter_row(OrderSuggestion.objects.all(), Value('suggestion_count')),
+        _counter_row(PurchaseOrder.objects.filter(status__in=ORDER_STATUS_COUNTERS.keys()), F('status')),
+        _counter_row(stocked, Value('warehouse'), F('warehouse_id')),
+        _counter_row(OrderSuggestionRefreshState.objects.all(), Value('suggestions_refreshed_at'),
+                     at=Max('last_refreshed_at')),
+        all=True,
+    )
+
+    counters = {key: 0 for key in (
+        'total_products', 'total_categories', 'total_suppliers', 'total_departments',
+        'active_stock_takes_count', 'suggestion_count', *ORDER_STATUS_COUNTERS.values(),
+    )}
+    counters['suggestions_refreshed_at'] = None
+    product_counts = {}
+    for key, ref, count, at in rows:
+        if key == 'warehouse':
+            product_counts[ref] = count
+        elif key == 'suggestions_refreshed_at':
+            counters[key] = at
+        else:
+            counters[ORDER_STATUS_COUNTERS.get(key, key)] = count
+    return counters, product_counts
+
+
+def _load_low_stock_items(user, warehouse_ids, warehouses_by_id, limit=10):
+    """Top-N kritische Bestände inkl. Hauptlager; die Gesamtzahl liefert eine Fensterfunktion.
+
+    Returns:
+        tuple: (Liste von LowStockItem, Anzahl aller Produkte mit niedrigem Bestand)
+    """
+    main_stock = ProductWarehouse.objects.filter(product=OuterRef('pk')).order_by('-quantity', 'warehouse_id')
+    if warehouse_ids is None:
+        main_stock = main_stock.filter(warehouse__is_active=True)
+    else:
+        main_stock = main_stock.filter(warehouse_id__in=warehouse_ids)
+
+    products = annotate_accessible_stock(Product.objects.all(), user, warehouse_ids or []).filter(
+        accessible_stock__lt=F('minimum_stock')
+    ).annotate(
+        low_stock_total=Window(Count('pk')),
+        main_warehouse_id=Subquery(main_stock.values('warehouse_id')[:1], output_field=IntegerField()),
+        main_quantity=Subquery(main_stock.values('quantity')[:1]),
+    ).order_by('name', 'pk')[:limit]
+
+    items = []
+    total = 0
+    for product in products:
+        total = product.low_stock_total
+        warehouse = warehouses_by_id.get(product.main_warehouse_id)
+        if warehouse is None:
+            items.append(LowStockItem(product, None, 0))
+        else:
+            items.append(LowStockItem(product, warehouse, product.main_quantity))
+    return items, total
+
+
+def build_dashboard_snapshot(user):
+    """Berechnet alle Daten des Dashboards in höchstens sechs Abfragen."""
+    warehouses = list(get_accessible_warehouses(user).order_by('name', 'pk'))
+    warehouse_ids = None if user.is_superuser else [warehouse.pk for warehouse in warehouses]
+
+    counters, product_counts = _load_counters([warehouse.pk for warehouse in warehouses])
+    for warehouse in warehouses:
+        warehouse.product_count = product_counts.get(warehouse.pk, 0)
+    warehouses_by_id = {warehouse.pk: warehouse for warehouse in warehouses}
+
+    low_stock_items, low_stock_count = _load_low_stock_items(user, warehouse_ids, warehouses_by_id)
+
+    snapshot = dict(counters)
+    snapshot.update({
+        'low_stock_count': low_stock_count,
+        'low_stock_items': low_stock_items,
+        'total_warehouses': len(warehouses),
+        'warehouses': warehouses[:5],
+        'recent_movements': list(
+            StockMovement.objects.select_related('product', 'warehouse', 'created_by').order_by('-created_at')[:10]
+        ),
+        'active_stock_takes': list(
+            StockTake.objects.select_related('warehouse').filter(status='in_progress').annotate(
+                item_total=Count('stocktakeitem'),
+                item_counted=Count('stocktakeitem', filter=Q(stocktakeitem__is_counted=True)),
+            )[:5]
+        ),
+        'recent_orders': list(PurchaseOrder.objects.select_related('supplier').order_by('-order_date')[:5]),
+    })
+    return snapshot
+
+
+def get_dashboard_snapshot(user):
+    """Liefert den Dashboard-Snapshot des Benutzers, bei Bedarf aus dem Cache.
+
+    Administratoren teilen sich einen Snapshot; alle anderen Benutzer teilen ihn
+    mit Benutzern, die dieselben Lager sehen dürfen.
+    """
+    key = _cache_key(get_permission_matrix(user).warehouse_ids('view'))
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_dashboard_snapshot(user)
+        cache.set(key, snapshot, getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT))
+    return snapshot
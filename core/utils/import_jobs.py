@@ -0,0 +1,244 @@
+"""
+Hintergrund-Importe über eine Warteschlange in der Datenbank.
+
+Hochgeladene Dateien werden als ImportJob mit einem ImportLog im Status
+'queued' gespeichert. Der Befehl process_import_jobs holt die Jobs mit einem
+bedingten UPDATE ab (mehrere Worker-Threads oder -Prozesse können dieselbe
+Warteschlange abarbeiten, ohne einen Job doppelt zu übernehmen) und führt sie
+mit dem passenden Importer aus. Der Importer schreibt nach jedem Block
+verarbeitete Zeilen und Durchsatz in das ImportLog, das die Import-Übersicht
+über get_import_progress() abfragt. Jobs abgestürzter Worker bleiben nicht
+dauerhaft 'running': requeue_stale_jobs() stellt sie nach IMPORT_JOB_TIMEOUT
+Sekunden wieder ein.
+
+Kleine Dateien werden direkt im Request importiert (siehe submit_import()).
+"""
+import logging
+import os
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models
+from django.urls import reverse
+from django.utils import timezone
+
+from core.importers.batch_numbers import BatchNumberImporter
+from core.importers.categories import CategoryImporter
+from core.importers.departments import DepartmentImporter
+from core.importers.products import ProductImporter, SupplierProductImporter
+from core.importers.serialnumbers import SerialNumberImporter
+from core.importers.suppliers import SupplierImporter
+from core.importers.warehouse_products import WarehouseProductImporter
+from core.importers.warehouses import WarehouseImporter
+from core.models import ImportJob, ImportLog
+
+logger = logging.getLogger(__name__)
+
+IMPORTERS = {
+    importer_class.import_type: importer_class
+    for importer_class in (
+        ProductImporter,
+        SupplierProductImporter,
+        SupplierImporter,
+        CategoryImporter,
+        BatchNumberImporter,
+        SerialNumberImporter,
+        WarehouseProductImporter,
+        WarehouseImporter,
+        DepartmentImporter,
+    )
+}
+
+# Bis zu dieser Dateigröße (Bytes) wird direkt im Request importiert
+DEFAULT_SYNC_MAX_FILE_SIZE = 256 * 1024
+
+# Anzahl wartender Jobs, die ein Worker pro Abfrage als Kandidaten lädt
+CLAIM_CANDIDATES = 10
+
+# Laufende Jobs ohne Lebenszeichen seit dieser Zeit (Sekunden) gelten als abgebrochen
+DEFAULT_JOB_TIMEOUT = 15 * 60
+
+
+def get_sync_max_file_size():
+    return getattr(settings, 'IMPORT_SYNC_MAX_FILE_SIZE', DEFAULT_SYNC_MAX_FILE_SIZE)
+
+
+def get_job_timeout():
+    return getattr(settings, 'IMPORT_JOB_TIMEOUT', DEFAULT_JOB_TIMEOUT)
+
+
+def serialize_options(options):
+    """Macht Importoptionen JSON-fähig (Modellinstanzen als Label und Primärschlüssel)."""
+    serialized = {}
+    for name, value in options.items():
+        if isinstance(value, models.Model):
+            value = {'model': value._meta.label_lower, 'pk': value.pk}
+        serialized[name] = value
+    return serialized
+
+
+def deserialize_options(options):
+    deserialized = {}
+    for name, value in options.items():
+        if isinstance(value, dict) and value.keys() == {'model', 'pk'}:
+            value = apps.get_model(value['model'])._default_manager.filter(pk=value['pk']).first()
+        deserialized[name] = value
+    return deserialized
+
+
+def enqueue_import(importer_class, file, user, **options):
+    """Speichert die hochgeladene Datei und reiht den Import ein.
+
+    Args:
+        importer_class: Importer-Klasse (oder deren import_type)
+        file: Hochgeladene Datei
+        user: Benutzer, dem der Import zugeordnet wird
+        **options: Weitere Argumente für den Importer (delimiter, encoding, ...)
+
+    Returns:
+        ImportLog: Protokoll im Status 'queued'
+    """
+    import_type = importer_class if isinstance(importer_class, str) else importer_class.import_type
+    if import_type not in IMPORTERS:
+        raise ValueError(f"Unbekannter Import-Typ: {import_type}")
+
+    import_log = ImportLog.objects.create(
+        import_type=import_type,
+        file_name=file.name,
+        created_by=user,
+        status='queued'
+    )
+    job = ImportJob(import_log=import_log, options=serialize_options(options))
+    job.file.save(os.path.basename(file.name), file, save=False)
+    job.save()
+    return import_log
+
+
+def requeue_stale_jobs():
+    """Gibt Jobs abgestürzter Worker an die Warteschlange zurück.
+
+    Ein Job gilt als abgebrochen, wenn sein Worker seit mehr als
+    IMPORT_JOB_TIMEOUT Sekunden kein Lebenszeichen (heartbeat_at, nach jedem
+    Block erneuert) gegeben hat; sein Protokoll wird wieder als 'queued'
+    angezeigt.
+
+    Returns:
+        int: Anzahl zurückgestellter Jobs
+    """
+    cutoff = timezone.now() - timedelta(seconds=get_job_timeout())
+    stale = list(ImportJob.objects.filter(status='running', heartbeat_at__lt=cutoff).values_list('pk', flat=True))
+    if not stale:
+        return 0
+    requeued = ImportJob.objects.filter(pk__in=stale, status='running', heartbeat_at__lt=cutoff).update(
+        status='queued', worker='', started_at=None, heartbeat_at=None
+    )
+    ImportLog.objects.filter(job__pk__in=stale, job__status='queued', status='processing').update(status='queued')
+    for job_id in stale:
+        logger.warning("Import-Job %s nach Zeitüberschreitung erneut eingereiht", job_id)
+    return requeued
+
+
+def claim_next_job(worker=''):
+    """Übernimmt den ältesten wartenden Job.
+
+    Der Statuswechsel erfolgt per bedingtem UPDATE; ein Job, den ein anderer
+    Worker gleichzeitig übernommen hat, wird übersprungen.
+
+    Returns:
+        ImportJob oder None, wenn keine Jobs warten
+    """
+    candidates = ImportJob.objects.filter(status='queued').order_by('created_at', 'pk')
+    for job_id in candidates.values_list('pk', flat=True)[:CLAIM_CANDIDATES]:
+        now = timezone.now()
+        claimed = ImportJob.objects.filter(pk=job_id, status='queued').update(
+            status='running', worker=worker, started_at=now, heartbeat_at=now
+        )
+        if claimed:
+            return ImportJob.objects.select_related('import_log__created_by').get(pk=job_id)
+    return None
+
+
+def run_job(job):
+    """Führt einen übernommenen Job aus.
+
+    Returns:
+        ImportLog: Das aktualisierte Protokoll
+    """
+    import_log = job.import_log
+    importer_class = IMPORTERS[import_log.import_type]
+    try:
+        with job.file.open('rb') as file_obj:
+            importer = importer_class(
+                file_obj=file_obj.file,
+                user=import_log.created_by,
+                import_log=import_log,
+                **deserialize_options(job.options)
+            )
+            importer.run_import()
+    except Exception as e:
+        logger.exception("Import-Job %s fehlgeschlagen", job.pk)
+        job.status = 'failed'
+        if import_log.status != 'failed':
+            import_log.status = 'failed'
+            import_log.error_details = str(e)
+            import_log.save(update_fields=['status', 'error_details'])
+    else:
+        job.status = 'finished'
+        # Die Datei wird nur für fehlgeschlagene Jobs aufbewahrt
+        job.file.delete(save=False)
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'file', 'finished_at'])
+    return import_log
+
+
+def process_next_job(worker=''):
+    """Übernimmt und verarbeitet einen wartenden Job.
+
+    Returns:
+        ImportLog oder None, wenn keine Jobs warten
+    """
+    job = claim_next_job(worker)
+    if job is None:
+        return None
+    return run_job(job)
+
+
+def submit_import(importer_class, file, user, **options):
+    """Reiht einen Import ein; kleine Dateien werden sofort verarbeitet.
+
+    Returns:
+        ImportLog: Protokoll des Imports (Status 'queued', wenn der Worker ihn übernimmt)
+    """
+    import_log = enqueue_import(importer_class, file, user, **options)
+    if file.size <= get_sync_max_file_size():
+        job = import_log.job
+        now = timezone.now()
+        if ImportJob.objects.filter(pk=job.pk, status='queued').update(
+            status='running', worker='request', started_at=now, heartbeat_at=now
+        ):
+            job.status = 'running'
+            import_log = run_job(job)
+    return import_log
+
+
+def get_import_progress(import_log):
+    """Fortschritt eines Imports für die Abfrage aus der Import-Übersicht.
+
+    Returns:
+        dict: Status, Zeilenzähler, Durchsatz und ob der Import beendet ist
+    """
+    processed = import_log.rows_processed
+    return {
+        'id': import_log.pk,
+        'status': import_log.status,
+        'status_display': import_log.get_status_display(),
+        'rows_processed': import_log.rows_processed,
+        'rows_created': import_log.rows_created,
+        'rows_error': import_log.rows_error,
+        'rows_per_second': import_log.rows_per_second,
+        'success_rate': round(import_log.rows_created * 100 / processed, 1) if processed else 0,
+        'finished': import_log.status not in ('queued', 'processing'),
+        'detail_url': reverse('import_log_detail', args=[import_log.pk]),
+    }
@@ -1,17 +1,26 @@
 from django.contrib import messages
 from django.shortcuts import render, redirect
 
+from core.utils.import_jobs import submit_import
+
+
 def handle_csv_import(form_class, importer_class, request, template_name, success_redirect, extra_context=None):
+    """Nimmt eine Importdatei entgegen; große Dateien verarbeitet process_import_jobs im Hintergrund."""
     if request.method == 'POST':
         form = form_class(request.POST, request.FILES)
         if form.is_valid():
             try:
-                importer = importer_class(user=request.user, **form.cleaned_data)
-                import_log = importer.run_import()
+                options = dict(form.cleaned_data)
+                import_log = submit_import(importer_class, options.pop('file'), request.user, **options)
 
-                messages.success(request, f"{import_log.successful_rows} von {import_log.total_rows} Zeilen erfolgreich importiert.")
-                if import_log.failed_rows:
-                    messages.warning(request, f"{import_log.failed_rows} Zeilen konnten nicht importiert werden.")
+                if import_log.status == 'queued':
+                    messages.info(request, "Der Import wurde eingereiht und wird im Hintergrund verarbeitet.")
+                elif import_log.status == 'failed':
+                    messages.error(request, f"Fehler beim Import: {import_log.error_details}")
+                else:
+                    messages.success(request, f"{import_log.successful_rows} von {import_log.total_rows} Zeilen erfolgreich importiert.")
+                    if import_log.failed_rows:
+                        messages.warning(request, f"{import_log.failed_rows} Zeilen konnten nicht importiert werden.")
                 return redirect(success_redirect, pk=import_log.pk)
 
             except Exception as e:
@@ -1,11 +1,11 @@
+from django.db.models import F, Q
+
 from core.models import Product
-from core.utils.access import get_accessible_warehouses
-from core.utils.stock import get_accessible_stock
+from core.utils.stock import annotate_accessible_stock
 
 
 def get_filtered_products(request, filter_low_stock=False):
-    warehouses = get_accessible_warehouses(request.user)
-    products = Product.objects.select_related('category').all()
+    products = Product.objects.select_related('category', 'stock_summary').all()
     search = request.GET.get('search', '')
     category = request.GET.get('category', '')
     stock_status = request.GET.get('stock_status', '')
@@ -15,21 +15,16 @@ def get_filtered_products(request, filter_low_stock=False):
     if category:
         products = products.filter(category_id=category)
 
-    filtered = []
-    for product in products:
-        stock = get_accessible_stock(product, warehouses)
-        product.accessible_stock = stock
+    # Bestand wird in der Datenbank annotiert und gefiltert statt pro Produkt aggregiert
+    products = annotate_accessible_stock(products, request.user)
 
-        if filter_low_stock and stock < product.minimum_stock:
-            filtered.append(product)
-        elif not filter_low_stock:
-            if stock_status == 'low' and (stock <= product.minimum_stock and stock > 0):
-                filtered.append(product)
-            elif stock_status == 'ok' and stock > product.minimum_stock:
-                filtered.append(product)
-            elif stock_status == 'out' and stock == 0:
-                filtered.append(product)
-            elif not stock_status:
-                filtered.append(product)
+    if filter_low_stock:
+        products = products.filter(accessible_stock__lt=F('minimum_stock'))
+    elif stock_status == 'low':
+        products = products.filter(accessible_stock__lte=F('minimum_stock'), accessible_stock__gt=0)
+    elif stock_status == 'ok':
+        products = products.filter(accessible_stock__gt=F('minimum_stock'))
+    elif stock_status == 'out':
+        products = products.filter(accessible_stock=0)
 
-    return sorted(filtered, key=lambda p: p.name)
+    return products.order_by('name')
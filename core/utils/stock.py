@@ -1,8 +1,103 @@
-from django.db.models import Sum
-from core.models import ProductWarehouse
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value, Count
+from django.db.models.functions import Coalesce
+
+from core.models import ProductStockSummary, ProductWarehouse
+
+ZERO_STOCK = Value(0, output_field=DecimalField(max_digits=12, decimal_places=2))
+
 
 def get_accessible_stock(product, warehouses):
     return ProductWarehouse.objects.filter(
         product=product,
         warehouse__in=warehouses
     ).aggregate(total=Sum('quantity'))['total'] or 0
+
+
+def compute_stock_totals(product_ids=None, id_range=None):
+    """Berechnet die Bestandssummen live aus ProductWarehouse.
+
+    Args:
+        product_ids: Optionale Liste von Produkt-IDs
+        id_range: Optionales Tupel (erste_id, letzte_id) für blockweise Verarbeitung
+
+    Returns:
+        dict: {product_id: (total_quantity, active_quantity, warehouse_count)}
+    """
+    rows = ProductWarehouse.objects.all()
+    if product_ids is not None:
+        rows = rows.filter(product_id__in=product_ids)
+    if id_range is not None:
+        rows = rows.filter(product_id__gte=id_range[0], product_id__lte=id_range[1])
+
+    rows = rows.values('product_id').annotate(
+        total=Sum('quantity'),
+        active=Sum('quantity', filter=Q(warehouse__is_active=True)),
+        warehouses=Count('pk', filter=~Q(quantity=0)),
+    ).values_list('product_id', 'total', 'active', 'warehouses')
+
+    return {
+        product_id: (Decimal(total or 0), Decimal(active or 0), warehouses)
+        for product_id, total, active, warehouses in rows
+    }
+
+
+def refresh_stock_summaries(product_ids):
+    """Aktualisiert die materialisierten Bestandssummen der angegebenen Produkte.
+
+    Muss innerhalb der Transaktion aufgerufen werden, die ProductWarehouse ändert,
+    damit Bestand und Summe nie auseinanderlaufen.
+    """
+    product_ids = list({product_id for product_id in product_ids if product_id})
+    if not product_ids:
+        return
+
+    totals = compute_stock_totals(product_ids)
+    summaries = []
+    for product_id in product_ids:
+        total, active, warehouses = totals.get(product_id, (Decimal('0'), Decimal('0'), 0))
+        summaries.append(ProductStockSummary(
+            product_id=product_id,
+            total_quantity=total,
+            active_quantity=active,
+            warehouse_count=warehouses,
+        ))
+
+    ProductStockSummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=['total_quantity', 'active_quantity', 'warehouse_count', 'updated_at'],
+    )
+
+
+def annotate_accessible_stock(products, user, warehouses=None):
+    """Annotiert den für den Benutzer sichtbaren Bestand als accessible_stock.
+
+    Für Administratoren (Zugriff auf alle aktiven Lager) wird die indizierte
+    Spalte der Bestandssumme verwendet, sonst eine gruppierte Unterabfrage
+    über die zugänglichen Lager.
+    """
+    if user.is_superuser:
+        return products.annotate(
+            accessible_stock=Coalesce(F('stock_summary__active_quantity'), ZERO_STOCK)
+        )
+
+    if warehouses is None:
+        from core.utils.access import get_accessible_warehouses
+        warehouses = get_accessible_warehouses(user)
+
+    return products.annotate(
+        accessible_stock=Coalesce(
+            Subquery(
+                ProductWarehouse.objects.filter(
+                    product=OuterRef('pk'),
+                    warehouse__in=warehouses
+                ).values('product')
+                .annotate(total=Sum('quantity'))
+                .values('total')[:1]
+            ),
+            ZERO_STOCK
+        )
+    )
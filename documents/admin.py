@@ -3,7 +3,8 @@ from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 from .models import (
     DocumentType, Document, DocumentTemplate,
-    TemplateField, DocumentMatch, DocumentProcessingLog, StandardField
+    TemplateField, DocumentMatch, DocumentProcessingLog, DocumentProcessingJob, OcrCacheEntry,
+    DocumentReprocessingRun, StandardField
 )
 
 
@@ -30,20 +31,21 @@ class DocumentAdmin(admin.ModelAdmin):
     list_display = ('title', 'document_type', 'supplier', 'upload_date', 'status_badge', 'matching_info')
     list_filter = ('processing_status', 'document_type', 'supplier', 'upload_date')
     search_fields = ('title', 'document_number', 'ocr_text')
-    readonly_fields = ('ocr_text', 'ocr_data', 'processing_status', 'confidence_score', 'extracted_data')
+    readonly_fields = ('ocr_text', 'ocr_pages_summary', 'processing_status', 'confidence_score', 'extracted_data',
+                       'content_hash')
     fieldsets = (
         (None, {
             'fields': ('title', 'file', 'document_type', 'supplier')
         }),
         (_('Processing Information'), {
-            'fields': ('processing_status', 'document_number', 'document_date')
+            'fields': ('processing_status', 'document_number', 'document_date', 'content_hash')
         }),
         (_('Matching Information'), {
             'fields': ('matched_template', 'matched_order', 'confidence_score')
         }),
         (_('OCR Data'), {
             'classes': ('collapse',),
-            'fields': ('ocr_text', 'extracted_data', 'ocr_data')
+            'fields': ('ocr_text', 'extracted_data', 'ocr_pages_summary')
         }),
     )
     inlines = [DocumentProcessingLogInline]
@@ -64,6 +66,16 @@ class DocumentAdmin(admin.ModelAdmin):
 
     status_badge.short_description = _('Status')
 
+    def ocr_pages_summary(self, obj):
+        # Only page metadata; the packed word data is not loaded
+        pages = obj.ocr_pages.values_list('page_number', 'word_count', 'source')
+        return ', '.join(
+            f"{page_number}: {word_count} {_('words')}{' (text layer)' if source == 'text' else ''}"
+            for page_number, word_count, source in pages
+        ) or '-'
+
+    ocr_pages_summary.short_description = _('OCR pages')
+
     def matching_info(self, obj):
         if obj.matched_order:
             return format_html(
@@ -180,6 +192,30 @@ class DocumentProcessingLogAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(DocumentProcessingJob)
+class DocumentProcessingJobAdmin(admin.ModelAdmin):
+    list_display = ('document', 'status', 'attempts', 'available_at', 'locked_by', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('document__title', 'last_error')
+    readonly_fields = ('created_at', 'locked_at', 'finished_at')
+
+
+@admin.register(OcrCacheEntry)
+class OcrCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('content_hash', 'size', 'hits', 'created_at', 'last_used_at')
+    search_fields = ('content_hash',)
+    readonly_fields = ('key', 'content_hash', 'size', 'hits', 'created_at', 'last_used_at')
+    exclude = ('ocr_text', 'ocr_data')
+
+
+@admin.register(DocumentReprocessingRun)
+class DocumentReprocessingRunAdmin(admin.ModelAdmin):
+    list_display = ('started_at', 'documents', 'matched', 'failed', 'documents_per_second', 'latency_p50',
+                    'latency_p95')
+    readonly_fields = ('filters', 'started_at', 'finished_at', 'documents', 'ocr_documents', 'matched', 'failed',
+                       'documents_per_second', 'latency_p50', 'latency_p95')
+
+
 @admin.register(StandardField)
 class StandardFieldAdmin(admin.ModelAdmin):
     list_display = ('name', 'code', 'original_code', 'field_type', 'document_type', 'is_key_field', 'is_required')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Copy legacy OCR data into OCR pages, restore missing pages from the OCR cache or re-run OCR'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Documents per batch (default: 500)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the documents, do not change anything')
+
+    def handle(self, *args, **options):
+        from documents.ocr_storage import backfill_ocr_pages
+
+        stats = backfill_ocr_pages(batch_size=max(options['batch_size'], 1), dry_run=options['dry_run'])
+        prefix = 'Dry run: ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{stats['copied']} document(s) copied from the legacy OCR data, "
+            f"{stats['restored']} restored from the OCR cache, {stats['queued']} queued for OCR."
+        ))
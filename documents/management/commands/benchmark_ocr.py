@@ -0,0 +1,103 @@
+import os
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: no peak memory figures
+    resource = None
+
+import fitz
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.ocr import get_ocr_dpi, get_ocr_processes, get_page_count, iter_ocr_pages, render_page
+
+SAMPLE_LINES = [
+    'Lieferschein Nr. LS-{page:05d}',
+    'Ihre Bestellnummer: PO-2024-{page:04d}',
+    'Pos  Artikelnummer  Bezeichnung            Menge  Einheit',
+]
+
+
+def create_sample_pdf(path, pages):
+    """Write a text-only sample delivery note with the given number of pages."""
+    with fitz.open() as pdf:
+        for page_number in range(1, pages + 1):
+            page = pdf.new_page(width=595, height=842)
+            lines = [line.format(page=page_number) for line in SAMPLE_LINES]
+            lines += [f'{index:>3}  ART-{page_number:03d}-{index:03d}  Schraube M{index % 12 + 3} x 40'
+                      f'          {index * 5:>4}  Stk' for index in range(1, 36)]
+            page.insert_text((50, 60), '\n'.join(lines), fontsize=10, fontname='cour')
+        pdf.save(path)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the OCR pipeline (pages per second and peak memory) over sample PDFs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', help='PDF files or directories with PDF files')
+        parser.add_argument('--generate', type=int, default=0, metavar='PAGES',
+                            help='Generate a sample PDF with this many pages')
+        parser.add_argument('--dpi', type=int, default=get_ocr_dpi(),
+                            help=f'Rasterization resolution (default: {get_ocr_dpi()})')
+        parser.add_argument('--processes', type=int, nargs='+', default=[1, get_ocr_processes()],
+                            help='Process counts to compare (default: 1 and DOCUMENT_OCR_PROCESSES)')
+        parser.add_argument('--rasterize-only', action='store_true',
+                            help='Only rasterize the pages, without Tesseract')
+        parser.add_argument('--no-text-layer', action='store_true',
+                            help='OCR every page, even pages with a text layer')
+
+    def handle(self, *args, **options):
+        files = self.collect_files(options['files'])
+        with tempfile.TemporaryDirectory() as sample_dir:
+            if options['generate']:
+                sample = os.path.join(sample_dir, f'sample_{options["generate"]}_pages.pdf')
+                create_sample_pdf(sample, options['generate'])
+                files.append(sample)
+            if not files:
+                raise CommandError('No PDF files given. Pass files or use --generate PAGES.')
+
+            # Rasterizing alone always runs in this process
+            process_counts = [1] if options['rasterize_only'] else options['processes']
+            for file_path in files:
+                for processes in process_counts:
+                    self.benchmark(file_path, options['dpi'], processes, options['rasterize_only'],
+                                   not options['no_text_layer'])
+
+    def collect_files(self, paths):
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files += sorted(
+                    os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith('.pdf')
+                )
+            else:
+                files.append(path)
+        return files
+
+    def benchmark(self, file_path, dpi, processes, rasterize_only, use_text_layer):
+        page_count = get_page_count(file_path)
+        start = time.perf_counter()
+        errors = text_pages = 0
+        if rasterize_only:
+            with fitz.open(file_path) as pdf:
+                for page_number in range(1, page_count + 1):
+                    render_page(pdf, page_number, dpi)
+        else:
+            for page in iter_ocr_pages(file_path, dpi=dpi, processes=processes, use_text_layer=use_text_layer):
+                errors += 'error' in page
+                text_pages += 'text_layer' in page.get('timings', {})
+        elapsed = time.perf_counter() - start
+
+        line = (f'{os.path.basename(file_path)}: {page_count} pages, {dpi} dpi, {processes} process(es): '
+                f'{elapsed:.2f}s, {page_count / elapsed:.2f} pages/s')
+        if resource is not None:
+            # ru_maxrss is reported in kilobytes on Linux
+            peak_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+            peak_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // 1024
+            line += f', peak RSS {peak_self} MB (largest worker {peak_children} MB)'
+        if text_pages:
+            line += f', {text_pages} from text layer'
+        if errors:
+            line += f', {errors} failed pages'
+        self.stdout.write(line)
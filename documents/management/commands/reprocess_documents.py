@@ -0,0 +1,82 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils.dateparse import parse_date
+
+from documents.management.commands.run_ocr_workers import init_worker
+
+
+class Command(BaseCommand):
+    help = 'Re-run template matching and field extraction for existing documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--supplier', type=int, help='Supplier id')
+        parser.add_argument('--document-type', help='Document type code')
+        parser.add_argument('--from', dest='date_from', help='Uploaded on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Uploaded on or before this date (YYYY-MM-DD)')
+        parser.add_argument('--status', help='Processing status')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='Number of matching processes (default: number of CPUs)')
+        parser.add_argument('--chunk-size', type=int, default=100,
+                            help='Documents per chunk (default: 100)')
+
+    def handle(self, *args, **options):
+        from documents.reprocessing import get_documents, reprocess
+
+        filters = {
+            'supplier': options['supplier'],
+            'document_type': options['document_type'],
+            'date_from': self.parse_date_option(options['date_from'], '--from'),
+            'date_to': self.parse_date_option(options['date_to'], '--to'),
+            'status': options['status'],
+        }
+        filters = {key: value for key, value in filters.items() if value is not None}
+        documents = get_documents(**filters)
+        processes = max(options['processes'], 1)
+        chunk_size = max(options['chunk_size'], 1)
+
+        self.stdout.write(f'Reprocessing {documents.count()} document(s) with {processes} process(es).')
+        stored_filters = {key: str(value) for key, value in filters.items()}
+        if processes == 1:
+            run, previous, rate_before = reprocess(documents, stored_filters, chunk_size=chunk_size,
+                                                   progress=self.report_progress)
+        else:
+            # Child processes must not share the parent's database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=processes, initializer=init_worker) as pool:
+                run, previous, rate_before = reprocess(documents, stored_filters, map_chunks=pool.map,
+                                                       chunk_size=chunk_size, progress=self.report_progress)
+        if run.documents:
+            self.stdout.write('')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{run.documents} document(s) in {(run.finished_at - run.started_at).total_seconds():.1f}s: '
+            f'{run.documents_per_second:.1f} docs/s, p50 {run.latency_p50:.1f} ms, p95 {run.latency_p95:.1f} ms'
+        ))
+        if run.ocr_documents:
+            self.stdout.write(f'{run.ocr_documents} document(s) without OCR data were OCRed.')
+        if run.failed:
+            self.stdout.write(self.style.WARNING(f'{run.failed} document(s) failed.'))
+
+        self.stdout.write(
+            f'Match rate: {run.match_rate:.1%} ({run.matched}/{run.documents}), '
+            f'before this run {rate_before:.1%} ({run.match_rate - rate_before:+.1%})'
+        )
+        if previous is not None:
+            self.stdout.write(
+                f'Previous run with these filters ({previous.started_at:%Y-%m-%d %H:%M}): '
+                f'{previous.match_rate:.1%} ({run.match_rate - previous.match_rate:+.1%})'
+            )
+
+    def parse_date_option(self, value, option):
+        if value is None:
+            return None
+        date = parse_date(value)
+        if date is None:
+            raise CommandError(f'{option} expects a date in the format YYYY-MM-DD.')
+        return date
+
+    def report_progress(self, processed, total):
+        self.stdout.write(f'{processed}/{total} documents', ending='\r')
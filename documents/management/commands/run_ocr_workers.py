@@ -0,0 +1,66 @@
+import os
+import socket
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def init_worker():
+    """Prepare a worker process (Django setup for spawned processes, no inherited connections)."""
+    import django
+    django.setup()
+    connections.close_all()
+
+    # Documents already run in parallel across the workers: recognize their pages in-process
+    from documents.ocr import limit_ocr_processes
+    limit_ocr_processes(1)
+
+
+def run_worker(worker, interval, once):
+    # Imported here: with the 'spawn' start method the app registry is only ready after init_worker
+    from documents.processing_queue import work
+    try:
+        return work(worker, interval=interval, once=once)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Process queued documents with OCR in a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes (default: number of CPUs)')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to wait when the queue is empty (default: 5)')
+        parser.add_argument('--once', action='store_true',
+                            help='Process the currently due documents and exit')
+
+    def handle(self, *args, **options):
+        processes = max(options['processes'], 1)
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        self.stdout.write(self.style.SUCCESS(f'OCR workers started ({processes} processes).'))
+
+        if processes == 1:
+            # A single worker runs in this process
+            from documents.processing_queue import work
+            processed = work(f'{prefix}:0', interval=options['interval'], once=options['once'])
+        else:
+            # Child processes must not share the parent's database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=processes, initializer=init_worker) as pool:
+                futures = [
+                    pool.submit(run_worker, f'{prefix}:{index}', options['interval'], options['once'])
+                    for index in range(processes)
+                ]
+                try:
+                    processed = sum(future.result() for future in futures)
+                except KeyboardInterrupt:
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    processed = sum(
+                        future.result() for future in futures
+                        if future.done() and not future.cancelled() and future.exception() is None
+                    )
+
+        self.stdout.write(self.style.SUCCESS(f'{processed} document(s) processed.'))
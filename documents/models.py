@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 from suppliers.models import Supplier
@@ -37,11 +38,16 @@ class Document(models.Model):
     supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, blank=True, related_name='documents')
     upload_date = models.DateTimeField(auto_now_add=True)
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='uploaded_documents')
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True,
+                                    help_text=_("SHA-256 of the file content"))
 
     # OCR and processing fields
     processing_status = models.CharField(max_length=20, choices=PROCESSING_STATUS, default='pending')
     ocr_text = models.TextField(blank=True)
-    ocr_data = models.JSONField(null=True, blank=True, help_text=_("Complete OCR data including word coordinates"))
+    # Word coordinates are stored in DocumentOcrPage, see the ocr_data property. The former JSON column
+    # stays until backfill_ocr_pages has copied it into the page rows; remove the field only after that.
+    legacy_ocr_data = models.JSONField(null=True, blank=True, db_column='ocr_data',
+                                       help_text=_("Complete OCR data including word coordinates"))
 
     # Document identification and matching
     document_number = models.CharField(max_length=100, blank=True, help_text=_("Extracted document number"))
@@ -65,12 +71,52 @@ class Document(models.Model):
         verbose_name_plural = _("Documents")
         ordering = ['-upload_date']
 
+    @property
+    def ocr_data(self):
+        """Complete OCR data including word coordinates, loaded on first access."""
+        if '_ocr_data' not in self.__dict__:
+            from .ocr_storage import load_ocr_data
+            self._ocr_data = load_ocr_data(self) if self.pk else None
+        return self._ocr_data
+
+    @ocr_data.setter
+    def ocr_data(self, value):
+        self._ocr_data = value
+        self._ocr_data_changed = True
+
+    def save(self, *args, **kwargs):
+        # ocr_data is not a column: it is written to DocumentOcrPage after the row
+        update_fields = kwargs.get('update_fields')
+        store_ocr_data = getattr(self, '_ocr_data_changed', False) and (
+            update_fields is None or 'ocr_data' in update_fields
+        )
+        if update_fields is not None:
+            kwargs['update_fields'] = [field for field in update_fields if field != 'ocr_data']
+        super().save(*args, **kwargs)
+
+        if store_ocr_data:
+            from .ocr_storage import store_ocr_data as store
+            store(self, self._ocr_data)
+            self._ocr_data_changed = False
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None:
+            self.__dict__.pop('_ocr_data', None)
+            self._ocr_data_changed = False
+
     def get_field_value(self, field_code):
         """Return the extracted value for a given field code"""
         if not self.extracted_data:
             return None
         return self.extracted_data.get(field_code)
 
+    def get_possible_duplicates(self):
+        """Return other documents with identical file content."""
+        if not self.content_hash:
+            return Document.objects.none()
+        return Document.objects.filter(content_hash=self.content_hash).exclude(pk=self.pk)
+
 
 class DocumentTemplate(models.Model):
     """Template for document recognition and field mapping."""
@@ -224,6 +270,79 @@ class DocumentProcessingLog(models.Model):
         verbose_name_plural = _("Document Processing Logs")
         ordering = ['-timestamp']
 
+
+class DocumentProcessingJob(models.Model):
+    """Queue entry for background OCR processing (see documents/processing_queue.py)."""
+    STATUS_CHOICES = [
+        ('queued', _('Queued')),
+        ('running', _('Running')),
+        ('done', _('Done')),
+        ('failed', _('Failed')),
+    ]
+
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='processing_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now, help_text=_("Earliest time for the next attempt"))
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.document.title} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = _("Document Processing Job")
+        verbose_name_plural = _("Document Processing Jobs")
+        ordering = ['available_at', 'pk']
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='doc_job_queue_idx'),
+        ]
+
+
+class DocumentOcrPage(models.Model):
+    """OCR words of one document page as packed columnar arrays (see documents/ocr_storage.py)."""
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='ocr_pages')
+    page_number = models.PositiveIntegerField()
+    width = models.PositiveIntegerField(help_text=_("Page width in pixels"))
+    height = models.PositiveIntegerField(help_text=_("Page height in pixels"))
+    source = models.CharField(max_length=10, blank=True, help_text=_("'text' if read from the PDF text layer"))
+    word_count = models.PositiveIntegerField(default=0)
+    words = models.BinaryField()
+
+    def __str__(self):
+        return f"{self.document.title} - {_('Page')} {self.page_number}"
+
+    class Meta:
+        verbose_name = _("Document OCR Page")
+        verbose_name_plural = _("Document OCR Pages")
+        unique_together = ('document', 'page_number')
+        ordering = ['document', 'page_number']
+
+
+class OcrCacheEntry(models.Model):
+    """OCR result of a file content, reused for identical uploads (see documents/ocr_cache.py)."""
+    key = models.CharField(max_length=64, unique=True,
+                           help_text=_("SHA-256 of the file content and the OCR engine configuration"))
+    content_hash = models.CharField(max_length=64, db_index=True)
+    ocr_text = models.TextField(blank=True)
+    ocr_data = models.JSONField()
+    size = models.PositiveIntegerField(default=0, help_text=_("Size of the stored result in bytes"))
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.hits} hits)"
+
+    class Meta:
+        verbose_name = _("OCR Cache Entry")
+        verbose_name_plural = _("OCR Cache Entries")
+        ordering = ['-last_used_at']
+
+
 class StandardField(models.Model):
     """Standard fields that can be used in document templates."""
     name = models.CharField(max_length=100)
@@ -249,4 +368,30 @@ class StandardField(models.Model):
 
     def get_extraction_code(self):
         """Returns the code to use for extraction (original code or general code)"""
-        return self.original_code or self.code.split('_', 1)[1] if '_' in self.code else self.code
\ No newline at end of file
+        return self.original_code or self.code.split('_', 1)[1] if '_' in self.code else self.code
+
+
+class DocumentReprocessingRun(models.Model):
+    """Statistics of a reprocess_documents run, compared with the previous run for the same filters."""
+    filters = models.JSONField(default=dict, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    documents = models.PositiveIntegerField(default=0)
+    ocr_documents = models.PositiveIntegerField(default=0, help_text=_("Documents without OCR data that were OCRed"))
+    matched = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    documents_per_second = models.FloatField(default=0.0)
+    latency_p50 = models.FloatField(default=0.0, help_text=_("Median matching time per document in milliseconds"))
+    latency_p95 = models.FloatField(default=0.0, help_text=_("95th percentile matching time in milliseconds"))
+
+    def __str__(self):
+        return f"{self.started_at:%Y-%m-%d %H:%M} ({self.matched}/{self.documents})"
+
+    @property
+    def match_rate(self):
+        return self.matched / self.documents if self.documents else 0.0
+
+    class Meta:
+        verbose_name = _("Document Reprocessing Run")
+        verbose_name_plural = _("Document Reprocessing Runs")
+        ordering = ['-started_at']
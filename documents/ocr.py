@@ -0,0 +1,286 @@
+"""
+Page-parallel OCR pipeline.
+
+Born-digital PDFs carry a text layer: for those pages the words and their
+bounding boxes are read directly with PyMuPDF (milliseconds per page) and
+Tesseract is skipped. Only pages without usable text are OCRed.
+
+Pages without text are rasterized lazily with PyMuPDF, one page at a time and only inside
+the process that recognizes it, so peak memory depends on the number of
+worker processes and the DPI, not on the page count. Each page gets a single
+Tesseract pass (image_to_data); the page text is rebuilt from the recognized
+words instead of running image_to_string a second time.
+
+This module must not import models: it is imported by the OCR pool processes.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import fitz
+import pytesseract
+from PIL import Image
+from django.conf import settings
+
+# Configure Tesseract path if needed
+if hasattr(settings, 'TESSERACT_CMD'):
+    pytesseract.pytesseract.tesseract_cmd = settings.TESSERACT_CMD
+
+# Bump when a change to the pipeline alters its results (invalidates the OCR cache)
+PIPELINE_VERSION = 2
+
+DEFAULT_DPI = 300
+
+TESSERACT_CONFIG = '--psm 1'
+
+OCR_DATA_KEYS = ('text', 'conf', 'left', 'top', 'width', 'height')
+
+# A text layer with fewer words is treated as missing (e.g. scans with a stamp or page number)
+DEFAULT_TEXT_LAYER_MIN_WORDS = 5
+
+# Confidence reported for words taken from the text layer
+TEXT_LAYER_CONFIDENCE = 100
+
+# Upper bound for get_ocr_processes() in this process (see limit_ocr_processes)
+_process_limit = None
+
+
+def get_ocr_dpi():
+    return getattr(settings, 'DOCUMENT_OCR_DPI', DEFAULT_DPI)
+
+
+def get_ocr_processes():
+    """Number of processes used to recognize the pages of one document."""
+    processes = getattr(settings, 'DOCUMENT_OCR_PROCESSES', min(os.cpu_count() or 1, 4))
+    return min(processes, _process_limit) if _process_limit else processes
+
+
+def limit_ocr_processes(processes):
+    """
+    Limit the page processes per document in this process (None removes the limit).
+
+    Worker processes that already handle documents in parallel set 1, so the
+    pages are recognized in-process instead of in a process pool per document.
+    """
+    global _process_limit
+    _process_limit = processes
+
+
+def get_text_layer_min_words():
+    return getattr(settings, 'DOCUMENT_TEXT_LAYER_MIN_WORDS', DEFAULT_TEXT_LAYER_MIN_WORDS)
+
+
+def get_engine_config():
+    """Settings that determine the OCR result of a file, used as part of the OCR cache key."""
+    return {
+        'pipeline': PIPELINE_VERSION,
+        'dpi': get_ocr_dpi(),
+        'tesseract_config': TESSERACT_CONFIG,
+        'text_layer_min_words': get_text_layer_min_words(),
+    }
+
+
+def get_page_count(file_path):
+    with fitz.open(file_path) as pdf:
+        return pdf.page_count
+
+
+def render_page(pdf, page_number, dpi):
+    """
+    Rasterize a single page as a grayscale PIL image.
+
+    Args:
+        pdf: Open fitz document
+        page_number: 1-based page number
+        dpi: Resolution of the image
+    """
+    pixmap = pdf[page_number - 1].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    return Image.frombytes('L', (pixmap.width, pixmap.height), pixmap.samples)
+
+
+def join_page_text(entries):
+    """
+    Join words to the page text: words per line, lines per paragraph and
+    paragraphs separated by a blank line, matching the layout of image_to_string.
+
+    Args:
+        entries: (paragraph key, line key, word) tuples in reading order
+    """
+    paragraphs = []
+    current_paragraph = current_line = None
+    for paragraph_key, line_key, text in entries:
+        if paragraph_key != current_paragraph:
+            current_paragraph, current_line = paragraph_key, None
+            paragraphs.append([])
+        if line_key != current_line:
+            current_line = line_key
+            paragraphs[-1].append([])
+        paragraphs[-1][-1].append(text)
+
+    return '\n\n'.join(
+        '\n'.join(' '.join(line) for line in paragraph) for paragraph in paragraphs
+    )
+
+
+def make_word(text, conf, left, top, w, h, width, height, page_number):
+    """Word entry of ocr_data with normalized (0-1) and pixel coordinates."""
+    return {
+        'text': text,
+        'conf': conf,
+        'x': left / width,
+        'y': top / height,
+        'w': w / width,
+        'h': h / height,
+        'page': page_number,
+        # Include original pixel coordinates for reference
+        'orig_x': left,
+        'orig_y': top,
+        'orig_w': w,
+        'orig_h': h,
+    }
+
+
+def build_page(page_number, data, width, height):
+    """
+    Build the ocr_data page structure and the page text from image_to_data output.
+
+    Returns:
+        tuple: (page dict, page text)
+    """
+    words = []
+    entries = []
+    for j, text in enumerate(data['text']):
+        if not text.strip():  # Only include non-empty text
+            continue
+
+        words.append(make_word(text, data['conf'][j], data['left'][j], data['top'][j],
+                               data['width'][j], data['height'][j], width, height, page_number))
+        entries.append(((data['block_num'][j], data['par_num'][j]), data['line_num'][j], text))
+
+    page = {'page': page_number, 'width': width, 'height': height, 'words': words}
+    return page, join_page_text(entries)
+
+
+def extract_text_layer(pdf, page_number, dpi):
+    """
+    Read the words of a page from its text layer.
+
+    Coordinates are scaled to the pixel size the page would have when
+    rasterized at dpi, so the result matches the OCR structure exactly.
+
+    Returns:
+        tuple: (page dict, page text), or None if the page has no usable text
+    """
+    page = pdf[page_number - 1]
+    raw_words = [word for word in page.get_text('words', sort=True) if word[4].strip()]
+    if len(raw_words) < get_text_layer_min_words():
+        return None
+    # Undecodable glyphs (fonts without a Unicode mapping) make the layer unusable
+    if sum(word[4].count('\ufffd') for word in raw_words) > len(raw_words) // 10:
+        return None
+
+    scale = dpi / 72
+    width, height = round(page.rect.width * scale), round(page.rect.height * scale)
+    words = []
+    entries = []
+    for x0, y0, x1, y1, text, block_no, line_no, _ in raw_words:
+        left, top = round(x0 * scale), round(y0 * scale)
+        words.append(make_word(text, TEXT_LAYER_CONFIDENCE, left, top, round(x1 * scale) - left,
+                               round(y1 * scale) - top, width, height, page_number))
+        entries.append((block_no, line_no, text))
+
+    result = {'page': page_number, 'width': width, 'height': height, 'words': words, 'source': 'text'}
+    return result, join_page_text(entries)
+
+
+def read_text_page(pdf, page_number, dpi):
+    """
+    Try the text layer of a page.
+
+    Returns:
+        dict: Result like recognize_page(), or None if the page needs OCR
+    """
+    start = time.perf_counter()
+    try:
+        extracted = extract_text_layer(pdf, page_number, dpi)
+    except Exception:
+        return None
+    if extracted is None:
+        return None
+    page, text = extracted
+    return {'page': page_number, 'result': page, 'text': text,
+            'timings': {'text_layer': time.perf_counter() - start}}
+
+
+def recognize_page(pdf, page_number, dpi):
+    """
+    Rasterize and recognize one page.
+
+    Returns:
+        dict: page, text and timings, or page and error if the page failed
+    """
+    try:
+        start = time.perf_counter()
+        image = render_page(pdf, page_number, dpi)
+        rasterized = time.perf_counter()
+        data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT, config=TESSERACT_CONFIG)
+        recognized = time.perf_counter()
+
+        if not isinstance(data, dict) or not all(key in data for key in OCR_DATA_KEYS):
+            return {'page': page_number, 'error': 'Unexpected OCR data'}
+
+        page, text = build_page(page_number, data, *image.size)
+        return {
+            'page': page_number,
+            'result': page,
+            'text': text,
+            'timings': {'rasterize': rasterized - start, 'ocr': recognized - rasterized},
+        }
+    except Exception as e:
+        return {'page': page_number, 'error': str(e)}
+
+
+def recognize_file_page(file_path, page_number, dpi):
+    """Open the file and recognize one page (task of the process pool)."""
+    with fitz.open(file_path) as pdf:
+        return recognize_page(pdf, page_number, dpi)
+
+
+def iter_ocr_pages(file_path, dpi=None, processes=None, use_text_layer=True):
+    """
+    Read all pages of a PDF: from the text layer where possible, otherwise
+    with OCR in parallel across a process pool.
+
+    Args:
+        file_path: Path of the PDF file
+        dpi: Rasterization resolution (default: DOCUMENT_OCR_DPI)
+        processes: Number of processes (default: DOCUMENT_OCR_PROCESSES)
+        use_text_layer: Read pages with usable text directly instead of OCRing them
+
+    Yields:
+        dict: Result of recognize_page() or read_text_page() per page, in page order
+    """
+    dpi = dpi or get_ocr_dpi()
+    processes = processes or get_ocr_processes()
+
+    text_pages = {}
+    with fitz.open(file_path) as pdf:
+        page_count = pdf.page_count
+        if use_text_layer:
+            for page_number in range(1, page_count + 1):
+                result = read_text_page(pdf, page_number, dpi)
+                if result is not None:
+                    text_pages[page_number] = result
+        ocr_pages = [page_number for page_number in range(1, page_count + 1) if page_number not in text_pages]
+
+        if min(processes, len(ocr_pages)) <= 1:
+            for page_number in range(1, page_count + 1):
+                yield text_pages.get(page_number) or recognize_page(pdf, page_number, dpi)
+            return
+
+    # Every task opens the file itself; only page numbers and results cross process boundaries
+    with ProcessPoolExecutor(max_workers=min(processes, len(ocr_pages))) as pool:
+        recognized = pool.map(recognize_file_page, repeat(file_path), ocr_pages, repeat(dpi))
+        for page_number in range(1, page_count + 1):
+            yield text_pages.get(page_number) or next(recognized)
@@ -0,0 +1,116 @@
+"""
+Content-addressed cache for OCR results.
+
+Suppliers often send the same file twice (e-mail and portal). Results are
+stored once per SHA-256 of the file content plus the OCR engine configuration
+and copied to every further document with the same content. The cache is
+limited by the total size of the stored results; least recently used entries
+are evicted first.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import OcrCacheEntry
+from .ocr import get_engine_config
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def is_cache_enabled():
+    return getattr(settings, 'DOCUMENT_OCR_CACHE_ENABLED', True)
+
+
+def get_max_size():
+    """Maximum total size of the cached results in bytes."""
+    return getattr(settings, 'DOCUMENT_OCR_CACHE_MAX_SIZE', DEFAULT_MAX_SIZE)
+
+
+def compute_content_hash(file):
+    """
+    SHA-256 of a file's content.
+
+    Args:
+        file: Django File (stored FieldFile or uploaded file)
+    """
+    digest = hashlib.sha256()
+    file.open('rb')
+    try:
+        file.seek(0)
+        for chunk in file.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    finally:
+        file.seek(0)
+    return digest.hexdigest()
+
+
+def get_cache_key(content_hash):
+    """Cache key of a file content under the current OCR engine configuration."""
+    config = json.dumps(get_engine_config(), sort_keys=True)
+    return hashlib.sha256(f'{content_hash}:{config}'.encode()).hexdigest()
+
+
+def get_cached_result(content_hash):
+    """
+    Look up the OCR result for a file content.
+
+    Returns:
+        OcrCacheEntry or None if the content is not cached
+    """
+    if not is_cache_enabled() or not content_hash:
+        return None
+    entry = OcrCacheEntry.objects.filter(key=get_cache_key(content_hash)).first()
+    if entry is not None:
+        OcrCacheEntry.objects.filter(pk=entry.pk).update(hits=F('hits') + 1, last_used_at=timezone.now())
+    return entry
+
+
+def store_result(content_hash, ocr_text, ocr_data):
+    """Store the OCR result for a file content and evict old entries if the cache is full."""
+    if not is_cache_enabled() or not content_hash:
+        return None
+    size = len(ocr_text.encode()) + len(json.dumps(ocr_data))
+    if size > get_max_size():
+        return None
+
+    entry, _ = OcrCacheEntry.objects.update_or_create(
+        key=get_cache_key(content_hash),
+        defaults={
+            'content_hash': content_hash,
+            'ocr_text': ocr_text,
+            'ocr_data': ocr_data,
+            'size': size,
+            'last_used_at': timezone.now(),
+        },
+    )
+    evict(keep=entry.pk)
+    return entry
+
+
+def evict(max_size=None, keep=None):
+    """
+    Delete least recently used entries until the cache fits into max_size.
+
+    Returns:
+        int: Number of deleted entries
+    """
+    max_size = get_max_size() if max_size is None else max_size
+    excess = (OcrCacheEntry.objects.aggregate(total=Sum('size'))['total'] or 0) - max_size
+    if excess <= 0:
+        return 0
+
+    doomed = []
+    for pk, size in OcrCacheEntry.objects.exclude(pk=keep).order_by('last_used_at', 'pk').values_list('pk', 'size'):
+        doomed.append(pk)
+        excess -= size
+        if excess <= 0:
+            break
+
+    for start in range(0, len(doomed), 500):
+        OcrCacheEntry.objects.filter(pk__in=doomed[start:start + 500]).delete()
+    return len(doomed)
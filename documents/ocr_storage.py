@@ -0,0 +1,204 @@
+"""
+Compact storage for OCR word data.
+
+The words of a page are kept outside the Document row in DocumentOcrPage as
+packed columnar NumPy arrays (pixel boxes and text lengths as int32,
+confidences as float64, the texts as one UTF-8 string), compressed with zlib.
+Normalized coordinates are not stored: they are recomputed from the pixel
+boxes and the page size, which gives exactly the values the OCR pipeline
+produced. Loading Document objects therefore never pulls word data; it is
+read on first access of Document.ocr_data or per page by load_ocr_page().
+"""
+import struct
+import zlib
+
+import numpy as np
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Document, DocumentOcrPage, OcrCacheEntry
+
+FORMAT_VERSION = 1
+
+# Magic, format version, word count
+HEADER = struct.Struct('<4sHI')
+MAGIC = b'OCRW'
+
+BOX_KEYS = ('orig_x', 'orig_y', 'orig_w', 'orig_h')
+
+
+def pack_words(words):
+    """Pack the words of a page into a compressed binary blob."""
+    texts = [word.get('text', '').encode() for word in words]
+    columns = np.empty((len(BOX_KEYS) + 1, len(words)), dtype='<i4')
+    for row, key in enumerate(BOX_KEYS):
+        columns[row] = [word.get(key, 0) for word in words]
+    columns[len(BOX_KEYS)] = [len(text) for text in texts]
+    confidences = np.array([float(word.get('conf', 0)) for word in words], dtype='<f8')
+
+    payload = HEADER.pack(MAGIC, FORMAT_VERSION, len(words)) + columns.tobytes() + confidences.tobytes() + \
+        b''.join(texts)
+    return zlib.compress(payload)
+
+
+def unpack_words(blob, page_number, width, height):
+    """
+    Restore the word dictionaries of a page.
+
+    Returns:
+        list: Words in the ocr_data format (text, conf, x, y, w, h, page, orig_*)
+    """
+    data = zlib.decompress(blob)
+    magic, version, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported OCR word format {magic!r} v{version}')
+
+    offset = HEADER.size
+    columns = np.frombuffer(data, dtype='<i4', count=(len(BOX_KEYS) + 1) * count, offset=offset)
+    columns = columns.reshape(len(BOX_KEYS) + 1, count)
+    offset += columns.nbytes
+    confidences = np.frombuffer(data, dtype='<f8', count=count, offset=offset).tolist()
+    offset += count * 8
+
+    lefts, tops, widths, heights, lengths = (column.tolist() for column in columns)
+    words = []
+    for index in range(count):
+        text = data[offset:offset + lengths[index]].decode()
+        offset += lengths[index]
+        conf = confidences[index]
+        left, top, w, h = lefts[index], tops[index], widths[index], heights[index]
+        words.append({
+            'text': text,
+            'conf': int(conf) if conf.is_integer() else conf,
+            'x': left / width,
+            'y': top / height,
+            'w': w / width,
+            'h': h / height,
+            'page': page_number,
+            'orig_x': left,
+            'orig_y': top,
+            'orig_w': w,
+            'orig_h': h,
+        })
+    return words
+
+
+def page_from_row(row):
+    page = {
+        'page': row.page_number,
+        'width': row.width,
+        'height': row.height,
+        'words': unpack_words(bytes(row.words), row.page_number, row.width, row.height),
+    }
+    if row.source:
+        page['source'] = row.source
+    return page
+
+
+def store_ocr_data(document, ocr_data):
+    """Replace the stored OCR pages of a document (None removes them)."""
+    DocumentOcrPage.objects.filter(document=document).delete()
+    pages = (ocr_data or {}).get('pages', [])
+    DocumentOcrPage.objects.bulk_create([
+        DocumentOcrPage(
+            document=document,
+            page_number=page['page'],
+            width=page['width'],
+            height=page['height'],
+            source=page.get('source', ''),
+            word_count=len(page['words']),
+            words=pack_words(page['words']),
+        )
+        for page in pages
+    ])
+
+
+def load_ocr_data(document):
+    """
+    Load all OCR pages of a document.
+
+    Returns:
+        dict: {'pages': [...]} or None if the document has no OCR data
+    """
+    # Uses prefetch_related('ocr_pages') if the caller loaded the pages in bulk
+    rows = sorted(document.ocr_pages.all(), key=lambda row: row.page_number)
+    if not rows:
+        return None
+    return {'pages': [page_from_row(row) for row in rows]}
+
+
+def load_ocr_page(document, page_number):
+    """
+    Load a single OCR page of a document.
+
+    Returns:
+        dict: The page or None if it does not exist
+    """
+    row = DocumentOcrPage.objects.filter(document=document, page_number=page_number).first()
+    return page_from_row(row) if row else None
+
+
+def backfill_ocr_pages(batch_size=500, dry_run=False):
+    """
+    Copy OCR word data of documents processed before DocumentOcrPage existed.
+
+    The pages are taken from the legacy JSON column of the document, which is
+    cleared afterwards. Documents without legacy data that are processed but
+    have no pages get them from a cached OCR result with the same content
+    hash (most recently used first); only documents without any stored data
+    are queued for OCR again.
+
+    Returns:
+        dict: Number of documents 'copied' from the legacy column, 'restored'
+        from the OCR cache and 'queued' for OCR
+    """
+    from .processing_queue import enqueue_document
+
+    stats = {'copied': 0, 'restored': 0, 'queued': 0}
+    has_pages = Exists(DocumentOcrPage.objects.filter(document=OuterRef('pk')))
+    documents = Document.objects.annotate(has_pages=has_pages).filter(
+        Q(legacy_ocr_data__isnull=False) | Q(is_processed=True, has_pages=False)
+    ).only('pk', 'content_hash', 'is_processed', 'legacy_ocr_data')
+    # Handled documents leave the result set, so the batches are read by pk
+    last_pk = 0
+    while True:
+        batch = list(documents.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+        if not batch:
+            return stats
+        last_pk = batch[-1].pk
+
+        hashes = {
+            document.content_hash for document in batch
+            if document.content_hash and not document.has_pages and not document.legacy_ocr_data
+        }
+        entries = {}
+        for entry in OcrCacheEntry.objects.filter(content_hash__in=hashes).order_by('-last_used_at'):
+            entries.setdefault(entry.content_hash, entry)
+
+        for document in batch:
+            legacy = document.legacy_ocr_data
+            if document.has_pages:
+                # Processed again since the upgrade: the legacy data is outdated
+                action, ocr_data = None, None
+            elif legacy and legacy.get('pages'):
+                action, ocr_data = 'copied', legacy
+            elif document.content_hash in entries and entries[document.content_hash].ocr_data.get('pages'):
+                action, ocr_data = 'restored', entries[document.content_hash].ocr_data
+            elif document.is_processed:
+                action, ocr_data = 'queued', None
+            else:
+                # Never processed: nothing to restore, only the legacy value is cleared
+                action, ocr_data = None, None
+
+            if action is not None:
+                stats[action] += 1
+            if dry_run:
+                continue
+            with transaction.atomic():
+                if ocr_data is not None:
+                    store_ocr_data(document, ocr_data)
+                if legacy is not None:
+                    Document.objects.filter(pk=document.pk).update(legacy_ocr_data=None)
+            if action == 'queued':
+                enqueue_document(document)
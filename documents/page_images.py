@@ -0,0 +1,140 @@
+"""
+Rendered page images for the document preview and the field mapping editor.
+
+Pages are rendered one at a time with PyMuPDF and stored on disk together
+with a thumbnail, keyed by the file's content hash, the page number and the
+resolution. Identical uploads share their images, and a page is rendered at
+most once. The files are served directly (see views.document_page_image) and
+can be prerendered by the OCR worker after processing.
+"""
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+import fitz
+from PIL import Image
+from django.conf import settings
+
+from .ocr_cache import compute_content_hash
+
+DEFAULT_DPI = 200
+DEFAULT_THUMBNAIL_WIDTH = 240
+JPEG_QUALITY = 85
+
+
+def get_page_image_dpi():
+    return getattr(settings, 'DOCUMENT_PAGE_IMAGE_DPI', DEFAULT_DPI)
+
+
+def get_thumbnail_width():
+    return getattr(settings, 'DOCUMENT_THUMBNAIL_WIDTH', DEFAULT_THUMBNAIL_WIDTH)
+
+
+def get_cache_dir():
+    return getattr(settings, 'DOCUMENT_PAGE_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'page_cache'))
+
+
+def get_content_hash(document):
+    """Content hash of the document file, computed and stored on first use."""
+    if not document.content_hash:
+        document.content_hash = compute_content_hash(document.file)
+        type(document).objects.filter(pk=document.pk).update(content_hash=document.content_hash)
+    return document.content_hash
+
+
+def get_image_version(document, thumbnail=False):
+    """Identifier of a rendered image variant, used as ETag."""
+    size = f'w{get_thumbnail_width()}' if thumbnail else f'{get_page_image_dpi()}dpi'
+    return f'{get_content_hash(document)}-{size}'
+
+
+def get_image_path(document, page_number, thumbnail=False):
+    content_hash = get_content_hash(document)
+    name = f'thumb-{get_thumbnail_width()}-{page_number}.jpg' if thumbnail else \
+        f'page-{get_page_image_dpi()}-{page_number}.jpg'
+    return os.path.join(get_cache_dir(), content_hash[:2], content_hash, name)
+
+
+def get_page_info(document):
+    """
+    Page count and pixel size of the rendered pages, without rendering.
+
+    Returns:
+        dict: page_count and sizes (list of (width, height) per page)
+    """
+    scale = get_page_image_dpi() / 72
+    with fitz.open(document.file.path) as pdf:
+        sizes = [(round(page.rect.width * scale), round(page.rect.height * scale)) for page in pdf]
+    return {'page_count': len(sizes), 'sizes': sizes}
+
+
+def _render(pdf, page_number, thumbnail):
+    page = pdf[page_number - 1]
+    if thumbnail:
+        zoom = get_thumbnail_width() / page.rect.width
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    else:
+        pixmap = page.get_pixmap(dpi=get_page_image_dpi(), alpha=False)
+    # Pillow encodes JPEG several times faster than Pixmap.tobytes('jpeg')
+    buffer = BytesIO()
+    Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples).save(
+        buffer, format='JPEG', quality=JPEG_QUALITY
+    )
+    return buffer.getvalue()
+
+
+def _write_atomic(path, data):
+    # Concurrent requests and workers may render the same page; the last rename wins
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def get_page_image(document, page_number, thumbnail=False):
+    """
+    Path of the rendered page image (or thumbnail), rendering it if needed.
+
+    Raises:
+        IndexError: If the page does not exist
+    """
+    path = get_image_path(document, page_number, thumbnail)
+    if os.path.exists(path):
+        return path
+
+    with fitz.open(document.file.path) as pdf:
+        if not 1 <= page_number <= pdf.page_count:
+            raise IndexError(f'Page {page_number} does not exist')
+        _write_atomic(path, _render(pdf, page_number, thumbnail))
+    return path
+
+
+def prerender_pages(document):
+    """
+    Render all missing page images and thumbnails of a document.
+
+    Returns:
+        int: Number of rendered images
+    """
+    rendered = 0
+    with fitz.open(document.file.path) as pdf:
+        for page_number in range(1, pdf.page_count + 1):
+            for thumbnail in (False, True):
+                path = get_image_path(document, page_number, thumbnail)
+                if not os.path.exists(path):
+                    _write_atomic(path, _render(pdf, page_number, thumbnail))
+                    rendered += 1
+    return rendered
+
+
+def clear_page_images(content_hash):
+    """Delete all rendered images of a file content."""
+    if content_hash:
+        shutil.rmtree(os.path.join(get_cache_dir(), content_hash[:2], content_hash), ignore_errors=True)
@@ -0,0 +1,199 @@
+"""
+Database-backed queue for document OCR processing.
+
+Uploads only create a DocumentProcessingJob; the OCR itself runs in the
+worker processes started by the run_ocr_workers command. Workers claim jobs
+with SELECT ... FOR UPDATE SKIP LOCKED (where the database supports it) and a
+conditional UPDATE, so several processes can share the queue without taking
+the same document twice. Failed attempts are retried with exponential backoff.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Document, DocumentProcessingJob
+from .page_images import prerender_pages
+from .tasks import process_document_ocr
+from .utils import log_processing_event, timed_stage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Delay before the first retry in seconds; doubled for every further attempt
+DEFAULT_RETRY_DELAY = 60
+
+# Running jobs without progress for this many seconds are considered abandoned
+DEFAULT_JOB_TIMEOUT = 30 * 60
+
+OPEN_STATUSES = ('queued', 'running')
+
+
+def get_max_attempts():
+    return getattr(settings, 'DOCUMENT_PROCESSING_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+
+
+def get_retry_delay(attempts):
+    """Backoff in seconds after the given number of failed attempts."""
+    base = getattr(settings, 'DOCUMENT_PROCESSING_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+    return base * 2 ** max(attempts - 1, 0)
+
+
+def get_job_timeout():
+    return getattr(settings, 'DOCUMENT_PROCESSING_JOB_TIMEOUT', DEFAULT_JOB_TIMEOUT)
+
+
+def prerender_enabled():
+    """Render page images and thumbnails in the worker, so the editor never waits for them."""
+    return getattr(settings, 'DOCUMENT_PRERENDER_PAGE_IMAGES', True)
+
+
+def enqueue_document(document):
+    """
+    Queue a document for OCR processing.
+
+    The document is set to 'pending'; an already open job is reused.
+
+    Returns:
+        DocumentProcessingJob: The open job for the document
+    """
+    Document.objects.filter(pk=document.pk).update(processing_status='pending')
+    document.processing_status = 'pending'
+
+    job = DocumentProcessingJob.objects.filter(document=document, status__in=OPEN_STATUSES).first()
+    if job is None:
+        job = DocumentProcessingJob.objects.create(document=document)
+    return job
+
+
+def touch_job(job):
+    """Renew the lock of a running job, so requeue_stale_jobs() leaves it to its worker."""
+    DocumentProcessingJob.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(
+        locked_at=timezone.now()
+    )
+
+
+def requeue_stale_jobs():
+    """Return jobs of crashed workers to the queue.
+
+    A running job is abandoned when its lock has not been renewed by
+    touch_job() (after every page) for DOCUMENT_PROCESSING_JOB_TIMEOUT seconds.
+
+    Returns:
+        int: Number of requeued jobs
+    """
+    cutoff = timezone.now() - timedelta(seconds=get_job_timeout())
+    return DocumentProcessingJob.objects.filter(status='running', locked_at__lt=cutoff).update(
+        status='queued', locked_by='', locked_at=None
+    )
+
+
+def claim_next_job(worker=''):
+    """
+    Claim the next due job for a worker.
+
+    Returns:
+        DocumentProcessingJob or None if no job is due
+    """
+    candidates = DocumentProcessingJob.objects.filter(status='queued', available_at__lte=timezone.now())
+    if not connection.features.has_select_for_update_skip_locked:
+        # SQLite: no row locks, the conditional UPDATE alone decides
+        return _claim(candidates, worker)
+
+    with transaction.atomic():
+        return _claim(candidates.select_for_update(skip_locked=True), worker)
+
+
+def _claim(candidates, worker):
+    for job_id in candidates.order_by('available_at', 'pk').values_list('pk', flat=True)[:10]:
+        if DocumentProcessingJob.objects.filter(pk=job_id, status='queued').update(
+            status='running', locked_by=worker, locked_at=timezone.now(), attempts=F('attempts') + 1
+        ):
+            return DocumentProcessingJob.objects.select_related('document').get(pk=job_id)
+    return None
+
+
+def run_job(job):
+    """
+    Process the document of a claimed job and record the stage timings.
+
+    Returns:
+        bool: True if the document was processed successfully
+    """
+    document = job.document
+    Document.objects.filter(pk=document.pk).update(processing_status='processing')
+    document.processing_status = 'processing'
+
+    timings = {}
+    start = time.perf_counter()
+    try:
+        success = process_document_ocr(document.pk, timings=timings, progress=lambda page_number: touch_job(job))
+        error = '' if success else 'OCR processing failed'
+    except Exception as e:
+        logger.exception("Document processing job %s failed", job.pk)
+        success, error = False, str(e)
+
+    if success and prerender_enabled():
+        touch_job(job)
+        try:
+            with timed_stage(timings, 'prerender'):
+                prerender_pages(document)
+        except Exception:
+            # Missing images are rendered on request
+            logger.exception("Prerendering pages of document %s failed", document.pk)
+    timings['total'] = round(time.perf_counter() - start, 4)
+
+    details = {'job': job.pk, 'attempt': job.attempts, 'worker': job.locked_by, 'timings': timings}
+    job.locked_at = None
+    if success:
+        job.status = 'done'
+        job.finished_at = timezone.now()
+        log_processing_event(document, 'info', f"Processing job finished in {timings['total']:.2f}s", details)
+    elif job.attempts < get_max_attempts():
+        delay = get_retry_delay(job.attempts)
+        job.status = 'queued'
+        job.available_at = timezone.now() + timedelta(seconds=delay)
+        Document.objects.filter(pk=document.pk).update(processing_status='pending')
+        log_processing_event(
+            document, 'warning',
+            f"Processing attempt {job.attempts} failed, retrying in {delay}s", details
+        )
+    else:
+        job.status = 'failed'
+        job.finished_at = timezone.now()
+        Document.objects.filter(pk=document.pk).update(processing_status='error')
+        log_processing_event(
+            document, 'error',
+            f"Processing failed after {job.attempts} attempts", details
+        )
+    job.last_error = error
+    job.save(update_fields=['status', 'available_at', 'locked_at', 'finished_at', 'last_error'])
+    return success
+
+
+def work(worker, interval=5.0, once=False):
+    """
+    Worker loop: claim and process jobs until the queue is empty (once) or forever.
+
+    Returns:
+        int: Number of processed jobs
+    """
+    processed = 0
+    try:
+        while True:
+            requeue_stale_jobs()
+            job = claim_next_job(worker)
+            if job is not None:
+                run_job(job)
+                processed += 1
+                continue
+            if once:
+                return processed
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        return processed
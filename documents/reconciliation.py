@@ -0,0 +1,412 @@
+"""
+Reconciliation of extracted order numbers and delivery lines with purchase orders.
+
+After field extraction, the order numbers of a batch of documents are resolved
+together: first with one query for the literal values, then against a cached
+per-supplier index of normalized order numbers (without whitespace,
+separators and labels such as "Bestell-Nr.", with the OCR confusions O/0 and
+I/l/1 folded), and finally with a fuzzy fallback (unique suffix or a single
+edit). The extracted item numbers and quantities are matched against the
+open items of the resolved orders and stored as a receipt proposal
+(DocumentMatch with matched_by unset) for review before the goods receipt.
+
+Only exact and normalized hits link the document to the order. Order numbers
+are sequential, so a suffix or single-edit hit is often a different real
+order; those hits are only proposed for manual review.
+
+Like the template matchers, the indexes are kept per process and rebuilt
+when an order of the supplier is created or deleted (see signals.py) or
+after DOCUMENT_ORDER_INDEX_CACHE_TIMEOUT seconds.
+"""
+import re
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+
+from order.models import PurchaseOrder, PurchaseOrderItem
+
+from .models import DocumentMatch
+
+CACHE_VERSION_KEY = 'documents:order_index:{supplier_id}:version'
+DEFAULT_CACHE_TIMEOUT = 300
+
+# Labels that OCR or label-based extraction leave in front of the order number
+LABEL_PREFIX = re.compile(
+    r'^(?:ihre\s+)?(?:bestellung|bestellnummer|bestell-?\s*nr|order\s*(?:no|number|nr)|order|nr|no)'
+    r'(?=[\s:.#]|$)[\s:.#]*|^#\s*',
+    re.IGNORECASE
+)
+NON_ALPHANUMERIC = re.compile(r'[^0-9A-Z]')
+OCR_CONFUSIONS = str.maketrans({'O': '0', 'I': '1', 'L': '1'})
+
+# Shorter keys are too unspecific for a suffix match
+MIN_SUFFIX_LENGTH = 4
+
+# Confidence of the DocumentMatch by resolution method
+MATCH_CONFIDENCE = {'exact': 1.0, 'normalized': 0.95, 'suffix': 0.8, 'fuzzy': 0.7}
+
+# Resolution methods that are reliable enough to set Document.matched_order
+LINKING_METHODS = ('exact', 'normalized')
+
+LINE_FIELD = re.compile(r'^(item_number|quantity)(?:_(\d+))?$')
+NUMBER = re.compile(r'\d[\d.,]*')
+THOUSANDS = re.compile(r'^\d{1,3}(?:\.\d{3})+$')
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def strip_order_number(value):
+    """Order number without surrounding whitespace and leading labels."""
+    value = str(value).strip()
+    while True:
+        stripped = LABEL_PREFIX.sub('', value, count=1).strip()
+        if stripped == value or not stripped:
+            return value
+        value = stripped
+
+
+def normalize_order_number(value):
+    """
+    Comparison key of an order number.
+
+    Returns:
+        str: Upper case letters and digits only, with O -> 0 and I/L -> 1
+    """
+    return NON_ALPHANUMERIC.sub('', strip_order_number(value).upper()).translate(OCR_CONFUSIONS)
+
+
+def within_one_edit(a, b):
+    """True if a and b differ by at most one inserted, deleted or replaced character."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    for index, (char_a, char_b) in enumerate(zip(a, b)):
+        if char_a != char_b:
+            if len(a) == len(b):
+                return a[index + 1:] == b[index + 1:]
+            return a[index:] == b[index + 1:]
+    return True
+
+
+class OrderNumberIndex:
+    """Normalized order numbers of one supplier."""
+
+    def __init__(self, orders):
+        self.keys = {}
+        for pk, order_number in orders:
+            self.keys.setdefault(normalize_order_number(order_number), []).append(pk)
+
+    def resolve(self, key):
+        """
+        Find the order for a normalized order number.
+
+        Returns:
+            tuple: (order id or None, method); method is 'normalized', 'suffix', 'fuzzy',
+                'ambiguous' or None if nothing was found
+        """
+        if not key:
+            return None, None
+
+        pks = self.keys.get(key)
+        if pks:
+            return (pks[0], 'normalized') if len(pks) == 1 else (None, 'ambiguous')
+
+        # Missing or additional prefix, e.g. "2024-017" for "ORD-2024-017"
+        candidates = [
+            candidate for candidate in self.keys
+            if min(len(key), len(candidate)) >= MIN_SUFFIX_LENGTH and (candidate.endswith(key) or key.endswith(candidate))
+        ]
+        method = 'suffix'
+        if not candidates:
+            # A single misread, missing or additional character
+            candidates = [candidate for candidate in self.keys if within_one_edit(key, candidate)]
+            method = 'fuzzy'
+
+        pks = [pk for candidate in candidates for pk in self.keys[candidate]]
+        if len(pks) == 1:
+            return pks[0], method
+        return None, 'ambiguous' if pks else None
+
+
+def invalidate_order_number_index(supplier_id):
+    """Rebuild the order number index of a supplier on its next use."""
+    cache.set(CACHE_VERSION_KEY.format(supplier_id=supplier_id), time.time_ns(), None)
+
+
+def _get_versions(supplier_ids):
+    keys = {CACHE_VERSION_KEY.format(supplier_id=supplier_id): supplier_id for supplier_id in supplier_ids}
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        for key, version in missing.items():
+            cache.add(key, version, None)
+        versions.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def get_order_number_indexes(supplier_ids):
+    """
+    Return the order number indexes of several suppliers, loading the missing ones in one query.
+
+    Returns:
+        dict: supplier id -> OrderNumberIndex
+    """
+    supplier_ids = set(supplier_ids)
+    versions = _get_versions(supplier_ids)
+    timeout = getattr(settings, 'DOCUMENT_ORDER_INDEX_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT)
+    now = time.monotonic()
+
+    indexes = {}
+    with _indexes_lock:
+        for supplier_id in supplier_ids:
+            cached = _indexes.get(supplier_id)
+            if cached is not None and cached[0] == versions.get(supplier_id) and now - cached[1] < timeout:
+                indexes[supplier_id] = cached[2]
+
+    missing = supplier_ids - indexes.keys()
+    if missing:
+        orders = {supplier_id: [] for supplier_id in missing}
+        for pk, supplier_id, order_number in PurchaseOrder.objects.filter(
+            supplier_id__in=missing
+        ).values_list('pk', 'supplier_id', 'order_number').iterator():
+            orders[supplier_id].append((pk, order_number))
+        with _indexes_lock:
+            for supplier_id, rows in orders.items():
+                indexes[supplier_id] = OrderNumberIndex(rows)
+                _indexes[supplier_id] = (versions.get(supplier_id), now, indexes[supplier_id])
+    return indexes
+
+
+def parse_quantity(value):
+    """
+    Parse an extracted quantity ("12", "12,5", "1.000", "1,250.00 Stk").
+
+    Returns:
+        Decimal or None
+    """
+    match = NUMBER.search(str(value))
+    if not match:
+        return None
+    number = match.group(0).rstrip('.,')
+    if ',' in number and '.' in number:
+        # The separator that comes last is the decimal separator
+        thousands = '.' if number.rfind(',') > number.rfind('.') else ','
+        number = number.replace(thousands, '').replace(',', '.')
+    elif ',' in number:
+        number = number.replace(',', '.')
+    elif THOUSANDS.match(number):
+        number = number.replace('.', '')
+    try:
+        return Decimal(number)
+    except InvalidOperation:
+        return None
+
+
+def get_delivery_lines(extracted_data):
+    """
+    Delivery lines from the extracted fields item_number/quantity and item_number_<n>/quantity_<n>.
+
+    Returns:
+        list: Dicts with line, item_number and quantity, ordered by line
+    """
+    lines = {}
+    for code, value in (extracted_data or {}).items():
+        match = LINE_FIELD.match(code)
+        if match and value:
+            line = int(match.group(2) or 1)
+            lines.setdefault(line, {'line': line, 'item_number': None, 'quantity': None})[match.group(1)] = value
+    result = []
+    for line in sorted(lines.values(), key=lambda item: item['line']):
+        line['quantity'] = parse_quantity(line['quantity']) if line['quantity'] else None
+        if line['quantity'] is not None:
+            result.append(line)
+    return result
+
+
+def normalize_item_number(value):
+    return NON_ALPHANUMERIC.sub('', str(value).upper())
+
+
+def propose_receipt(lines, items):
+    """
+    Match delivery lines to the open items of an order.
+
+    A line is matched by supplier or product SKU, otherwise by a unique open
+    item whose remaining quantity equals the delivered quantity.
+
+    Returns:
+        list: One dict per line with the item (id or None), match ('sku', 'quantity' or None),
+            quantity, remaining quantity and status ('ok', 'exceeds_remaining' or 'unmatched')
+    """
+    open_items = [item for item in items if item.status != 'canceled']
+    remaining = {item.pk: item.effective_quantity - item.quantity_received for item in open_items}
+    skus = {}
+    for item in open_items:
+        for sku in (item.supplier_sku, item.product.sku):
+            if sku:
+                skus.setdefault(normalize_item_number(sku), item)
+
+    proposal = []
+    assigned = set()
+    for line in lines:
+        item, match = None, None
+        if line['item_number']:
+            item = skus.get(normalize_item_number(line['item_number']))
+            match = 'sku' if item else None
+        if item is None:
+            same_quantity = [
+                candidate for candidate in open_items
+                if candidate.pk not in assigned and remaining[candidate.pk] == line['quantity']
+            ]
+            if len(same_quantity) == 1:
+                item, match = same_quantity[0], 'quantity'
+
+        entry = {
+            'line': line['line'],
+            'item_number': line['item_number'],
+            'quantity': str(line['quantity']),
+            'item': item.pk if item else None,
+            'sku': item.product.sku if item else None,
+            'match': match,
+            'remaining': str(remaining[item.pk]) if item else None,
+            'status': 'unmatched',
+        }
+        if item is not None:
+            assigned.add(item.pk)
+            entry['status'] = 'ok' if line['quantity'] <= remaining[item.pk] else 'exceeds_remaining'
+        proposal.append(entry)
+    return proposal
+
+
+def reconcile_documents(matches):
+    """
+    Resolve the order numbers of a batch of documents and propose receipts, without writing anything.
+
+    Args:
+        matches: (document, result) pairs; result as returned by evaluate_document_template()
+
+    Each result gets 'order' (the PurchaseOrder to link, only for exact and
+    normalized hits), 'proposed_order' (the resolved PurchaseOrder of any
+    method) and 'reconciliation' (method, order number and receipt lines, None
+    without an order number), and the processing events are appended to
+    result['events'].
+    """
+    pending = []
+    for document, result in matches:
+        result.setdefault('reconciliation', None)
+        result.setdefault('proposed_order', None)
+        order_number = (result.get('extracted_data') or {}).get('order_number')
+        if result.get('template') is not None and order_number and document.supplier_id:
+            pending.append((document, result, str(order_number)))
+    if not pending:
+        return
+
+    # Literal order numbers in one query
+    exact = {}
+    values = list({strip_order_number(order_number) for _, _, order_number in pending})
+    for start in range(0, len(values), 500):
+        for pk, supplier_id, order_number in PurchaseOrder.objects.filter(
+            order_number__in=values[start:start + 500]
+        ).values_list('pk', 'supplier_id', 'order_number'):
+            exact[(supplier_id, order_number)] = pk
+
+    resolved = []
+    unresolved = []
+    for document, result, order_number in pending:
+        pk = exact.get((document.supplier_id, strip_order_number(order_number)))
+        if pk is not None:
+            resolved.append((document, result, order_number, pk, 'exact'))
+        else:
+            unresolved.append((document, result, order_number))
+
+    # Normalized and fuzzy lookup in the order number index of the supplier
+    if unresolved:
+        indexes = get_order_number_indexes(document.supplier_id for document, _, _ in unresolved)
+        for document, result, order_number in unresolved:
+            pk, method = indexes[document.supplier_id].resolve(normalize_order_number(order_number))
+            if pk is not None:
+                resolved.append((document, result, order_number, pk, method))
+            elif method == 'ambiguous':
+                result['events'].append((
+                    'warning', f"Multiple purchase orders found for number: {order_number}", None
+                ))
+            else:
+                result['events'].append((
+                    'warning', f"No matching purchase order found for number: {order_number}", None
+                ))
+
+    if not resolved:
+        return
+    orders = PurchaseOrder.objects.in_bulk({pk for _, _, _, pk, _ in resolved})
+    items = {}
+    for item in PurchaseOrderItem.objects.filter(
+        purchase_order_id__in=list(orders)
+    ).select_related('product').order_by('pk'):
+        items.setdefault(item.purchase_order_id, []).append(item)
+
+    for document, result, order_number, pk, method in resolved:
+        order = orders[pk]
+        result['proposed_order'] = order
+        receipt_lines = propose_receipt(get_delivery_lines(result['extracted_data']), items.get(pk, []))
+        result['reconciliation'] = {
+            'order_number': order_number,
+            'method': method,
+            'receipt_lines': receipt_lines,
+        }
+        details = {'method': method} if method != 'exact' else None
+        if method in LINKING_METHODS:
+            result['order'] = order
+            result['events'].append(('info', f"Matched to purchase order: {order.order_number}", details))
+        else:
+            result['events'].append((
+                'warning', f"Possible purchase order {order.order_number} for number {order_number}, "
+                           f"review required", details
+            ))
+        if receipt_lines:
+            open_lines = sum(1 for line in receipt_lines if line['status'] != 'ok')
+            result['events'].append((
+                'info' if not open_lines else 'warning',
+                f"Receipt proposed for {len(receipt_lines) - open_lines} of {len(receipt_lines)} delivery lines",
+                {'receipt_lines': receipt_lines}
+            ))
+
+
+def save_receipt_proposals(matches):
+    """
+    Store the reconciliation results as DocumentMatch records.
+
+    Earlier automatic proposals of the documents are replaced; manual matches are kept.
+    Suffix and fuzzy hits always need a manual review.
+    """
+    proposals = []
+    for document, result in matches:
+        reconciliation = result.get('reconciliation')
+        if not reconciliation or result.get('proposed_order') is None:
+            continue
+        lines = reconciliation['receipt_lines']
+        if reconciliation['method'] not in LINKING_METHODS:
+            status = 'manual_review'
+        elif not lines:
+            status = 'pending'
+        elif all(line['status'] == 'ok' for line in lines):
+            status = 'matched'
+        else:
+            status = 'manual_review'
+        proposals.append(DocumentMatch(
+            document=document,
+            template=result['template'],
+            purchase_order=result['proposed_order'],
+            status=status,
+            confidence_score=MATCH_CONFIDENCE[reconciliation['method']],
+            matched_data={**result['extracted_data'], 'reconciliation': reconciliation},
+        ))
+
+    DocumentMatch.objects.filter(
+        document__in=[document for document, _ in matches], matched_by__isnull=True
+    ).delete()
+    DocumentMatch.objects.bulk_create(proposals, batch_size=500)
@@ -0,0 +1,202 @@
+"""
+Batch reprocessing of documents after template changes.
+
+Template matching and field extraction run per chunk of documents, optionally
+spread over a process pool (see the reprocess_documents command). Workers only
+read; they return plain results. The calling process reconciles the order
+numbers of each chunk and writes the results back with bulk_update, together
+with the processing log entries. Documents that already have OCR data are not
+OCRed again.
+"""
+import math
+import time
+
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Document, DocumentOcrPage, DocumentProcessingLog, DocumentReprocessingRun, DocumentTemplate
+from .reconciliation import reconcile_documents, save_receipt_proposals
+from .utils import TEMPLATE_MATCH_FIELDS, apply_template_match, evaluate_document_template, process_document_with_ocr
+
+DEFAULT_CHUNK_SIZE = 100
+
+
+def get_documents(supplier=None, document_type=None, date_from=None, date_to=None, status=None):
+    """
+    Documents selected for reprocessing, annotated with has_ocr_data.
+
+    Args:
+        supplier: Supplier id
+        document_type: DocumentType code
+        date_from, date_to: Upload date range (inclusive)
+        status: Processing status
+    """
+    queryset = Document.objects.annotate(
+        has_ocr_data=Exists(DocumentOcrPage.objects.filter(document=OuterRef('pk')))
+    )
+    if supplier:
+        queryset = queryset.filter(supplier_id=supplier)
+    if document_type:
+        queryset = queryset.filter(document_type__code=document_type)
+    if date_from:
+        queryset = queryset.filter(upload_date__date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(upload_date__date__lte=date_to)
+    if status:
+        queryset = queryset.filter(processing_status=status)
+    return queryset.order_by('pk')
+
+
+def match_documents(document_ids):
+    """
+    Evaluate the templates of a chunk of documents without writing anything.
+
+    Returns:
+        list: One dict per document with pk, template id, score, extracted_data,
+            events, latency in seconds and error
+    """
+    documents = Document.objects.filter(pk__in=document_ids).select_related(
+        'supplier', 'document_type'
+    ).prefetch_related('ocr_pages')
+
+    results = []
+    for document in documents:
+        start = time.perf_counter()
+        try:
+            result = evaluate_document_template(document)
+            error = ''
+        except Exception as e:
+            result = {'template': None, 'score': 0.0, 'extracted_data': None, 'events': []}
+            error = str(e)
+        results.append({
+            'pk': document.pk,
+            'template': result['template'].pk if result['template'] else None,
+            'score': result['score'],
+            'extracted_data': result['extracted_data'],
+            'events': result['events'],
+            'latency': time.perf_counter() - start,
+            'error': error,
+        })
+    return results
+
+
+def save_results(results):
+    """
+    Write the results of match_documents() with bulk_update and log them.
+
+    The order numbers of the whole chunk are reconciled together before saving.
+    A document that no longer matches any template loses its earlier template match.
+
+    Returns:
+        int: Number of documents with a template match
+    """
+    templates = DocumentTemplate.objects.in_bulk({result['template'] for result in results if result['template']})
+    documents = Document.objects.only(*TEMPLATE_MATCH_FIELDS, 'supplier').in_bulk(
+        [result['pk'] for result in results]
+    )
+
+    matches = []
+    logs = []
+    for result in results:
+        document = documents.get(result['pk'])
+        if document is None:
+            continue
+        if result['error']:
+            logs.append(DocumentProcessingLog(
+                document=document, level='error',
+                message=f"Failed to identify document template: {result['error']}",
+                details={'exception': result['error']}
+            ))
+            continue
+        matches.append((document, {
+            'template': templates.get(result['template']),
+            'score': result['score'],
+            'extracted_data': result['extracted_data'],
+            'order': None,
+            'events': list(result['events']),
+        }))
+
+    reconcile_documents(matches)
+
+    changed = []
+    matched = 0
+    for document, match in matches:
+        if apply_template_match(document, match, reset_unmatched=True):
+            changed.append(document)
+        matched += match['template'] is not None
+        logs += [
+            DocumentProcessingLog(document=document, level=level, message=message, details=details)
+            for level, message, details in match['events']
+        ]
+
+    Document.objects.bulk_update(changed, TEMPLATE_MATCH_FIELDS, batch_size=500)
+    save_receipt_proposals(matches)
+    DocumentProcessingLog.objects.bulk_create(logs, batch_size=500)
+    return matched
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def reprocess(documents, filters=None, map_chunks=map, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Reprocess the given documents and record the run.
+
+    Args:
+        documents: Queryset from get_documents()
+        filters: Filters of the selection, stored with the run for the comparison with earlier runs
+        map_chunks: map function applied to match_documents over the id chunks (e.g. ProcessPoolExecutor.map)
+        chunk_size: Documents per chunk
+        progress: Optional callback(processed, total)
+
+    Returns:
+        tuple: (DocumentReprocessingRun, previous run with the same filters or None, match rate before the run)
+    """
+    filters = filters or {}
+    previous = DocumentReprocessingRun.objects.filter(filters=filters).first()
+    run = DocumentReprocessingRun.objects.create(filters=filters)
+    start = time.perf_counter()
+
+    rows = list(documents.values_list('pk', 'has_ocr_data', 'matched_template_id'))
+    total = len(rows)
+    matched_before = sum(1 for _, _, template_id in rows if template_id)
+    latencies = []
+
+    # Documents without OCR data are OCRed here (matching is part of the OCR processing)
+    for pk, has_ocr_data, _ in rows:
+        if has_ocr_data:
+            continue
+        document = Document.objects.get(pk=pk)
+        document_start = time.perf_counter()
+        if process_document_with_ocr(document):
+            run.matched += document.matched_template_id is not None
+        else:
+            run.failed += 1
+        latencies.append(time.perf_counter() - document_start)
+        run.ocr_documents += 1
+
+    ids = [pk for pk, has_ocr_data, _ in rows if has_ocr_data]
+    chunks = [ids[index:index + chunk_size] for index in range(0, len(ids), chunk_size)]
+    processed = run.ocr_documents
+    for results in map_chunks(match_documents, chunks):
+        run.matched += save_results(results)
+        run.failed += sum(1 for result in results if result['error'])
+        latencies += [result['latency'] for result in results]
+        processed += len(results)
+        if progress:
+            progress(processed, total)
+
+    elapsed = time.perf_counter() - start
+    run.documents = total
+    run.documents_per_second = total / elapsed if elapsed else 0.0
+    run.latency_p50 = percentile(latencies, 50) * 1000
+    run.latency_p95 = percentile(latencies, 95) * 1000
+    run.finished_at = timezone.now()
+    run.save()
+    return run, previous, (matched_before / total if total else 0.0)
@@ -1,19 +1,42 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from django.db import transaction
-from .models import Document
-from .tasks import process_document_ocr
+from order.models import PurchaseOrder
+from .models import Document, DocumentTemplate, TemplateField
+from .page_images import clear_page_images
+from .processing_queue import enqueue_document
+from .reconciliation import invalidate_order_number_index
+from .template_matcher import invalidate_template_matchers
 
 
 @receiver(post_save, sender=Document)
 def trigger_document_processing(sender, instance, created, **kwargs):
-    """Trigger document OCR processing when a new document is created."""
+    """Queue new documents for OCR processing by the run_ocr_workers command."""
     if created:
-        # Update status to processing
-        instance.processing_status = 'processing'
-        instance.save(update_fields=['processing_status'])
-
-        # Process document synchronously for now (no Celery)
-        # In a real project with Celery, you would use:
-        # transaction.on_commit(lambda: process_document_ocr.delay(instance.id))
-        transaction.on_commit(lambda: process_document_ocr(instance.id))
\ No newline at end of file
+        enqueue_document(instance)
+
+
+@receiver(post_delete, sender=Document)
+def remove_page_images(sender, instance, **kwargs):
+    """Delete rendered page images once no document with the same content is left."""
+    if instance.content_hash and not Document.objects.filter(content_hash=instance.content_hash).exists():
+        clear_page_images(instance.content_hash)
+
+
+@receiver([post_save, post_delete], sender=DocumentTemplate)
+@receiver([post_save, post_delete], sender=TemplateField)
+def reset_template_matchers(sender, **kwargs):
+    """Rebuild the compiled template matchers after template changes."""
+    invalidate_template_matchers()
+
+
+@receiver(post_save, sender=PurchaseOrder)
+def reset_order_number_index_on_create(sender, instance, created, **kwargs):
+    """Add new purchase orders to the order number index of their supplier."""
+    if created:
+        invalidate_order_number_index(instance.supplier_id)
+
+
+@receiver(post_delete, sender=PurchaseOrder)
+def reset_order_number_index_on_delete(sender, instance, **kwargs):
+    """Remove deleted purchase orders from the order number index of their supplier."""
+    invalidate_order_number_index(instance.supplier_id)
@@ -7,18 +7,20 @@ logger = logging.getLogger(__name__)
 
 # In a real application, this would be a Celery task
 # @celery.task(bind=True, max_retries=3)
-def process_document_ocr(document_id):
+def process_document_ocr(document_id, timings=None, progress=None):
     """
     Process a document with OCR.
 
     Args:
         document_id: ID of the document to process
+        timings: Optional dictionary receiving the duration of each processing stage
+        progress: Optional callable, called with the page number after each page
     """
     try:
         document = Document.objects.get(id=document_id)
 
         # Process document with OCR
-        success = process_document_with_ocr(document)
+        success = process_document_with_ocr(document, timings=timings, progress=progress)
 
         return success
     except Document.DoesNotExist:
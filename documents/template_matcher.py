@@ -0,0 +1,199 @@
+"""
+Compiled template matching.
+
+All header and footer lines of the active templates of a supplier and
+document type are compiled into one Aho-Corasick automaton, so scoring every
+candidate template takes a single pass over the OCR text instead of one
+case-insensitive search per pattern line and template. Label and regex
+patterns of the template fields are compiled once as well.
+
+Matchers are kept per process and rebuilt when a DocumentTemplate or
+TemplateField changes (a version number in the cache, bumped by
+documents/signals.py) or after DOCUMENT_MATCHER_CACHE_TIMEOUT seconds. The
+timeout bounds staleness in worker processes that do not share the cache
+with the web process.
+"""
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import DocumentTemplate
+
+CACHE_VERSION_KEY = 'documents:template_matcher:version'
+DEFAULT_CACHE_TIMEOUT = 300
+
+# Header and footer matches contribute this much to the template score
+HEADER_SCORE = 0.3
+FOOTER_SCORE = 0.2
+KEY_FIELDS_SCORE = 0.5
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+
+class PatternAutomaton:
+    """Aho-Corasick automaton finding all occurrences of a set of literal patterns."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [frozenset()]
+        outputs = [set()]
+
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    outputs.append(set())
+                state = next_state
+            outputs[state].add(index)
+
+        # Breadth-first: failure links point to the longest proper suffix that is a prefix of a pattern
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                outputs[next_state] |= outputs[self.fail[next_state]]
+        self.output = [frozenset(output) for output in outputs]
+
+    def find(self, text):
+        """
+        Indexes of all patterns that occur in the text.
+
+        Returns:
+            set: Pattern indexes
+        """
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+
+def split_pattern_lines(pattern_text):
+    """Non-empty, stripped lines of a header or footer pattern."""
+    return [line.strip() for line in (pattern_text or '').strip().split('\n') if line.strip()]
+
+
+@lru_cache(maxsize=4096)
+def compile_field_pattern(pattern):
+    """
+    Compile a label or regex field pattern (case-insensitive).
+
+    Returns:
+        re.Pattern or None if the pattern is invalid
+    """
+    try:
+        return re.compile(pattern, re.IGNORECASE)
+    except re.error:
+        return None
+
+
+class TemplateMatcher:
+    """Scores a document against a fixed set of templates in one pass over its text."""
+
+    def __init__(self, templates):
+        self.templates = list(templates)
+        patterns = {}
+        self.header_ids = []
+        self.footer_ids = []
+        for template in self.templates:
+            self.header_ids.append(frozenset(
+                patterns.setdefault(line.lower(), len(patterns)) for line in split_pattern_lines(template.header_pattern)
+            ))
+            self.footer_ids.append(frozenset(
+                patterns.setdefault(line.lower(), len(patterns)) for line in split_pattern_lines(template.footer_pattern)
+            ))
+            for field in template.fields.all():
+                if field.search_pattern and field.extraction_method in ('label_based', 'regex'):
+                    compile_field_pattern(field.search_pattern.strip() if field.extraction_method == 'label_based'
+                                          else field.search_pattern)
+        self.automaton = PatternAutomaton(list(patterns))
+
+    def score(self, document):
+        """
+        Match scores of all templates for a document.
+
+        Returns:
+            list: (template, score) tuples sorted by score, best first
+        """
+        # Imported here: utils imports this module
+        from .utils import extract_field_from_document
+
+        found = self.automaton.find(document.ocr_text.lower()) if document.ocr_text else set()
+        scores = []
+        for template, header_ids, footer_ids in zip(self.templates, self.header_ids, self.footer_ids):
+            score = 0.0
+            if header_ids & found:
+                score += HEADER_SCORE
+            if footer_ids & found:
+                score += FOOTER_SCORE
+
+            key_fields = [field for field in template.fields.all() if field.is_key_field]
+            if key_fields:
+                extracted = sum(1 for field in key_fields if extract_field_from_document(document, field))
+                score += KEY_FIELDS_SCORE * extracted / len(key_fields)
+
+            scores.append((template, min(score, 1.0)))  # Cap score at 1.0
+
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores
+
+
+def invalidate_template_matchers():
+    """Rebuild all template matchers on their next use."""
+    cache.set(CACHE_VERSION_KEY, time.time_ns(), None)
+
+
+def _get_version():
+    version = cache.get(CACHE_VERSION_KEY)
+    if version is None:
+        cache.add(CACHE_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CACHE_VERSION_KEY)
+    return version
+
+
+def get_template_matcher(supplier_id, document_type_id):
+    """
+    Return the matcher for the active templates of a supplier and document type.
+
+    Returns:
+        TemplateMatcher (possibly without templates)
+    """
+    key = (supplier_id, document_type_id)
+    version = _get_version()
+    timeout = getattr(settings, 'DOCUMENT_MATCHER_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT)
+    with _matchers_lock:
+        cached = _matchers.get(key)
+    if cached is not None and cached[0] == version and time.monotonic() - cached[1] < timeout:
+        return cached[2]
+
+    templates = DocumentTemplate.objects.filter(
+        supplier_id=supplier_id,
+        document_type_id=document_type_id,
+        is_active=True
+    ).prefetch_related('fields__reference_field', 'fields__table_parent')
+    matcher = TemplateMatcher(templates)
+    with _matchers_lock:
+        _matchers[key] = (version, time.monotonic(), matcher)
+    return matcher
@@ -1,3 +1,414 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+import fitz
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Product
+from core.test_utils import TemporaryMediaMixin
+from order.models import PurchaseOrder, PurchaseOrderItem
+from suppliers.models import Supplier
+
+from .models import (
+    Document, DocumentMatch, DocumentOcrPage, DocumentProcessingJob, DocumentReprocessingRun, DocumentTemplate,
+    DocumentType, OcrCacheEntry, TemplateField
+)
+from .ocr import build_page, get_ocr_processes, limit_ocr_processes, read_text_page, render_page
+from .ocr_cache import evict, store_result
+from .ocr_storage import load_ocr_page
+from .page_images import get_image_path
+from .processing_queue import claim_next_job, enqueue_document, requeue_stale_jobs, touch_job
+from .reconciliation import reconcile_documents, save_receipt_proposals
+from .tasks import process_document_ocr
+from .template_matcher import PatternAutomaton, get_template_matcher
+from .utils import apply_template_match, extract_field_from_document, process_document_with_ocr
+from .word_index import WordIndex
+
+
+class DocumentProcessingQueueTest(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.document = Document.objects.create(
+            title='Lieferschein', file=SimpleUploadedFile('lieferschein.pdf', b'kein PDF')
+        )
+
+    def test_upload_is_queued_and_claimed_once(self):
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.processing_status, 'pending')
+        # An open job is reused instead of queueing the document twice
+        self.assertEqual(enqueue_document(self.document), DocumentProcessingJob.objects.get())
+
+        job = claim_next_job('worker-1')
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('running', 1, 'worker-1'))
+        self.assertIsNone(claim_next_job('worker-2'))
+
+    @override_settings(DOCUMENT_PROCESSING_MAX_ATTEMPTS=2, DOCUMENT_PROCESSING_RETRY_DELAY=0)
+    def test_failed_processing_is_retried_and_timed(self):
+        call_command('run_ocr_workers', '--once', '--processes', '1', stdout=StringIO())
+
+        job = DocumentProcessingJob.objects.get()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.processing_status, 'error')
+
+        retry_log = self.document.processing_logs.get(level='warning', message__startswith='Processing attempt 1')
+        self.assertIn('total', retry_log.details['timings'])
+
+    @override_settings(DOCUMENT_PROCESSING_JOB_TIMEOUT=60)
+    def test_lock_of_a_long_running_job_is_renewed_per_page(self):
+        with fitz.open() as pdf:
+            for number in (1, 2):
+                pdf.new_page().insert_text((50, 60), f'Lieferschein LS-4711 Seite {number} vom 01.02.2026')
+            content = pdf.tobytes()
+        DocumentProcessingJob.objects.all().delete()
+        document = Document.objects.create(title='Mehrseitig', file=SimpleUploadedFile('mehrseitig.pdf', content))
+        job = claim_next_job('worker-1')
+        self.assertEqual(job.document, document)
+        # The job has been running for longer than the timeout
+        DocumentProcessingJob.objects.update(locked_at=timezone.now() - timedelta(minutes=5))
+
+        requeued = []
+        self.assertTrue(process_document_ocr(
+            document.pk, progress=lambda page_number: (touch_job(job), requeued.append(requeue_stale_jobs()))
+        ))
+        self.assertEqual(requeued, [0, 0])
+        self.assertEqual(DocumentProcessingJob.objects.get().locked_by, 'worker-1')
+
+
+class OcrCacheTest(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        with fitz.open() as pdf:
+            pdf.new_page().insert_text((50, 60), 'Lieferschein LS-4711 vom 01.02.2026, Kunde 10042')
+            self.content = pdf.tobytes()
+
+    def create_document(self, title):
+        return Document.objects.create(title=title, file=SimpleUploadedFile(f'{title}.pdf', self.content))
+
+    def test_identical_upload_reuses_cached_result(self):
+        first = self.create_document('per-mail')
+        self.assertTrue(process_document_with_ocr(first))
+        second = self.create_document('per-portal')
+        timings = {}
+        self.assertTrue(process_document_with_ocr(second, timings=timings))
+
+        self.assertEqual(second.ocr_text, first.ocr_text)
+        self.assertEqual(second.content_hash, first.content_hash)
+        self.assertNotIn('pages', timings)
+        self.assertEqual(OcrCacheEntry.objects.get().hits, 1)
+        self.assertEqual(list(second.get_possible_duplicates()), [first])
+        self.assertTrue(second.processing_logs.filter(message__startswith='OCR result reused').exists())
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for content_hash in ('a' * 64, 'b' * 64, 'c' * 64):
+            store_result(content_hash, 'x' * 100, {'pages': []})
+
+        self.assertEqual(evict(max_size=250), 1)
+        self.assertEqual(
+            sorted(OcrCacheEntry.objects.values_list('content_hash', flat=True)), ['b' * 64, 'c' * 64]
+        )
+
+
+class OcrStorageTest(TestCase):
+    def test_words_are_stored_outside_the_document_row(self):
+        words = [
+            {'text': 'Menge', 'conf': 96, 'left': 120, 'top': 300, 'width': 90, 'height': 20},
+            {'text': 'Größe', 'conf': 91.5, 'left': 640, 'top': 300, 'width': 85, 'height': 22},
+        ]
+        page = {'page': 1, 'width': 2480, 'height': 3508, 'words': [
+            {'text': word['text'], 'conf': word['conf'],
+             'x': word['left'] / 2480, 'y': word['top'] / 3508, 'w': word['width'] / 2480, 'h': word['height'] / 3508,
+             'page': 1, 'orig_x': word['left'], 'orig_y': word['top'], 'orig_w': word['width'],
+             'orig_h': word['height']}
+            for word in words
+        ]}
+        document = Document.objects.create(title='Lieferschein', file='lieferschein.pdf')
+        document.ocr_data = {'pages': [page, dict(page, page=2, words=[], source='text')]}
+        document.save(update_fields=['ocr_data'])
+
+        with self.assertNumQueries(1):
+            loaded = Document.objects.get(pk=document.pk)
+        self.assertEqual(loaded.ocr_data['pages'][0], page)
+        self.assertEqual(loaded.ocr_data['pages'][1]['source'], 'text')
+        self.assertEqual(load_ocr_page(loaded, 1), page)
+        self.assertEqual(loaded.ocr_pages.get(page_number=1).word_count, 2)
+
+    def test_backfill_copies_legacy_data_before_falling_back_to_ocr(self):
+        page = {'page': 1, 'width': 100, 'height': 200, 'words': [
+            {'text': 'LS-4711', 'conf': 95, 'x': 0.1, 'y': 0.1, 'w': 0.5, 'h': 0.05, 'page': 1,
+             'orig_x': 10, 'orig_y': 20, 'orig_w': 50, 'orig_h': 10},
+        ]}
+        store_result('a' * 64, 'LS-4711', {'pages': [page]})
+        # Processed before the page rows existed: only the legacy column holds the words
+        legacy = Document.objects.create(title='Auftrag', file='auftrag.pdf', legacy_ocr_data={'pages': [page]},
+                                         is_processed=True, processing_status='processed')
+        cached = Document.objects.create(title='Lieferschein', file='lieferschein.pdf', content_hash='a' * 64,
+                                         is_processed=True, processing_status='processed')
+        uncached = Document.objects.create(title='Rechnung', file='rechnung.pdf', content_hash='b' * 64,
+                                           is_processed=True, processing_status='processed')
+        DocumentProcessingJob.objects.all().delete()
+        Document.objects.update(processing_status='processed')
+
+        out = StringIO()
+        call_command('backfill_ocr_pages', '--dry-run', stdout=out)
+        self.assertIn('1 document(s) copied from the legacy OCR data, 1 restored from the OCR cache, 1 queued',
+                      out.getvalue())
+        self.assertFalse(DocumentOcrPage.objects.exists())
+
+        call_command('backfill_ocr_pages', stdout=StringIO())
+        legacy = Document.objects.get(pk=legacy.pk)
+        self.assertEqual(legacy.ocr_data, {'pages': [page]})
+        self.assertIsNone(legacy.legacy_ocr_data)
+        self.assertEqual(legacy.processing_status, 'processed')
+        self.assertEqual(Document.objects.get(pk=cached.pk).ocr_data, {'pages': [page]})
+        self.assertEqual(list(DocumentProcessingJob.objects.values_list('document', flat=True)), [uncached.pk])
+        uncached.refresh_from_db()
+        self.assertEqual(uncached.processing_status, 'pending')
+
+
+class PageImageTest(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        with fitz.open() as pdf:
+            pdf.new_page(width=144, height=72)
+            pdf.new_page(width=144, height=72)
+            content = pdf.tobytes()
+        self.document = Document.objects.create(title='Rechnung', file=SimpleUploadedFile('rechnung.pdf', content))
+        self.client.force_login(User.objects.create_user('editor'))
+
+    def test_page_info_links_to_cached_image(self):
+        response = self.client.get(reverse('get_document_image', args=[self.document.pk]), {'page': 2})
+        data = response.json()
+        self.assertEqual((data['page'], data['total_pages'], data['width'], data['height']), (2, 2, 400, 200))
+
+        image = self.client.get(data['image'])
+        self.assertEqual((image.status_code, image['Content-Type']), (200, 'image/jpeg'))
+        self.assertTrue(b''.join(image.streaming_content).startswith(b'\xff\xd8'))
+        self.document.refresh_from_db()
+        self.assertTrue(os.path.exists(get_image_path(self.document, 2)))
+
+        revalidated = self.client.get(data['image'], HTTP_IF_NONE_MATCH=image['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(self.client.get(data['thumbnail']).status_code, 200)
+        self.assertEqual(
+            self.client.get(reverse('document_page_image', args=[self.document.pk, 3])).status_code, 404
+        )
+
+
+class OcrPipelineTest(SimpleTestCase):
+    @override_settings(DOCUMENT_OCR_PROCESSES=4)
+    def test_pool_workers_recognize_pages_in_process(self):
+        self.addCleanup(limit_ocr_processes, None)
+        self.assertEqual(get_ocr_processes(), 4)
+        limit_ocr_processes(1)
+        self.assertEqual(get_ocr_processes(), 1)
+
+    def test_page_text_is_built_from_word_data(self):
+        data = {
+            'text': ['', 'Lieferschein', 'LS-1', '', 'Menge:', '5'],
+            'conf': [-1, 96, 91, -1, 90, 88],
+            'left': [0, 100, 400, 0, 100, 300],
+            'top': [0, 100, 100, 0, 300, 300],
+            'width': [0, 200, 80, 0, 100, 20],
+            'height': [0, 20, 20, 0, 20, 20],
+            'block_num': [1, 1, 1, 2, 2, 2],
+            'par_num': [1, 1, 1, 1, 1, 1],
+            'line_num': [1, 1, 1, 1, 1, 1],
+        }
+        page, text = build_page(2, data, 1000, 2000)
+
+        self.assertEqual(text, 'Lieferschein LS-1\n\nMenge: 5')
+        self.assertEqual(len(page['words']), 4)
+        self.assertEqual(page['words'][0], {
+            'text': 'Lieferschein', 'conf': 96, 'x': 0.1, 'y': 0.05, 'w': 0.2, 'h': 0.01, 'page': 2,
+            'orig_x': 100, 'orig_y': 100, 'orig_w': 200, 'orig_h': 20,
+        })
+
+    def test_pages_are_rasterized_one_at_a_time(self):
+        with fitz.open() as pdf:
+            pdf.new_page(width=200, height=100)
+            image = render_page(pdf, 1, 72)
+        self.assertEqual((image.mode, image.size), ('L', (200, 100)))
+
+    def test_text_layer_is_read_without_ocr(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'invoice.pdf')
+            with fitz.open() as pdf:
+                pdf.new_page(width=200, height=100).insert_text((10, 20), 'Rechnung Nr. RE-1\nMenge: 5 Stk')
+                pdf.new_page(width=200, height=100)
+                pdf.save(file_path)
+
+            with fitz.open(file_path) as pdf:
+                page = read_text_page(pdf, 1, 144)
+                self.assertIsNone(read_text_page(pdf, 2, 144))
+
+        self.assertEqual(page['text'], 'Rechnung Nr. RE-1\nMenge: 5 Stk')
+        self.assertEqual((page['result']['width'], page['result']['height']), (400, 200))
+        self.assertEqual(page['result']['source'], 'text')
+        first = page['result']['words'][0]
+        self.assertEqual((first['text'], first['conf'], first['orig_x']), ('Rechnung', 100, 20))
+        self.assertAlmostEqual(first['x'], 0.05)
+
+
+class FieldExtractionTest(SimpleTestCase):
+    def setUp(self):
+        words = [
+            {'text': 'LS-4711', 'x': 0.60, 'y': 0.10, 'w': 0.10, 'h': 0.02},
+            {'text': 'Nr.', 'x': 0.50, 'y': 0.10, 'w': 0.05, 'h': 0.02},
+            {'text': 'Datum', 'x': 0.60, 'y': 0.20, 'w': 0.08, 'h': 0.02},
+        ]
+        self.document = Document(ocr_data={'pages': [{'page': 1, 'words': words}]}, ocr_text='')
+
+    def test_box_query_returns_words_in_reading_order(self):
+        index = WordIndex(self.document.ocr_data, grid_size=4)
+        self.assertEqual(index.text_in_box(0.4, 0.0, 0.8, 0.15), 'Nr. LS-4711')
+        self.assertEqual(index.text_in_box(0.4, 0.0, 0.8, 0.3), 'Nr. LS-4711 Datum')
+        self.assertEqual(index.text_in_box(0.0, 0.5, 1.0, 1.0), '')
+
+    def test_changed_field_is_not_served_from_memo(self):
+        field = TemplateField(x1=0.55, y1=0.05, x2=0.8, y2=0.15, extraction_method='exact')
+        self.assertEqual(extract_field_from_document(self.document, field), 'LS-4711')
+        field.y2 = 0.3
+        self.assertEqual(extract_field_from_document(self.document, field), 'LS-4711 Datum')
+
+
+class TemplateMatcherTest(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(name='Schrauben GmbH')
+        self.document_type = DocumentType.objects.create(name='Lieferschein', code='delivery_note')
+        self.template = DocumentTemplate.objects.create(
+            name='Standard', supplier=self.supplier, document_type=self.document_type,
+            header_pattern='Schrauben GmbH\nLieferschein', footer_pattern='Seite 1 von'
+        )
+        self.document = Document(
+            supplier=self.supplier, document_type=self.document_type, ocr_data={'pages': []},
+            ocr_text='LIEFERSCHEIN Nr. 4711\nSeite 1 von 2'
+        )
+
+    def test_overlapping_patterns_are_all_found(self):
+        automaton = PatternAutomaton(['lieferschein', 'schein', 'schein nr', 'rechnung'])
+        self.assertEqual(automaton.find('lieferschein nr. 4711'), {0, 1, 2})
+
+    def test_matcher_scores_templates_and_follows_changes(self):
+        matcher = get_template_matcher(self.supplier.pk, self.document_type.pk)
+        self.assertEqual(matcher.score(self.document), [(self.template, 0.5)])
+        self.assertIs(get_template_matcher(self.supplier.pk, self.document_type.pk), matcher)
+
+        self.template.footer_pattern = 'Seite 9 von'
+        self.template.save()
+        matcher = get_template_matcher(self.supplier.pk, self.document_type.pk)
+        self.assertEqual(matcher.score(self.document)[0][1], 0.3)
+
+
+class ReprocessingTest(TestCase):
+    def setUp(self):
+        supplier = Supplier.objects.create(name='Schrauben GmbH')
+        document_type = DocumentType.objects.create(name='Lieferschein', code='delivery_note')
+        self.template = DocumentTemplate.objects.create(
+            name='Standard', supplier=supplier, document_type=document_type,
+            header_pattern='Schrauben GmbH', footer_pattern='Seite 1 von'
+        )
+        page = {'page': 1, 'width': 100, 'height': 100, 'words': []}
+        self.matching = Document.objects.create(
+            title='Lieferschein 4711', file='4711.pdf', supplier=supplier, document_type=document_type,
+            ocr_text='Schrauben GmbH\nLieferschein 4711\nSeite 1 von 1', ocr_data={'pages': [page]}
+        )
+        self.outdated = Document.objects.create(
+            title='Lieferschein 4712', file='4712.pdf', supplier=supplier, document_type=document_type,
+            ocr_text='Muttern AG\nLieferschein 4712', ocr_data={'pages': [page]},
+            matched_template=self.template, confidence_score=0.8
+        )
+
+    def test_templates_are_matched_again_and_the_run_is_recorded(self):
+        out = StringIO()
+        call_command('reprocess_documents', '--document-type', 'delivery_note', '--processes', '1', stdout=out)
+
+        self.matching.refresh_from_db()
+        self.outdated.refresh_from_db()
+        self.assertEqual(self.matching.matched_template, self.template)
+        self.assertEqual(self.matching.confidence_score, 0.5)
+        self.assertIsNone(self.outdated.matched_template)
+        self.assertEqual(self.matching.processing_logs.filter(message__startswith='Matched template').count(), 1)
+
+        run = DocumentReprocessingRun.objects.get()
+        self.assertEqual((run.documents, run.ocr_documents, run.matched, run.failed), (2, 0, 1, 0))
+        self.assertEqual(run.filters, {'document_type': 'delivery_note'})
+        self.assertIn('Match rate: 50.0% (1/2), before this run 50.0% (+0.0%)', out.getvalue())
+
+        call_command('reprocess_documents', '--document-type', 'delivery_note', '--processes', '1', stdout=out)
+        self.assertIn('Previous run with these filters', out.getvalue())
+
+
+class ReconciliationTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('einkauf')
+        self.supplier = Supplier.objects.create(name='Schrauben GmbH')
+        document_type = DocumentType.objects.create(name='Lieferschein', code='delivery_note')
+        self.template = DocumentTemplate.objects.create(name='Standard', supplier=self.supplier,
+                                                        document_type=document_type)
+        self.order = PurchaseOrder.objects.create(order_number='ORD-2024-017', supplier=self.supplier,
+                                                  created_by=user, status='sent')
+        self.other_order = PurchaseOrder.objects.create(order_number='ORD-2024-018', supplier=self.supplier,
+                                                        created_by=user, status='sent')
+        self.screws = PurchaseOrderItem.objects.create(
+            purchase_order=self.order, product=Product.objects.create(name='Schraube M8', sku='SCH-M8'),
+            quantity_ordered=100, unit_price=1
+        )
+        self.nuts = PurchaseOrderItem.objects.create(
+            purchase_order=self.order, product=Product.objects.create(name='Mutter M8', sku='MUT-M8'),
+            quantity_ordered=50, quantity_received=20, unit_price=1
+        )
+
+    def match(self, extracted_data):
+        document = Document.objects.create(title='Lieferschein', file='lieferschein.pdf', supplier=self.supplier)
+        return document, {'template': self.template, 'score': 1.0, 'extracted_data': extracted_data,
+                          'order': None, 'events': []}
+
+    def test_order_numbers_are_resolved_per_batch(self):
+        matches = [
+            self.match({'order_number': 'Bestell-Nr. ORD-2024-017', 'item_number': 'SCH M8', 'quantity': '100',
+                        'quantity_2': '30,00'}),
+            self.match({'order_number': '0RD 2O24-0l8'}),
+            self.match({'order_number': '2024-018'}),
+            self.match({'order_number': 'ORD-2024-019'}),
+        ]
+        with self.assertNumQueries(4):
+            reconcile_documents(matches)
+
+        self.assertEqual([result['proposed_order'] for _, result in matches],
+                         [self.order, self.other_order, self.other_order, None])
+        self.assertEqual([result['order'] for _, result in matches], [self.order, self.other_order, None, None])
+        self.assertEqual([(result['reconciliation'] or {}).get('method') for _, result in matches],
+                         ['exact', 'normalized', 'suffix', None])
+        self.assertEqual(matches[3][1]['events'][0][1], 'Multiple purchase orders found for number: ORD-2024-019')
+
+        lines = matches[0][1]['reconciliation']['receipt_lines']
+        self.assertEqual([(line['item'], line['match'], line['quantity'], line['status']) for line in lines],
+                         [(self.screws.pk, 'sku', '100', 'ok'), (self.nuts.pk, 'quantity', '30.00', 'ok')])
+
+        save_receipt_proposals(matches)
+        proposal = DocumentMatch.objects.get(document=matches[0][0])
+        self.assertEqual((proposal.purchase_order, proposal.status), (self.order, 'matched'))
+        self.assertEqual(DocumentMatch.objects.get(document=matches[2][0]).status, 'manual_review')
+
+    def test_one_digit_off_order_number_is_not_linked(self):
+        self.other_order.order_number = 'ORD-2024-100'
+        self.other_order.save()
+        document, result = self.match({'order_number': 'ORD-2024-018'})
+        reconcile_documents([(document, result)])
+        apply_template_match(document, result)
+        save_receipt_proposals([(document, result)])
+
+        self.assertEqual(result['reconciliation']['method'], 'fuzzy')
+        self.assertIsNone(document.matched_order)
+        self.assertNotEqual(document.processing_status, 'matched')
+        proposal = DocumentMatch.objects.get(document=document)
+        self.assertEqual((proposal.purchase_order, proposal.status), (self.order, 'manual_review'))
@@ -29,6 +29,9 @@ urlpatterns = [
 
     # AJAX endpoints
     path('ajax/get-document-image/<int:pk>/', views.get_document_image, name='get_document_image'),
+    path('<int:pk>/pages/<int:page>.jpg', views.document_page_image, name='document_page_image'),
+    path('<int:pk>/pages/<int:page>/thumbnail.jpg', views.document_page_image, {'thumbnail': True},
+         name='document_page_thumbnail'),
     path('ajax/get-document-ocr-data/<int:pk>/', views.get_document_ocr_data, name='get_document_ocr_data'),
     path('ajax/save-field-coordinates/', views.save_field_coordinates, name='save_field_coordinates'),
     path('ajax/extract-field-value/', views.extract_field_value, name='extract_field_value'),
@@ -3,20 +3,20 @@ import re
 import json
 import logging
 import tempfile
-import pytesseract
-from PIL import Image
-from pdf2image import convert_from_path
-from django.conf import settings
+import time
+from contextlib import contextmanager
+
 from django.utils import timezone
 from django.core.files.storage import default_storage
-from .models import DocumentProcessingLog, Document, DocumentTemplate, TemplateField
+from .models import DocumentProcessingLog, Document, TemplateField
+from .ocr import get_page_count, iter_ocr_pages
+from .ocr_cache import compute_content_hash, get_cached_result, store_result
+from .reconciliation import reconcile_documents, save_receipt_proposals
+from .template_matcher import TemplateMatcher, compile_field_pattern, get_template_matcher
+from .word_index import get_word_index
 
 logger = logging.getLogger(__name__)
 
-# Configure Tesseract path if needed
-if hasattr(settings, 'TESSERACT_CMD'):
-    pytesseract.pytesseract.tesseract_cmd = settings.TESSERACT_CMD
-
 
 def log_processing_event(document, level, message, details=None):
     """
@@ -50,29 +50,37 @@ def log_processing_event(document, level, message, details=None):
         logger.error(f"Failed to log document processing event: {e}")
 
 
-def convert_pdf_to_images(file_path):
+@contextmanager
+def timed_stage(timings, stage):
     """
-    Convert a PDF file to a list of PIL Image objects.
+    Measure the duration of a processing stage.
 
     Args:
-        file_path: Path to the PDF file
-
-    Returns:
-        List of PIL Image objects, one per page
+        timings: Dictionary receiving the duration in seconds per stage, or None
+        stage: Name of the stage
     """
+    start = time.perf_counter()
     try:
-        return convert_from_path(file_path, dpi=300)
-    except Exception as e:
-        logger.error(f"Failed to convert PDF to images: {e}")
-        raise
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0) + time.perf_counter() - start, 4)
 
 
-def process_document_with_ocr(document):
+def process_document_with_ocr(document, timings=None, progress=None):
     """
     Process a document with OCR and store the results.
 
+    Results of identical files are taken from the OCR cache. Otherwise pages
+    with a usable text layer are read directly and the remaining pages are
+    recognized in parallel by the pipeline in documents/ocr.py.
+
     Args:
         document: Document instance to process
+        timings: Optional dictionary receiving the duration of each stage
+            (hash, cache, text_layer, rasterize and ocr summed over all pages,
+            pages, save, template_matching) in seconds
+        progress: Optional callable, called with the page number after each page
 
     Returns:
         bool: True if processing was successful, False otherwise
@@ -92,89 +100,51 @@ def process_document_with_ocr(document):
             document.save(update_fields=['processing_status'])
             return False
 
-        # Convert PDF to images
-        log_processing_event(document, 'info', "Converting PDF to images")
-        images = convert_pdf_to_images(file_path)
+        with timed_stage(timings, 'hash'):
+            if not document.content_hash:
+                document.content_hash = compute_content_hash(document.file)
+                document.save(update_fields=['content_hash'])
+
+        with timed_stage(timings, 'cache'):
+            cached = get_cached_result(document.content_hash)
+        if cached is not None:
+            return apply_cached_ocr_result(document, cached, timings)
 
-        # Process each page with Tesseract
-        log_processing_event(document, 'info', f"Processing {len(images)} pages with OCR")
+        page_count = get_page_count(file_path)
+        log_processing_event(document, 'info', f"Processing {page_count} pages")
         ocr_results = []
         ocr_text = ""
-
-        for i, img in enumerate(images):
-            try:
-                # Get OCR data with word bounding boxes
-                page_data = pytesseract.image_to_data(
-                    img,
-                    output_type=pytesseract.Output.DICT,
-                    config='--psm 1'
-                )
-
-                # Validate page_data before processing
-                if not isinstance(page_data, dict):
+        text_layer_pages = 0
+        failed_pages = 0
+
+        with timed_stage(timings, 'pages'):
+            for page in iter_ocr_pages(file_path):
+                page_number = page['page']
+                if progress is not None:
+                    progress(page_number)
+                if 'error' in page:
                     log_processing_event(
-                        document, 'warning',
-                        f"Unexpected page data type for page {i+1}: {type(page_data)}",
-                        {'page_data': page_data}
+                        document, 'error',
+                        f"Error processing page {page_number}: {page['error']}",
+                        {'page_number': page_number, 'exception': page['error']}
                     )
+                    failed_pages += 1
                     continue
 
-                # Safety checks for expected dictionary keys
-                expected_keys = ['text', 'conf', 'left', 'top', 'width', 'height']
-                if not all(key in page_data for key in expected_keys):
-                    log_processing_event(
-                        document, 'warning',
-                        f"Missing keys in page data for page {i+1}",
-                        {'page_data_keys': list(page_data.keys())}
-                    )
-                    continue
-
-                # Extract full text for this page
-                page_text = pytesseract.image_to_string(img)
-                ocr_text += f"\n--- Page {i + 1} ---\n" + page_text
-
-                # Calculate relative coordinates (0-1) instead of pixel coordinates
-                width, height = img.size
-
-                # Store the word bounding boxes with normalized coordinates
-                words_with_coords = []
-                for j in range(len(page_data['text'])):
-                    if page_data['text'][j].strip():  # Only include non-empty text
-                        words_with_coords.append({
-                            'text': page_data['text'][j],
-                            'conf': page_data['conf'][j],
-                            'x': page_data['left'][j] / width,
-                            'y': page_data['top'][j] / height,
-                            'w': page_data['width'][j] / width,
-                            'h': page_data['height'][j] / height,
-                            'page': i + 1,
-                            # Include original pixel coordinates for reference
-                            'orig_x': page_data['left'][j],
-                            'orig_y': page_data['top'][j],
-                            'orig_w': page_data['width'][j],
-                            'orig_h': page_data['height'][j],
-                        })
-
-                ocr_results.append({
-                    'page': i + 1,
-                    'width': width,
-                    'height': height,
-                    'words': words_with_coords
-                })
-
-            except Exception as page_err:
-                log_processing_event(
-                    document, 'error',
-                    f"Error processing page {i+1}: {str(page_err)}",
-                    {'page_number': i+1, 'exception': str(page_err)}
-                )
+                ocr_text += f"\n--- Page {page_number} ---\n" + page['text']
+                ocr_results.append(page['result'])
+                text_layer_pages += page['result'].get('source') == 'text'
+                if timings is not None:
+                    for stage, duration in page['timings'].items():
+                        timings[stage] = round(timings.get(stage, 0) + duration, 4)
 
         # Update document with OCR results
-        document.ocr_text = ocr_text
-        document.ocr_data = {'pages': ocr_results}
-        document.processing_status = 'processed' if ocr_results else 'error'
-        document.is_processed = bool(ocr_results)
-        document.save(update_fields=['ocr_text', 'ocr_data', 'processing_status', 'is_processed'])
+        with timed_stage(timings, 'save'):
+            document.ocr_text = ocr_text
+            document.ocr_data = {'pages': ocr_results}
+            document.processing_status = 'processed' if ocr_results else 'error'
+            document.is_processed = bool(ocr_results)
+            document.save(update_fields=['ocr_text', 'ocr_data', 'processing_status', 'is_processed'])
 
         if not ocr_results:
             log_processing_event(
@@ -186,11 +156,20 @@ def process_document_with_ocr(document):
         log_processing_event(
             document, 'info',
             f"OCR processing completed, {len(ocr_results)} pages processed",
-            {'total_words': sum(len(page['words']) for page in ocr_results)}
+            {
+                'total_words': sum(len(page['words']) for page in ocr_results),
+                'text_layer_pages': text_layer_pages,
+                'ocr_pages': len(ocr_results) - text_layer_pages,
+            }
         )
 
+        # Incomplete results are not cached, so the next copy gets a new attempt
+        if not failed_pages:
+            store_result(document.content_hash, document.ocr_text, document.ocr_data)
+
         # Try to identify document template
-        identify_document_template(document)
+        with timed_stage(timings, 'template_matching'):
+            identify_document_template(document)
 
         return True
     except Exception as e:
@@ -204,98 +183,53 @@ def process_document_with_ocr(document):
         return False
 
 
-def identify_document_template(document):
+def apply_cached_ocr_result(document, entry, timings=None):
     """
-    Try to identify the document template based on OCR content.
+    Copy a cached OCR result to a document instead of processing the file again.
 
-    Args:
-        document: Document instance with OCR data
+    Returns:
+        bool: True (the cache only holds complete results)
     """
-    try:
-        if not document.supplier:
-            log_processing_event(document, 'warning', "Cannot identify template: no supplier assigned")
-            return
-
-        if not document.ocr_text:
-            log_processing_event(document, 'warning', "Cannot identify template: no OCR text available")
-            return
-
-        # Get all templates for this supplier
-        templates = DocumentTemplate.objects.filter(
-            supplier=document.supplier,
-            document_type=document.document_type,
-            is_active=True
-        )
-
-        if not templates.exists():
-            log_processing_event(
-                document, 'info',
-                f"No templates found for supplier {document.supplier.name} and document type {document.document_type.name}"
-            )
-            return
-
-        # Calculate match scores for each template
-        template_scores = []
-        for template in templates:
-            score = calculate_template_match_score(document, template)
-            template_scores.append((template, score))
+    with timed_stage(timings, 'save'):
+        document.ocr_text = entry.ocr_text
+        document.ocr_data = entry.ocr_data
+        document.processing_status = 'processed'
+        document.is_processed = True
+        document.save(update_fields=['ocr_text', 'ocr_data', 'processing_status', 'is_processed'])
 
-        # Sort by score descending
-        template_scores.sort(key=lambda x: x[1], reverse=True)
+    duplicates = list(document.get_possible_duplicates().values_list('pk', flat=True)[:10])
+    log_processing_event(
+        document, 'info',
+        f"OCR result reused from cache, {len(entry.ocr_data.get('pages', []))} pages",
+        {'content_hash': document.content_hash, 'cache_hits': entry.hits + 1, 'duplicates': duplicates}
+    )
 
-        best_template, best_score = template_scores[0]
+    with timed_stage(timings, 'template_matching'):
+        identify_document_template(document)
+    return True
 
-        # If score is above threshold, consider it a match
-        if best_score >= 0.5:  # 70% confidence threshold
-            document.matched_template = best_template
-            document.confidence_score = best_score
 
-            # Extract field data based on template
-            extracted_data = extract_fields_from_document(document, best_template)
-            document.extracted_data = extracted_data
+TEMPLATE_MATCH_FIELDS = ['matched_template', 'confidence_score', 'extracted_data', 'matched_order', 'processing_status']
 
-            log_processing_event(
-                document, 'info',
-                f"Matched template: {best_template.name} with score {best_score * 100:.0f}%",
-                {'extracted_fields': list(extracted_data.keys())}
-            )
+# Minimum score for a template match
+MATCH_THRESHOLD = 0.5
 
-            # Look for order number in extracted data and try to match it to an order
-            if extracted_data.get('order_number'):
-                from order.models import PurchaseOrder
-                order_number = extracted_data.get('order_number')
-                try:
-                    order = PurchaseOrder.objects.get(
-                        supplier=document.supplier,
-                        order_number=order_number
-                    )
-                    document.matched_order = order
-                    document.processing_status = 'matched'
-                    log_processing_event(
-                        document, 'info',
-                        f"Matched to purchase order: {order.order_number}"
-                    )
-                except PurchaseOrder.DoesNotExist:
-                    log_processing_event(
-                        document, 'warning',
-                        f"No matching purchase order found for number: {order_number}"
-                    )
-                except PurchaseOrder.MultipleObjectsReturned:
-                    log_processing_event(
-                        document, 'warning',
-                        f"Multiple purchase orders found for number: {order_number}"
-                    )
 
-            document.save(update_fields=[
-                'matched_template', 'confidence_score', 'extracted_data',
-                'matched_order', 'processing_status'
-            ])
-        else:
-            log_processing_event(
-                document, 'info',
-                f"No confident template match found. Best match: {best_template.name} with score {best_score:.2f}"
-            )
+def identify_document_template(document):
+    """
+    Try to identify the document template based on OCR content.
 
+    Args:
+        document: Document instance with OCR data
+    """
+    try:
+        result = evaluate_document_template(document)
+        reconcile_documents([(document, result)])
+        if apply_template_match(document, result):
+            document.save(update_fields=TEMPLATE_MATCH_FIELDS)
+        save_receipt_proposals([(document, result)])
+        for level, message, details in result['events']:
+            log_processing_event(document, level, message, details)
     except Exception as e:
         log_processing_event(
             document, 'error',
@@ -304,49 +238,107 @@ def identify_document_template(document):
         )
 
 
-def calculate_template_match_score(document, template):
+def evaluate_document_template(document):
     """
-    Calculate a match score between a document and a template.
+    Find the best template and extract its fields, without saving anything.
+
+    The purchase order is resolved afterwards by reconciliation.reconcile_documents().
 
     Args:
         document: Document instance with OCR data
-        template: DocumentTemplate instance to match against
 
     Returns:
-        float: Match score between 0 and 1
+        dict: template and score of the best match (None if there is no confident match),
+            extracted_data, order (always None here) and the processing events as
+            (level, message, details) tuples
     """
-    score = 0.0
+    result = {'template': None, 'score': 0.0, 'extracted_data': None, 'order': None, 'events': []}
+    events = result['events']
+
+    if not document.supplier:
+        events.append(('warning', "Cannot identify template: no supplier assigned", None))
+        return result
+
+    if not document.ocr_text:
+        events.append(('warning', "Cannot identify template: no OCR text available", None))
+        return result
+
+    # Compiled matcher for all active templates of this supplier and document type
+    matcher = get_template_matcher(document.supplier_id, document.document_type_id)
+
+    if not matcher.templates:
+        events.append((
+            'info',
+            f"No templates found for supplier {document.supplier.name} and document type {document.document_type.name}",
+            None
+        ))
+        return result
+
+    # Calculate match scores for all templates in one pass, best first
+    best_template, best_score = matcher.score(document)[0]
+
+    # If score is above threshold, consider it a match
+    if best_score < MATCH_THRESHOLD:
+        events.append((
+            'info',
+            f"No confident template match found. Best match: {best_template.name} with score {best_score:.2f}",
+            None
+        ))
+        return result
+
+    # Extract field data based on template
+    extracted_data = extract_fields_from_document(document, best_template)
+    result.update(template=best_template, score=best_score, extracted_data=extracted_data)
+    events.append((
+        'info',
+        f"Matched template: {best_template.name} with score {best_score * 100:.0f}%",
+        {'extracted_fields': list(extracted_data.keys())}
+    ))
+
+    return result
 
-    # Check for header pattern match
-    if template.header_pattern and document.ocr_text:
-        header_patterns = template.header_pattern.strip().split('\n')
-        for pattern in header_patterns:
-            if pattern.strip() and re.search(re.escape(pattern.strip()), document.ocr_text, re.IGNORECASE):
-                score += 0.3  # Header match provides 30% confidence
-                break
 
-    # Check for footer pattern match
-    if template.footer_pattern and document.ocr_text:
-        footer_patterns = template.footer_pattern.strip().split('\n')
-        for pattern in footer_patterns:
-            if pattern.strip() and re.search(re.escape(pattern.strip()), document.ocr_text, re.IGNORECASE):
-                score += 0.2  # Footer match provides 20% confidence
-                break
+def apply_template_match(document, result, reset_unmatched=False):
+    """
+    Set the result of evaluate_document_template() on the document (without saving).
 
-    # Check for key fields
-    key_fields = template.fields.filter(is_key_field=True)
-    if key_fields.exists():
-        field_score = 0.0
-        max_field_score = key_fields.count() * 0.5  # Key fields provide 50% confidence total
+    Args:
+        reset_unmatched: Clear an earlier template match if no template matches any more
+
+    Returns:
+        bool: True if TEMPLATE_MATCH_FIELDS have to be saved
+    """
+    if result['template'] is None:
+        if not reset_unmatched or document.matched_template_id is None:
+            return False
+        document.matched_template = None
+        document.confidence_score = 0.0
+        document.extracted_data = None
+        return True
 
-        for field in key_fields:
-            field_data = extract_field_from_document(document, field)
-            if field_data:
-                field_score += 0.5 / key_fields.count()
+    document.matched_template = result['template']
+    document.confidence_score = result['score']
+    document.extracted_data = result['extracted_data']
+    if result['order'] is not None:
+        document.matched_order = result['order']
+        document.processing_status = 'matched'
+    return True
 
-        score += field_score
 
-    return min(score, 1.0)  # Cap score at 1.0
+def calculate_template_match_score(document, template):
+    """
+    Calculate a match score between a document and a template.
+
+    Header lines count 30%, footer lines 20% and extracted key fields up to 50%.
+
+    Args:
+        document: Document instance with OCR data
+        template: DocumentTemplate instance to match against
+
+    Returns:
+        float: Match score between 0 and 1
+    """
+    return TemplateMatcher([template]).score(document)[0][1]
 
 
 def extract_fields_from_document(document, template):
@@ -377,6 +369,9 @@ def extract_field_from_document(document, field):
     """
     Extract a single field from a document based on field definition.
 
+    Results are memoized per field definition for the current OCR data, so
+    scoring several templates and extracting the best one extracts each field once.
+
     Args:
         document: Document instance with OCR data
         field: TemplateField instance defining the field
@@ -387,6 +382,14 @@ def extract_field_from_document(document, field):
     if not document.ocr_data or 'pages' not in document.ocr_data:
         return None
 
+    cache = get_extraction_cache(document)
+    key = field_signature(field)
+    if key not in cache:
+        cache[key] = _extract_field(document, field)
+    return cache[key]
+
+
+def _extract_field(document, field):
     # Determine extraction method
     if field.extraction_method == 'exact':
         return extract_field_by_position(document, field)
@@ -402,6 +405,40 @@ def extract_field_from_document(document, field):
         return None
 
 
+def field_signature(field):
+    """
+    Everything that determines the extraction result of a field.
+
+    Referenced fields are included recursively, so edited fields never hit a stale result.
+    """
+    return (
+        field.extraction_method, field.field_type, field.x1, field.y1, field.x2, field.y2,
+        field.search_pattern, field.format_pattern, field.x_offset, field.y_offset,
+        field.table_row_index, field.table_column_index,
+        field_signature(field.reference_field) if field.reference_field_id else None,
+        field_signature(field.table_parent) if field.table_parent_id else None,
+    )
+
+
+def get_ocr_lines(document):
+    """Lines of the OCR text, split once per text."""
+    cached = getattr(document, '_ocr_lines', None)
+    if cached is None or cached[0] is not document.ocr_text:
+        cached = (document.ocr_text, document.ocr_text.split('\n'))
+        document._ocr_lines = cached
+    return cached[1]
+
+
+def get_extraction_cache(document):
+    """Memo of extracted field values, kept on the instance for the current OCR data and text."""
+    source = (document.ocr_data, document.ocr_text)
+    cached = getattr(document, '_extraction_cache', None)
+    if cached is None or cached[0][0] is not source[0] or cached[0][1] is not source[1]:
+        cached = (source, {})
+        document._extraction_cache = cached
+    return cached[1]
+
+
 def extract_field_by_position(document, field):
     """
     Extract field value based on exact position coordinates.
@@ -413,39 +450,8 @@ def extract_field_by_position(document, field):
     Returns:
         str: Extracted text from the field area
     """
-    pages = document.ocr_data.get('pages', [])
-    extracted_text = []
-
-    for page in pages:
-        page_number = page.get('page', 1)
-        words = page.get('words', [])
-
-        # Filter words that fall within the field's bounding box
-        field_words = []
-        for word in words:
-            word_x = word.get('x', 0)
-            word_y = word.get('y', 0)
-            word_w = word.get('w', 0)
-            word_h = word.get('h', 0)
-
-            # Check if word center is within field bounding box
-            word_center_x = word_x + word_w / 2
-            word_center_y = word_y + word_h / 2
-
-            if (field.x1 <= word_center_x <= field.x2 and
-                    field.y1 <= word_center_y <= field.y2):
-                field_words.append((word, word_center_y))  # Store word and y-position for sorting
-
-        # Sort words by y-position and then by x-position for reading order
-        field_words.sort(key=lambda w: (w[1], w[0].get('x', 0)))
-
-        # Extract text from sorted words
-        if field_words:
-            text = ' '.join(word[0].get('text', '') for word in field_words)
-            extracted_text.append(text)
-
-    # Join text from all pages
-    result = ' '.join(extracted_text).strip()
+    # Words whose center lies within the field's bounding box, in reading order per page
+    result = get_word_index(document).text_in_box(field.x1, field.y1, field.x2, field.y2)
 
     # Apply formatting if needed
     if field.format_pattern and result:
@@ -525,13 +531,12 @@ def extract_field_by_label(document, field):
 
     # Behandle das Suchmuster als einen einzelnen regulären Ausdruck
     pattern = field.search_pattern.strip()
+    lines = get_ocr_lines(document)
 
-    try:
-        # Kompiliere den regulären Ausdruck mit IGNORECASE-Flag
-        regex = re.compile(pattern, re.IGNORECASE)
-
+    # Vorkompilierter regulärer Ausdruck mit IGNORECASE-Flag (None bei ungültigem Muster)
+    regex = compile_field_pattern(pattern)
+    if regex is not None:
         # Suche in jeder Zeile des OCR-Textes
-        lines = document.ocr_text.split('\n')
         for i, line in enumerate(lines):
             match = regex.search(line)
             if match:
@@ -551,10 +556,9 @@ def extract_field_by_label(document, field):
                     next_line = lines[i + 1].strip()
                     if next_line and not regex.search(next_line):
                         return next_line
-
-    except re.error as e:
+    else:
         # Bei einem Regex-Fehler loggen und auf fallback-Methode zurückgreifen
-        logger.warning(f"Invalid regex pattern for field {field.name}: {pattern} - {str(e)}")
+        logger.warning(f"Invalid regex pattern for field {field.name}: {pattern}")
 
         # Fallback: Behandle als Liste von Teilstrings
         patterns = [p.strip() for p in pattern.split('|')]
@@ -629,24 +633,24 @@ def extract_field_by_regex(document, field):
     if not field.search_pattern:
         return None
 
-    try:
-        pattern = re.compile(field.search_pattern, re.IGNORECASE)
-        match = pattern.search(document.ocr_text)
-
-        if match:
-            value = match.group(1) if match.groups() else match.group(0)
-
-            # Apply formatting if needed
-            if field.format_pattern and value:
-                value = format_field_value(value, field)
-
-            return value
-    except re.error:
+    pattern = compile_field_pattern(field.search_pattern)
+    if pattern is None:
         # Log error if regex is invalid
         log_processing_event(
             document, 'error',
             f"Invalid regex pattern for field {field.name}: {field.search_pattern}"
         )
+        return None
+
+    match = pattern.search(document.ocr_text)
+    if match:
+        value = match.group(1) if match.groups() else match.group(0)
+
+        # Apply formatting if needed
+        if field.format_pattern and value:
+            value = format_field_value(value, field)
+
+        return value
 
     return None
 
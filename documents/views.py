@@ -1,12 +1,8 @@
 import os
 import json
-import base64
-from io import BytesIO
-from PIL import Image
-from pdf2image import convert_from_path
 
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, FileResponse, Http404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
@@ -15,14 +11,20 @@ from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.core.exceptions import PermissionDenied
 from django.db.models import Q
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 
 from core.utils.pagination import paginate_queryset
 from suppliers.models import Supplier
 from .models import Document, DocumentTemplate, TemplateField, DocumentType, DocumentMatch, StandardField
 from .forms import DocumentUploadForm, DocumentTemplateForm, TemplateFieldForm, DocumentMatchForm
-from .utils import process_document_with_ocr, extract_field_from_document, log_processing_event, \
+from .utils import extract_field_from_document, log_processing_event, \
     extract_fields_from_document
-from .tasks import process_document_ocr
+from .processing_queue import enqueue_document
+from .ocr_cache import compute_content_hash
+from .page_images import get_image_version, get_page_image, get_page_info
+from .ocr_storage import load_ocr_page
 
 
 @login_required
@@ -34,8 +36,8 @@ def document_list(request):
     status = request.GET.get('status', '')
     search_query = request.GET.get('search', '')
 
-    # Base queryset
-    queryset = Document.objects.all()
+    # Base queryset (the OCR text is only searched, never displayed in the list)
+    queryset = Document.objects.defer('ocr_text')
 
     # Apply filters
     if document_type_id and document_type_id.isdigit():
@@ -83,9 +85,18 @@ def document_upload(request):
         if form.is_valid():
             document = form.save(commit=False)
             document.uploaded_by = request.user
+            document.content_hash = compute_content_hash(document.file)
             document.save()
 
-            messages.success(request, _('Document uploaded successfully.'))
+            messages.success(request, _('Document uploaded successfully. It has been queued for processing.'))
+            duplicates = list(document.get_possible_duplicates()[:3])
+            if duplicates:
+                messages.warning(
+                    request,
+                    _('This file has already been uploaded as: %(titles)s') % {
+                        'titles': ', '.join(duplicate.title for duplicate in duplicates)
+                    }
+                )
             return redirect('document_detail', pk=document.pk)
     else:
         form = DocumentUploadForm()
@@ -126,6 +137,10 @@ def document_detail(request, pk):
         'processing_logs': processing_logs,
         'matching_templates': matching_templates,
         'match_form': match_form,
+        'possible_duplicates': document.get_possible_duplicates().select_related('supplier'),
+        'receipt_proposal': document.match_attempts.filter(
+            matched_by__isnull=True
+        ).select_related('purchase_order').first(),
     }
 
     return render(request, 'documents/document_detail.html', context)
@@ -153,19 +168,9 @@ def document_process(request, pk):
     """View for manually triggering document processing."""
     document = get_object_or_404(Document, pk=pk)
 
-    # Process the document with OCR
-    document.processing_status = 'processing'
-    document.save(update_fields=['processing_status'])
-
-    # In a real application, this would be a Celery task
-    # process_document_ocr.delay(document.id)
-    # For demonstration, we'll process it synchronously
-    success = process_document_with_ocr(document)
-
-    if success:
-        messages.success(request, _('Document processed successfully.'))
-    else:
-        messages.error(request, _('Failed to process document.'))
+    # Processing runs in the run_ocr_workers command
+    enqueue_document(document)
+    messages.success(request, _('Document has been queued for processing.'))
 
     return redirect('document_detail', pk=document.pk)
 
@@ -476,7 +481,7 @@ def field_mapping_editor(request, template_id):
 
 @login_required
 def get_document_image(request, pk):
-    """AJAX view for getting a document page image."""
+    """AJAX view for getting the image URLs and size of a document page."""
     document = get_object_or_404(Document, pk=pk)
     page = request.GET.get('page', 1)
     try:
@@ -485,32 +490,47 @@ def get_document_image(request, pk):
         page = 1
 
     try:
-        # Convert PDF to image
-        images = convert_from_path(document.file.path, dpi=200)
+        # Page count and size come from the PDF itself; the image is rendered on first request
+        info = get_page_info(document)
 
-        if page <= 0 or page > len(images):
+        if page <= 0 or page > info['page_count']:
             page = 1
 
-        # Get the requested page
-        img = images[page - 1]
-
-        # Convert image to base64
-        buffer = BytesIO()
-        img.save(buffer, format='JPEG')
-        image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-
-        # Return as JSON
+        width, height = info['sizes'][page - 1]
         return JsonResponse({
-            'image': f'data:image/jpeg;base64,{image_base64}',
+            'image': reverse('document_page_image', args=[document.pk, page]),
+            'thumbnail': reverse('document_page_thumbnail', args=[document.pk, page]),
             'page': page,
-            'total_pages': len(images),
-            'width': img.width,
-            'height': img.height,
+            'total_pages': info['page_count'],
+            'width': width,
+            'height': height,
         })
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@login_required
+def document_page_image(request, pk, page, thumbnail=False):
+    """Serve a rendered page image (or thumbnail) from the page image cache."""
+    document = get_object_or_404(Document, pk=pk)
+    etag = quote_etag(f'{get_image_version(document, thumbnail)}-{page}')
+
+    # Answer revalidations without rendering
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        try:
+            path = get_page_image(document, page, thumbnail)
+        except (IndexError, FileNotFoundError):
+            raise Http404(_('Page not found'))
+        response = get_conditional_response(request, etag=etag, last_modified=int(os.path.getmtime(path)))
+        if response is None:
+            response = FileResponse(open(path, 'rb'), content_type='image/jpeg')
+            response['Last-Modified'] = http_date(os.path.getmtime(path))
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=24 * 60 * 60)
+    return response
+
+
 @login_required
 def get_document_ocr_data(request, pk):
     """AJAX view for getting document OCR data."""
@@ -521,16 +541,16 @@ def get_document_ocr_data(request, pk):
     except ValueError:
         page = 1
 
-    if not document.ocr_data or 'pages' not in document.ocr_data:
+    # Only the requested page is loaded from the OCR storage
+    page_count = document.ocr_pages.count()
+    if not page_count:
         return JsonResponse({'error': 'No OCR data available'}, status=404)
 
-    pages = document.ocr_data.get('pages', [])
-
-    if page <= 0 or page > len(pages):
+    if page <= 0 or page > page_count:
         page = 1
 
     # Get data for the requested page
-    page_data = next((p for p in pages if p.get('page') == page), None)
+    page_data = load_ocr_page(document, page)
 
     if not page_data:
         return JsonResponse({'error': 'Page not found in OCR data'}, status=404)
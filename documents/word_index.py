@@ -0,0 +1,88 @@
+"""
+Spatial index over the words of a document's OCR data.
+
+Field extraction asks for the words whose center lies inside a bounding box.
+Instead of scanning every word of every page for each field (and again for
+every key field of every candidate template), the word centers are bucketed
+once into a uniform grid per page, so a query only looks at the cells the box
+overlaps. The index is built lazily and kept on the Document instance for the
+rest of the processing run.
+"""
+import math
+
+# Grid cells per axis; coordinates are normalized to 0-1
+DEFAULT_GRID_SIZE = 32
+
+
+class PageGrid:
+    """Word centers of one page, bucketed into grid cells."""
+
+    def __init__(self, words, grid_size=DEFAULT_GRID_SIZE):
+        self.grid_size = grid_size
+        self.cells = {}
+        for position, word in enumerate(words):
+            x = word.get('x', 0)
+            y = word.get('y', 0)
+            center_x = x + word.get('w', 0) / 2
+            center_y = y + word.get('h', 0) / 2
+            cell = (self._cell(center_x), self._cell(center_y))
+            self.cells.setdefault(cell, []).append((center_y, x, position, center_x, word.get('text', '')))
+
+    def _cell(self, value):
+        return min(max(math.floor(value * self.grid_size), 0), self.grid_size - 1)
+
+    def query(self, x1, y1, x2, y2):
+        """
+        Words whose center lies inside the box (bounds inclusive), in reading order.
+
+        Returns:
+            list: Word texts sorted by center y, then x
+        """
+        if x1 > x2 or y1 > y2:
+            return []
+
+        hits = []
+        for column in range(self._cell(x1), self._cell(x2) + 1):
+            for row in range(self._cell(y1), self._cell(y2) + 1):
+                for entry in self.cells.get((column, row), ()):
+                    center_y, _, _, center_x, _ = entry
+                    if x1 <= center_x <= x2 and y1 <= center_y <= y2:
+                        hits.append(entry)
+        # Ties keep the OCR word order
+        hits.sort(key=lambda entry: entry[:3])
+        return [entry[4] for entry in hits]
+
+
+class WordIndex:
+    """Spatial index over all pages of an ocr_data structure."""
+
+    def __init__(self, ocr_data, grid_size=DEFAULT_GRID_SIZE):
+        pages = (ocr_data or {}).get('pages', [])
+        self.pages = [PageGrid(page.get('words', []), grid_size) for page in pages]
+
+    def text_in_box(self, x1, y1, x2, y2):
+        """
+        Text inside a bounding box: words per page in reading order, pages joined with a space.
+
+        Returns:
+            str: The text (empty if no word lies inside the box)
+        """
+        texts = []
+        for page in self.pages:
+            words = page.query(x1, y1, x2, y2)
+            if words:
+                texts.append(' '.join(words))
+        return ' '.join(texts).strip()
+
+
+def get_word_index(document):
+    """
+    Return the word index of a document, building it on first use.
+
+    The index is kept on the instance and rebuilt when ocr_data is replaced.
+    """
+    cached = getattr(document, '_word_index', None)
+    if cached is None or cached[0] is not document.ocr_data:
+        cached = (document.ocr_data, WordIndex(document.ocr_data))
+        document._word_index = cached
+    return cached[1]
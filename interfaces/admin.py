@@ -4,7 +4,10 @@ from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 from django.conf import settings
 
-from .models import InterfaceType, SupplierInterface, InterfaceLog, XMLStandardTemplate
+from .models import (
+    InboundFile, InterfaceType, SupplierInterface, InterfaceLog, OrderTransmission, XMLStandardTemplate
+)
+from .outbox import requeue_transmission
 
 
 @admin.register(InterfaceType)
@@ -172,6 +175,43 @@ class InterfaceLogAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('interface', 'order', 'initiated_by')
 
 
+@admin.register(OrderTransmission)
+class OrderTransmissionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order', 'interface', 'status', 'attempt_count', 'available_at', 'finished_at')
+    list_filter = ('status', 'interface__supplier', 'interface__interface_type')
+    search_fields = ('order__order_number', 'interface__name', 'last_error')
+    readonly_fields = ('order', 'interface', 'status', 'mark_as_sent', 'attempt_count', 'available_at',
+                       'locked_by', 'locked_at', 'last_error', 'initiated_by', 'created_at', 'finished_at')
+    actions = ['requeue']
+
+    def has_add_permission(self, request):
+        return False
+
+    def requeue(self, request, queryset):
+        transmissions = queryset.filter(status='dead')
+        for transmission in transmissions:
+            requeue_transmission(transmission)
+        self.message_user(request, _('%(count)d Übertragung(en) erneut eingereiht.') % {'count': len(transmissions)})
+    requeue.short_description = _('Unzustellbare Übertragungen erneut einreihen')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('order', 'interface__supplier', 'interface__interface_type')
+
+
+@admin.register(InboundFile)
+class InboundFileAdmin(admin.ModelAdmin):
+    list_display = ('path', 'interface', 'status', 'record_count', 'size', 'modified_at', 'processed_at')
+    list_filter = ('status', 'interface__supplier')
+    search_fields = ('path', 'interface__name', 'message')
+    readonly_fields = ('interface', 'path', 'size', 'modified_at', 'status', 'record_count', 'message', 'processed_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('interface__supplier')
+
+
 @admin.register(XMLStandardTemplate)
 class XMLStandardTemplateAdmin(admin.ModelAdmin):
     list_display = ('name', 'code', 'industry', 'version', 'is_active')
@@ -0,0 +1,263 @@
+"""
+Wiederverwendbare Verbindungen zu den Lieferanten-Schnittstellen.
+
+Pro SupplierInterface hält der ConnectionManager eine requests.Session mit
+Keep-Alive sowie Pools angemeldeter FTP- und SFTP-Verbindungen, so dass
+mehrere Bestellungen an denselben Lieferanten nur einmal TLS-Handshake,
+FTP-Login bzw. SSH-Handshake kosten. Die Pools sind an den Stand der
+Konfiguration gebunden (updated_at): nach einer Änderung der Schnittstelle
+werden neue Verbindungen aufgebaut.
+
+Ungenutzte Verbindungen werden nach INTERFACE_CONNECTION_IDLE_TIMEOUT
+Sekunden geschlossen. Eine FTP-/SFTP-Verbindung, die länger als
+INTERFACE_CONNECTION_CHECK_INTERVAL Sekunden nicht benutzt wurde, wird vor
+der Wiederverwendung mit NOOP bzw. stat geprüft; bei einem Fehler während der
+Benutzung wird sie verworfen statt zurückgegeben.
+"""
+import ftplib
+import threading
+import time
+from contextlib import contextmanager
+
+import paramiko
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+DEFAULT_IDLE_TIMEOUT = 60
+DEFAULT_CHECK_INTERVAL = 10
+DEFAULT_POOL_SIZE = 4
+DEFAULT_TIMEOUT = 30
+
+
+def get_idle_timeout():
+    return getattr(settings, 'INTERFACE_CONNECTION_IDLE_TIMEOUT', DEFAULT_IDLE_TIMEOUT)
+
+
+def get_check_interval():
+    return getattr(settings, 'INTERFACE_CONNECTION_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+
+
+def get_pool_size():
+    return getattr(settings, 'INTERFACE_CONNECTION_POOL_SIZE', DEFAULT_POOL_SIZE)
+
+
+def get_timeout():
+    return getattr(settings, 'INTERFACE_CONNECTION_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+class ConnectionPool:
+    """Pool gleichartiger Verbindungen zu einem Server (nicht threadsichere Verbindungen werden exklusiv vergeben)."""
+
+    def __init__(self, connect, check, close):
+        self.connect = connect
+        self.check = check
+        self.close = close
+        self.idle = []  # (Verbindung, Zeitpunkt der letzten Benutzung)
+        self.lock = threading.Lock()
+        self.created = 0
+
+    def acquire(self):
+        now = time.monotonic()
+        while True:
+            with self.lock:
+                if not self.idle:
+                    break
+                connection, last_used = self.idle.pop()
+            if now - last_used > get_idle_timeout():
+                self._close(connection)
+                continue
+            if now - last_used > get_check_interval():
+                try:
+                    self.check(connection)
+                except Exception:
+                    self._close(connection)
+                    continue
+            return connection
+
+        connection = self.connect()
+        self.created += 1
+        return connection
+
+    def release(self, connection, broken=False):
+        if broken:
+            self._close(connection)
+            return
+        with self.lock:
+            if len(self.idle) < get_pool_size():
+                self.idle.append((connection, time.monotonic()))
+                return
+        self._close(connection)
+
+    def close_idle(self):
+        """Schließt Verbindungen, die länger als das Idle-Timeout nicht benutzt wurden."""
+        cutoff = time.monotonic() - get_idle_timeout()
+        with self.lock:
+            expired = [connection for connection, last_used in self.idle if last_used < cutoff]
+            self.idle = [(connection, last_used) for connection, last_used in self.idle if last_used >= cutoff]
+        for connection in expired:
+            self._close(connection)
+
+    def close_all(self):
+        with self.lock:
+            connections, self.idle = self.idle, []
+        for connection, _ in connections:
+            self._close(connection)
+
+    def _close(self, connection):
+        try:
+            self.close(connection)
+        except Exception:
+            pass
+
+
+class SFTPConnection:
+    """SSH-Transport mit geöffnetem SFTP-Kanal."""
+
+    def __init__(self, transport, sftp):
+        self.transport = transport
+        self.sftp = sftp
+
+
+def connect_ftp(interface):
+    ftp = ftplib.FTP(timeout=get_timeout())
+    try:
+        ftp.connect(interface.host, interface.port or 21)
+        ftp.login(interface.username, interface.password)
+        ftp.set_pasv(True)  # Passiver Modus funktioniert besser mit Firewalls
+    except Exception:
+        ftp.close()
+        raise
+    return ftp
+
+
+def close_ftp(ftp):
+    try:
+        ftp.quit()
+    except Exception:
+        ftp.close()
+
+
+def connect_sftp(interface):
+    transport = paramiko.Transport((interface.host, interface.port or 22))
+    try:
+        transport.banner_timeout = get_timeout()
+        transport.connect(username=interface.username, password=interface.password)
+        sftp = paramiko.SFTPClient.from_transport(transport)
+        sftp.get_channel().settimeout(get_timeout())
+    except Exception:
+        transport.close()
+        raise
+    return SFTPConnection(transport, sftp)
+
+
+def check_sftp(connection):
+    if not connection.transport.is_active():
+        raise paramiko.SSHException("SSH-Verbindung ist nicht mehr aktiv")
+    connection.sftp.stat('.')
+
+
+def close_sftp(connection):
+    try:
+        connection.sftp.close()
+    finally:
+        connection.transport.close()
+
+
+class ConnectionManager:
+    """Verbindungen aller Schnittstellen eines Prozesses, geschlüsselt nach SupplierInterface."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}  # Schnittstellen-ID -> (Konfigurationsstand, Session, letzte Benutzung)
+        self.pools = {}  # (Protokoll, Schnittstellen-ID) -> (Konfigurationsstand, ConnectionPool)
+
+    def http_session(self, interface):
+        """
+        requests.Session mit Keep-Alive für eine Schnittstelle.
+
+        Sessions sind threadsicher genug für parallele Requests; der Adapter hält bis zu
+        INTERFACE_CONNECTION_POOL_SIZE offene Verbindungen.
+        """
+        now = time.monotonic()
+        stale = None
+        with self.lock:
+            cached = self.sessions.get(interface.pk)
+            if cached is not None and cached[0] == interface.updated_at and now - cached[2] <= get_idle_timeout():
+                session = cached[1]
+            else:
+                stale = cached[1] if cached is not None else None
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=get_pool_size())
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+            self.sessions[interface.pk] = (interface.updated_at, session, now)
+        if stale is not None:
+            stale.close()
+        return session
+
+    def _pool(self, protocol, interface, connect, check, close):
+        stale = None
+        with self.lock:
+            cached = self.pools.get((protocol, interface.pk))
+            if cached is not None and cached[0] == interface.updated_at:
+                return cached[1]
+            if cached is not None:
+                stale = cached[1]
+            # Die Verbindungsfunktion bindet den aktuellen Konfigurationsstand
+            pool = ConnectionPool(lambda: connect(interface), check, close)
+            self.pools[(protocol, interface.pk)] = (interface.updated_at, pool)
+        if stale is not None:
+            stale.close_all()
+        return pool
+
+    @contextmanager
+    def _lease(self, pool):
+        connection = pool.acquire()
+        try:
+            yield connection
+        except BaseException:
+            # Zustand der Verbindung nach einem Fehler unklar: nicht wiederverwenden
+            pool.release(connection, broken=True)
+            raise
+        pool.release(connection)
+
+    def ftp(self, interface):
+        """Kontextmanager für eine angemeldete ftplib.FTP-Verbindung aus dem Pool."""
+        pool = self._pool('ftp', interface, connect_ftp, lambda ftp: ftp.voidcmd('NOOP'), close_ftp)
+        return self._lease(pool)
+
+    def sftp(self, interface):
+        """Kontextmanager für eine SFTPConnection (transport, sftp) aus dem Pool."""
+        pool = self._pool('sftp', interface, connect_sftp, check_sftp, close_sftp)
+        return self._lease(pool)
+
+    def close_idle(self):
+        """Schließt ungenutzte Sessions und Verbindungen nach Ablauf des Idle-Timeouts."""
+        cutoff = time.monotonic() - get_idle_timeout()
+        with self.lock:
+            expired = [key for key, (_, _, last_used) in self.sessions.items() if last_used < cutoff]
+            sessions = [self.sessions.pop(key)[1] for key in expired]
+            pools = [pool for _, pool in self.pools.values()]
+        for session in sessions:
+            session.close()
+        for pool in pools:
+            pool.close_idle()
+
+    def close_all(self):
+        with self.lock:
+            sessions = [session for _, session, _ in self.sessions.values()]
+            pools = [pool for _, pool in self.pools.values()]
+            self.sessions = {}
+            self.pools = {}
+        for session in sessions:
+            session.close()
+        for pool in pools:
+            pool.close_all()
+
+
+_manager = ConnectionManager()
+
+
+def get_connection_manager():
+    return _manager
@@ -0,0 +1,108 @@
+"""
+Sammelversand vieler Bestellungen.
+
+dispatch_orders stellt die Bestellungen über enqueue_orders in den Postausgang
+und arbeitet sie sofort ab, statt auf die Worker zu warten. Die Aufträge werden
+nach Schnittstelle gruppiert: innerhalb einer Schnittstelle nacheinander in der
+Reihenfolge der Warteschlange (bzw. als Sammelübertragung), verschiedene
+Schnittstellen parallel in einem Thread-Pool. Geholt wird wie bei den Workern
+über claim_batch, so dass Kapazitätslimit und Reihenfolge pro Schnittstelle
+auch neben laufenden run_transmission_workers gelten. Ist die Schnittstelle
+belegt oder wartet ein älterer Auftrag auf seine Wiederholung, bleiben die
+Bestellungen im Postausgang und werden als 'queued' gemeldet. Da jede
+Übertragung den Auftrag im Postausgang aktualisiert, gelten Wiederholungen und
+Dead-Letter-Behandlung wie bei den Workern.
+"""
+import os
+import socket
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+
+from .models import OrderTransmission
+from .outbox import QUERY_CHUNK_SIZE, claim_batch, deliver_batch, enqueue_orders
+
+DEFAULT_WORKERS = 8
+
+
+def dispatch_interface(worker, interface_id, transmission_ids):
+    """
+    Überträgt die Aufträge einer Schnittstelle nacheinander bzw. in Sammelübertragungen.
+
+    Ältere fällige Aufträge derselben Schnittstelle werden vorher mit übertragen.
+    Jeder eigene Auftrag wird höchstens einmal versucht; die Schleife endet
+    auch, sobald die Schnittstelle keinen Auftrag mehr freigibt.
+
+    Returns:
+        dict: Auftrags-ID -> (Status, letzter Fehler)
+    """
+    remaining = set(transmission_ids)
+    while remaining:
+        transmissions = claim_batch(worker, interface_id)
+        if not transmissions:
+            break
+        deliver_batch(transmissions)
+        remaining.difference_update(transmission.pk for transmission in transmissions)
+
+    outcome = {}
+    for start in range(0, len(transmission_ids), QUERY_CHUNK_SIZE):
+        for pk, status, last_error in OrderTransmission.objects.filter(
+            pk__in=transmission_ids[start:start + QUERY_CHUNK_SIZE]
+        ).values_list('pk', 'status', 'last_error'):
+            outcome[pk] = (status, last_error)
+    return outcome
+
+
+def dispatch_interface_in_thread(worker, interface_id, transmission_ids):
+    try:
+        return dispatch_interface(worker, interface_id, transmission_ids)
+    finally:
+        # Jeder Thread hat eigene Datenbankverbindungen
+        connections.close_all()
+
+
+def dispatch_orders(orders, user=None, workers=DEFAULT_WORKERS, mark_as_sent=True):
+    """
+    Sendet Bestellungen über die Standard-Schnittstellen ihrer Lieferanten.
+
+    Args:
+        orders: PurchaseOrder-Objekte (mit select_related('supplier')), Reihenfolge = Versandreihenfolge
+        user: Auslösender Benutzer
+        workers: Anzahl paralleler Schnittstellen; 1 überträgt alles im aufrufenden Thread
+        mark_as_sent: Bestellungen nach erfolgreicher Übertragung als 'sent' markieren
+
+    Returns:
+        list: Ergebnis je Bestellung als dict mit order, interface, transmission, status und message.
+        status ist 'sent', 'queued' (Wiederholung geplant), 'dead', 'running' (von einem
+        Worker bearbeitet) oder 'failed' (nicht eingereiht).
+    """
+    report = []
+    groups = defaultdict(list)
+    for order, transmission, error in enqueue_orders(orders, user, mark_as_sent):
+        report.append({
+            'order': order,
+            'interface': transmission.interface if transmission else None,
+            'transmission': transmission,
+            'status': 'queued' if transmission else 'failed',
+            'message': error,
+        })
+        if transmission is not None:
+            groups[transmission.interface_id].append(transmission.pk)
+
+    prefix = f'{socket.gethostname()}:{os.getpid()}:dispatch'
+    tasks = [
+        (f'{prefix}:{interface_id}', interface_id, transmission_ids) for interface_id, transmission_ids in groups.items()
+    ]
+    if workers <= 1 or len(tasks) <= 1:
+        outcomes = [dispatch_interface(*task) for task in tasks]
+    else:
+        # Übertragungen warten überwiegend auf das Netzwerk, daher Threads statt Prozesse
+        with ThreadPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            outcomes = list(pool.map(lambda task: dispatch_interface_in_thread(*task), tasks))
+
+    results = {pk: result for outcome in outcomes for pk, result in outcome.items()}
+    for row in report:
+        if row['transmission'] is not None and row['transmission'].pk in results:
+            row['status'], row['message'] = results[row['transmission'].pk]
+    return report
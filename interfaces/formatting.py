@@ -0,0 +1,291 @@
+"""
+Formatierung von Bestellungen für die Lieferanten-Schnittstellen.
+
+CSV, XML und JSON werden als Folge von Textblöcken erzeugt (OrderPayload), so
+dass große Bestellungen direkt an FTP, SFTP oder die API gestreamt werden,
+ohne die ganze Datei im Speicher aufzubauen. Die Positionen einer Bestellung
+werden mit Produkt und Steuersatz in einer Abfrage gelesen und blockweise
+verarbeitet; ein vorhandener Prefetch (prefetch_order_items) wird übernommen.
+
+Eigene Vorlagen werden pro Prozess einmal kompiliert und nach Schnittstelle
+und updated_at zwischengespeichert. Eine gespeicherte Änderung der
+Schnittstelle führt beim nächsten Aufruf zu einer neuen Kompilierung.
+Vorlagen werden als Ganzes gerendert.
+"""
+import csv
+import io
+import json
+import threading
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+from django.template import Context, Template
+
+from order.models import PurchaseOrderItem
+
+# Positionen je Datenbank-Block beim Streamen großer Bestellungen
+ITEM_CHUNK_SIZE = 500
+
+# CSV-Zeilen je erzeugtem Textblock
+CSV_BLOCK_ROWS = 500
+
+# Zeichen der übertragenen Daten, die im Übertragungsprotokoll gespeichert werden
+DEFAULT_LOG_LIMIT = 100_000
+
+CSV_HEADER = [
+    'Order Number', 'Supplier', 'Order Date', 'Product SKU',
+    'Product Name', 'Supplier SKU', 'Quantity', 'Unit Price', 'Total'
+]
+
+_templates = {}  # Schnittstellen-ID -> (updated_at, Quelltext, Template)
+_templates_lock = threading.Lock()
+
+
+def get_log_limit():
+    return getattr(settings, 'INTERFACE_LOG_REQUEST_DATA_LIMIT', DEFAULT_LOG_LIMIT)
+
+
+def get_compiled_template(interface):
+    """Kompilierte Vorlage der Schnittstelle, zwischengespeichert bis zur nächsten Änderung."""
+    source = interface.template
+    with _templates_lock:
+        cached = _templates.get(interface.pk)
+    if cached is not None and cached[0] == interface.updated_at and cached[1] == source:
+        return cached[2]
+
+    template = Template(source)
+    if interface.pk is not None:
+        with _templates_lock:
+            _templates[interface.pk] = (interface.updated_at, source, template)
+    return template
+
+
+def clear_template_cache():
+    with _templates_lock:
+        _templates.clear()
+
+
+def prefetch_order_items(orders):
+    """Lädt die Positionen mehrerer Bestellungen samt Produkt und Steuersatz mit einer Abfrage."""
+    prefetch_related_objects(
+        orders, Prefetch('items', queryset=PurchaseOrderItem.objects.select_related('product', 'tax'))
+    )
+
+
+def iter_items(order):
+    """Positionen einer Bestellung; ohne Prefetch blockweise aus einer Abfrage mit Produkt und Steuersatz."""
+    if 'items' in getattr(order, '_prefetched_objects_cache', {}):
+        return iter(order.items.all())
+    return order.items.select_related('product', 'tax').iterator(chunk_size=ITEM_CHUNK_SIZE)
+
+
+def iter_csv(orders, batch=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+
+    rows = 0
+    for order in orders:
+        supplier_name = order.supplier.name
+        order_date = order.order_date.strftime('%Y-%m-%d')
+        for item in iter_items(order):
+            writer.writerow([
+                order.order_number,
+                supplier_name,
+                order_date,
+                item.product.sku,
+                item.product.name,
+                item.supplier_sku,
+                item.quantity_ordered,
+                item.unit_price,
+                item.line_total
+            ])
+            rows += 1
+            if rows % CSV_BLOCK_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _xml(value):
+    return escape(str(value))
+
+
+def iter_xml_order(order):
+    yield (
+        '<Order>\n'
+        f'  <OrderNumber>{_xml(order.order_number)}</OrderNumber>\n'
+        f'  <OrderDate>{order.order_date.strftime("%Y-%m-%d")}</OrderDate>\n'
+        f'  <Supplier>{_xml(order.supplier.name)}</Supplier>\n'
+        '  <Items>\n'
+    )
+    for item in iter_items(order):
+        yield (
+            '    <Item>\n'
+            f'      <ProductSKU>{_xml(item.product.sku)}</ProductSKU>\n'
+            f'      <ProductName>{_xml(item.product.name)}</ProductName>\n'
+            f'      <SupplierSKU>{_xml(item.supplier_sku)}</SupplierSKU>\n'
+            f'      <Quantity>{item.quantity_ordered}</Quantity>\n'
+            f'      <UnitPrice>{item.unit_price}</UnitPrice>\n'
+            f'      <Total>{item.line_total}</Total>\n'
+            '    </Item>\n'
+        )
+    yield (
+        '  </Items>\n'
+        f'  <Subtotal>{order.subtotal}</Subtotal>\n'
+        f'  <Tax>{order.tax}</Tax>\n'
+        f'  <ShippingCost>{order.shipping_cost}</ShippingCost>\n'
+        f'  <Total>{order.total}</Total>\n'
+        '</Order>'
+    )
+
+
+def iter_xml(orders, batch=False):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    if not batch:
+        for order in orders:
+            yield from iter_xml_order(order)
+        return
+    yield '<Orders>\n'
+    for order in orders:
+        yield from iter_xml_order(order)
+        yield '\n'
+    yield '</Orders>'
+
+
+def _json(value, level):
+    """json.dumps mit indent=2, eingerückt für die angegebene Verschachtelungstiefe."""
+    return json.dumps(value, indent=2).replace('\n', '\n' + '  ' * level)
+
+
+def iter_json_order(order, level=0):
+    """Eine Bestellung als JSON-Objekt, Ausgabe identisch zu json.dumps(..., indent=2)."""
+    pad = '  ' * (level + 1)
+    yield (
+        '{\n'
+        f'{pad}"order_number": {json.dumps(order.order_number)},\n'
+        f'{pad}"order_date": {json.dumps(order.order_date.strftime("%Y-%m-%d"))},\n'
+        f'{pad}"supplier": {json.dumps(order.supplier.name)},\n'
+        f'{pad}"items": ['
+    )
+    separator = '\n'
+    for item in iter_items(order):
+        yield separator + pad + '  ' + _json({
+            'product_sku': item.product.sku,
+            'product_name': item.product.name,
+            'supplier_sku': item.supplier_sku,
+            'quantity': float(item.quantity_ordered),
+            'unit_price': float(item.unit_price),
+            'total': float(item.line_total)
+        }, level + 2)
+        separator = ',\n'
+    # Leere Liste wie bei json.dumps ohne Zeilenumbruch: "items": []
+    yield (
+        ('],\n' if separator == '\n' else f'\n{pad}],\n') +
+        f'{pad}"subtotal": {json.dumps(float(order.subtotal))},\n'
+        f'{pad}"tax": {json.dumps(float(order.tax))},\n'
+        f'{pad}"shipping_cost": {json.dumps(float(order.shipping_cost))},\n'
+        f'{pad}"total": {json.dumps(float(order.total))}\n'
+        f'{"  " * level}}}'
+    )
+
+
+def iter_json(orders, batch=False):
+    if not batch:
+        for order in orders:
+            yield from iter_json_order(order)
+        return
+    yield '{\n  "orders": ['
+    separator = '\n'
+    for order in orders:
+        yield separator + '    '
+        yield from iter_json_order(order, level=2)
+        separator = ',\n'
+    yield ']\n}' if separator == '\n' else '\n  ]\n}'
+
+
+def iter_template(interface, orders, batch=False):
+    template = get_compiled_template(interface)
+    for order in orders:
+        items = order.items.all()
+        if 'items' not in getattr(order, '_prefetched_objects_cache', {}):
+            items = items.select_related('product', 'tax')
+        yield template.render(Context({
+            'order': order,
+            'supplier': interface.supplier,
+            'items': items,
+        }))
+
+
+FORMATTERS = {
+    'csv': iter_csv,
+    'xml': iter_xml,
+    'json': iter_json,
+}
+
+
+class IteratorReader(io.RawIOBase):
+    """Dateiartiger Lesezugriff auf einen Iterator von Byte-Blöcken."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            try:
+                self.pending = next(self.chunks)
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+class OrderPayload:
+    """
+    Formatierte Bestelldaten als einmal lesbarer Strom von Textblöcken.
+
+    Beim Lesen werden die ersten INTERFACE_LOG_REQUEST_DATA_LIMIT Zeichen für
+    das Übertragungsprotokoll mitgeschrieben (log_data).
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.limit = get_log_limit()
+        self.excerpt = []
+        self.excerpt_length = 0
+        self.length = 0
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.length += len(chunk)
+            if self.excerpt_length < self.limit:
+                part = chunk[:self.limit - self.excerpt_length]
+                self.excerpt.append(part)
+                self.excerpt_length += len(part)
+            yield chunk
+
+    def iter_bytes(self):
+        for chunk in self:
+            if chunk:
+                yield chunk.encode('utf-8')
+
+    def read(self):
+        return ''.join(self)
+
+    def as_file(self):
+        return io.BufferedReader(IteratorReader(self.iter_bytes()))
+
+    @property
+    def log_data(self):
+        data = ''.join(self.excerpt)
+        if self.length > self.excerpt_length:
+            data += f"\n... (gekürzt, {self.length} Zeichen insgesamt)"
+        return data
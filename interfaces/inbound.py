@@ -0,0 +1,625 @@
+"""
+Eingang von Lieferantendateien (Auftragsbestätigungen und Lieferavise).
+
+Lieferanten legen Bestätigungen und Lieferavise (ASN) auf denselben FTP- bzw.
+SFTP-Servern ab, über die sie Bestellungen erhalten. Für Schnittstellen mit
+config_json['inbound_polling'] liest poll_interface das Eingangsverzeichnis
+(config_json['inbound_path'], sonst remote_path) über die gepoolten
+Verbindungen und verarbeitet nur neue oder geänderte Dateien: bereits
+verarbeitete Dateien werden über Name, Größe und Änderungszeitpunkt
+wiedererkannt (InboundFile). Eigene Bestelldateien (order_*, orders_*)
+werden übersprungen.
+
+CSV, XML und JSON werden als Strom von Datensätzen gelesen und blockweise
+angewendet:
+
+- Auftragsbestätigung: setzt den erwarteten Liefertermin der Bestellung
+- Lieferavis: legt je Bestellung und Sendung eine Teillieferung (OrderSplit)
+  im Status 'in_transit' mit den gelieferten Positionen an bzw. aktualisiert sie
+
+Je betroffener Bestellung wird ein InterfaceLog-Eintrag geschrieben.
+poll_interfaces fragt mehrere Lieferanten parallel in einem Thread-Pool ab.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import stat
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+from xml.etree.ElementTree import iterparse
+
+from django.db import connections, transaction
+from django.db.models import Q
+
+from order.models import OrderSplit, OrderSplitItem, PurchaseOrder, PurchaseOrderItem
+from .connection_pool import get_connection_manager
+from .models import InboundFile, InterfaceLog, SupplierInterface
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+
+# Datensätze je Anwendungsblock (und Blockgröße für __in-Abfragen)
+RECORD_CHUNK_SIZE = 500
+
+# Dateien bis zu dieser Größe werden im Speicher gehalten, größere auf der Festplatte
+SPOOL_SIZE = 1024 * 1024
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xml', '.json', '.jsonl')
+
+# Eigene, über die Schnittstelle gesendete Bestelldateien
+OUTBOUND_PREFIXES = ('order_', 'orders_')
+
+FIELD_ALIASES = {
+    'order_number': ('order_number', 'ordernumber', 'order_no', 'po_number', 'purchase_order',
+                     'bestellnummer', 'bestellung', 'order'),
+    'kind': ('type', 'document_type', 'message_type', 'belegart', 'art'),
+    'delivery_date': ('delivery_date', 'deliverydate', 'expected_delivery', 'confirmed_delivery',
+                      'confirmed_delivery_date', 'liefertermin', 'lieferdatum'),
+    'shipment': ('shipment', 'shipment_number', 'asn_number', 'despatch_number', 'dispatch_number',
+                 'delivery_note', 'lieferschein', 'lieferscheinnummer'),
+    'tracking_number': ('tracking_number', 'trackingnumber', 'tracking', 'sendungsnummer'),
+    'carrier': ('carrier', 'spediteur', 'versender'),
+    'sku': ('sku', 'product_sku', 'productsku', 'artikelnummer'),
+    'supplier_sku': ('supplier_sku', 'suppliersku', 'lieferanten_artikelnummer'),
+    'quantity': ('quantity', 'qty', 'shipped_quantity', 'menge', 'liefermenge'),
+}
+ALIASES = {alias: field for field, aliases in FIELD_ALIASES.items() for alias in aliases}
+
+ASN_KINDS = ('asn', 'desadv', 'despatch_advice', 'dispatch_advice', 'shipping_notice', 'shipment', 'lieferavis')
+CONFIRMATION_KINDS = ('confirmation', 'order_confirmation', 'ordrsp', 'order_response', 'auftragsbestaetigung',
+                      'auftragsbestätigung', 'ab')
+
+# XML-Elemente, die einen Datensatz bzw. eine Position beschreiben (ohne Namespace, klein geschrieben)
+XML_RECORD_TAGS = ('confirmation', 'orderconfirmation', 'orderresponse', 'shipment', 'despatchadvice',
+                   'dispatchadvice', 'shippingnotice', 'asn', 'auftragsbestaetigung', 'lieferavis')
+XML_LINE_TAGS = ('item', 'line', 'position', 'orderline', 'despatchline', 'shipmentline')
+JSON_LINE_KEYS = ('items', 'lines', 'positions', 'positionen')
+
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%Y%m%d', '%d/%m/%Y')
+
+
+def normalize_key(key):
+    return str(key).strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def parse_date(value):
+    if not value:
+        return None
+    value = str(value).strip()
+    for candidate in (value, value[:10]):
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(candidate, date_format).date()
+            except ValueError:
+                continue
+    return None
+
+
+def parse_quantity(value):
+    """Menge aus deutscher oder englischer Schreibweise (1.234,5 bzw. 1,234.5)."""
+    if value in (None, ''):
+        return None
+    text = str(value).strip().replace(' ', '')
+    if ',' in text and '.' in text:
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    else:
+        text = text.replace(',', '.')
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        return None
+
+
+def kind_from_filename(name):
+    name = name.lower()
+    if any(hint in name for hint in ('asn', 'desadv', 'avis', 'shipment', 'despatch')):
+        return 'asn'
+    if any(hint in name for hint in ('confirm', 'ordrsp', 'bestaetigung', 'ab_')):
+        return 'confirmation'
+    return None
+
+
+def build_line(values):
+    fields = {ALIASES[normalize_key(key)]: value for key, value in values.items() if normalize_key(key) in ALIASES}
+    quantity = parse_quantity(fields.get('quantity'))
+    sku = str(fields.get('sku') or '').strip()
+    supplier_sku = str(fields.get('supplier_sku') or '').strip()
+    if quantity is None or not (sku or supplier_sku):
+        return None
+    return {'sku': sku, 'supplier_sku': supplier_sku, 'quantity': quantity}
+
+
+def build_record(values, lines=(), default_kind=None):
+    """
+    Vereinheitlicht einen Datensatz aus CSV-Zeile, JSON-Objekt oder XML-Element.
+
+    Returns:
+        dict oder None, wenn keine Bestellnummer enthalten ist
+    """
+    fields = {}
+    for key, value in values.items():
+        field = ALIASES.get(normalize_key(key))
+        if field and field not in fields and not isinstance(value, (dict, list)):
+            fields[field] = value
+    order_number = str(fields.get('order_number') or '').strip()
+    if not order_number:
+        return None
+
+    line_values = [line for line in lines if line is not None]
+    flat_line = build_line(values)
+    if flat_line:
+        line_values.append(flat_line)
+
+    kind = normalize_key(fields.get('kind') or '')
+    if kind in ASN_KINDS:
+        kind = 'asn'
+    elif kind in CONFIRMATION_KINDS:
+        kind = 'confirmation'
+    elif default_kind:
+        kind = default_kind
+    elif fields.get('shipment') or fields.get('tracking_number') or fields.get('carrier'):
+        kind = 'asn'
+    else:
+        kind = 'confirmation'
+
+    return {
+        'order_number': order_number,
+        'kind': kind,
+        'delivery_date': parse_date(fields.get('delivery_date')),
+        'shipment': str(fields.get('shipment') or '').strip(),
+        'tracking_number': str(fields.get('tracking_number') or '').strip(),
+        'carrier': str(fields.get('carrier') or '').strip(),
+        'lines': line_values,
+    }
+
+
+def iter_csv_records(binary, default_kind=None):
+    text = io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t|')
+    except csv.Error:
+        dialect = csv.excel
+    for row in csv.DictReader(text, dialect=dialect):
+        record = build_record({key: value for key, value in row.items() if key}, default_kind=default_kind)
+        if record:
+            yield record
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1].lower()
+
+
+def _element_values(element):
+    values = dict(element.attrib)
+    for child in element:
+        if len(child) == 0 and child.text and child.text.strip():
+            values.setdefault(_local_name(child.tag), child.text.strip())
+    return values
+
+
+def iter_xml_records(binary, default_kind=None):
+    for event, element in iterparse(binary, events=('end',)):
+        # Einfache Elemente gleichen Namens (z. B. <Shipment>LS-1</Shipment>) sind Felder, keine Datensätze
+        if _local_name(element.tag) not in XML_RECORD_TAGS or len(element) == 0:
+            continue
+        lines = [
+            build_line(_element_values(line))
+            for line in element.iter() if line is not element and _local_name(line.tag) in XML_LINE_TAGS
+        ]
+        kind = default_kind or ('asn' if _local_name(element.tag) not in
+                                ('confirmation', 'orderconfirmation', 'orderresponse', 'auftragsbestaetigung')
+                                else 'confirmation')
+        record = build_record(_element_values(element), lines, default_kind=kind)
+        # Verarbeitete Elemente freigeben, damit große Dateien nicht vollständig im Speicher landen
+        element.clear()
+        if record:
+            yield record
+
+
+def _json_record(value, default_kind):
+    if not isinstance(value, dict):
+        return None
+    lines = []
+    for key, items in value.items():
+        if normalize_key(key) in JSON_LINE_KEYS and isinstance(items, list):
+            lines.extend(build_line(item) for item in items if isinstance(item, dict))
+    return build_record(value, lines, default_kind=default_kind)
+
+
+def iter_json_values(text, block_size=64 * 1024):
+    """
+    Liest JSON-Werte blockweise: Elemente eines Arrays auf oberster Ebene,
+    JSON Lines oder ein einzelnes Objekt (mit Liste unter 'confirmations',
+    'notices' oder 'records').
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    in_array = None
+    exhausted = False
+    while True:
+        # Trennzeichen zwischen den Werten überspringen
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) or exhausted:
+                break
+            buffer, position = text.read(block_size), 0
+            exhausted = not buffer
+        if position >= len(buffer):
+            return
+        if in_array is None:
+            in_array = buffer[position] == '['
+            if in_array:
+                position += 1
+                continue
+        if in_array and buffer[position] == ']':
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if exhausted:
+                raise
+            # Wert unvollständig: nächsten Block anhängen
+            block = text.read(block_size)
+            exhausted = not block
+            buffer, position = buffer[position:] + block, 0
+            continue
+        position = end
+        if not in_array and isinstance(value, dict):
+            wrapped = next((value[key] for key in ('confirmations', 'notices', 'records')
+                            if isinstance(value.get(key), list)), None)
+            if wrapped is not None:
+                yield from wrapped
+                continue
+        yield value
+
+
+def iter_json_records(binary, default_kind=None):
+    text = io.TextIOWrapper(binary, encoding='utf-8-sig')
+    for value in iter_json_values(text):
+        record = _json_record(value, default_kind)
+        if record:
+            yield record
+
+
+PARSERS = {
+    '.csv': iter_csv_records,
+    '.xml': iter_xml_records,
+    '.json': iter_json_records,
+    '.jsonl': iter_json_records,
+}
+
+
+def iter_records(name, binary):
+    """Datensätze einer Eingangsdatei; das Format ergibt sich aus der Dateiendung."""
+    parser = PARSERS[os.path.splitext(name)[1].lower()]
+    return parser(binary, default_kind=kind_from_filename(name))
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for value in iterable:
+        chunk.append(value)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def apply_records(interface, records, filename, written_items=None):
+    """
+    Wendet einen Block von Datensätzen auf die Bestellungen des Lieferanten an.
+
+    Args:
+        written_items: Menge der (Teillieferung, Position), die frühere Blöcke derselben
+            Datei bereits geschrieben haben; wird fortgeschrieben (siehe _apply_split_items)
+
+    Returns:
+        dict: confirmed (Bestellungen mit neuem Liefertermin), splits (angelegte bzw.
+        aktualisierte Teillieferungen), unknown (unbekannte Bestellnummern)
+    """
+    orders = {
+        order.order_number: order
+        for order in PurchaseOrder.objects.filter(
+            supplier_id=interface.supplier_id, order_number__in={record['order_number'] for record in records}
+        )
+    }
+    unknown = sorted({record['order_number'] for record in records if record['order_number'] not in orders})
+    messages = defaultdict(list)
+
+    # Auftragsbestätigungen: der letzte Liefertermin einer Bestellung in der Datei gilt
+    confirmed = {}
+    for record in records:
+        order = orders.get(record['order_number'])
+        if order is not None and record['kind'] == 'confirmation' and record['delivery_date']:
+            confirmed[order.pk] = (order, record['delivery_date'])
+    changed = []
+    for order, delivery_date in confirmed.values():
+        if order.expected_delivery != delivery_date:
+            order.expected_delivery = delivery_date
+            changed.append(order)
+        messages[order.pk].append(f"Liefertermin bestätigt: {delivery_date:%d.%m.%Y}")
+    PurchaseOrder.objects.bulk_update(changed, ['expected_delivery'])
+
+    # Lieferavise: eine Teillieferung je Bestellung und Sendung
+    shipments = {}
+    for record in records:
+        order = orders.get(record['order_number'])
+        if order is None or record['kind'] != 'asn':
+            continue
+        name = (record['shipment'] or f"Lieferavis {os.path.splitext(filename)[0]}")[:100]
+        shipment = shipments.setdefault((order.pk, name), {'order': order, 'lines': []})
+        for field in ('delivery_date', 'tracking_number', 'carrier'):
+            if record[field]:
+                shipment[field] = record[field]
+        shipment['lines'].extend(record['lines'])
+
+    if shipments:
+        splits = {
+            (split.purchase_order_id, split.name): split
+            for split in OrderSplit.objects.filter(
+                purchase_order_id__in={order_id for order_id, _ in shipments},
+                name__in={name for _, name in shipments}
+            )
+        }
+        new_splits = []
+        updated_splits = []
+        for key, shipment in shipments.items():
+            split = splits.get(key)
+            if split is None:
+                split = OrderSplit(purchase_order=shipment['order'], name=key[1], status='in_transit',
+                                   notes=f"Aus Lieferavis {filename}")
+                splits[key] = split
+                new_splits.append(split)
+            else:
+                updated_splits.append(split)
+            split.expected_delivery = shipment.get('delivery_date') or split.expected_delivery
+            split.tracking_number = shipment.get('tracking_number') or split.tracking_number
+            split.carrier = shipment.get('carrier') or split.carrier
+            messages[shipment['order'].pk].append(f"Lieferavis {key[1]}: {len(shipment['lines'])} Position(en)")
+        OrderSplit.objects.bulk_create(new_splits)
+        OrderSplit.objects.bulk_update(updated_splits, ['expected_delivery', 'tracking_number', 'carrier'])
+        _apply_split_items(shipments, splits, written_items if written_items is not None else set())
+
+    if messages:
+        InterfaceLog.objects.bulk_create([
+            InterfaceLog(interface=interface, order_id=order_id, status='success',
+                         message=f"Eingang {filename}: " + '; '.join(order_messages))
+            for order_id, order_messages in messages.items()
+        ])
+    return {'confirmed': len(confirmed), 'splits': len(shipments), 'unknown': unknown}
+
+
+def _apply_split_items(shipments, splits, written_items):
+    """
+    Ordnet die gelieferten Positionen den Bestellpositionen zu (Artikelnummer oder Lieferanten-Artikelnummer).
+
+    Eine erneut verarbeitete Datei ersetzt die Mengen der Teillieferung. Innerhalb
+    einer Datei werden Mengen aus früheren Blöcken (written_items) dagegen addiert.
+    """
+    skus = {line['sku'] for shipment in shipments.values() for line in shipment['lines'] if line['sku']}
+    supplier_skus = {line['supplier_sku'] for shipment in shipments.values()
+                     for line in shipment['lines'] if line['supplier_sku']}
+    by_sku = {}
+    by_supplier_sku = {}
+    for item in PurchaseOrderItem.objects.filter(
+        Q(product__sku__in=skus) | Q(supplier_sku__in=supplier_skus),
+        purchase_order_id__in={order_id for order_id, _ in shipments}
+    ).select_related('product'):
+        by_sku.setdefault((item.purchase_order_id, item.product.sku), item)
+        if item.supplier_sku:
+            by_supplier_sku.setdefault((item.purchase_order_id, item.supplier_sku), item)
+
+    quantities = defaultdict(Decimal)
+    for key, shipment in shipments.items():
+        order_id = key[0]
+        for line in shipment['lines']:
+            item = by_sku.get((order_id, line['sku'])) or by_supplier_sku.get((order_id, line['supplier_sku']))
+            if item is not None:
+                quantities[(splits[key].pk, item.pk)] += line['quantity']
+    if not quantities:
+        return
+
+    existing = {
+        (split_item.order_split_id, split_item.order_item_id): split_item
+        for split_item in OrderSplitItem.objects.filter(order_split_id__in={split_id for split_id, _ in quantities})
+    }
+    new_items = []
+    for (split_id, item_id), quantity in quantities.items():
+        split_item = existing.get((split_id, item_id))
+        if split_item is None:
+            new_items.append(OrderSplitItem(order_split_id=split_id, order_item_id=item_id, quantity=quantity))
+        elif (split_id, item_id) in written_items:
+            split_item.quantity += quantity
+        else:
+            split_item.quantity = quantity
+        written_items.add((split_id, item_id))
+    OrderSplitItem.objects.bulk_create(new_items)
+    OrderSplitItem.objects.bulk_update(
+        [split_item for key, split_item in existing.items() if key in quantities], ['quantity']
+    )
+
+
+def process_file(interface, path, size, modified_at, binary):
+    """
+    Liest eine heruntergeladene Datei und wendet ihre Datensätze an.
+
+    Returns:
+        InboundFile: Ergebnis der Verarbeitung ('processed' oder 'failed')
+    """
+    filename = os.path.basename(path)
+    totals = {'records': 0, 'confirmed': 0, 'splits': 0, 'unknown': set()}
+    written_items = set()
+    try:
+        with transaction.atomic():
+            for records in _chunks(iter_records(filename, binary), RECORD_CHUNK_SIZE):
+                result = apply_records(interface, records, filename, written_items)
+                totals['records'] += len(records)
+                totals['confirmed'] += result['confirmed']
+                totals['splits'] += result['splits']
+                totals['unknown'].update(result['unknown'])
+            message = (f"{totals['records']} Datensätze: {totals['confirmed']} Liefertermin(e), "
+                       f"{totals['splits']} Teillieferung(en)")
+            if totals['unknown']:
+                message += f"; unbekannte Bestellungen: {', '.join(sorted(totals['unknown']))}"
+            return InboundFile.objects.create(interface=interface, path=path, size=size, modified_at=modified_at,
+                                              status='processed', record_count=totals['records'], message=message)
+    except Exception as e:
+        logger.warning("Eingangsdatei %s von %s nicht verarbeitet: %s", path, interface.name, e)
+        return InboundFile.objects.create(interface=interface, path=path, size=size, modified_at=modified_at,
+                                          status='failed', message=f"Fehler beim Verarbeiten: {e}")
+
+
+class FTPInbox:
+    """Verzeichnisliste und Download über eine gepoolte FTP-Verbindung."""
+
+    def __init__(self, ftp):
+        self.ftp = ftp
+
+    def list(self, path):
+        import ftplib
+        try:
+            for name, facts in self.ftp.mlsd(path, facts=['type', 'size', 'modify']):
+                if facts.get('type') == 'file':
+                    yield name, int(facts.get('size', 0)), _parse_ftp_time(facts.get('modify'))
+        except ftplib.error_perm:
+            # Server ohne MLSD: Namen über NLST, Größe und Zeitpunkt einzeln abfragen
+            for name in self.ftp.nlst(path):
+                name = os.path.basename(name)
+                remote = join_path(path, name)
+                try:
+                    size = self.ftp.size(remote)
+                except ftplib.error_perm:
+                    continue  # Verzeichnis
+                try:
+                    modified = _parse_ftp_time(self.ftp.voidcmd(f'MDTM {remote}').split()[-1])
+                except ftplib.error_perm:
+                    modified = None
+                yield name, size or 0, modified
+
+    def download(self, remote, target):
+        self.ftp.retrbinary(f'RETR {remote}', target.write)
+
+
+class SFTPInbox:
+    """Verzeichnisliste und Download über einen gepoolten SFTP-Kanal."""
+
+    def __init__(self, connection):
+        self.sftp = connection.sftp
+
+    def list(self, path):
+        for attributes in self.sftp.listdir_attr(path or '.'):
+            if attributes.st_mode is None or stat.S_ISREG(attributes.st_mode):
+                modified = (datetime.fromtimestamp(attributes.st_mtime, tz=dt_timezone.utc)
+                            if attributes.st_mtime is not None else None)
+                yield attributes.filename, attributes.st_size or 0, modified
+
+    def download(self, remote, target):
+        self.sftp.getfo(remote, target)
+
+
+def _parse_ftp_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value[:14], '%Y%m%d%H%M%S').replace(tzinfo=dt_timezone.utc)
+    except ValueError:
+        return None
+
+
+def join_path(path, name):
+    if not path or path == '.':
+        return name
+    return f"{path.rstrip('/')}/{name}"
+
+
+def get_inbound_path(interface):
+    config = interface.config_json or {}
+    return config.get('inbound_path') or interface.remote_path or ''
+
+
+def get_polling_interfaces():
+    interfaces = SupplierInterface.objects.filter(
+        is_active=True, interface_type__code__in=('ftp', 'sftp')
+    ).select_related('interface_type', 'supplier')
+    return [interface for interface in interfaces if (interface.config_json or {}).get('inbound_polling')]
+
+
+def poll_interface(interface):
+    """
+    Verarbeitet neue oder geänderte Dateien im Eingangsverzeichnis einer Schnittstelle.
+
+    Returns:
+        dict: files (verarbeitet), failed (fehlerhaft), records (Datensätze), error (Verbindungsfehler)
+    """
+    stats = {'files': 0, 'failed': 0, 'records': 0, 'error': ''}
+    manager = get_connection_manager()
+    protocol = interface.interface_type.code.lower()
+    lease = manager.ftp(interface) if protocol == 'ftp' else manager.sftp(interface)
+    path = get_inbound_path(interface)
+    try:
+        with lease as connection:
+            inbox = FTPInbox(connection) if protocol == 'ftp' else SFTPInbox(connection)
+            candidates = [
+                (join_path(path, name), size, modified)
+                for name, size, modified in inbox.list(path)
+                if name.lower().endswith(SUPPORTED_EXTENSIONS) and not name.lower().startswith(OUTBOUND_PREFIXES)
+            ]
+            seen = set()
+            for start in range(0, len(candidates), RECORD_CHUNK_SIZE):
+                seen.update(InboundFile.objects.filter(
+                    interface=interface, path__in=[remote for remote, _, _ in candidates[start:start + RECORD_CHUNK_SIZE]]
+                ).values_list('path', 'size', 'modified_at'))
+
+            for remote, size, modified in candidates:
+                if (remote, size, modified) in seen:
+                    continue
+                with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+                    inbox.download(remote, spool)
+                    spool.seek(0)
+                    inbound_file = process_file(interface, remote, size, modified, spool)
+                stats['files'] += 1
+                stats['records'] += inbound_file.record_count
+                if inbound_file.status == 'failed':
+                    stats['failed'] += 1
+    except Exception as e:
+        # Verbindungsfehler: nicht verarbeitete Dateien werden beim nächsten Abruf erneut versucht
+        logger.warning("Abruf der Eingangsdateien von %s fehlgeschlagen: %s", interface.name, e)
+        stats['error'] = str(e)
+    return stats
+
+
+def poll_interface_in_thread(interface):
+    try:
+        return poll_interface(interface)
+    finally:
+        # Jeder Thread hat eigene Datenbankverbindungen
+        connections.close_all()
+
+
+def poll_interfaces(interfaces=None, workers=DEFAULT_WORKERS):
+    """
+    Fragt die Eingangsverzeichnisse mehrerer Schnittstellen parallel ab.
+
+    Returns:
+        list: (Schnittstelle, Statistik aus poll_interface)
+    """
+    interfaces = get_polling_interfaces() if interfaces is None else list(interfaces)
+    if workers <= 1 or len(interfaces) <= 1:
+        return [(interface, poll_interface(interface)) for interface in interfaces]
+    # Abrufe warten überwiegend auf das Netzwerk, daher Threads statt Prozesse
+    with ThreadPoolExecutor(max_workers=min(workers, len(interfaces))) as pool:
+        return list(zip(interfaces, pool.map(poll_interface_in_thread, interfaces)))
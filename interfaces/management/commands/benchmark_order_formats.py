@@ -0,0 +1,125 @@
+# interfaces/management/commands/benchmark_order_formats.py
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Product, Tax
+from interfaces.formatting import get_compiled_template
+from interfaces.models import InterfaceType, SupplierInterface
+from interfaces.services import get_interface_service
+from order.models import PurchaseOrder, PurchaseOrderItem
+from suppliers.models import Supplier
+
+SAMPLE_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<Bestellung nummer="{{ order.order_number }}" datum="{{ order.order_date|date:"Y-m-d" }}">
+  <Lieferant>{{ supplier.name }}</Lieferant>
+  {% for item in items %}<Position nr="{{ forloop.counter }}">
+    <Artikel>{{ item.product.sku }}</Artikel>
+    <Menge>{{ item.quantity_ordered }}</Menge>
+    <Preis>{{ item.unit_price }}</Preis>
+    <Steuer>{{ item.tax.rate }}</Steuer>
+  </Position>
+  {% endfor %}
+</Bestellung>"""
+
+
+class _Rollback(Exception):
+    """Wird ausgelöst, um die Benchmark-Daten am Ende zu verwerfen."""
+
+
+class Command(BaseCommand):
+    help = 'Misst Abfragen, Laufzeit und Speicherbedarf der Bestellformate für große Bestellungen'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lines', nargs='+', type=int, default=[5000],
+            help='Anzahl der Bestellpositionen pro Durchlauf (Standard: 5000)'
+        )
+        parser.add_argument(
+            '--formats', nargs='+', default=['csv', 'xml', 'json', 'template'],
+            choices=['csv', 'xml', 'json', 'template'],
+            help='Zu messende Formate (Standard: alle)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Starte Benchmark der Bestellformate...'))
+        self.stdout.write(f"{'Format':>9} {'Positionen':>11} {'Abfragen':>9} {'Zeit (s)':>9} "
+                          f"{'Größe (KB)':>11} {'Spitze (KB)':>12}")
+
+        for lines in options['lines']:
+            try:
+                with transaction.atomic():
+                    order, interface = self._seed(lines)
+                    for format_name in options['formats']:
+                        self._measure(order, interface, format_name, lines)
+                    raise _Rollback()
+            except _Rollback:
+                pass
+
+        self.stdout.write(self.style.SUCCESS('Benchmark abgeschlossen, Testdaten wurden verworfen.'))
+
+    def _measure(self, order, interface, format_name, lines):
+        if format_name == 'template':
+            interface.order_format, interface.template = 'xml', SAMPLE_TEMPLATE
+            start = time.perf_counter()
+            get_compiled_template(interface)
+            compiled = time.perf_counter() - start
+            start = time.perf_counter()
+            get_compiled_template(interface)
+            cached = time.perf_counter() - start
+            self.stdout.write(f"  Vorlage kompilieren: {compiled * 1000:.2f} ms, aus dem Cache: {cached * 1e6:.1f} µs")
+        else:
+            interface.order_format, interface.template = format_name, ''
+        service = get_interface_service(interface)
+
+        # Laufzeit und Abfragen ohne Speichermessung, Bestellung jeweils frisch geladen
+        order = PurchaseOrder.objects.select_related('supplier').get(pk=order.pk)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            size = sum(len(chunk) for chunk in service.order_payload([order]).iter_bytes())
+            duration = time.perf_counter() - start
+
+        # Speicherspitze beim Streamen (Blöcke werden direkt verworfen)
+        order = PurchaseOrder.objects.select_related('supplier').get(pk=order.pk)
+        tracemalloc.start()
+        for _ in service.order_payload([order]).iter_bytes():
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        self.stdout.write(f"{format_name:>9} {lines:>11} {len(queries):>9} {duration:>9.3f} "
+                          f"{size / 1024:>11.0f} {peak / 1024:>12.0f}")
+
+    def _seed(self, lines):
+        """Legt eine Bestellung mit der angegebenen Anzahl Positionen an."""
+        prefix = f'BMF{time.time_ns()}-'
+        user = User.objects.create(username=f'benchmark-{time.time_ns()}')
+        supplier = Supplier.objects.create(name=f'{prefix}Lieferant')
+        taxes = [
+            Tax.objects.create(name=f'{prefix}{rate}', code=f'{prefix}{rate}', rate=Decimal(rate))
+            for rate in ('7.00', '19.00')
+        ]
+        Product.objects.bulk_create(
+            [Product(name=f'Benchmark-Artikel {i}', sku=f'{prefix}{i}') for i in range(lines)],
+            batch_size=1000
+        )
+        products = list(Product.objects.filter(sku__startswith=prefix).values_list('pk', flat=True))
+
+        order = PurchaseOrder.objects.create(order_number=f'{prefix}PO', supplier=supplier, created_by=user,
+                                             status='approved')
+        PurchaseOrderItem.objects.bulk_create([
+            PurchaseOrderItem(purchase_order=order, product_id=product_id, quantity_ordered=Decimal(index % 50 + 1),
+                              unit_price=Decimal('9.99'), supplier_sku=f'L-{index}', tax=taxes[index % 2])
+            for index, product_id in enumerate(products)
+        ], batch_size=1000)
+
+        interface = SupplierInterface.objects.create(
+            supplier=supplier, name='Benchmark', order_format='csv',
+            interface_type=InterfaceType.objects.get_or_create(code='email', defaults={'name': 'E-Mail'})[0]
+        )
+        return order, interface
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Ruft Auftragsbestätigungen und Lieferavise aus den FTP-/SFTP-Verzeichnissen der Lieferanten ab'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Anzahl parallel abgefragter Schnittstellen (Standard: 4)')
+        parser.add_argument('--interval', type=float, default=300.0,
+                            help='Wartezeit in Sekunden zwischen zwei Abrufen (Standard: 300)')
+        parser.add_argument('--once', action='store_true',
+                            help='Nur einmal abrufen und beenden')
+
+    def handle(self, *args, **options):
+        from interfaces.connection_pool import get_connection_manager
+        from interfaces.inbound import poll_interfaces
+
+        workers = max(options['workers'], 1)
+        manager = get_connection_manager()
+        self.stdout.write(self.style.SUCCESS(f'Abruf der Lieferantendateien gestartet ({workers} Threads).'))
+
+        try:
+            while True:
+                started = time.monotonic()
+                results = poll_interfaces(workers=workers)
+                for interface, stats in results:
+                    if stats['error']:
+                        self.stdout.write(self.style.WARNING(f"{interface.name}: {stats['error']}"))
+                    elif stats['files']:
+                        self.stdout.write(f"{interface.name}: {stats['files']} Datei(en), "
+                                          f"{stats['records']} Datensätze, {stats['failed']} fehlerhaft")
+                self.stdout.write(f'{len(results)} Schnittstelle(n) in {time.monotonic() - started:.1f} s abgefragt.')
+                if options['once']:
+                    break
+                manager.close_idle()
+                time.sleep(options['interval'])
+        finally:
+            manager.close_all()
@@ -0,0 +1,50 @@
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def run_worker(worker, interval, once):
+    from interfaces.outbox import work
+    try:
+        return work(worker, interval=interval, once=once)
+    finally:
+        # Jeder Thread hat eigene Datenbankverbindungen
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Überträgt Bestellungen aus dem Postausgang an die Lieferanten-Schnittstellen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Anzahl paralleler Worker-Threads (Standard: 4)')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Wartezeit in Sekunden bei leerer Warteschlange (Standard: 5)')
+        parser.add_argument('--once', action='store_true',
+                            help='Nur die aktuell fälligen Übertragungen bearbeiten und beenden')
+
+    def handle(self, *args, **options):
+        from interfaces.connection_pool import get_connection_manager
+        from interfaces.outbox import work
+
+        workers = max(options['workers'], 1)
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        self.stdout.write(self.style.SUCCESS(f'Übertragungs-Worker gestartet ({workers} Threads).'))
+
+        if workers == 1:
+            # Ein einzelner Worker läuft im Hauptthread
+            processed = work(f'{prefix}:0', interval=options['interval'], once=options['once'])
+        else:
+            # Übertragungen warten überwiegend auf das Netzwerk, daher Threads statt Prozesse
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(run_worker, f'{prefix}:{index}', options['interval'], options['once'])
+                    for index in range(workers)
+                ]
+                processed = sum(future.result() for future in futures)
+        get_connection_manager().close_all()
+
+        self.stdout.write(self.style.SUCCESS(f'{processed} Übertragung(en) bearbeitet.'))
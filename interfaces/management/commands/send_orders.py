@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from order.models import PurchaseOrder
+
+
+class Command(BaseCommand):
+    help = 'Sendet Bestellungen sofort über die Standard-Schnittstellen ihrer Lieferanten (parallel je Schnittstelle)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('order_numbers', nargs='*',
+                            help='Bestellnummern (Standard: alle Bestellungen im gewählten Status)')
+        parser.add_argument('--status', default='approved',
+                            help='Status der zu sendenden Bestellungen (Standard: approved)')
+        parser.add_argument('--supplier', type=int, action='append',
+                            help='Nur Bestellungen dieses Lieferanten (ID, mehrfach möglich)')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Anzahl parallel belieferter Schnittstellen (Standard: 8)')
+
+    def handle(self, *args, **options):
+        from interfaces.connection_pool import get_connection_manager
+        from interfaces.dispatch import dispatch_orders
+
+        orders = PurchaseOrder.objects.filter(status=options['status']).select_related('supplier')
+        if options['order_numbers']:
+            orders = orders.filter(order_number__in=options['order_numbers'])
+        if options['supplier']:
+            orders = orders.filter(supplier_id__in=options['supplier'])
+        orders = list(orders.order_by('order_date', 'pk'))
+        if not orders:
+            self.stdout.write('Keine Bestellungen zu senden.')
+            return
+
+        started = time.monotonic()
+        report = dispatch_orders(orders, workers=max(options['workers'], 1))
+        get_connection_manager().close_all()
+        duration = time.monotonic() - started
+
+        counts = {}
+        for row in report:
+            counts[row['status']] = counts.get(row['status'], 0) + 1
+            interface = row['interface'].name if row['interface'] else '-'
+            line = f"{row['order'].order_number:<20} {row['order'].supplier.name:<30} {interface:<25} {row['status']}"
+            if row['message'] and row['status'] != 'sent':
+                line += f"  {row['message']}"
+            self.stdout.write(line)
+
+        summary = ', '.join(f'{status}: {count}' for status, count in sorted(counts.items()))
+        style = self.style.SUCCESS if counts.get('sent', 0) == len(report) else self.style.WARNING
+        self.stdout.write(style(
+            f'{len(report)} Bestellung(en) in {duration:.1f} s ({len(report) / max(duration, 1e-9):.0f}/s) - {summary}'
+        ))
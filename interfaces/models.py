@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from suppliers.models import Supplier
 
@@ -237,6 +238,154 @@ class InterfaceLog(models.Model):
         ordering = ['-timestamp']
 
 
+class OrderTransmission(models.Model):
+    """Auftrag im Postausgang für die Übertragung einer Bestellung (siehe interfaces/outbox.py)"""
+
+    STATUS_CHOICES = [
+        ('queued', _('Wartend')),
+        ('running', _('In Bearbeitung')),
+        ('sent', _('Gesendet')),
+        ('dead', _('Unzustellbar')),
+    ]
+
+    order = models.ForeignKey(
+        'order.PurchaseOrder',
+        on_delete=models.CASCADE,
+        related_name='transmissions',
+        verbose_name=_("Bestellung")
+    )
+    interface = models.ForeignKey(
+        SupplierInterface,
+        on_delete=models.CASCADE,
+        related_name='transmissions',
+        verbose_name=_("Schnittstelle")
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='queued',
+        verbose_name=_("Status")
+    )
+    mark_as_sent = models.BooleanField(
+        default=True,
+        verbose_name=_("Als bestellt markieren"),
+        help_text=_("Bestellung nach erfolgreicher Übertragung in den Status 'Bestellt' setzen")
+    )
+    attempt_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Versuchszähler")
+    )
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("Nächster Versuch")
+    )
+    locked_by = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name=_("Bearbeitet von")
+    )
+    locked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("Gesperrt seit")
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name=_("Letzter Fehler")
+    )
+    initiated_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name=_("Ausgelöst von")
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_("Erstellt am")
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("Abgeschlossen am")
+    )
+
+    def __str__(self):
+        return f"{self.order.order_number} - {self.interface.name} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = _("Bestellübertragung")
+        verbose_name_plural = _("Bestellübertragungen")
+        ordering = ['available_at', 'pk']
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='order_transmission_queue_idx'),
+            models.Index(fields=['interface', 'status'], name='order_transmission_iface_idx'),
+        ]
+        constraints = [
+            # Höchstens ein offener Auftrag je Bestellung und Schnittstelle, sonst geht die Bestellung doppelt raus
+            models.UniqueConstraint(fields=['order', 'interface'], condition=models.Q(status__in=['queued', 'running']),
+                                    name='order_transmission_open_unique'),
+        ]
+
+
+class InboundFile(models.Model):
+    """Vom Lieferanten bereitgestellte Datei (Auftragsbestätigung, Lieferavis), siehe interfaces/inbound.py"""
+
+    STATUS_CHOICES = [
+        ('processed', _('Verarbeitet')),
+        ('failed', _('Fehlerhaft')),
+    ]
+
+    interface = models.ForeignKey(
+        SupplierInterface,
+        on_delete=models.CASCADE,
+        related_name='inbound_files',
+        verbose_name=_("Schnittstelle")
+    )
+    path = models.CharField(
+        max_length=500,
+        verbose_name=_("Pfad")
+    )
+    size = models.BigIntegerField(
+        verbose_name=_("Größe")
+    )
+    modified_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("Geändert am (Server)")
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='processed',
+        verbose_name=_("Status")
+    )
+    record_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Datensätze")
+    )
+    message = models.TextField(
+        blank=True,
+        verbose_name=_("Nachricht")
+    )
+    processed_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_("Verarbeitet am")
+    )
+
+    def __str__(self):
+        return f"{self.interface.name}: {self.path} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = _("Eingangsdatei")
+        verbose_name_plural = _("Eingangsdateien")
+        ordering = ['-processed_at']
+        constraints = [
+            models.UniqueConstraint(fields=['interface', 'path', 'size', 'modified_at'],
+                                    name='inbound_file_version_unique'),
+        ]
+
+
 class XMLStandardTemplate(models.Model):
     """Vordefinierte XML-Standards für Bestellungen"""
     name = models.CharField(
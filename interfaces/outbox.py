@@ -0,0 +1,504 @@
+"""
+Postausgang für die Übertragung von Bestellungen an Lieferanten.
+
+Web-Requests und Signale legen nur einen OrderTransmission-Auftrag an
+(enqueue_order); die eigentliche Übertragung übernehmen die Worker des
+Befehls run_transmission_workers. Ein Worker holt sich fällige Aufträge über
+ein bedingtes UPDATE, das zugleich die maximale Anzahl gleichzeitiger
+Übertragungen pro Schnittstelle einhält (Standard 1). Pro Schnittstelle wird
+immer der älteste wartende Auftrag zuerst geholt; wartet er nach einem
+Fehlschlag auf seine Wiederholung, bleiben die späteren Bestellungen an
+denselben Lieferanten so lange zurück. Fehlgeschlagene Versuche werden mit
+exponentiellem Backoff wiederholt; nach der maximalen Anzahl Versuche landet
+der Auftrag im Status 'dead' und kann über requeue_transmission erneut
+eingestellt werden.
+
+Unterstützt eine Schnittstelle Sammelübertragungen (config_json['batch_orders']),
+holt ein Worker mit claim_batch alle fälligen Aufträge dieser Schnittstelle auf
+einmal und überträgt sie in einer Datei bzw. einem Payload (deliver_batch).
+"""
+import logging
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, Exists, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from order.models import PurchaseOrder
+from suppliers.models import SupplierProduct
+from .connection_pool import get_connection_manager
+from .formatting import prefetch_order_items
+from .models import InterfaceLog, OrderTransmission, SupplierInterface
+from .services import InterfaceError, get_interface_service
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 5
+
+# Wartezeit vor dem ersten erneuten Versuch in Sekunden; verdoppelt sich mit jedem weiteren Versuch
+DEFAULT_RETRY_DELAY = 60
+DEFAULT_MAX_RETRY_DELAY = 6 * 60 * 60
+
+# Gleichzeitige Übertragungen pro Schnittstelle (überschreibbar über config_json['max_concurrent_transmissions'])
+DEFAULT_CONCURRENCY = 1
+
+# Aufträge je Sammelübertragung (überschreibbar über config_json['max_batch_size'])
+DEFAULT_BATCH_SIZE = 100
+
+# Blockgröße für __in-Abfragen über viele Bestellungen
+QUERY_CHUNK_SIZE = 500
+
+# Laufende Aufträge ohne Abschluss nach dieser Zeit gelten als abgebrochen
+DEFAULT_JOB_TIMEOUT = 10 * 60
+
+OPEN_STATUSES = ('queued', 'running')
+
+# Standard-Lieferzeit in Tagen, wenn keine Lieferantenprodukte hinterlegt sind
+DEFAULT_LEAD_TIME_DAYS = 7
+
+
+def get_max_attempts():
+    return getattr(settings, 'INTERFACE_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+
+
+def get_retry_delay(attempts):
+    """Wartezeit in Sekunden nach der angegebenen Anzahl fehlgeschlagener Versuche."""
+    base = getattr(settings, 'INTERFACE_OUTBOX_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+    maximum = getattr(settings, 'INTERFACE_OUTBOX_MAX_RETRY_DELAY', DEFAULT_MAX_RETRY_DELAY)
+    return min(base * 2 ** max(attempts - 1, 0), maximum)
+
+
+def get_job_timeout():
+    return getattr(settings, 'INTERFACE_OUTBOX_JOB_TIMEOUT', DEFAULT_JOB_TIMEOUT)
+
+
+def get_concurrency_limit(interface):
+    """Maximale Anzahl gleichzeitiger Übertragungen über eine Schnittstelle."""
+    default = getattr(settings, 'INTERFACE_OUTBOX_CONCURRENCY', DEFAULT_CONCURRENCY)
+    try:
+        return max(int((interface.config_json or {}).get('max_concurrent_transmissions', default)), 1)
+    except (TypeError, ValueError):
+        return default
+
+
+def get_batch_size(interface):
+    """Maximale Anzahl Bestellungen in einer Sammelübertragung über eine Schnittstelle."""
+    default = getattr(settings, 'INTERFACE_OUTBOX_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    try:
+        return max(int((interface.config_json or {}).get('max_batch_size', default)), 1)
+    except (TypeError, ValueError):
+        return default
+
+
+def supports_batch(interface):
+    try:
+        return get_interface_service(interface).supports_batch()
+    except InterfaceError:
+        return False
+
+
+def get_default_interface(order):
+    return SupplierInterface.objects.filter(
+        supplier_id=order.supplier_id,
+        is_default=True,
+        is_active=True
+    ).first()
+
+
+def enqueue_order(order, interface=None, user=None, mark_as_sent=True):
+    """
+    Stellt eine Bestellung in den Postausgang.
+
+    Args:
+        order: PurchaseOrder
+        interface: SupplierInterface oder deren ID; ohne Angabe die Standard-Schnittstelle des Lieferanten
+        user: Auslösender Benutzer
+        mark_as_sent: Bestellung nach erfolgreicher Übertragung als 'sent' markieren
+
+    Returns:
+        OrderTransmission: Neuer oder bereits offener Auftrag für Bestellung und Schnittstelle
+
+    Raises:
+        InterfaceError: Wenn keine aktive Schnittstelle gefunden wird
+    """
+    if interface is None:
+        interface = get_default_interface(order)
+    elif not isinstance(interface, SupplierInterface):
+        interface = SupplierInterface.objects.filter(pk=interface, supplier_id=order.supplier_id).first()
+    if interface is None or not interface.is_active:
+        raise InterfaceError(f"Keine aktive Schnittstelle für Lieferant {order.supplier.name} gefunden")
+
+    transmission = _open_transmission(order.pk, interface.pk)
+    if transmission is not None:
+        return transmission
+    try:
+        with transaction.atomic():
+            return OrderTransmission.objects.create(
+                order=order, interface=interface, initiated_by=user, mark_as_sent=mark_as_sent
+            )
+    except IntegrityError:
+        # Gleichzeitig eingereiht (Doppelklick, automatischer Versand nach der Freigabe)
+        transmission = _open_transmission(order.pk, interface.pk)
+        if transmission is None:
+            raise
+        return transmission
+
+
+def _open_transmission(order_id, interface_id):
+    return OrderTransmission.objects.filter(
+        order_id=order_id, interface_id=interface_id, status__in=OPEN_STATUSES
+    ).first()
+
+
+def enqueue_orders(orders, user=None, mark_as_sent=True):
+    """
+    Stellt mehrere Bestellungen über die Standard-Schnittstellen ihrer Lieferanten in den Postausgang.
+
+    Schnittstellen und bereits offene Aufträge werden blockweise gelesen, neue
+    Aufträge mit bulk_create angelegt. Die Reihenfolge der Bestellungen bleibt
+    als Reihenfolge in der Warteschlange erhalten. Aufträge, die eine andere
+    Anfrage gleichzeitig angelegt hat, werden übersprungen und anschließend
+    aus der Datenbank gelesen.
+
+    Returns:
+        list: (Bestellung, OrderTransmission oder None, Fehlermeldung) in der Reihenfolge der Eingabe
+    """
+    orders = list(orders)
+    interfaces = {}
+    for interface in SupplierInterface.objects.filter(
+        supplier_id__in={order.supplier_id for order in orders}, is_default=True, is_active=True
+    ):
+        interfaces.setdefault(interface.supplier_id, interface)
+
+    open_transmissions = _open_transmissions([order.pk for order in orders])
+
+    results = []
+    new_transmissions = []
+    for order in orders:
+        interface = interfaces.get(order.supplier_id)
+        if interface is None:
+            results.append((order, None, f"Keine aktive Schnittstelle für Lieferant {order.supplier.name} gefunden"))
+            continue
+        transmission = open_transmissions.get((order.pk, interface.pk))
+        if transmission is None:
+            transmission = OrderTransmission(
+                order=order, interface=interface, initiated_by=user, mark_as_sent=mark_as_sent
+            )
+            open_transmissions[(order.pk, interface.pk)] = transmission
+            new_transmissions.append(transmission)
+        results.append((order, transmission, ''))
+
+    if not new_transmissions:
+        return results
+
+    # Ohne zurückgegebene Primärschlüssel: die angelegten (oder gleichzeitig angelegten) Aufträge neu lesen
+    OrderTransmission.objects.bulk_create(new_transmissions, batch_size=QUERY_CHUNK_SIZE, ignore_conflicts=True)
+    stored = _open_transmissions([transmission.order_id for transmission in new_transmissions])
+    new_ids = {id(transmission) for transmission in new_transmissions}
+    for index, (order, transmission, error) in enumerate(results):
+        if id(transmission) in new_ids:
+            transmission = stored.get((order.pk, transmission.interface_id))
+            results[index] = (order, transmission, '' if transmission else 'Bestellung wurde bereits übertragen')
+    return results
+
+
+def _open_transmissions(order_ids):
+    """Offene Aufträge der Bestellungen, blockweise gelesen, nach (Bestellung, Schnittstelle)."""
+    open_transmissions = {}
+    for start in range(0, len(order_ids), QUERY_CHUNK_SIZE):
+        for transmission in OrderTransmission.objects.filter(
+            order__in=order_ids[start:start + QUERY_CHUNK_SIZE], status__in=OPEN_STATUSES
+        ):
+            open_transmissions.setdefault((transmission.order_id, transmission.interface_id), transmission)
+    return open_transmissions
+
+
+def requeue_transmission(transmission):
+    """
+    Stellt einen unzustellbaren Auftrag mit neuem Versuchszähler erneut ein.
+
+    Returns:
+        OrderTransmission: Der Auftrag oder ein bereits offener Auftrag für Bestellung und Schnittstelle
+    """
+    open_transmission = _open_transmission(transmission.order_id, transmission.interface_id)
+    if open_transmission is not None:
+        return open_transmission
+    transmission.status = 'queued'
+    transmission.attempt_count = 0
+    transmission.available_at = timezone.now()
+    transmission.finished_at = None
+    try:
+        with transaction.atomic():
+            transmission.save(update_fields=['status', 'attempt_count', 'available_at', 'finished_at'])
+    except IntegrityError:
+        transmission.refresh_from_db()
+        return _open_transmission(transmission.order_id, transmission.interface_id) or transmission
+    return transmission
+
+
+def requeue_stale_transmissions():
+    """
+    Gibt Aufträge abgestürzter Worker an die Warteschlange zurück.
+
+    Returns:
+        int: Anzahl zurückgestellter Aufträge
+    """
+    cutoff = timezone.now() - timedelta(seconds=get_job_timeout())
+    return OrderTransmission.objects.filter(status='running', locked_at__lt=cutoff).update(
+        status='queued', locked_by='', locked_at=None
+    )
+
+
+def _running_count():
+    return Coalesce(
+        Subquery(
+            OrderTransmission.objects.filter(interface=OuterRef('interface'), status='running')
+            .order_by().values('interface').annotate(count=Count('pk')).values('count'),
+            output_field=IntegerField()
+        ),
+        Value(0)
+    )
+
+
+def _earlier_queued():
+    """Wartende Aufträge derselben Schnittstelle, die vor dem Auftrag eingestellt wurden."""
+    return Exists(OrderTransmission.objects.filter(
+        interface=OuterRef('interface'), status='queued', pk__lt=OuterRef('pk')
+    ))
+
+
+def claim_next_transmission(worker='', interface=None):
+    """
+    Holt den nächsten fälligen Auftrag, dessen Schnittstelle noch freie Kapazität hat.
+
+    Das UPDATE prüft die Anzahl laufender Aufträge der Schnittstelle selbst,
+    so dass parallele Worker das Limit nicht gemeinsam überschreiten. Pro
+    Schnittstelle kommt nur der älteste wartende Auftrag in Frage: wartet er
+    nach einem Fehlschlag auf seine Wiederholung, hält er die späteren
+    Bestellungen an denselben Lieferanten zurück.
+
+    Args:
+        interface: Nur Aufträge dieser Schnittstelle (ID oder SupplierInterface)
+
+    Returns:
+        OrderTransmission oder None, wenn kein Auftrag fällig ist
+    """
+    candidates = OrderTransmission.objects.filter(status='queued', available_at__lte=timezone.now())
+    if interface is not None:
+        candidates = candidates.filter(interface=interface)
+    candidates = candidates.exclude(_earlier_queued()).select_related('interface').order_by('available_at', 'pk')[:50]
+
+    saturated = set()
+    for candidate in candidates:
+        if candidate.interface_id in saturated:
+            continue
+        if OrderTransmission.objects.alias(running=_running_count()).filter(
+            pk=candidate.pk, status='queued', running__lt=get_concurrency_limit(candidate.interface)
+        ).exclude(_earlier_queued()).update(status='running', locked_by=worker, locked_at=timezone.now(), attempt_count=F('attempt_count') + 1):
+            return OrderTransmission.objects.select_related(
+                'order__supplier', 'interface__interface_type', 'interface__supplier', 'initiated_by'
+            ).get(pk=candidate.pk)
+        # Entweder von einem anderen Worker übernommen oder die Schnittstelle ist ausgelastet
+        saturated.add(candidate.interface_id)
+    return None
+
+
+def claim_batch(worker='', interface=None):
+    """
+    Holt den nächsten fälligen Auftrag und bei Schnittstellen mit Sammelübertragung
+    die direkt folgenden fälligen Aufträge derselben Schnittstelle (bis get_batch_size).
+
+    Args:
+        interface: Nur Aufträge dieser Schnittstelle (ID oder SupplierInterface)
+
+    Returns:
+        list: Geholte Aufträge in der Reihenfolge der Warteschlange (leer, wenn keiner fällig ist)
+    """
+    first = claim_next_transmission(worker, interface)
+    if first is None:
+        return []
+    size = get_batch_size(first.interface)
+    if size <= 1 or not supports_batch(first.interface):
+        return [first]
+
+    now = timezone.now()
+    pending = []
+    for pk, available_at in OrderTransmission.objects.filter(
+        interface=first.interface, status='queued'
+    ).order_by('pk').values_list('pk', 'available_at')[:size - 1]:
+        if available_at > now:
+            break  # Spätere Aufträge nicht an einer wartenden Wiederholung vorbeiziehen lassen
+        pending.append(pk)
+    return [first, *claim_transmissions(pending, worker, now)]
+
+
+def claim_transmissions(transmission_ids, worker='', now=None):
+    """
+    Übernimmt bestimmte wartende Aufträge unabhängig von Fälligkeit und Kapazität der Schnittstelle.
+
+    Nur für die Ergänzung einer Sammelübertragung, deren erster Auftrag die
+    Kapazität bereits über claim_next_transmission belegt hat.
+
+    Returns:
+        list: Tatsächlich übernommene Aufträge in der Reihenfolge der Warteschlange
+    """
+    now = now or timezone.now()
+    claimed = []
+    for start in range(0, len(transmission_ids), QUERY_CHUNK_SIZE):
+        chunk = transmission_ids[start:start + QUERY_CHUNK_SIZE]
+        OrderTransmission.objects.filter(pk__in=chunk, status='queued').update(
+            status='running', locked_by=worker, locked_at=now, attempt_count=F('attempt_count') + 1
+        )
+        # Von anderen Workern übernommene Aufträge bleiben außen vor
+        claimed.extend(OrderTransmission.objects.filter(
+            pk__in=chunk, status='running', locked_by=worker, locked_at=now
+        ).select_related('order__supplier', 'interface__interface_type', 'interface__supplier', 'initiated_by'))
+    return sorted(claimed, key=lambda transmission: (transmission.available_at, transmission.pk))
+
+
+def mark_order_sent(order):
+    """Setzt eine genehmigte Bestellung auf 'sent' und ergänzt den erwarteten Liefertermin."""
+    if order.status != 'approved':
+        return
+    order.status = 'sent'
+    update_fields = ['status']
+    if not order.expected_delivery:
+        # Längste Lieferzeit der bestellten Produkte bei diesem Lieferanten
+        lead_times = SupplierProduct.objects.filter(
+            supplier_id=order.supplier_id,
+            product__in=order.items.values('product')
+        ).values_list('lead_time_days', flat=True)
+        order.expected_delivery = date.today() + timedelta(
+            days=max([DEFAULT_LEAD_TIME_DAYS, *[days for days in lead_times if days]])
+        )
+        update_fields.append('expected_delivery')
+    order.save(update_fields=update_fields)
+
+
+def deliver(transmission):
+    """
+    Überträgt die Bestellung eines geholten Auftrags.
+
+    Returns:
+        bool: True bei erfolgreicher Übertragung
+    """
+    interface = transmission.interface
+    order = transmission.order
+    previous_log_id = get_last_log_id(interface)
+    try:
+        if not interface.is_active:
+            raise InterfaceError(f"Schnittstelle {interface.name} ist deaktiviert")
+        success = get_interface_service(interface).send_order(order, transmission.initiated_by)
+        error = '' if success else 'Übertragung fehlgeschlagen'
+    except Exception as e:
+        logger.warning("Übertragung %s (Bestellung %s) fehlgeschlagen: %s", transmission.pk, order.order_number, e)
+        success, error = False, str(e)
+
+    finish_transmissions([transmission], success, error, previous_log_id)
+    return success
+
+
+def deliver_batch(transmissions):
+    """
+    Überträgt mehrere geholte Aufträge derselben Schnittstelle.
+
+    Mit Sammelübertragung gehen alle Bestellungen in einer Datei bzw. einem
+    Payload hinaus und teilen sich das Ergebnis; sonst werden sie nacheinander
+    in der Reihenfolge der Warteschlange übertragen.
+
+    Returns:
+        list: Erfolg je Auftrag
+    """
+    if len(transmissions) == 1 or not supports_batch(transmissions[0].interface):
+        return [deliver(transmission) for transmission in transmissions]
+
+    interface = transmissions[0].interface
+    orders = [transmission.order for transmission in transmissions]
+    prefetch_order_items(orders)
+    previous_log_id = get_last_log_id(interface)
+    try:
+        if not interface.is_active:
+            raise InterfaceError(f"Schnittstelle {interface.name} ist deaktiviert")
+        success = get_interface_service(interface).send_orders(orders, transmissions[0].initiated_by)
+        error = '' if success else 'Übertragung fehlgeschlagen'
+    except Exception as e:
+        logger.warning("Sammelübertragung von %s Bestellungen über %s fehlgeschlagen: %s",
+                       len(orders), interface.name, e)
+        success, error = False, str(e)
+
+    finish_transmissions(transmissions, success, error, previous_log_id)
+    return [success] * len(transmissions)
+
+
+def get_last_log_id(interface):
+    return InterfaceLog.objects.filter(interface=interface).order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def finish_transmissions(transmissions, success, error, previous_log_id):
+    """Schreibt das Ergebnis eines Versuchs in die Aufträge und ihre Protokolleinträge."""
+    interface = transmissions[0].interface
+    now = timezone.now()
+    retried = []
+    for transmission in transmissions:
+        transmission.locked_at = None
+        transmission.last_error = error
+        if success:
+            transmission.status = 'sent'
+            transmission.finished_at = now
+            if transmission.mark_as_sent:
+                mark_order_sent(PurchaseOrder.objects.get(pk=transmission.order_id))
+        elif transmission.attempt_count < get_max_attempts() and interface.is_active:
+            transmission.status = 'queued'
+            transmission.available_at = now + timedelta(seconds=get_retry_delay(transmission.attempt_count))
+            retried.append(transmission.order_id)
+        else:
+            transmission.status = 'dead'
+            transmission.finished_at = now
+            logger.error("Bestellung %s nach %s Versuchen nicht zustellbar: %s",
+                         transmission.order.order_number, transmission.attempt_count, error)
+    OrderTransmission.objects.bulk_update(
+        transmissions, ['status', 'available_at', 'locked_at', 'finished_at', 'last_error']
+    )
+
+    # Der Service protokolliert jeden Versuch; Versuchszähler und Wiederholungsstatus nachtragen
+    logs = InterfaceLog.objects.filter(interface=interface, pk__gt=previous_log_id)
+    if len(transmissions) == 1:
+        attempt_count = Value(transmissions[0].attempt_count)
+    else:
+        attempt_count = Case(
+            *[When(order_id=transmission.order_id, then=Value(transmission.attempt_count))
+              for transmission in transmissions],
+            default=F('attempt_count')
+        )
+    logs.filter(order_id__in=[transmission.order_id for transmission in transmissions]).update(
+        attempt_count=attempt_count
+    )
+    if retried:
+        logs.filter(order_id__in=retried).update(status='retry')
+
+
+def work(worker, interval=5.0, once=False):
+    """
+    Worker-Schleife: Aufträge holen und übertragen, bis die Warteschlange leer ist (once) oder endlos.
+
+    Returns:
+        int: Anzahl bearbeiteter Aufträge
+    """
+    processed = 0
+    try:
+        while True:
+            requeue_stale_transmissions()
+            transmissions = claim_batch(worker)
+            if transmissions:
+                deliver_batch(transmissions)
+                processed += len(transmissions)
+                continue
+            if once:
+                return processed
+            get_connection_manager().close_idle()
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        return processed
@@ -1,28 +1,39 @@
 import os
-import json
-import csv
 import logging
 import smtplib
-import ftplib
 import requests
-import paramiko
-from io import StringIO
+from contextlib import suppress
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 from datetime import datetime
 from django.conf import settings
-from django.template import Template, Context
 from django.utils import timezone
 from django.core.mail import EmailMultiAlternatives
 from django.db import transaction
 
 from order.models import PurchaseOrder
+from .connection_pool import get_connection_manager
+from .formatting import FORMATTERS, OrderPayload, iter_template
 from .models import SupplierInterface, InterfaceLog
 
 
 logger = logging.getLogger(__name__)
 
+# Dateiendung und MIME-Typ je Bestellformat
+FORMAT_EXTENSIONS = {
+    'csv': ('csv', 'text/csv'),
+    'xml': ('xml', 'application/xml'),
+    'json': ('json', 'application/json'),
+    'pdf': ('pdf', 'application/pdf'),
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+}
+
+
+def describe_orders(orders):
+    """'Bestellung' bzw. 'n Bestellungen' für Protokollmeldungen"""
+    return "Bestellung" if len(orders) == 1 else f"{len(orders)} Bestellungen"
+
 
 class InterfaceError(Exception):
     """Basisklasse für alle Interface-bezogenen Fehler"""
@@ -68,105 +79,105 @@ class InterfaceService:
             # Continue execution even if logging fails
             return None
     
+    def order_payload(self, orders, batch=False):
+        """
+        Formatiert eine oder mehrere Bestellungen gemäß dem konfigurierten Format als Datenstrom.
+
+        Returns:
+            OrderPayload: Einmal lesbarer Strom, log_data enthält den Auszug für das Protokoll
+        """
+        if self.interface.order_format == 'xml' and self.interface.template:
+            if batch:
+                raise InterfaceError("Sammelübertragung mit eigener XML-Vorlage nicht unterstützt")
+            return OrderPayload(iter_template(self.interface, orders))
+        formatter = FORMATTERS.get(self.interface.order_format)
+        if formatter is None:
+            raise InterfaceError(f"Nicht unterstütztes Format: {self.interface.order_format}")
+        return OrderPayload(formatter(orders, batch))
+
     def format_order_data(self, order):
         """Formatiert die Bestelldaten gemäß dem konfigurierten Format"""
-        format_method = getattr(self, f"format_as_{self.interface.order_format}", None)
-        if format_method:
-            return format_method(order)
-        else:
-            raise InterfaceError(f"Nicht unterstütztes Format: {self.interface.order_format}")
-    
-    def format_as_csv(self, order):
-        """Formatiert die Bestellung als CSV"""
-        output = StringIO()
-        writer = csv.writer(output)
-        
-        # Header
-        writer.writerow([
-            'Order Number', 'Supplier', 'Order Date', 'Product SKU', 
-            'Product Name', 'Supplier SKU', 'Quantity', 'Unit Price', 'Total'
-        ])
-        
-        # Bestellpositionen
-        for item in order.items.all():
-            writer.writerow([
-                order.order_number,
-                order.supplier.name,
-                order.order_date.strftime('%Y-%m-%d'),
-                item.product.sku,
-                item.product.name,
-                item.supplier_sku,
-                item.quantity_ordered,
-                item.unit_price,
-                item.line_total
+        return self.order_payload([order]).read()
+
+    def get_file_extension(self):
+        """Dateiendung für das konfigurierte Format"""
+        return FORMAT_EXTENSIONS.get(self.interface.order_format, ('txt', 'text/plain'))[0]
+
+    def transmit(self, order_data, filename, orders):
+        """
+        Überträgt bereits formatierte Daten einer oder mehrerer Bestellungen.
+
+        Returns:
+            tuple: (Meldung für das Protokoll, Antwortdaten)
+        """
+        raise NotImplementedError("Subklassen müssen diese Methode implementieren")
+
+    def supports_batch(self):
+        """
+        Prüft, ob mehrere Bestellungen in einer Datei bzw. einem Payload übertragen werden können.
+
+        Der Lieferant muss Sammeldateien verarbeiten können, daher nur mit
+        config_json['batch_orders']. Eine eigene XML-Vorlage beschreibt genau eine Bestellung.
+        """
+        config = self.interface.config_json or {}
+        if not config.get('batch_orders'):
+            return False
+        if self.interface.order_format == 'xml' and self.interface.template:
+            return False
+        return self.interface.order_format in FORMATTERS
+
+    def send_orders(self, orders, user=None):
+        """
+        Sendet mehrere Bestellungen als eine Sammelübertragung.
+
+        Jede Bestellung erhält einen eigenen Protokolleintrag, die übertragenen Daten
+        werden nur beim ersten Eintrag gespeichert.
+        """
+        if not self.supports_batch():
+            raise InterfaceError("Schnittstelle unterstützt keine Sammelübertragung")
+        try:
+            order_data = self.order_payload(orders, batch=True)
+            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+            filename = f"orders_{orders[0].order_number}_{timestamp}.{self.get_file_extension()}"
+            message, response_data = self.transmit(order_data, filename, orders)
+        except Exception as e:
+            error_message = f"Fehler bei der Sammelübertragung von {len(orders)} Bestellungen: {str(e)}"
+            logger.error(error_message)
+            self.log_batch(
+                orders, 'failed', error_message,
+                request_data=order_data.log_data if 'order_data' in locals() else "",
+                user=user
+            )
+            raise InterfaceError(error_message)
+
+        self.log_batch(
+            orders, 'success', message, request_data=order_data.log_data, response_data=response_data, user=user
+        )
+        return True
+
+    def format_orders_data(self, orders):
+        """Formatiert mehrere Bestellungen als Sammeldatei"""
+        return self.order_payload(orders, batch=True).read()
+
+    def log_batch(self, orders, status, message, request_data="", response_data="", user=None):
+        """Protokolliert eine Sammelübertragung mit einem Eintrag je Bestellung"""
+        try:
+            InterfaceLog.objects.bulk_create([
+                InterfaceLog(
+                    interface=self.interface,
+                    order=order,
+                    status=status,
+                    message=message,
+                    request_data=request_data if index == 0 else "",
+                    response_data=response_data if index == 0 else "",
+                    initiated_by=user
+                )
+                for index, order in enumerate(orders)
             ])
-        
-        return output.getvalue()
-    
-    def format_as_xml(self, order):
-        """Formatiert die Bestellung als XML"""
-        # Wenn eine benutzerdefinierte Vorlage existiert, diese verwenden
-        if self.interface.template:
-            template = Template(self.interface.template)
-            context = Context({
-                'order': order,
-                'supplier': self.supplier,
-                'items': order.items.all(),
-            })
-            return template.render(context)
-        
-        # Ansonsten Standard-XML-Format erstellen
-        xml = '<?xml version="1.0" encoding="UTF-8"?>\n'
-        xml += '<Order>\n'
-        xml += f'  <OrderNumber>{order.order_number}</OrderNumber>\n'
-        xml += f'  <OrderDate>{order.order_date.strftime("%Y-%m-%d")}</OrderDate>\n'
-        xml += f'  <Supplier>{order.supplier.name}</Supplier>\n'
-        xml += '  <Items>\n'
-        
-        for item in order.items.all():
-            xml += '    <Item>\n'
-            xml += f'      <ProductSKU>{item.product.sku}</ProductSKU>\n'
-            xml += f'      <ProductName>{item.product.name}</ProductName>\n'
-            xml += f'      <SupplierSKU>{item.supplier_sku}</SupplierSKU>\n'
-            xml += f'      <Quantity>{item.quantity_ordered}</Quantity>\n'
-            xml += f'      <UnitPrice>{item.unit_price}</UnitPrice>\n'
-            xml += f'      <Total>{item.line_total}</Total>\n'
-            xml += '    </Item>\n'
-        
-        xml += '  </Items>\n'
-        xml += f'  <Subtotal>{order.subtotal}</Subtotal>\n'
-        xml += f'  <Tax>{order.tax}</Tax>\n'
-        xml += f'  <ShippingCost>{order.shipping_cost}</ShippingCost>\n'
-        xml += f'  <Total>{order.total}</Total>\n'
-        xml += '</Order>'
-        
-        return xml
-    
-    def format_as_json(self, order):
-        """Formatiert die Bestellung als JSON"""
-        data = {
-            'order_number': order.order_number,
-            'order_date': order.order_date.strftime('%Y-%m-%d'),
-            'supplier': order.supplier.name,
-            'items': []
-        }
-        
-        for item in order.items.all():
-            data['items'].append({
-                'product_sku': item.product.sku,
-                'product_name': item.product.name,
-                'supplier_sku': item.supplier_sku,
-                'quantity': float(item.quantity_ordered),
-                'unit_price': float(item.unit_price),
-                'total': float(item.line_total)
-            })
-        
-        data['subtotal'] = float(order.subtotal)
-        data['tax'] = float(order.tax)
-        data['shipping_cost'] = float(order.shipping_cost)
-        data['total'] = float(order.total)
-        
-        return json.dumps(data, indent=2)
+            self.interface.last_used = timezone.now()
+            self.interface.save(update_fields=['last_used'])
+        except Exception as e:
+            logger.error(f"Failed to create transmission logs: {str(e)}")
 
 
 class EmailInterfaceService(InterfaceService):
@@ -176,66 +187,17 @@ class EmailInterfaceService(InterfaceService):
         """Sendet eine Bestellung per E-Mail"""
         try:
             # Formatieren der Bestelldaten
-            order_data = self.format_order_data(order)
-            
-            # E-Mail-Betreff erstellen
-            subject = self.interface.email_subject_template or f"Bestellung {order.order_number}"
-            subject = subject.replace("{order_number}", order.order_number)
-            
-            # Empfänger festlegen
-            to_emails = [email.strip() for email in self.interface.email_to.split(",") if email.strip()]
-            if not to_emails:
-                raise InterfaceError("Keine E-Mail-Empfänger konfiguriert")
-            
-            # CC-Empfänger festlegen
-            cc_emails = [email.strip() for email in self.interface.email_cc.split(",") if email.strip()]
-            
-            # Nachrichtentext erstellen
-            text_content = f"""
-            Sehr geehrte Damen und Herren,
+            order_data = self.order_payload([order])
             
-            anbei erhalten Sie unsere Bestellung mit der Nummer {order.order_number}.
-            
-            Mit freundlichen Grüßen
-            Ihr Team von {settings.COMPANY_NAME if hasattr(settings, 'COMPANY_NAME') else 'InventoryPulse'}
-            """
-            
-            # E-Mail erstellen
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=text_content,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=to_emails,
-                cc=cc_emails
-            )
-            
-            # Bestimme den Dateinamen und MIME-Typ basierend auf dem Format
-            format_to_extension = {
-                'csv': ('csv', 'text/csv'),
-                'xml': ('xml', 'application/xml'),
-                'json': ('json', 'application/json'),
-                'pdf': ('pdf', 'application/pdf'),
-                'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            }
-            
-            ext, mime_type = format_to_extension.get(
-                self.interface.order_format, ('txt', 'text/plain')
-            )
-            
-            # Anhang hinzufügen
-            attachment = MIMEApplication(order_data.encode('utf-8'))
-            attachment['Content-Disposition'] = f'attachment; filename="order_{order.order_number}.{ext}"'
-            email.attach(attachment)
-            
-            # E-Mail senden
-            email.send()
+            filename = f"order_{order.order_number}.{self.get_file_extension()}"
+            message, _ = self.transmit(order_data, filename, [order])
             
             # Erfolgreich protokollieren
             self.log_transmission(
                 order=order,
                 status='success',
-                message="Bestellung erfolgreich per E-Mail gesendet",
-                request_data=order_data,
+                message=message,
+                request_data=order_data.log_data,
                 user=user
             )
             
@@ -250,12 +212,62 @@ class EmailInterfaceService(InterfaceService):
                 order=order,
                 status='failed',
                 message=error_message,
-                request_data=order_data if 'order_data' in locals() else "",
+                request_data=order_data.log_data if 'order_data' in locals() else "",
                 user=user
             )
             
             raise InterfaceError(error_message)
 
+    def transmit(self, order_data, filename, orders):
+        """Versendet die Bestelldaten als Anhang einer E-Mail"""
+        order_numbers = ', '.join(order.order_number for order in orders)
+        
+        # E-Mail-Betreff erstellen
+        default_subject = f"Bestellung {order_numbers}" if len(orders) == 1 else f"Bestellungen {order_numbers}"
+        subject = self.interface.email_subject_template or default_subject
+        subject = subject.replace("{order_number}", order_numbers)
+        
+        # Empfänger festlegen
+        to_emails = [email.strip() for email in self.interface.email_to.split(",") if email.strip()]
+        if not to_emails:
+            raise InterfaceError("Keine E-Mail-Empfänger konfiguriert")
+        
+        # CC-Empfänger festlegen
+        cc_emails = [email.strip() for email in self.interface.email_cc.split(",") if email.strip()]
+        
+        # Nachrichtentext erstellen
+        if len(orders) == 1:
+            reference = f"unsere Bestellung mit der Nummer {order_numbers}"
+        else:
+            reference = f"unsere Bestellungen mit den Nummern {order_numbers}"
+        text_content = f"""
+            Sehr geehrte Damen und Herren,
+            
+            anbei erhalten Sie {reference}.
+            
+            Mit freundlichen Grüßen
+            Ihr Team von {settings.COMPANY_NAME if hasattr(settings, 'COMPANY_NAME') else 'InventoryPulse'}
+            """
+        
+        # E-Mail erstellen
+        email = EmailMultiAlternatives(
+            subject=subject,
+            body=text_content,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=to_emails,
+            cc=cc_emails
+        )
+        
+        # Anhang hinzufügen
+        attachment = MIMEApplication(order_data.read().encode('utf-8'))
+        attachment['Content-Disposition'] = f'attachment; filename="{filename}"'
+        email.attach(attachment)
+        
+        # E-Mail senden
+        email.send()
+        
+        return f"{describe_orders(orders)} erfolgreich per E-Mail gesendet", ""
+
 
 class APIInterfaceService(InterfaceService):
     """Service für API-Schnittstellen"""
@@ -263,62 +275,18 @@ class APIInterfaceService(InterfaceService):
     def send_order(self, order, user=None):
         """Sendet eine Bestellung über eine API"""
         try:
-            # URL überprüfen
-            if not self.interface.api_url:
-                raise InterfaceError("Keine API-URL konfiguriert")
-            
             # Formatieren der Bestelldaten
-            order_data = self.format_order_data(order)
-            
-            # Headers vorbereiten
-            headers = {'Content-Type': 'application/json'}
+            order_data = self.order_payload([order])
             
-            # API-Key hinzufügen, falls vorhanden
-            if self.interface.api_key:
-                headers['Authorization'] = f"Bearer {self.interface.api_key}"
-            
-            # Basic Auth hinzufügen, falls Benutzername und Passwort vorhanden
-            auth = None
-            if self.interface.username and self.interface.password:
-                auth = (self.interface.username, self.interface.password)
-            
-            # Zusätzliche Konfiguration aus JSON laden
-            config = self.interface.config_json or {}
-            
-            # Methode ermitteln (Standard: POST)
-            method = config.get('http_method', 'POST').upper()
-            
-            # Endpunkt aufrufen
-            response = None
-            if method == 'POST':
-                response = requests.post(
-                    self.interface.api_url,
-                    data=order_data,
-                    headers=headers,
-                    auth=auth,
-                    timeout=30
-                )
-            elif method == 'PUT':
-                response = requests.put(
-                    self.interface.api_url,
-                    data=order_data,
-                    headers=headers,
-                    auth=auth,
-                    timeout=30
-                )
-            else:
-                raise InterfaceError(f"Nicht unterstützte HTTP-Methode: {method}")
-            
-            # Antwort überprüfen
-            response.raise_for_status()
+            message, response_data = self.transmit(order_data, None, [order])
             
             # Erfolgreich protokollieren
             self.log_transmission(
                 order=order,
                 status='success',
-                message=f"Bestellung erfolgreich über API gesendet. Status: {response.status_code}",
-                request_data=order_data,
-                response_data=response.text,
+                message=message,
+                request_data=order_data.log_data,
+                response_data=response_data,
                 user=user
             )
             
@@ -333,7 +301,7 @@ class APIInterfaceService(InterfaceService):
                 order=order,
                 status='failed',
                 message=error_message,
-                request_data=order_data if 'order_data' in locals() else "",
+                request_data=order_data.log_data if 'order_data' in locals() else "",
                 response_data=response_text,
                 user=user
             )
@@ -350,13 +318,61 @@ class APIInterfaceService(InterfaceService):
                 order=order,
                 status='failed',
                 message=error_message,
-                request_data=order_data if 'order_data' in locals() else "",
+                request_data=order_data.log_data if 'order_data' in locals() else "",
                 user=user
             )
             
             raise InterfaceError(error_message)
 
 
+    def transmit(self, order_data, filename, orders):
+        """Sendet die Bestelldaten an den API-Endpunkt der Schnittstelle"""
+        # URL überprüfen
+        if not self.interface.api_url:
+            raise InterfaceError("Keine API-URL konfiguriert")
+        
+        # Headers vorbereiten
+        headers = {'Content-Type': 'application/json'}
+        
+        # API-Key hinzufügen, falls vorhanden
+        if self.interface.api_key:
+            headers['Authorization'] = f"Bearer {self.interface.api_key}"
+        
+        # Basic Auth hinzufügen, falls Benutzername und Passwort vorhanden
+        auth = None
+        if self.interface.username and self.interface.password:
+            auth = (self.interface.username, self.interface.password)
+        
+        # Zusätzliche Konfiguration aus JSON laden
+        config = self.interface.config_json or {}
+        
+        # Methode ermitteln (Standard: POST)
+        method = config.get('http_method', 'POST').upper()
+        
+        # Endpunkt über die wiederverwendete Session der Schnittstelle aufrufen (Keep-Alive)
+        if method not in ('POST', 'PUT'):
+            raise InterfaceError(f"Nicht unterstützte HTTP-Methode: {method}")
+        session = get_connection_manager().http_session(self.interface)
+        if config.get('chunked_upload'):
+            # Große Bestellungen ohne Zwischenspeicher senden (Transfer-Encoding: chunked)
+            body = order_data.iter_bytes()
+        else:
+            body = b''.join(order_data.iter_bytes())
+        response = session.request(
+            method,
+            self.interface.api_url,
+            data=body,
+            headers=headers,
+            auth=auth,
+            timeout=30
+        )
+        
+        # Antwort überprüfen
+        response.raise_for_status()
+        
+        return f"{describe_orders(orders)} erfolgreich über API gesendet. Status: {response.status_code}", response.text
+
+
 class FTPInterfaceService(InterfaceService):
     """Service für FTP-Schnittstellen"""
 
@@ -382,57 +398,21 @@ class FTPInterfaceService(InterfaceService):
                     f"Bestellung {order.order_number} wurde bereits erfolgreich über diese Schnittstelle gesendet.")
                 # Alternatively: return True  # Consider it a success since it already exists
 
-            # Host überprüfen
-            if not self.interface.host:
-                raise InterfaceError("Kein FTP-Host konfiguriert")
-
             # Formatieren der Bestelldaten
-            order_data = self.format_order_data(order)
-
-            # Bestimme Dateiendung basierend auf dem Format
-            format_to_extension = {
-                'csv': 'csv',
-                'xml': 'xml',
-                'json': 'json',
-                'pdf': 'pdf',
-                'excel': 'xlsx'
-            }
-            ext = format_to_extension.get(self.interface.order_format, 'txt')
+            order_data = self.order_payload([order])
 
             # Dateiname erstellen
             timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            remote_filename = f"order_{order.order_number}_{timestamp}.{ext}"
-
-            # Remote-Pfad festlegen
-            remote_path = self.interface.remote_path or '/'
-            remote_path = remote_path.rstrip('/') + '/'
-            full_remote_path = remote_path + remote_filename
+            remote_filename = f"order_{order.order_number}_{timestamp}.{self.get_file_extension()}"
 
-            # Port festlegen (Standard: 21)
-            port = self.interface.port or 21
-
-            # FTP-Verbindung herstellen
-            ftp = ftplib.FTP()
-            ftp.timeout = 30  # Increase timeout to 30 seconds
-            ftp.connect(self.interface.host, port)
-            ftp.login(self.interface.username, self.interface.password)
-            ftp.set_pasv(True)  # Use passive mode which works better with firewalls
-
-            # Properly encode and prepare the data
-            from io import BytesIO
-            file_data = order_data.encode('utf-8')
-            data_stream = BytesIO(file_data)
-
-            # Datei hochladen
-            ftp.storbinary(f'STOR {remote_filename}', data_stream)
-            ftp.quit()
+            message, _ = self.transmit(order_data, remote_filename, [order])
 
             # Erfolgreich protokollieren
             self.log_transmission(
                 order=order,
                 status='success',
-                message=f"Bestellung erfolgreich per FTP gesendet. Datei: {full_remote_path}",
-                request_data=order_data,
+                message=message,
+                request_data=order_data.log_data,
                 user=user
             )
 
@@ -447,67 +427,62 @@ class FTPInterfaceService(InterfaceService):
                 order=order,
                 status='failed',
                 message=error_message,
-                request_data=order_data if 'order_data' in locals() else "",
+                request_data=order_data.log_data if 'order_data' in locals() else "",
                 user=user
             )
 
             raise InterfaceError(error_message)
 
 
+    def transmit(self, order_data, filename, orders):
+        """Lädt die Bestelldaten als Datei auf den FTP-Server hoch"""
+        # Host überprüfen
+        if not self.interface.host:
+            raise InterfaceError("Kein FTP-Host konfiguriert")
+
+        # Remote-Pfad festlegen
+        remote_path = self.interface.remote_path or '/'
+        remote_path = remote_path.rstrip('/') + '/'
+        full_remote_path = remote_path + filename
+
+        # Ohne Remote-Pfad ins Login-Verzeichnis hochladen; gepoolte Verbindungen wechseln
+        # das Verzeichnis nie, daher wird der Zielpfad vollständig angegeben
+        target = full_remote_path if self.interface.remote_path else filename
+
+        # Datei über eine angemeldete Verbindung aus dem Pool hochladen
+        with get_connection_manager().ftp(self.interface) as ftp:
+            try:
+                ftp.storbinary(f'STOR {target}', order_data.as_file())
+            except Exception:
+                # Abgebrochene Übertragung: keine unvollständige Datei beim Lieferanten liegen lassen
+                with suppress(Exception):
+                    ftp.delete(target)
+                raise
+
+        return f"{describe_orders(orders)} erfolgreich per FTP gesendet. Datei: {target}", ""
+
+
 class SFTPInterfaceService(InterfaceService):
     """Service für SFTP-Schnittstellen"""
     
     def send_order(self, order, user=None):
         """Sendet eine Bestellung über SFTP"""
         try:
-            # Host überprüfen
-            if not self.interface.host:
-                raise InterfaceError("Kein SFTP-Host konfiguriert")
-            
             # Formatieren der Bestelldaten
-            order_data = self.format_order_data(order)
-            
-            # Bestimme Dateiendung basierend auf dem Format
-            format_to_extension = {
-                'csv': 'csv',
-                'xml': 'xml',
-                'json': 'json',
-                'pdf': 'pdf',
-                'excel': 'xlsx'
-            }
-            ext = format_to_extension.get(self.interface.order_format, 'txt')
+            order_data = self.order_payload([order])
             
             # Dateiname erstellen
             timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            remote_filename = f"order_{order.order_number}_{timestamp}.{ext}"
-            
-            # Remote-Pfad festlegen
-            remote_path = self.interface.remote_path or '/'
-            remote_path = remote_path.rstrip('/') + '/'
-            full_remote_path = remote_path + remote_filename
-            
-            # Port festlegen (Standard: 22)
-            port = self.interface.port or 22
-            
-            # SFTP-Verbindung herstellen
-            transport = paramiko.Transport((self.interface.host, port))
-            transport.connect(username=self.interface.username, password=self.interface.password)
+            remote_filename = f"order_{order.order_number}_{timestamp}.{self.get_file_extension()}"
             
-            sftp = paramiko.SFTPClient.from_transport(transport)
-            
-            # Temporäre Datei erstellen
-            with StringIO(order_data) as file_obj:
-                sftp.putfo(file_obj, full_remote_path)
-            
-            sftp.close()
-            transport.close()
+            message, _ = self.transmit(order_data, remote_filename, [order])
             
             # Erfolgreich protokollieren
             self.log_transmission(
                 order=order,
                 status='success',
-                message=f"Bestellung erfolgreich per SFTP gesendet. Datei: {full_remote_path}",
-                request_data=order_data,
+                message=message,
+                request_data=order_data.log_data,
                 user=user
             )
             
@@ -522,13 +497,36 @@ class SFTPInterfaceService(InterfaceService):
                 order=order,
                 status='failed',
                 message=error_message,
-                request_data=order_data if 'order_data' in locals() else "",
+                request_data=order_data.log_data if 'order_data' in locals() else "",
                 user=user
             )
             
             raise InterfaceError(error_message)
 
 
+    def transmit(self, order_data, filename, orders):
+        """Lädt die Bestelldaten als Datei auf den SFTP-Server hoch"""
+        # Host überprüfen
+        if not self.interface.host:
+            raise InterfaceError("Kein SFTP-Host konfiguriert")
+        
+        # Remote-Pfad festlegen
+        remote_path = self.interface.remote_path or '/'
+        remote_path = remote_path.rstrip('/') + '/'
+        full_remote_path = remote_path + filename
+        
+        # Datei über einen offenen SFTP-Kanal aus dem Pool hochladen
+        with get_connection_manager().sftp(self.interface) as connection:
+            try:
+                connection.sftp.putfo(order_data.as_file(), full_remote_path)
+            except Exception:
+                # Abgebrochene Übertragung: keine unvollständige Datei beim Lieferanten liegen lassen
+                with suppress(Exception):
+                    connection.sftp.remove(full_remote_path)
+                raise
+        
+        return f"{describe_orders(orders)} erfolgreich per SFTP gesendet. Datei: {full_remote_path}", ""
+
 def get_interface_service(interface):
     """Factory-Methode für Interface-Services"""
     interface_type_code = interface.interface_type.code.lower()
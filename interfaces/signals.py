@@ -20,7 +20,7 @@ def handle_order_status_change(sender, instance, created, **kwargs):
 
     # Prüfen, ob die Bestellung gerade in den Status "approved" gewechselt ist
     if instance.status == 'approved' and instance.tracker.has_changed('status') and instance.tracker.previous('status') == 'pending':
-        # In einem neuen Thread ausführen, um die Transaktion nicht zu blockieren
+        # Erst nach dem Commit einreihen, damit der Worker die genehmigte Bestellung sieht
         transaction.on_commit(lambda: check_auto_send_order(instance))
 
 
@@ -42,19 +42,10 @@ def check_auto_send_order(order):
             ).first()
             
             if interface:
-                from .services import send_order_via_interface
-                try:
-                    # Bestellung senden
-                    send_order_via_interface(order.id, interface.id)
-                    
-                    # Bestellung als gesendet markieren
-                    order.status = 'sent'
-                    order.save(update_fields=['status'])
-                except Exception as e:
-                    # Fehler beim Senden protokollieren
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.error(f"Fehler beim automatischen Senden der Bestellung {order.order_number}: {str(e)}")
+                from .outbox import enqueue_order
+                # Nur in den Postausgang stellen; der Übertragungs-Worker sendet die Bestellung
+                # und markiert sie danach als gesendet
+                enqueue_order(order, interface)
     
     except (WorkflowSettings.DoesNotExist, ObjectDoesNotExist, Exception) as e:
         # Fehler beim Abrufen der Einstellungen protokollieren
@@ -1,3 +1,595 @@
-from django.test import TestCase
+import io
+import json
+import os
+import posixpath
+import socket
+import socketserver
+import stat
+from decimal import Decimal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import paramiko
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from admin_dashboard.models import WorkflowSettings
+from core.models import Product, Tax
+from order.models import OrderSplit, PurchaseOrder, PurchaseOrderItem
+from suppliers.models import Supplier
+
+from .models import InboundFile, InterfaceLog, InterfaceType, OrderTransmission, SupplierInterface
+from .connection_pool import get_connection_manager
+from .dispatch import dispatch_orders
+from .formatting import get_compiled_template
+from .inbound import RECORD_CHUNK_SIZE, poll_interfaces, process_file
+from .outbox import (
+    claim_next_transmission, deliver, enqueue_order, enqueue_orders, requeue_transmission, work
+)
+from .services import get_interface_service
+
+
+@override_settings(INTERFACE_OUTBOX_RETRY_DELAY=0, INTERFACE_OUTBOX_MAX_ATTEMPTS=2)
+class OrderOutboxTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('einkauf')
+        self.supplier = Supplier.objects.create(name='Schrauben GmbH')
+        self.email = SupplierInterface.objects.create(
+            supplier=self.supplier, name='E-Mail', is_default=True, email_to='bestellung@example.com',
+            interface_type=InterfaceType.objects.create(name='E-Mail', code='email')
+        )
+        self.api = SupplierInterface.objects.create(
+            supplier=self.supplier, name='API', interface_type=InterfaceType.objects.create(name='API', code='api')
+        )
+
+    def create_order(self, number, status='approved'):
+        return PurchaseOrder.objects.create(order_number=number, supplier=self.supplier, created_by=self.user,
+                                            status=status)
+
+    def test_approval_only_enqueues_the_transmission(self):
+        WorkflowSettings.objects.create(send_order_emails=True)
+        order = self.create_order('ORD-001', status='pending')
+
+        order.status = 'approved'
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+
+        transmission = OrderTransmission.objects.get(order=order)
+        self.assertEqual((transmission.interface, transmission.status), (self.email, 'queued'))
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(work('test', once=True), 1)
+        transmission.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual((transmission.status, transmission.attempt_count), ('sent', 1))
+        self.assertEqual(order.status, 'sent')
+        self.assertIsNotNone(order.expected_delivery)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_transmissions_are_retried_and_dead_lettered(self):
+        order = self.create_order('ORD-002')
+        transmission = enqueue_order(order, self.api)
+        self.assertEqual(enqueue_order(order, self.api), transmission)
+
+        self.assertFalse(deliver(claim_next_transmission('test')))
+        transmission.refresh_from_db()
+        self.assertEqual((transmission.status, transmission.attempt_count), ('queued', 1))
+        self.assertEqual(InterfaceLog.objects.get(order=order).status, 'retry')
+
+        self.assertFalse(deliver(claim_next_transmission('test')))
+        transmission.refresh_from_db()
+        self.assertEqual((transmission.status, transmission.attempt_count), ('dead', 2))
+        self.assertIn('Keine API-URL', transmission.last_error)
+        self.assertEqual(
+            list(InterfaceLog.objects.filter(order=order).order_by('-pk').values_list('status', 'attempt_count')),
+            [('failed', 2), ('retry', 1)]
+        )
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'approved')
+
+    def test_concurrency_is_limited_per_interface(self):
+        first = enqueue_order(self.create_order('ORD-003'))
+        enqueue_order(self.create_order('ORD-004'))
+        other = enqueue_order(self.create_order('ORD-005'), self.api)
+
+        self.assertEqual(claim_next_transmission('a'), first)
+        # The second e-mail order waits until the first one is finished
+        self.assertEqual(claim_next_transmission('b'), other)
+        self.assertIsNone(claim_next_transmission('c'))
+
+        self.email.config_json = {'max_concurrent_transmissions': 2}
+        self.email.save()
+        self.assertEqual(claim_next_transmission('c').order.order_number, 'ORD-004')
+
+    @override_settings(INTERFACE_OUTBOX_RETRY_DELAY=3600)
+    def test_waiting_retry_holds_back_later_orders_of_the_interface(self):
+        first = enqueue_order(self.create_order('ORD-006'), self.api)
+        self.assertFalse(deliver(claim_next_transmission('test')))
+        later = enqueue_order(self.create_order('ORD-007'), self.api)
+        other = enqueue_order(self.create_order('ORD-008'))
+
+        # Die spätere Bestellung überholt die wartende Wiederholung nicht
+        self.assertEqual(claim_next_transmission('test'), other)
+        self.assertIsNone(claim_next_transmission('test'))
+
+        OrderTransmission.objects.filter(pk=first.pk).update(available_at=timezone.now())
+        self.assertEqual(claim_next_transmission('test'), first)
+        later.refresh_from_db()
+        self.assertEqual(later.status, 'queued')
+
+
+    def test_only_one_open_transmission_per_order_and_interface(self):
+        order = self.create_order('ORD-009')
+        transmission = enqueue_order(order, self.api)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            OrderTransmission.objects.create(order=order, interface=self.api)
+
+        # Gleichzeitige Anfrage: die Prüfung auf offene Aufträge findet noch nichts, create schlägt fehl
+        with mock.patch('interfaces.outbox._open_transmission', side_effect=[None, transmission]):
+            self.assertEqual(enqueue_order(order, self.api), transmission)
+
+        # Ein unzustellbarer Auftrag wird nicht neben einem offenen erneut eingestellt
+        OrderTransmission.objects.filter(pk=transmission.pk).update(status='dead')
+        retry = enqueue_order(order, self.api)
+        transmission.refresh_from_db()
+        self.assertEqual(requeue_transmission(transmission), retry)
+        self.assertEqual(OrderTransmission.objects.filter(order=order, status='queued').count(), 1)
+
+        first, second = enqueue_orders([self.create_order('ORD-010'), order])
+        self.assertIsNotNone(first[1].pk)
+        self.assertEqual(second[1].interface, self.email)
+        self.assertEqual(OrderTransmission.objects.filter(status='queued').count(), 3)
+
+@override_settings(INTERFACE_OUTBOX_RETRY_DELAY=0)
+class OrderDispatchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('einkauf')
+        self.supplier = Supplier.objects.create(name='Schrauben GmbH')
+        self.email = SupplierInterface.objects.create(
+            supplier=self.supplier, name='E-Mail', is_default=True, email_to='bestellung@example.com',
+            order_format='csv', config_json={'batch_orders': True},
+            interface_type=InterfaceType.objects.create(name='E-Mail', code='email')
+        )
+
+    def create_orders(self, supplier, count, prefix):
+        return [
+            PurchaseOrder.objects.create(order_number=f'{prefix}-{index}', supplier=supplier, created_by=self.user,
+                                         status='approved')
+            for index in range(count)
+        ]
+
+    def test_orders_are_grouped_per_interface_with_a_report(self):
+        broken = Supplier.objects.create(name='Muttern AG')
+        SupplierInterface.objects.create(
+            supplier=broken, name='API', is_default=True,
+            interface_type=InterfaceType.objects.create(name='API', code='api')
+        )
+        orders = [*self.create_orders(self.supplier, 3, 'ORD'), *self.create_orders(broken, 1, 'MUT'),
+                  *self.create_orders(Supplier.objects.create(name='Ohne Schnittstelle'), 1, 'OHNE')]
+
+        report = dispatch_orders(orders, self.user, workers=1)
+
+        self.assertEqual([(row['order'].order_number, row['status']) for row in report], [
+            ('ORD-0', 'sent'), ('ORD-1', 'sent'), ('ORD-2', 'sent'), ('MUT-0', 'queued'), ('OHNE-0', 'failed')
+        ])
+        self.assertIn('Keine API-URL', report[3]['message'])
+        self.assertIn('Keine aktive Schnittstelle', report[4]['message'])
+        # Eine Sammel-E-Mail für alle Bestellungen des Lieferanten, ein Protokolleintrag je Bestellung
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, 'Bestellungen ORD-0, ORD-1, ORD-2')
+        self.assertEqual(InterfaceLog.objects.filter(interface=self.email, status='success').count(), 3)
+        self.assertEqual(PurchaseOrder.objects.filter(status='sent').count(), 3)
+
+    def test_worker_claims_batches_per_interface(self):
+        self.email.config_json = {'batch_orders': True, 'max_batch_size': 2}
+        self.email.save()
+        for order in self.create_orders(self.supplier, 3, 'ORD'):
+            enqueue_order(order)
+
+        self.assertEqual(work('test', once=True), 3)
+        self.assertEqual([message.subject for message in mail.outbox],
+                         ['Bestellungen ORD-0, ORD-1', 'Bestellung ORD-2'])
+        self.assertFalse(OrderTransmission.objects.exclude(status='sent').exists())
+
+    def test_dispatch_respects_a_running_worker(self):
+        first, *later = self.create_orders(self.supplier, 3, 'ORD')
+        transmission = enqueue_order(first)
+        self.assertEqual(claim_next_transmission('worker'), transmission)
+
+        # Die Schnittstelle ist durch den Worker belegt: nichts wird parallel gesendet
+        report = dispatch_orders(later, self.user, workers=1)
+        self.assertEqual([row['status'] for row in report], ['queued', 'queued'])
+        self.assertEqual(len(mail.outbox), 0)
+
+        OrderTransmission.objects.filter(order=first).update(status='sent')
+        report = dispatch_orders(later, self.user, workers=1)
+        self.assertEqual([row['status'] for row in report], ['sent', 'sent'])
+        self.assertEqual(mail.outbox[0].subject, 'Bestellungen ORD-1, ORD-2')
+
+
+class OrderFormattingTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('einkauf')
+        self.supplier = Supplier.objects.create(name='Schrauben & Muttern GmbH')
+        self.interface = SupplierInterface.objects.create(
+            supplier=self.supplier, name='E-Mail', email_to='bestellung@example.com', order_format='json',
+            interface_type=InterfaceType.objects.create(name='E-Mail', code='email')
+        )
+        tax = Tax.objects.create(name='MwSt', code='MWST19', rate=Decimal('19.00'))
+        self.order = PurchaseOrder.objects.create(order_number='ORD-1', supplier=self.supplier, created_by=user)
+        self.empty = PurchaseOrder.objects.create(order_number='ORD-2', supplier=self.supplier, created_by=user)
+        for index in range(3):
+            PurchaseOrderItem.objects.create(
+                purchase_order=self.order, product=Product.objects.create(name=f'Schraube {index}', sku=f'S-{index}'),
+                quantity_ordered=Decimal(index + 1), unit_price=Decimal('2.50'), tax=tax
+            )
+
+    def fresh(self, order):
+        return PurchaseOrder.objects.select_related('supplier').get(pk=order.pk)
+
+    def test_streamed_json_matches_json_dumps_with_one_query(self):
+        service = get_interface_service(self.interface)
+        order = self.fresh(self.order)
+        with self.assertNumQueries(1):
+            data = service.format_order_data(order)
+        self.assertEqual(data, json.dumps(json.loads(data), indent=2))
+        self.assertEqual([item['quantity'] for item in json.loads(data)['items']], [1.0, 2.0, 3.0])
+        self.assertEqual(json.loads(data)['items'][0]['total'], 2.975)
+
+        batch = service.format_orders_data([self.fresh(self.order), self.fresh(self.empty)])
+        self.assertEqual(batch, json.dumps(json.loads(batch), indent=2))
+        self.assertEqual([order['order_number'] for order in json.loads(batch)['orders']], ['ORD-1', 'ORD-2'])
+
+    def test_xml_is_escaped_and_templates_are_compiled_once(self):
+        self.interface.order_format = 'xml'
+        self.assertIn('<Supplier>Schrauben &amp; Muttern GmbH</Supplier>',
+                      get_interface_service(self.interface).format_order_data(self.fresh(self.order)))
+
+        self.interface.template = '{% for item in items %}{{ item.product.sku }};{% endfor %}'
+        self.interface.save()
+        template = get_compiled_template(self.interface)
+        self.assertIs(get_compiled_template(self.interface), template)
+        self.assertEqual(get_interface_service(self.interface).format_order_data(self.fresh(self.order)),
+                         'S-0;S-1;S-2;')
+
+        self.interface.template = '{{ order.order_number }}'
+        self.interface.save()
+        self.assertIsNot(get_compiled_template(self.interface), template)
+
+    @override_settings(INTERFACE_LOG_REQUEST_DATA_LIMIT=50)
+    def test_log_keeps_an_excerpt_of_large_payloads(self):
+        self.interface.order_format = 'csv'
+        self.assertTrue(get_interface_service(self.interface).send_order(self.fresh(self.order)))
+
+        self.assertIn('S-2', mail.outbox[0].attachments[0].get_payload(decode=True).decode())
+        request_data = InterfaceLog.objects.get(order=self.order).request_data
+        self.assertTrue(request_data.startswith('Order Number,Supplier'))
+        self.assertIn('(gekürzt,', request_data)
+
+
+class StandInHTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-Alive
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        self.server.requests.append(self.rfile.read(int(self.headers['Content-Length'])))
+        self.send_response(201)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInFTPHandler(socketserver.StreamRequestHandler):
+    """Minimaler FTP-Server: Login, passiver Modus, STOR, RETR, MLSD, NOOP und QUIT."""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 Bereit')
+        listener = None
+        for line in self.rfile:
+            command, _, argument = line.decode().strip().partition(' ')
+            command = command.upper()
+            if command == 'USER':
+                self.reply('331 Passwort erforderlich')
+            elif command == 'PASS':
+                self.server.logins += 1
+                self.reply('230 Angemeldet')
+            elif command in ('TYPE', 'NOOP', 'OPTS'):
+                self.reply('200 OK')
+            elif command == 'PASV':
+                listener = socket.create_server(('127.0.0.1', 0))
+                port = listener.getsockname()[1]
+                self.reply(f'227 Entering Passive Mode (127,0,0,1,{port >> 8},{port & 255})')
+            elif command == 'STOR':
+                self.reply('150 Bereit zum Empfang')
+                data_connection, _ = listener.accept()
+                with data_connection, listener:
+                    self.server.files[argument] = data_connection.makefile('rb').read()
+                self.reply('226 Übertragung abgeschlossen')
+                if self.server.drop_after_store:
+                    return
+            elif command in ('RETR', 'MLSD'):
+                self.reply('150 Sende Daten')
+                if command == 'RETR':
+                    data = self.server.files[argument]
+                else:
+                    data = ''.join(
+                        f"type=file;size={len(content)};modify={self.server.mtimes.get(path, '20260101000000')}; "
+                        f"{posixpath.basename(path)}\r\n"
+                        for path, content in self.server.files.items() if posixpath.dirname(path) == argument
+                    ).encode()
+                data_connection, _ = listener.accept()
+                with data_connection, listener:
+                    data_connection.sendall(data)
+                self.reply('226 Übertragung abgeschlossen')
+            elif command == 'QUIT':
+                self.reply('221 Auf Wiedersehen')
+                return
+            else:
+                self.reply('502 Nicht implementiert')
+
+
+class StandInSSHServer(paramiko.ServerInterface):
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == 'session' else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+class StandInSFTPHandle(paramiko.SFTPHandle):
+    def __init__(self, files, path, flags=0):
+        super().__init__(flags)
+        self.files = files
+        self.path = path
+        self.data = bytearray()
+        self.writing = bool(flags & (os.O_WRONLY | os.O_RDWR))
+        if not self.writing:
+            self.readfile = io.BytesIO(files[path])
+
+    def write(self, offset, data):
+        self.data[offset:offset + len(data)] = data
+        return paramiko.SFTP_OK
+
+    def close(self):
+        if self.writing:
+            self.files[self.path] = bytes(self.data)
+        super().close()
+
+
+class StandInSFTPServer(paramiko.SFTPServerInterface):
+    def __init__(self, server, files, mtimes=None, *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.files = files
+        self.mtimes = mtimes if mtimes is not None else {}
+
+    def open(self, path, flags, attr):
+        return StandInSFTPHandle(self.files, path, flags)
+
+    def stat(self, path):
+        attributes = paramiko.SFTPAttributes()
+        attributes.filename = posixpath.basename(path)
+        attributes.st_size = len(self.files.get(path, b''))
+        attributes.st_mode = stat.S_IFREG | 0o644
+        attributes.st_mtime = self.mtimes.get(path, 1767225600)
+        return attributes
+
+    def list_folder(self, path):
+        return [self.stat(name) for name in self.files if posixpath.dirname(name) == path]
+
+    lstat = stat
+
+
+def serve_sftp(listener, server):
+    host_key = paramiko.ECDSAKey.generate()
+    while True:
+        try:
+            connection, _ = listener.accept()
+        except OSError:
+            return
+        transport = paramiko.Transport(connection)
+        transport.add_server_key(host_key)
+        transport.set_subsystem_handler('sftp', paramiko.SFTPServer, StandInSFTPServer, server.files,
+                                        getattr(server, 'mtimes', None))
+        transport.start_server(server=StandInSSHServer())
+        server.transports.append(transport)
+
+
+class ConnectionPoolTest(TestCase):
+    """Übertragungen gegen lokale HTTP-, FTP- und SFTP-Server."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('einkauf')
+        self.supplier = Supplier.objects.create(name='Schrauben GmbH')
+        self.orders = [
+            PurchaseOrder.objects.create(order_number=f'ORD-{index}', supplier=self.supplier, created_by=self.user,
+                                         status='approved')
+            for index in range(3)
+        ]
+        self.addCleanup(get_connection_manager().close_all)
+
+    def create_interface(self, code, **kwargs):
+        return SupplierInterface.objects.create(
+            supplier=self.supplier, name=code, username='lieferant', password='geheim',
+            interface_type=InterfaceType.objects.get_or_create(name=code, code=code)[0], **kwargs
+        )
+
+    def start(self, server, target=None):
+        thread = threading.Thread(target=target or server.serve_forever, daemon=True)
+        thread.start()
+        return server
+
+    def send_all(self, interface):
+        service = get_interface_service(interface)
+        for order in self.orders:
+            self.assertTrue(service.send_order(order))
+
+    def test_api_orders_share_one_keep_alive_connection(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHTTPHandler)
+        server.connections, server.requests = 0, []
+        self.start(server)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        self.send_all(self.create_interface('api', api_url=f'http://127.0.0.1:{server.server_port}/orders',
+                                            order_format='json'))
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual(server.connections, 1)
+
+    def test_ftp_login_is_reused_and_checked(self):
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), StandInFTPHandler)
+        server.daemon_threads = True
+        server.logins, server.files, server.drop_after_store = 0, {}, False
+        self.start(server)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        interface = self.create_interface('ftp', host='127.0.0.1', port=server.server_address[1])
+
+        self.send_all(interface)
+        self.assertEqual(len(server.files), 3)
+        self.assertEqual(server.logins, 1)
+
+        # Vom Server geschlossene Verbindungen fallen beim Health-Check auf und werden ersetzt
+        server.drop_after_store = True
+        self.orders = [PurchaseOrder.objects.create(order_number=f'ORD-{index}', supplier=self.supplier,
+                                                    created_by=self.user) for index in range(3, 5)]
+        with override_settings(INTERFACE_CONNECTION_CHECK_INTERVAL=-1):
+            self.send_all(interface)
+        self.assertEqual(len(server.files), 5)
+        self.assertEqual(server.logins, 2)
+
+    def test_sftp_channel_is_reused(self):
+        listener = socket.create_server(('127.0.0.1', 0))
+        server = type('StandInSFTP', (), {'files': {}, 'transports': []})()
+        self.start(server, target=lambda: serve_sftp(listener, server))
+        self.addCleanup(listener.close)
+
+        self.send_all(self.create_interface('sftp', host='127.0.0.1', port=listener.getsockname()[1],
+                                            remote_path='/eingang'))
+        self.assertEqual(len(server.files), 3)
+        self.assertTrue(all(path.startswith('/eingang/') for path in server.files))
+        self.assertEqual(len(server.transports), 1)
+
+
+class InboundPollingTest(TestCase):
+    """Abruf von Auftragsbestätigungen und Lieferavisen aus FTP- und SFTP-Verzeichnissen."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('einkauf')
+        self.supplier = Supplier.objects.create(name='Schrauben GmbH')
+        self.order = PurchaseOrder.objects.create(order_number='ORD-1', supplier=self.supplier, created_by=self.user,
+                                                  status='sent')
+        for sku in ('S-1', 'S-2'):
+            PurchaseOrderItem.objects.create(
+                purchase_order=self.order, product=Product.objects.create(name=sku, sku=sku),
+                quantity_ordered=Decimal('10'), unit_price=Decimal('1.00'), supplier_sku=f'L-{sku}'
+            )
+        self.addCleanup(get_connection_manager().close_all)
+
+    def create_interface(self, code, port):
+        return SupplierInterface.objects.create(
+            supplier=self.supplier, name=code, host='127.0.0.1', port=port, username='lieferant', password='geheim',
+            remote_path='/eingang', config_json={'inbound_polling': True, 'inbound_path': '/ausgang'},
+            interface_type=InterfaceType.objects.get_or_create(name=code, code=code)[0]
+        )
+
+    def poll(self, interface):
+        [(_, stats)] = poll_interfaces([interface], workers=1)
+        self.assertEqual(stats['error'], '')
+        return stats
+
+    def test_ftp_files_are_processed_once(self):
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), StandInFTPHandler)
+        server.daemon_threads = True
+        server.logins, server.drop_after_store = 0, False
+        server.mtimes = {}
+        server.files = {
+            '/ausgang/ab_0001.csv': 'Bestellnummer;Liefertermin\nORD-1;24.11.2026\nORD-99;25.11.2026\n'.encode(),
+            '/ausgang/desadv_0001.xml': (
+                b'<?xml version="1.0"?><DespatchAdvices xmlns="urn:example">'
+                b'<DespatchAdvice><OrderNumber>ORD-1</OrderNumber><Shipment>LS-7</Shipment>'
+                b'<DeliveryDate>2026-11-20</DeliveryDate><TrackingNumber>TR-1</TrackingNumber>'
+                b'<Line><SupplierSKU>L-S-1</SupplierSKU><Quantity>4</Quantity></Line>'
+                b'<Line><SKU>S-2</SKU><Quantity>6,5</Quantity></Line>'
+                b'</DespatchAdvice></DespatchAdvices>'
+            ),
+            '/ausgang/order_ORD-1.csv': b'Order Number\nORD-1\n',
+        }
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        interface = self.create_interface('ftp', server.server_address[1])
+
+        stats = self.poll(interface)
+        self.assertEqual((stats['files'], stats['records'], stats['failed']), (2, 3, 0))
+        self.order.refresh_from_db()
+        self.assertEqual(str(self.order.expected_delivery), '2026-11-24')
+        split = OrderSplit.objects.get(purchase_order=self.order)
+        self.assertEqual((split.name, split.status, split.tracking_number), ('LS-7', 'in_transit', 'TR-1'))
+        self.assertEqual(
+            sorted((item.order_item.product.sku, item.quantity) for item in split.items.all()),
+            [('S-1', Decimal('4')), ('S-2', Decimal('6.5'))]
+        )
+        self.assertIn('ORD-99', InboundFile.objects.get(path='/ausgang/ab_0001.csv').message)
+        self.assertEqual(InterfaceLog.objects.filter(interface=interface, order=self.order).count(), 2)
+
+        # Unveränderte Dateien werden beim nächsten Abruf übersprungen, geänderte erneut verarbeitet
+        self.assertEqual(self.poll(interface)['files'], 0)
+        server.files['/ausgang/desadv_0001.xml'] = server.files['/ausgang/desadv_0001.xml'].replace(
+            b'<Quantity>4</Quantity>', b'<Quantity>5</Quantity>'
+        ) + b'\n'
+        self.assertEqual(self.poll(interface)['files'], 1)
+        self.assertEqual(split.items.get(order_item__product__sku='S-1').quantity, Decimal('5'))
+        self.assertEqual(OrderSplit.objects.filter(purchase_order=self.order).count(), 1)
+
+    def test_sftp_json_lines_and_invalid_files(self):
+        listener = socket.create_server(('127.0.0.1', 0))
+        server = type('StandInSFTP', (), {'files': {
+            '/ausgang/asn_0001.json': (
+                b'{"order_number": "ORD-1", "shipment_number": "LS-8", "carrier": "DHL",'
+                b' "items": [{"sku": "S-2", "quantity": 3}]}\n'
+                b'{"order_number": "ORD-1", "shipment_number": "LS-9", "items": [{"sku": "S-1", "quantity": 1}]}\n'
+            ),
+            '/ausgang/confirmation_0002.json': b'[{"order_number": "ORD-1", "delivery_date": ',
+        }, 'mtimes': {}, 'transports': []})()
+        threading.Thread(target=lambda: serve_sftp(listener, server), daemon=True).start()
+        self.addCleanup(listener.close)
+        interface = self.create_interface('sftp', listener.getsockname()[1])
+
+        stats = self.poll(interface)
+        self.assertEqual((stats['files'], stats['records'], stats['failed']), (2, 2, 1))
+        self.assertEqual(
+            list(OrderSplit.objects.filter(purchase_order=self.order).order_by('name').values_list('name', 'carrier')),
+            [('LS-8', 'DHL'), ('LS-9', '')]
+        )
+        self.assertEqual(InboundFile.objects.get(path='/ausgang/confirmation_0002.json').status, 'failed')
+        self.assertEqual(self.poll(interface)['files'], 0)
+
+    def test_asn_quantities_are_summed_across_record_chunks(self):
+        interface = self.create_interface('ftp', 21)
+        rows = ''.join('ORD-1;LS-10;S-1;1\n' for _ in range(RECORD_CHUNK_SIZE + 1))
+        content = f'Bestellnummer;Lieferschein;Artikelnummer;Menge\n{rows}'.encode()
+
+        for _ in range(2):
+            # Eine erneut verarbeitete Datei ersetzt die Mengen, statt sie zu verdoppeln
+            inbound_file = process_file(interface, '/ausgang/asn_0002.csv', len(content), None, io.BytesIO(content))
+            self.assertEqual(inbound_file.record_count, RECORD_CHUNK_SIZE + 1)
+            split = OrderSplit.objects.get(purchase_order=self.order, name='LS-10')
+            self.assertEqual(split.items.get().quantity, RECORD_CHUNK_SIZE + 1)
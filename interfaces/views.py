@@ -14,7 +14,8 @@ from order.models import PurchaseOrder
 from suppliers.models import Supplier
 from .forms import SupplierInterfaceForm, InterfaceTestForm
 from .models import InterfaceType, SupplierInterface, InterfaceLog, XMLStandardTemplate
-from .services import send_order_via_interface, InterfaceError
+from .outbox import enqueue_order, requeue_transmission
+from .services import InterfaceError
 
 
 @login_required
@@ -662,18 +663,11 @@ def select_interface(request, order_id):
         interface_id = request.POST.get('interface')
 
         try:
-            # Bestellung senden
-            result = send_order_via_interface(order_id, interface_id, request.user)
-
-            if result:
-                # Bestellung als gesendet markieren (automatisch)
-                order.status = 'sent'
-                order.save()
-
-                messages.success(request,
-                                 f'Bestellung {order.order_number} wurde erfolgreich gesendet und als "Bestellt" markiert.')
-            else:
-                messages.warning(request, f'Bestellung {order.order_number} konnte nicht gesendet werden.')
+            # Bestellung in den Postausgang stellen; der Übertragungs-Worker markiert sie nach
+            # erfolgreichem Versand als "Bestellt"
+            enqueue_order(order, interface_id, request.user)
+            messages.success(request,
+                             f'Bestellung {order.order_number} wurde zum Senden eingereiht.')
 
         except InterfaceError as e:
             messages.error(request, f'Fehler beim Senden der Bestellung: {str(e)}')
@@ -702,20 +696,14 @@ def retry_failed_transmission(request, log_id):
         return redirect('interface_log_detail', pk=log_id)
     
     try:
-        # Bestellung erneut senden
-        from .services import get_interface_service
-        
-        service = get_interface_service(log.interface)
-        result = service.send_order(log.order, user=request.user)
-        
-        if result:
-            # Versuchszähler des alten Logs erhöhen
-            log.attempt_count += 1
-            log.save()
-            
-            messages.success(request, f'Bestellung {log.order.order_number} wurde erfolgreich erneut gesendet.')
+        # Bestellung erneut in den Postausgang stellen (eine unzustellbare Übertragung mit neuem Versuchszähler)
+        transmission = log.order.transmissions.filter(interface=log.interface, status='dead').first()
+        if transmission is not None:
+            requeue_transmission(transmission)
         else:
-            messages.warning(request, f'Bestellung {log.order.order_number} konnte nicht erneut gesendet werden.')
+            enqueue_order(log.order, log.interface, request.user, mark_as_sent=False)
+
+        messages.success(request, f'Bestellung {log.order.order_number} wurde erneut zum Senden eingereiht.')
             
     except InterfaceError as e:
         messages.error(request, f'Fehler beim erneuten Senden der Bestellung: {str(e)}')
@@ -814,28 +802,17 @@ def test_send_order(request):
         })
 
     try:
-        # Bestellung über die Schnittstelle senden
-        result = send_order_via_interface(order_id, interface_id, request.user)
+        # Testübertragung in den Postausgang stellen; das Ergebnis erscheint im Übertragungsprotokoll
+        order = PurchaseOrder.objects.get(pk=order_id)
+        interface = SupplierInterface.objects.get(pk=interface_id, supplier=order.supplier)
+        transmission = enqueue_order(order, interface, request.user, mark_as_sent=False)
 
-        # Log abrufen, um Details zu erhalten
-        log = InterfaceLog.objects.filter(
-            interface_id=interface_id,
-            order_id=order_id
-        ).order_by('-timestamp').first()
-
-        if result:
-            return JsonResponse({
-                'success': True,
-                'message': 'Testübertragung der Bestellung erfolgreich durchgeführt.',
-                'details': log.message if log else "Die Bestellung wurde erfolgreich gesendet.",
-                'log_id': log.id if log else None
-            })
-        else:
-            return JsonResponse({
-                'success': False,
-                'message': 'Fehler bei der Testübertragung',
-                'details': log.message if log else "Unbekannter Fehler beim Senden der Bestellung."
-            })
+        return JsonResponse({
+            'success': True,
+            'message': 'Testübertragung der Bestellung wurde zum Senden eingereiht.',
+            'details': f"Übertragung #{transmission.pk}: Das Ergebnis erscheint nach dem Versand im Übertragungsprotokoll.",
+            'transmission_id': transmission.pk
+        })
 
     except SupplierInterface.DoesNotExist:
         return JsonResponse({
@@ -7,6 +7,7 @@ from .models import (
     StockTake,
     StockTakeItem,
     Department,
+    ProductClassification,
 )
 
 class WarehouseAdmin(admin.ModelAdmin):
@@ -58,9 +59,18 @@ class WarehouseAccessAdmin(admin.ModelAdmin):
     search_fields = ('warehouse__name', 'department__name')
 
 
+class ProductClassificationAdmin(admin.ModelAdmin):
+    list_display = ('product', 'warehouse', 'abc_class', 'xyz_class', 'consumption_value', 'computed_at')
+    list_filter = ('abc_class', 'xyz_class', 'warehouse')
+    search_fields = ('product__name', 'product__sku')
+    list_select_related = ('product', 'warehouse')
+    readonly_fields = ('computed_at',)
+
+
 admin.site.register(Warehouse, WarehouseAdmin)
 admin.site.register(StockMovement, StockMovementAdmin)
 admin.site.register(StockTake, StockTakeAdmin)
 admin.site.register(StockTakeItem, StockTakeItemAdmin)
 admin.site.register(Department, DepartmentAdmin)
-admin.site.register(WarehouseAccess, WarehouseAccessAdmin)
\ No newline at end of file
+admin.site.register(WarehouseAccess, WarehouseAccessAdmin)
+admin.site.register(ProductClassification, ProductClassificationAdmin)
@@ -0,0 +1,280 @@
+# inventory/classification.py
+"""
+ABC/XYZ-Klassifizierung der Produkte je Lager.
+
+ABC: Verbrauchswert der letzten zwölf Monate (Warenausgänge x Einkaufspreis
+des bevorzugten Lieferanten). Die Produkte eines Lagers werden absteigend nach
+Wert sortiert; A-Artikel machen die ersten 80 % des kumulierten Werts aus,
+B-Artikel die nächsten 15 %, der Rest sind C-Artikel.
+
+XYZ: Variationskoeffizient des monatlichen Verbrauchs (X <= 0,5, Y <= 1,0,
+sonst bzw. ohne Verbrauch Z).
+
+Die Daten werden mit drei gruppierten Abfragen geladen und in einem
+vektorisierten NumPy-Durchlauf für alle Lager gleichzeitig klassifiziert.
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, Exists, IntegerField, OuterRef, Sum, Value, When
+from django.db.models.functions import Abs
+from django.utils import timezone
+
+from core.models import ProductWarehouse
+from suppliers.models import SupplierProduct
+from .models import ProductClassification, StockMovement, Warehouse
+
+# Kumulierte Wertanteile, bis zu denen ein Produkt als A- bzw. B-Artikel gilt
+ABC_THRESHOLDS = (0.8, 0.95)
+
+# Variationskoeffizienten, bis zu denen ein Produkt als X- bzw. Y-Artikel gilt
+XYZ_THRESHOLDS = (0.5, 1.0)
+
+PERIOD_MONTHS = 12
+
+# Ergebnisfelder in der Reihenfolge der von compute() gelieferten Tupel
+RESULT_FIELDS = ('abc_class', 'xyz_class', 'consumption_quantity', 'consumption_value',
+                 'variation_coefficient')
+
+# Obergrenze für Zeilen pro Schreibvorgang (SQLite-Parameterlimit)
+CHUNK_SIZE = 500
+
+
+def _month_index(value):
+    return value.year * 12 + value.month - 1
+
+
+def _pair_keys(product_ids, warehouse_ids, warehouse_span):
+    """Eindeutiger ganzzahliger Schlüssel je (Produkt, Lager)."""
+    return product_ids.astype(np.int64) * warehouse_span + warehouse_ids.astype(np.int64)
+
+
+def classify_abc(values, groups, thresholds=ABC_THRESHOLDS):
+    """Ordnet jedem Wert innerhalb seiner Gruppe eine ABC-Klasse zu.
+
+    Args:
+        values: Verbrauchswerte (float-Array)
+        groups: Gruppenschlüssel gleicher Länge (z. B. Lager-IDs)
+
+    Returns:
+        numpy.ndarray: Array aus 'A', 'B' und 'C'
+    """
+    classes = np.full(len(values), 'C', dtype='<U1')
+    if not len(values):
+        return classes
+
+    order = np.lexsort((-values, groups))
+    sorted_values = values[order]
+    sorted_groups = groups[order]
+
+    # Kumulierte Summe je Gruppe: globale Summe minus Summe vor Gruppenbeginn
+    cumulative = np.cumsum(sorted_values)
+    group_starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    group_sizes = np.diff(np.r_[group_starts, len(sorted_values)])
+    offset = np.repeat(np.r_[0.0, cumulative[group_starts[1:] - 1]], group_sizes)
+    totals = np.repeat(np.add.reduceat(sorted_values, group_starts), group_sizes)
+
+    # Anteil vor dem Produkt: das Produkt, das die Schwelle überschreitet, zählt noch zur Klasse
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share_before = np.where(totals > 0, (cumulative - offset - sorted_values) / totals, 1.0)
+
+    sorted_classes = np.where(
+        sorted_values <= 0, 'C',
+        np.where(share_before < thresholds[0], 'A', np.where(share_before < thresholds[1], 'B', 'C'))
+    )
+    classes[order] = sorted_classes
+    return classes
+
+
+def classify_xyz(monthly, thresholds=XYZ_THRESHOLDS):
+    """Ordnet jeder Zeile der Monatsmatrix eine XYZ-Klasse zu.
+
+    Returns:
+        tuple: (Klassen-Array, Variationskoeffizienten mit NaN ohne Verbrauch)
+    """
+    mean = monthly.mean(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variation = np.where(mean > 0, monthly.std(axis=1) / mean, np.nan)
+
+    classes = np.where(
+        np.isnan(variation), 'Z',
+        np.where(variation <= thresholds[0], 'X', np.where(variation <= thresholds[1], 'Y', 'Z'))
+    )
+    return classes, variation
+
+
+class ProductClassifier:
+    """Berechnet und speichert die ABC/XYZ-Klassen für die angegebenen Lager.
+
+    Args:
+        warehouse_ids: Optionale Liste von Lager-IDs (Standard: alle aktiven Lager)
+        as_of: Stichtag der Auswertung (Standard: jetzt)
+    """
+
+    def __init__(self, warehouse_ids=None, as_of=None):
+        if warehouse_ids is None:
+            warehouse_ids = Warehouse.objects.filter(is_active=True).values_list('pk', flat=True)
+        self.warehouse_ids = sorted(set(warehouse_ids))
+        # Monatsgrenzen in der aktuellen Zeitzone
+        self.as_of = timezone.localtime(as_of or timezone.now())
+
+    def month_boundaries(self):
+        """Monatsanfänge der zwölf ausgewerteten Monate (inkl. laufendem Monat), aufsteigend."""
+        last_month = _month_index(self.as_of)
+        return [
+            self.as_of.replace(year=index // 12, month=index % 12 + 1, day=1,
+                               hour=0, minute=0, second=0, microsecond=0)
+            for index in range(last_month - PERIOD_MONTHS + 1, last_month + 1)
+        ]
+
+    def load_pairs(self):
+        rows = np.array(
+            ProductWarehouse.objects.filter(warehouse_id__in=self.warehouse_ids)
+            .values_list('product_id', 'warehouse_id'),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        return rows[:, 0], rows[:, 1]
+
+    def load_monthly_consumption(self, pair_keys, warehouse_span):
+        """Monatliche Ausgangsmengen je (Produkt, Lager) als Matrix (Zeilen wie pair_keys).
+
+        Der Monat wird per CASE über die vorab berechneten Monatsgrenzen bestimmt,
+        damit die Datenbank keine Datumsfunktion je Bewegung auswerten muss.
+        """
+        monthly = np.zeros((len(pair_keys), PERIOD_MONTHS))
+        boundaries = self.month_boundaries()
+        month_column = Case(
+            *[When(created_at__gte=boundary, then=Value(column))
+              for column, boundary in reversed(list(enumerate(boundaries)))],
+            output_field=IntegerField()
+        )
+        rows = list(
+            StockMovement.objects.filter(
+                movement_type='out',
+                warehouse_id__in=self.warehouse_ids,
+                created_at__gte=boundaries[0],
+                created_at__lt=self.as_of,
+            ).annotate(month_column=month_column)
+            .values('product_id', 'warehouse_id', 'month_column')
+            .annotate(consumed=Sum(Abs('quantity')))
+            .values_list('product_id', 'warehouse_id', 'month_column', 'consumed')
+        )
+        if not rows or not len(pair_keys):
+            return monthly
+
+        rows = np.array(rows, dtype=float)
+        keys = _pair_keys(rows[:, 0].astype(np.int64), rows[:, 1].astype(np.int64), warehouse_span)
+        positions = np.searchsorted(pair_keys, keys).clip(max=len(pair_keys) - 1)
+        known = pair_keys[positions] == keys
+
+        np.add.at(monthly, (positions[known], rows[known, 2].astype(np.int64)), rows[known, 3])
+        return monthly
+
+    def load_prices(self, product_ids):
+        """Einkaufspreis je Produkt (bevorzugter Lieferant, sonst günstigster)."""
+        prices = {}
+        for product_id, price in SupplierProduct.objects.filter(
+            product_id__in=ProductWarehouse.objects.filter(
+                warehouse_id__in=self.warehouse_ids
+            ).values('product_id')
+        ).order_by('product_id', 'is_preferred', '-purchase_price').values_list('product_id', 'purchase_price'):
+            # Spätere Zeilen (bevorzugt, günstiger) überschreiben frühere
+            prices[product_id] = float(price)
+        return np.array([prices.get(product_id, 0.0) for product_id in product_ids.tolist()])
+
+    def compute(self):
+        """Klassifiziert alle Produkt/Lager-Kombinationen.
+
+        Returns:
+            dict: {(product_id, warehouse_id): (abc, xyz, Menge, Wert, Variationskoeffizient)}
+        """
+        product_ids, warehouse_ids = self.load_pairs()
+        if not len(product_ids):
+            return {}
+
+        warehouse_span = int(warehouse_ids.max()) + 1
+        pair_keys = _pair_keys(product_ids, warehouse_ids, warehouse_span)
+        order = np.argsort(pair_keys)
+        product_ids, warehouse_ids, pair_keys = product_ids[order], warehouse_ids[order], pair_keys[order]
+
+        monthly = self.load_monthly_consumption(pair_keys, warehouse_span)
+        quantities = monthly.sum(axis=1).round(2)
+        values = (quantities * self.load_prices(product_ids)).round(2)
+
+        abc_classes = classify_abc(values, warehouse_ids)
+        xyz_classes, variation = classify_xyz(monthly)
+        variation = variation.round(4)
+
+        return {
+            (product_id, warehouse_id): (
+                abc_class, xyz_class, Decimal(f'{quantity:.2f}'), Decimal(f'{value:.2f}'),
+                None if cv != cv else cv  # NaN: kein Verbrauch
+            )
+            for product_id, warehouse_id, abc_class, xyz_class, quantity, value, cv in zip(
+                product_ids.tolist(), warehouse_ids.tolist(), abc_classes.tolist(), xyz_classes.tolist(),
+                quantities.tolist(), values.tolist(), variation.tolist()
+            )
+        }
+
+    def _load_existing(self):
+        return {
+            (product_id, warehouse_id): values
+            for product_id, warehouse_id, *values in ProductClassification.objects.filter(
+                warehouse_id__in=self.warehouse_ids
+            ).values_list('product_id', 'warehouse_id', *RESULT_FIELDS)
+        }
+
+    def run(self):
+        """Berechnet die Klassen und schreibt nur neue oder geänderte Einträge.
+
+        Der Berechnungszeitpunkt aller Einträge wird mit einem UPDATE gesetzt,
+        Einträge ohne Bestandszeile im Lager werden entfernt.
+
+        Returns:
+            dict: Anzahl der Produkte je ABC-Klasse, insgesamt und geschrieben
+        """
+        results = self.compute()
+        existing = self._load_existing()
+
+        changed = [
+            ProductClassification(
+                product_id=product_id,
+                warehouse_id=warehouse_id,
+                computed_at=self.as_of,
+                **dict(zip(RESULT_FIELDS, values))
+            )
+            for (product_id, warehouse_id), values in results.items()
+            if tuple(existing.get((product_id, warehouse_id), ())) != values
+        ]
+
+        with transaction.atomic():
+            for start in range(0, len(changed), CHUNK_SIZE):
+                ProductClassification.objects.bulk_create(
+                    changed[start:start + CHUNK_SIZE],
+                    update_conflicts=True,
+                    unique_fields=['product', 'warehouse'],
+                    update_fields=[*RESULT_FIELDS, 'computed_at'],
+                )
+            classifications = ProductClassification.objects.filter(warehouse_id__in=self.warehouse_ids)
+            classifications.filter(~Exists(ProductWarehouse.objects.filter(
+                product_id=OuterRef('product_id'),
+                warehouse_id=OuterRef('warehouse_id'),
+            ))).delete()
+            classifications.update(computed_at=self.as_of)
+
+        stats = {'A': 0, 'B': 0, 'C': 0, 'total': len(results), 'written': len(changed)}
+        for abc_class, *_ in results.values():
+            stats[abc_class] += 1
+        return stats
+
+
+def classify_products(warehouse_ids=None):
+    """Berechnet die ABC/XYZ-Klassen der angegebenen (Standard: aller aktiven) Lager neu."""
+    return ProductClassifier(warehouse_ids).run()
+
+
+def ensure_classified(warehouse_id):
+    """Klassifiziert ein Lager, falls für es noch keine Klassen berechnet wurden."""
+    if not ProductClassification.objects.filter(warehouse_id=warehouse_id).exists():
+        ProductClassifier([warehouse_id]).run()
@@ -0,0 +1,24 @@
+# inventory/management/commands/classify_products.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.classification import ProductClassifier
+
+
+class Command(BaseCommand):
+    help = 'Berechnet die ABC/XYZ-Klassifizierung der Produkte je Lager neu (z. B. nächtlich per Cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warehouse', type=int, action='append', dest='warehouses',
+                            help='Nur dieses Lager klassifizieren (mehrfach möglich, Standard: alle aktiven)')
+
+    def handle(self, *args, **options):
+        start_time = time.monotonic()
+        stats = ProductClassifier(options['warehouses']).run()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['total']} Produkt/Lager-Kombinationen in {time.monotonic() - start_time:.2f} Sekunden "
+            f"klassifiziert: {stats['A']} A, {stats['B']} B, {stats['C']} C "
+            f"({stats['written']} neu oder geändert)."
+        ))
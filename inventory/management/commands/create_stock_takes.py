@@ -0,0 +1,88 @@
+# inventory/management/commands/create_stock_takes.py
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from inventory.models import StockTake, Warehouse
+from inventory.stock_take_builder import create_cycle_stock_take, get_due_cycle_stock_takes, populate_stock_take
+
+
+class Command(BaseCommand):
+    help = ('Legt fällige Zykleninventuren an (für geplante Ausführung, z. B. per Cron) '
+            'oder erstellt mit --warehouse eine einzelne Inventur')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Fällige Zykleninventuren nur anzeigen, nichts anlegen')
+        parser.add_argument('--warehouse', type=int,
+                            help='ID des Lagers für eine einzelne neue Inventur')
+        parser.add_argument('--type', dest='inventory_type', default='full',
+                            choices=['full', 'rolling', 'blind', 'sample'],
+                            help='Inventurtyp der einzelnen Inventur (Standard: full)')
+        parser.add_argument('--category', default='', choices=['', 'A', 'B', 'C'],
+                            help='ABC-Kategorie für rollierende Inventuren')
+        parser.add_argument('--user', help='Benutzername des Erstellers (Standard: erster Administrator)')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+
+        if options['warehouse']:
+            self.create_single(options, user)
+            return
+
+        due = get_due_cycle_stock_takes()
+        if not due:
+            self.stdout.write('Keine Zykleninventuren fällig.')
+            return
+
+        for original in due:
+            if options['dry_run']:
+                self.stdout.write(f'Fällig: {original.name} ({original.warehouse.name}), '
+                                  f'nächster Zyklus {original.get_next_cycle_date():%d.%m.%Y}')
+                continue
+
+            start_time = time.monotonic()
+            stock_take, item_count = create_cycle_stock_take(original, user)
+            self.stdout.write(self.style.SUCCESS(
+                f'"{stock_take.name}" mit {item_count} Positionen in '
+                f'{time.monotonic() - start_time:.2f} Sekunden angelegt.'
+            ))
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Benutzer "{username}" existiert nicht.')
+        return User.objects.filter(is_superuser=True).order_by('pk').first()
+
+    def create_single(self, options, user):
+        if user is None:
+            raise CommandError('Kein Ersteller gefunden, bitte --user angeben.')
+        try:
+            warehouse = Warehouse.objects.get(pk=options['warehouse'], is_active=True)
+        except Warehouse.DoesNotExist:
+            raise CommandError(f'Aktives Lager mit ID {options["warehouse"]} existiert nicht.')
+
+        inventory_type = options['inventory_type']
+        today = timezone.now().date()
+        start_time = time.monotonic()
+
+        with transaction.atomic():
+            stock_take = StockTake.objects.create(
+                name=f'{warehouse.name} ({today:%d.%m.%Y})',
+                warehouse=warehouse,
+                inventory_type=inventory_type,
+                display_expected_quantity=inventory_type != 'blind',
+                cycle_count_category=options['category'] if inventory_type == 'rolling' else '',
+                created_by=user
+            )
+            item_count = populate_stock_take(stock_take)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Inventur "{stock_take.name}" mit {item_count} Positionen in '
+            f'{time.monotonic() - start_time:.2f} Sekunden angelegt.'
+        ))
@@ -0,0 +1,50 @@
+# inventory/management/commands/process_stock_take_completions.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.models import StockTake
+from inventory.stock_take_completion import CHUNK_SIZE, StockTakeCompletion
+
+
+class Command(BaseCommand):
+    help = ('Bucht die Bestandskorrekturen von Inventuren im Status "Wird abgeschlossen" '
+            'und setzt unterbrochene Abschlüsse fort')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Wartezeit in Sekunden zwischen zwei Durchläufen (Standard: 5)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help=f'Anzahl der Positionen pro Transaktion (Standard: {CHUNK_SIZE})')
+        parser.add_argument('--once', action='store_true',
+                            help='Nur einen Durchlauf ausführen und dann beenden')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Inventurabschluss-Worker gestartet.'))
+
+        try:
+            while True:
+                self.run_cycle(options['chunk_size'])
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Worker wird beendet.')
+
+    def run_cycle(self, chunk_size):
+        pending = StockTake.objects.filter(status='completing').select_related('completed_by').order_by('pk')
+        for stock_take in pending:
+            start_time = time.monotonic()
+            completion = StockTakeCompletion(stock_take, chunk_size=chunk_size)
+            processed = completion.run(progress_callback=self.report_progress(stock_take))
+            self.stdout.write(self.style.SUCCESS(
+                f'Inventur "{stock_take.name}" abgeschlossen: {processed} Korrekturen in '
+                f'{time.monotonic() - start_time:.2f} Sekunden gebucht.'
+            ))
+
+    def report_progress(self, stock_take):
+        def callback(progress):
+            self.stdout.write(
+                f'{stock_take.name}: {progress["processed"]}/{progress["total"]} ({progress["percent"]} %)'
+            )
+        return callback
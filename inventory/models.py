@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import timedelta
 from decimal import Decimal
 from django.contrib.auth.models import User
 from django.db import models
@@ -42,6 +42,7 @@ class StockTake(models.Model):
     STATUS_CHOICES = (
         ('draft', 'Entwurf'),
         ('in_progress', 'In Bearbeitung'),
+        ('completing', 'Wird abgeschlossen'),
         ('completed', 'Abgeschlossen'),
         ('cancelled', 'Abgebrochen'),
     )
@@ -110,11 +111,17 @@ class StockTake(models.Model):
         return self.stocktakeitem_set.filter(is_counted=True).exclude(counted_quantity=F('expected_quantity')).count()
 
     def get_completion_percentage(self):
-        """Get the percentage of items counted."""
-        total = self.stocktakeitem_set.count()
+        """Get the percentage of items counted.
+
+        Uses the annotations item_total/item_counted when the queryset provides them.
+        """
+        if hasattr(self, 'item_total') and hasattr(self, 'item_counted'):
+            total, counted = self.item_total, self.item_counted
+        else:
+            total = self.stocktakeitem_set.count()
+            counted = self.stocktakeitem_set.filter(is_counted=True).count() if total else 0
         if total == 0:
             return 100  # Avoid division by zero
-        counted = self.stocktakeitem_set.filter(is_counted=True).count()
         return int((counted / total) * 100)
 
     def is_blind_count(self):
@@ -125,7 +132,7 @@ class StockTake(models.Model):
         """Berechnet das Datum der nächsten Zykleninventur."""
         if not self.count_frequency or not self.last_cycle_date:
             return None
-        return self.last_cycle_date + datetime.timedelta(days=self.count_frequency)
+        return self.last_cycle_date + timedelta(days=self.count_frequency)
 
     class Meta:
         ordering = ['-start_date']
@@ -144,6 +151,7 @@ class StockTakeItem(models.Model):
     notes = models.TextField(blank=True, verbose_name="Anmerkungen")
     counted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Gezählt von")
     counted_at = models.DateTimeField(null=True, blank=True, verbose_name="Gezählt am")
+    adjustment_applied = models.BooleanField(default=False, verbose_name="Korrektur gebucht")
 
     def __str__(self):
         return f"{self.product.name} - {self.stock_take.name}"
@@ -179,3 +187,46 @@ class StockTakeItem(models.Model):
         ordering = ['product__name']
         verbose_name = "Inventurposition"
         verbose_name_plural = "Inventurpositionen"
+
+
+class ProductClassification(models.Model):
+    """ABC/XYZ-Klassifizierung eines Produkts je Lager.
+
+    Wird von inventory.classification berechnet (Verbrauchswert der letzten
+    zwölf Monate aus Warenausgängen und Einkaufspreis) und von rollierenden
+    Inventuren zur Auswahl der Positionen genutzt.
+    """
+    ABC_CHOICES = (
+        ('A', 'A-Artikel (hoher Verbrauchswert)'),
+        ('B', 'B-Artikel (mittlerer Verbrauchswert)'),
+        ('C', 'C-Artikel (niedriger Verbrauchswert)'),
+    )
+    XYZ_CHOICES = (
+        ('X', 'X-Artikel (gleichmäßiger Verbrauch)'),
+        ('Y', 'Y-Artikel (schwankender Verbrauch)'),
+        ('Z', 'Z-Artikel (unregelmäßiger Verbrauch)'),
+    )
+
+    product = models.ForeignKey('core.Product', on_delete=models.CASCADE, related_name='classifications',
+                                verbose_name="Produkt")
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='classifications',
+                                  verbose_name="Lager")
+    abc_class = models.CharField(max_length=1, choices=ABC_CHOICES, verbose_name="ABC-Klasse")
+    xyz_class = models.CharField(max_length=1, choices=XYZ_CHOICES, verbose_name="XYZ-Klasse")
+    consumption_quantity = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                               verbose_name="Verbrauchsmenge")
+    consumption_value = models.DecimalField(max_digits=16, decimal_places=2, default=0,
+                                            verbose_name="Verbrauchswert")
+    variation_coefficient = models.FloatField(null=True, blank=True, verbose_name="Variationskoeffizient")
+    computed_at = models.DateTimeField(verbose_name="Berechnet am")
+
+    def __str__(self):
+        return f"{self.product} / {self.warehouse}: {self.abc_class}{self.xyz_class}"
+
+    class Meta:
+        unique_together = ('product', 'warehouse')
+        indexes = [
+            models.Index(fields=['warehouse', 'abc_class']),
+        ]
+        verbose_name = "Produktklassifizierung"
+        verbose_name_plural = "Produktklassifizierungen"
@@ -9,6 +9,8 @@ def check_low_stock_products():
     Überprüft alle Produkte auf kritischen Bestand.
 
     Returns:
-        list: Liste von Produkten mit kritischem Bestand
+        QuerySet: Produkte mit kritischem Bestand
     """
-    return Product.objects.filter(current_stock__lte=F('minimum_stock')).order_by('name')
\ No newline at end of file
+    return Product.objects.filter(
+        stock_summary__total_quantity__lte=F('minimum_stock')
+    ).select_related('stock_summary').order_by('name')
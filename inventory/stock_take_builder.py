@@ -0,0 +1,154 @@
+# inventory/stock_take_builder.py
+"""
+Befüllung von Inventuren mit Positionen.
+
+Die erwarteten Mengen werden mit einem einzigen INSERT ... SELECT direkt aus
+ProductWarehouse übernommen, sodass auch Lager mit mehreren hunderttausend
+Positionen in Sekunden angelegt sind. Auswahl (ABC-Klasse, Stichprobe) und
+Zufallsauswahl erfolgen vollständig in der Datenbank.
+"""
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from core.models import ProductWarehouse
+from .classification import ensure_classified
+from .models import ProductClassification, StockTake, StockTakeItem
+
+# Anteil und Obergrenze der Stichprobeninventur
+SAMPLE_RATIO = 0.1
+SAMPLE_MAX_ITEMS = 50
+
+
+class StockTakeBuilder:
+    """Erzeugt die Positionen einer Inventur passend zu ihrem Inventurtyp.
+
+    Args:
+        stock_take: Die zu befüllende Inventur (muss gespeichert sein)
+    """
+
+    def __init__(self, stock_take):
+        self.stock_take = stock_take
+
+    def get_source_queryset(self):
+        """Bestandszeilen des Lagers, die in die Inventur aufgenommen werden."""
+        rows = ProductWarehouse.objects.filter(warehouse_id=self.stock_take.warehouse_id)
+        inventory_type = self.stock_take.inventory_type
+
+        if inventory_type == 'rolling' and self.stock_take.cycle_count_category:
+            # Auswahl über die gespeicherte ABC-Klassifizierung des Lagers
+            ensure_classified(self.stock_take.warehouse_id)
+            return rows.filter(Exists(ProductClassification.objects.filter(
+                product_id=OuterRef('product_id'),
+                warehouse_id=OuterRef('warehouse_id'),
+                abc_class=self.stock_take.cycle_count_category,
+            )))
+
+        if inventory_type == 'sample':
+            sample_size = min(int(rows.count() * SAMPLE_RATIO), SAMPLE_MAX_ITEMS)
+            return rows.order_by('?')[:sample_size]
+
+        # 'full' und 'blind' erfassen alle Produkte des Lagers
+        return rows
+
+    @staticmethod
+    def _insert_sql(select_sql):
+        """INSERT ... SELECT, das die Auswahl als abgeleitete Tabelle übernimmt."""
+        quote = connection.ops.quote_name
+        columns = ', '.join(
+            quote(StockTakeItem._meta.get_field(name).column)
+            for name in ('stock_take', 'product', 'expected_quantity', 'is_counted', 'adjustment_applied', 'notes')
+        )
+        return (
+            f'INSERT INTO {quote(StockTakeItem._meta.db_table)} ({columns}) '
+            f'SELECT %s, source.source_product, source.source_quantity, %s, %s, %s '
+            f'FROM ({select_sql}) source'
+        )
+
+    def populate(self, replace=False):
+        """Legt die Positionen an und gibt deren Anzahl zurück.
+
+        Args:
+            replace: Vorhandene Positionen vorher löschen (z. B. nach Lagerwechsel)
+        """
+        source = self.get_source_queryset().values(
+            source_product=F('product_id'),
+            source_quantity=F('quantity'),
+        )
+        try:
+            select_sql, select_params = source.query.sql_with_params()
+        except EmptyResultSet:
+            # Leere Auswahl (z. B. Stichprobe aus einem fast leeren Lager)
+            select_sql = None
+
+        with transaction.atomic():
+            if replace:
+                self.stock_take.stocktakeitem_set.all().delete()
+            if select_sql is None:
+                return 0
+            with connection.cursor() as cursor:
+                cursor.execute(self._insert_sql(select_sql), (self.stock_take.pk, False, False, '', *select_params))
+                return cursor.rowcount
+
+
+def populate_stock_take(stock_take, replace=False):
+    """Befüllt eine Inventur mit den erwarteten Mengen ihres Lagers."""
+    return StockTakeBuilder(stock_take).populate(replace=replace)
+
+
+def create_cycle_stock_take(original, user=None):
+    """Legt die nächste Zykleninventur einer rollierenden Inventur an.
+
+    Args:
+        original: Rollierende Inventur, deren Einstellungen übernommen werden
+        user: Ersteller der neuen Inventur (Standard: Ersteller des Originals)
+
+    Returns:
+        tuple: (neue Inventur, Anzahl der Positionen)
+    """
+    today = timezone.now().date()
+    with transaction.atomic():
+        stock_take = StockTake.objects.create(
+            name=f"{original.name} (Zyklus {today.strftime('%d.%m.%Y')})",
+            description=original.description,
+            warehouse=original.warehouse,
+            status='draft',
+            inventory_type='rolling',
+            display_expected_quantity=original.display_expected_quantity,
+            cycle_count_category=original.cycle_count_category,
+            count_frequency=original.count_frequency,
+            last_cycle_date=today,
+            created_by=user or original.created_by
+        )
+        item_count = populate_stock_take(stock_take)
+
+        original.last_cycle_date = today
+        original.save(update_fields=['last_cycle_date'])
+
+    return stock_take, item_count
+
+
+def get_due_cycle_stock_takes(today=None):
+    """Rollierende Inventuren, deren nächster Zyklus fällig ist.
+
+    Je Lager und ABC-Kategorie zählt nur die jüngste Inventur der Serie, damit
+    aus bereits erzeugten Zykleninventuren keine weiteren Duplikate entstehen.
+    """
+    today = today or timezone.now().date()
+    candidates = StockTake.objects.filter(
+        inventory_type='rolling',
+        count_frequency__gt=0,
+        last_cycle_date__isnull=False,
+    ).exclude(status='cancelled').select_related('warehouse', 'created_by').order_by('-start_date', '-pk')
+
+    due = []
+    seen_series = set()
+    for stock_take in candidates:
+        series = (stock_take.warehouse_id, stock_take.cycle_count_category)
+        if series in seen_series:
+            continue
+        seen_series.add(series)
+        if stock_take.get_next_cycle_date() <= today:
+            due.append(stock_take)
+    return due
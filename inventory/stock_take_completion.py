@@ -0,0 +1,196 @@
+# inventory/stock_take_completion.py
+"""
+Abschluss von Inventuren mit Bestandskorrekturen.
+
+Die Korrekturen werden in Blöcken fester Größe gebucht: je Block eine
+Transaktion mit bulk_create für Bestandsbewegungen, bulk_update/bulk_create
+für ProductWarehouse und einem UPDATE, das die Positionen als gebucht
+markiert. Ein unterbrochener Abschluss setzt daher beim nächsten offenen
+Block wieder auf. Große Inventuren werden im Status 'completing' vom
+Hintergrundprozess (process_stock_take_completions) abgeschlossen.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from core.models import ProductWarehouse
+from core.utils.dashboard import invalidate_dashboard_cache
+from core.utils.stock import refresh_stock_summaries
+from order.services import mark_products_dirty
+from .models import StockMovement, StockTake, StockTakeItem
+
+# Positionen pro Transaktion
+CHUNK_SIZE = 500
+
+# Bis zu dieser Anzahl an Korrekturen wird direkt im Request abgeschlossen
+DEFAULT_SYNC_LIMIT = 2000
+
+
+def get_sync_limit():
+    return getattr(settings, 'STOCK_TAKE_SYNC_COMPLETION_LIMIT', DEFAULT_SYNC_LIMIT)
+
+
+class StockTakeCompletion:
+    """Bucht die Bestandskorrekturen einer Inventur und schließt sie ab.
+
+    Args:
+        stock_take: Die abzuschließende Inventur
+        user: Benutzer, dem Abschluss und Korrekturbuchungen zugeordnet werden
+        chunk_size: Anzahl der Positionen pro Transaktion
+    """
+
+    def __init__(self, stock_take, user=None, chunk_size=CHUNK_SIZE):
+        self.stock_take = stock_take
+        self.user = user or stock_take.completed_by
+        self.chunk_size = chunk_size
+
+    def discrepant_items(self):
+        return StockTakeItem.objects.filter(
+            stock_take=self.stock_take,
+            is_counted=True
+        ).exclude(counted_quantity=F('expected_quantity'))
+
+    def get_progress(self):
+        """Fortschritt der Korrekturbuchungen.
+
+        Returns:
+            dict: total, processed, percent und status
+        """
+        counts = self.discrepant_items().aggregate(
+            total=Count('pk'),
+            processed=Count('pk', filter=Q(adjustment_applied=True)),
+        )
+        total, processed = counts['total'], counts['processed']
+        return {
+            'total': total,
+            'processed': processed,
+            'percent': int(processed * 100 / total) if total else 100,
+            'status': self.stock_take.status,
+        }
+
+    def start(self, apply_adjustments=True):
+        """Versetzt die Inventur in den Status 'completing' bzw. schließt sie direkt ab.
+
+        Returns:
+            bool: True, wenn noch Korrekturen gebucht werden müssen
+        """
+        if not apply_adjustments:
+            self.finish()
+            return False
+
+        self.stock_take.status = 'completing'
+        self.stock_take.completed_by = self.user
+        self.stock_take.save(update_fields=['status', 'completed_by'])
+        return True
+
+    def process_chunk(self):
+        """Bucht den nächsten Block offener Korrekturen.
+
+        Returns:
+            int: Anzahl der gebuchten Positionen (0, wenn nichts mehr offen ist)
+        """
+        stock_take = self.stock_take
+        with transaction.atomic():
+            # Sperrt die Inventur, damit Request und Hintergrundprozess nicht parallel buchen
+            StockTake.objects.select_for_update().filter(pk=stock_take.pk).first()
+
+            items = list(
+                self.discrepant_items().filter(adjustment_applied=False)
+                .order_by('pk')
+                .values_list('pk', 'product_id', 'expected_quantity', 'counted_quantity')[:self.chunk_size]
+            )
+            if not items:
+                return 0
+
+            product_ids = [product_id for _, product_id, _, _ in items]
+            stock_rows = {
+                row.product_id: row
+                for row in ProductWarehouse.objects.filter(
+                    warehouse_id=stock_take.warehouse_id,
+                    product_id__in=product_ids
+                )
+            }
+
+            movements = []
+            changed_rows = []
+            new_rows = []
+            for _, product_id, expected_quantity, counted_quantity in items:
+                movements.append(StockMovement(
+                    product_id=product_id,
+                    warehouse_id=stock_take.warehouse_id,
+                    quantity=counted_quantity,
+                    movement_type='adj',
+                    reference=f'Inventur: {stock_take.name}',
+                    notes=f'Bestandskorrektur durch Inventur: Vorher {expected_quantity}, Nachher {counted_quantity}',
+                    created_by=self.user,
+                ))
+
+                stock_row = stock_rows.get(product_id)
+                if stock_row is None:
+                    new_rows.append(ProductWarehouse(
+                        product_id=product_id,
+                        warehouse_id=stock_take.warehouse_id,
+                        quantity=counted_quantity
+                    ))
+                else:
+                    stock_row.quantity = counted_quantity
+                    changed_rows.append(stock_row)
+
+            StockMovement.objects.bulk_create(movements)
+            ProductWarehouse.objects.bulk_update(changed_rows, ['quantity'])
+            ProductWarehouse.objects.bulk_create(new_rows)
+            StockTakeItem.objects.filter(pk__in=[pk for pk, _, _, _ in items]).update(adjustment_applied=True)
+
+            # Massenoperationen lösen keine Signale aus: abhängige Daten direkt nachziehen
+            refresh_stock_summaries(product_ids)
+            mark_products_dirty(product_ids)
+
+        return len(items)
+
+    def finish(self):
+        """Schließt die Inventur ab, nachdem alle Korrekturen gebucht sind."""
+        self.stock_take.status = 'completed'
+        self.stock_take.end_date = timezone.now()
+        self.stock_take.completed_by = self.user
+        self.stock_take.save(update_fields=['status', 'end_date', 'completed_by'])
+        invalidate_dashboard_cache()
+
+    def run(self, progress_callback=None):
+        """Bucht alle offenen Korrekturen und schließt die Inventur ab.
+
+        Args:
+            progress_callback: Optionale Funktion, die nach jedem Block mit
+                dem Ergebnis von get_progress() aufgerufen wird
+
+        Returns:
+            int: Anzahl der in diesem Aufruf gebuchten Positionen
+        """
+        processed = 0
+        while True:
+            count = self.process_chunk()
+            if not count:
+                break
+            processed += count
+            if progress_callback:
+                progress_callback(self.get_progress())
+
+        self.finish()
+        return processed
+
+
+def complete_stock_take(stock_take, user, apply_adjustments=True):
+    """Schließt eine Inventur ab; große Korrekturmengen werden im Hintergrund gebucht.
+
+    Returns:
+        bool: True, wenn der Abschluss im Hintergrund fortgesetzt wird
+    """
+    completion = StockTakeCompletion(stock_take, user)
+    if not completion.start(apply_adjustments):
+        return False
+
+    if completion.discrepant_items().filter(adjustment_applied=False).count() > get_sync_limit():
+        return True
+
+    completion.run()
+    return False
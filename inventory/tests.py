@@ -0,0 +1,147 @@
+from datetime import timedelta
+from io import StringIO
+
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.models import Product, ProductStockSummary, ProductWarehouse
+from suppliers.models import Supplier, SupplierProduct
+from .classification import ProductClassifier, classify_abc
+from .models import ProductClassification, StockMovement, StockTake, Warehouse
+from .stock_take_builder import populate_stock_take
+from .stock_take_completion import StockTakeCompletion, complete_stock_take
+
+
+class StockTakeBuilderTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.warehouse = Warehouse.objects.create(name='Hauptlager', location='Berlin')
+        other = Warehouse.objects.create(name='Ausweichlager', location='Potsdam')
+        supplier = Supplier.objects.create(name='Schrauben GmbH')
+        for index in range(20):
+            product = Product.objects.create(name=f'Artikel {index:02d}', sku=f'ART-{index}')
+            SupplierProduct.objects.create(supplier=supplier, product=product, purchase_price=index)
+            ProductWarehouse.objects.create(product=product, warehouse=self.warehouse, quantity=index)
+            ProductWarehouse.objects.create(product=product, warehouse=other, quantity=1)
+
+    def stock_take(self, inventory_type, **kwargs):
+        return StockTake.objects.create(name='Inventur', warehouse=self.warehouse, created_by=self.user,
+                                        inventory_type=inventory_type, **kwargs)
+
+    def test_full_stock_take_snapshots_expected_quantities(self):
+        stock_take = self.stock_take('full')
+        self.assertEqual(populate_stock_take(stock_take), 20)
+
+        item = stock_take.stocktakeitem_set.get(product__sku='ART-7')
+        self.assertEqual(item.expected_quantity, 7)
+        self.assertFalse(item.is_counted)
+
+        # Neu befüllen ersetzt die Positionen, statt sie zu verdoppeln
+        self.assertEqual(populate_stock_take(stock_take, replace=True), 20)
+        self.assertEqual(stock_take.stocktakeitem_set.count(), 20)
+
+    def test_rolling_and_sample_selection(self):
+        for product in Product.objects.filter(sku__in=['ART-16', 'ART-17', 'ART-18', 'ART-19']):
+            StockMovement.objects.create(product=product, warehouse=self.warehouse, quantity=10,
+                                         movement_type='out')
+
+        a_items = self.stock_take('rolling', cycle_count_category='A')
+        populate_stock_take(a_items)
+        self.assertEqual(
+            sorted(a_items.stocktakeitem_set.values_list('product__sku', flat=True)),
+            ['ART-16', 'ART-17', 'ART-18', 'ART-19']
+        )
+
+        sample = self.stock_take('sample')
+        self.assertEqual(populate_stock_take(sample), 2)
+
+    def test_command_creates_due_cycle_counts_once(self):
+        original = self.stock_take('rolling', cycle_count_category='C', count_frequency=7,
+                                   last_cycle_date=timezone.now().date() - timedelta(days=7))
+
+        call_command('create_stock_takes', stdout=StringIO())
+        call_command('create_stock_takes', stdout=StringIO())
+
+        cycles = StockTake.objects.exclude(pk=original.pk)
+        self.assertEqual(cycles.count(), 1)
+        # Ohne Warenausgänge sind alle Produkte C-Artikel
+        self.assertEqual(cycles.get().stocktakeitem_set.count(), 20)
+
+
+class ProductClassificationTest(TestCase):
+    def test_classify_abc_per_group(self):
+        values = np.array([50.0, 30.0, 15.0, 5.0, 0.0, 100.0])
+        groups = np.array([1, 1, 1, 1, 1, 2])
+        self.assertEqual(classify_abc(values, groups).tolist(), ['A', 'A', 'B', 'C', 'C', 'A'])
+
+    def test_classifier_stores_classes_with_consumption(self):
+        user = User.objects.create_user('lager', 'lager@example.com', 'secret')
+        warehouse = Warehouse.objects.create(name='Hauptlager', location='Berlin')
+        supplier = Supplier.objects.create(name='Schrauben GmbH')
+        steady = Product.objects.create(name='Schraube', sku='SCR-1')
+        idle = Product.objects.create(name='Mutter', sku='MUT-1')
+        for product in (steady, idle):
+            SupplierProduct.objects.create(supplier=supplier, product=product, purchase_price=2)
+            ProductWarehouse.objects.create(product=product, warehouse=warehouse, quantity=100)
+        StockMovement.objects.create(product=steady, warehouse=warehouse, quantity=-25, movement_type='out',
+                                     created_by=user)
+
+        stats = ProductClassifier([warehouse.pk]).run()
+        self.assertEqual(stats, {'A': 1, 'B': 0, 'C': 1, 'total': 2, 'written': 2})
+        # Unveränderte Klassen werden beim nächsten Lauf nicht erneut geschrieben
+        self.assertEqual(ProductClassifier([warehouse.pk]).run()['written'], 0)
+
+        classification = ProductClassification.objects.get(product=steady, warehouse=warehouse)
+        self.assertEqual(classification.abc_class, 'A')
+        self.assertEqual(classification.consumption_value, 50)
+        # Verbrauch nur in einem von zwölf Monaten
+        self.assertEqual(classification.xyz_class, 'Z')
+        self.assertEqual(ProductClassification.objects.get(product=idle).abc_class, 'C')
+
+
+class StockTakeCompletionTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.warehouse = Warehouse.objects.create(name='Hauptlager', location='Berlin')
+        self.stock_take = StockTake.objects.create(name='Inventur', warehouse=self.warehouse, created_by=self.user,
+                                                   status='in_progress')
+        for index in range(10):
+            product = Product.objects.create(name=f'Artikel {index}', sku=f'ART-{index}')
+            ProductWarehouse.objects.create(product=product, warehouse=self.warehouse, quantity=10)
+        populate_stock_take(self.stock_take)
+        # Sechs Abweichungen, vier korrekt gezählte Positionen
+        for item in self.stock_take.stocktakeitem_set.order_by('pk'):
+            item.counted_quantity = 10 if item.product.sku < 'ART-4' else 20
+            item.is_counted = True
+            item.save()
+
+    def test_completion_applies_adjustments_in_chunks(self):
+        completion = StockTakeCompletion(self.stock_take, self.user, chunk_size=4)
+        self.assertTrue(completion.start())
+        self.assertEqual(completion.process_chunk(), 4)
+        self.assertEqual(completion.get_progress(),
+                         {'total': 6, 'processed': 4, 'percent': 66, 'status': 'completing'})
+
+        # Ein neuer Lauf setzt beim nächsten offenen Block fort
+        self.assertEqual(StockTakeCompletion(self.stock_take, chunk_size=4).run(), 2)
+
+        self.stock_take.refresh_from_db()
+        self.assertEqual(self.stock_take.status, 'completed')
+        self.assertEqual(StockMovement.objects.filter(movement_type='adj').count(), 6)
+        self.assertEqual(ProductWarehouse.objects.get(product__sku='ART-9').quantity, 20)
+        self.assertEqual(ProductStockSummary.objects.get(product__sku='ART-9').total_quantity, 20)
+
+    @override_settings(STOCK_TAKE_SYNC_COMPLETION_LIMIT=5)
+    def test_large_completion_is_left_to_worker(self):
+        self.assertTrue(complete_stock_take(self.stock_take, self.user))
+        self.assertEqual(self.stock_take.status, 'completing')
+        self.assertFalse(StockMovement.objects.exists())
+
+        call_command('process_stock_take_completions', '--once', stdout=StringIO())
+        self.stock_take.refresh_from_db()
+        self.assertEqual(self.stock_take.status, 'completed')
+        self.assertEqual(StockMovement.objects.filter(movement_type='adj').count(), 6)
@@ -14,6 +14,8 @@ urlpatterns = [
     path('stock-takes/<int:pk>/delete/', views.stock_take_delete, name='stock_take_delete'),
     path('stock-takes/<int:pk>/start/', views.stock_take_start, name='stock_take_start'),
     path('stock-takes/<int:pk>/complete/', views.stock_take_complete, name='stock_take_complete'),
+    path('stock-takes/<int:pk>/completion-progress/', views.stock_take_completion_progress,
+         name='stock_take_completion_progress'),
     path('stock-takes/<int:pk>/cancel/', views.stock_take_cancel, name='stock_take_cancel'),
     path('stock-takes/<int:pk>/count-items/', views.stock_take_count_items, name='stock_take_count_items'),
     path('stock-takes/<int:pk>/barcode-scan/', views.stock_take_barcode_scan, name='stock_take_barcode_scan'),
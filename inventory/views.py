@@ -1,6 +1,5 @@
 import csv
 from decimal import Decimal
-from random import random
 
 from django import forms
 from django.contrib import messages
@@ -14,10 +13,13 @@ from django.utils import timezone
 
 from accessmanagement.models import WarehouseAccess
 from core.models import Product, Category, ProductWarehouse, BatchNumber
+from core.utils.access import get_accessible_warehouses
 from core.utils.pagination import paginate_queryset
 from .forms import StockTakeForm, StockTakeItemForm, StockTakeFilterForm, DepartmentForm, \
     WarehouseForm, StockAdjustmentForm
 from .models import StockMovement, StockTake, StockTakeItem, Warehouse, Department
+from .stock_take_builder import create_cycle_stock_take, populate_stock_take
+from .stock_take_completion import StockTakeCompletion, complete_stock_take
 
 
 @login_required
@@ -26,11 +28,7 @@ from .models import StockMovement, StockTake, StockTakeItem, Warehouse, Departme
 def stock_movement_list(request):
     """List all stock movements with filtering and search."""
     # Nur Bewegungen in Lagern, auf die der Benutzer Zugriff hat
-    if request.user.is_superuser:
-        accessible_warehouses = Warehouse.objects.filter(is_active=True)
-    else:
-        accessible_warehouses = [w for w in Warehouse.objects.filter(is_active=True)
-                                 if WarehouseAccess.has_access(request.user, w, 'view')]
+    accessible_warehouses = get_accessible_warehouses(request.user)
 
     movements_list = StockMovement.objects.select_related('product', 'created_by', 'warehouse').filter(
         warehouse__in=accessible_warehouses
@@ -100,11 +98,7 @@ def stock_movement_list(request):
 def stock_take_list(request):
     """List all stock takes with filtering."""
     # Nur Inventuren in Lagern anzeigen, auf die der Benutzer Zugriff hat
-    if request.user.is_superuser:
-        accessible_warehouses = Warehouse.objects.filter(is_active=True)
-    else:
-        accessible_warehouses = [w for w in Warehouse.objects.filter(is_active=True)
-                                 if WarehouseAccess.has_access(request.user, w, 'view')]
+    accessible_warehouses = get_accessible_warehouses(request.user)
 
     stock_takes = StockTake.objects.filter(warehouse__in=accessible_warehouses)
 
@@ -157,11 +151,7 @@ def stock_take_list(request):
 def stock_take_create(request):
     """Create a new stock take."""
     # Lager abrufen, auf die der Benutzer Zugriff hat
-    if request.user.is_superuser:
-        accessible_warehouses = Warehouse.objects.filter(is_active=True)
-    else:
-        accessible_warehouses = [w for w in Warehouse.objects.filter(is_active=True)
-                                 if WarehouseAccess.has_access(request.user, w, 'manage_stock')]
+    accessible_warehouses = get_accessible_warehouses(request.user, 'manage_stock')
 
     if not accessible_warehouses:
         messages.error(request, "Sie haben keine Berechtigung, Inventuren durchzuführen.")
@@ -171,7 +161,7 @@ def stock_take_create(request):
         form = StockTakeForm(request.POST)
 
         # Stellen Sie sicher, dass nur zugängliche Lager im Formular ausgewählt werden können
-        form.fields['warehouse'].queryset = Warehouse.objects.filter(id__in=[w.id for w in accessible_warehouses])
+        form.fields['warehouse'].queryset = accessible_warehouses
 
         if form.is_valid():
             stock_take = form.save(commit=False)
@@ -181,81 +171,19 @@ def stock_take_create(request):
             if stock_take.inventory_type == 'rolling' and stock_take.count_frequency > 0:
                 stock_take.last_cycle_date = timezone.now().date()
 
-            stock_take.save()
-
-            # Produkte zur Inventur hinzufügen basierend auf dem Inventurtyp
-            if stock_take.inventory_type == 'full':
-                # Alle Produkte im ausgewählten Lager zur Inventur hinzufügen
-                product_warehouses = ProductWarehouse.objects.filter(warehouse=stock_take.warehouse)
-
-                for product_warehouse in product_warehouses:
-                    StockTakeItem.objects.create(
-                        stock_take=stock_take,
-                        product=product_warehouse.product,
-                        expected_quantity=product_warehouse.quantity
-                    )
-
-            elif stock_take.inventory_type == 'rolling':
-                # Nur Produkte der ausgewählten Kategorie hinzufügen
-                product_warehouses = ProductWarehouse.objects.filter(warehouse=stock_take.warehouse)
-
-                if stock_take.cycle_count_category:
-                    # ABC-Analyse müsste implementiert sein, hier vereinfacht angenommen
-                    # In der Realität würden wir hier eine komplexere Abfrage machen
-                    if stock_take.cycle_count_category == 'A':
-                        # A-Artikel: Höherwertige Produkte (obere 20% nach Wert)
-                        product_warehouses = product_warehouses.order_by('-product__purchase_price')[
-                                             :int(product_warehouses.count() * 0.2)]
-                    elif stock_take.cycle_count_category == 'B':
-                        # B-Artikel: Mittlerer Wert (nächste 30%)
-                        sorted_pws = product_warehouses.order_by('-product__purchase_price')
-                        start_idx = int(product_warehouses.count() * 0.2)
-                        end_idx = int(product_warehouses.count() * 0.5)
-                        product_warehouses = sorted_pws[start_idx:end_idx]
-                    elif stock_take.cycle_count_category == 'C':
-                        # C-Artikel: Geringerer Wert (restliche 50%)
-                        sorted_pws = product_warehouses.order_by('-product__purchase_price')
-                        start_idx = int(product_warehouses.count() * 0.5)
-                        product_warehouses = sorted_pws[start_idx:]
-
-                for product_warehouse in product_warehouses:
-                    StockTakeItem.objects.create(
-                        stock_take=stock_take,
-                        product=product_warehouse.product,
-                        expected_quantity=product_warehouse.quantity
-                    )
-
-            elif stock_take.inventory_type == 'sample':
-                # Zufällige Stichprobe von Produkten
-                product_warehouses = ProductWarehouse.objects.filter(warehouse=stock_take.warehouse)
-                sample_size = min(int(product_warehouses.count() * 0.1), 50)  # 10% oder max 50 Produkte
+            with transaction.atomic():
+                stock_take.save()
 
-                # Zufällige Auswahl
-                sample_pws = random.sample(list(product_warehouses), sample_size)
-
-                for product_warehouse in sample_pws:
-                    StockTakeItem.objects.create(
-                        stock_take=stock_take,
-                        product=product_warehouse.product,
-                        expected_quantity=product_warehouse.quantity
-                    )
-            else:
-                # Typ 'blind' - gleich wie 'full', nur ohne Anzeige der erwarteten Mengen
-                product_warehouses = ProductWarehouse.objects.filter(warehouse=stock_take.warehouse)
-
-                for product_warehouse in product_warehouses:
-                    StockTakeItem.objects.create(
-                        stock_take=stock_take,
-                        product=product_warehouse.product,
-                        expected_quantity=product_warehouse.quantity
-                    )
+                # Produkte zur Inventur hinzufügen basierend auf dem Inventurtyp
+                # (Voll-, Blind-, rollierende und Stichprobeninventur)
+                populate_stock_take(stock_take)
 
             messages.success(request,
                              f'Inventur "{stock_take.name}" für Lager "{stock_take.warehouse.name}" wurde erfolgreich erstellt.')
             return redirect('stock_take_detail', pk=stock_take.pk)
     else:
         form = StockTakeForm()
-        form.fields['warehouse'].queryset = Warehouse.objects.filter(id__in=[w.id for w in accessible_warehouses])
+        form.fields['warehouse'].queryset = accessible_warehouses
 
     context = {
         'form': form,
@@ -339,17 +267,13 @@ def stock_take_update(request, pk):
         return redirect('stock_take_detail', pk=stock_take.pk)
 
     # Lager abrufen, auf die der Benutzer Zugriff hat
-    if request.user.is_superuser:
-        accessible_warehouses = Warehouse.objects.filter(is_active=True)
-    else:
-        accessible_warehouses = [w for w in Warehouse.objects.filter(is_active=True)
-                                 if WarehouseAccess.has_access(request.user, w, 'manage_stock')]
+    accessible_warehouses = get_accessible_warehouses(request.user, 'manage_stock')
 
     if request.method == 'POST':
         form = StockTakeForm(request.POST, instance=stock_take)
 
         # Beschränken Sie die auswählbaren Lager
-        form.fields['warehouse'].queryset = Warehouse.objects.filter(id__in=[w.id for w in accessible_warehouses])
+        form.fields['warehouse'].queryset = accessible_warehouses
 
         if form.is_valid():
             # Prüfen, ob das Lager geändert wurde
@@ -360,23 +284,14 @@ def stock_take_update(request, pk):
 
             # Wenn das Lager geändert wurde, Positionen neu erstellen
             if old_warehouse != new_warehouse:
-                # Alte Positionen löschen
-                stock_take.stocktakeitem_set.all().delete()
-
-                # Neue Positionen für das neue Lager erstellen
-                product_warehouses = ProductWarehouse.objects.filter(warehouse=new_warehouse)
-                for product_warehouse in product_warehouses:
-                    StockTakeItem.objects.create(
-                        stock_take=stock_take,
-                        product=product_warehouse.product,
-                        expected_quantity=product_warehouse.quantity
-                    )
+                # Alte Positionen löschen und für das neue Lager neu erstellen
+                populate_stock_take(stock_take, replace=True)
 
             messages.success(request, f'Inventur "{stock_take.name}" wurde erfolgreich aktualisiert.')
             return redirect('stock_take_detail', pk=stock_take.pk)
     else:
         form = StockTakeForm(instance=stock_take)
-        form.fields['warehouse'].queryset = Warehouse.objects.filter(id__in=[w.id for w in accessible_warehouses])
+        form.fields['warehouse'].queryset = accessible_warehouses
 
     context = {
         'form': form,
@@ -476,46 +391,12 @@ def stock_take_complete(request, pk):
                            f'Es gibt noch {uncounted_count} ungezählte Positionen. Bitte alle Positionen zählen oder "Ungezählte Positionen überspringen" auswählen.')
             return redirect('stock_take_complete', pk=stock_take.pk)
 
-        # Transaktionen für die Bestandsanpassungen
-        with transaction.atomic():
-            if apply_adjustments:
-                # Bestandskorrekturen für alle gezählten Positionen mit Abweichungen
-                items_with_discrepancy = stock_take.stocktakeitem_set.filter(is_counted=True).exclude(
-                    counted_quantity=F('expected_quantity'))
-
-                for item in items_with_discrepancy:
-                    # Bestandskorrektur erstellen
-                    StockMovement.objects.create(
-                        product=item.product,
-                        quantity=item.counted_quantity,
-                        movement_type='adj',
-                        reference=f'Inventur: {stock_take.name}',
-                        notes=f'Bestandskorrektur durch Inventur: Vorher {item.expected_quantity}, Nachher {item.counted_quantity}',
-                        created_by=request.user,
-                        warehouse=stock_take.warehouse  # Lager hinzufügen
-                    )
-
-                    # Produktbestand im Lager aktualisieren
-                    try:
-                        product_warehouse = ProductWarehouse.objects.get(
-                            product=item.product,
-                            warehouse=stock_take.warehouse
-                        )
-                        product_warehouse.quantity = item.counted_quantity
-                        product_warehouse.save()
-                    except ProductWarehouse.DoesNotExist:
-                        # Falls noch kein Eintrag existiert, einen neuen erstellen
-                        ProductWarehouse.objects.create(
-                            product=item.product,
-                            warehouse=stock_take.warehouse,
-                            quantity=item.counted_quantity
-                        )
-
-            # Inventur abschließen
-            stock_take.status = 'completed'
-            stock_take.end_date = timezone.now()
-            stock_take.completed_by = request.user
-            stock_take.save()
+        # Korrekturen werden blockweise gebucht, große Inventuren im Hintergrund
+        if complete_stock_take(stock_take, request.user, apply_adjustments):
+            messages.info(request,
+                          f'Inventur "{stock_take.name}" wird abgeschlossen. Die Bestandskorrekturen werden '
+                          f'im Hintergrund gebucht.')
+            return redirect('stock_take_detail', pk=stock_take.pk)
 
         messages.success(request,
                          f'Inventur "{stock_take.name}" für Lager "{stock_take.warehouse.name}" wurde erfolgreich abgeschlossen.')
@@ -545,6 +426,19 @@ def stock_take_complete(request, pk):
     return render(request, 'inventory/stock_take_confirm_complete.html', context)
 
 
+@login_required
+@permission_required('inventory.view_inventory', raise_exception=True)
+def stock_take_completion_progress(request, pk):
+    """Fortschritt der Korrekturbuchungen eines Inventurabschlusses (JSON)."""
+    stock_take = get_object_or_404(StockTake, pk=pk)
+
+    # Zugriffskontrolle
+    if not WarehouseAccess.has_access(request.user, stock_take.warehouse, 'view'):
+        return HttpResponseForbidden("Sie haben keine Berechtigung, diese Inventur anzusehen.")
+
+    return JsonResponse(StockTakeCompletion(stock_take).get_progress())
+
+
 @login_required
 @permission_required('inventory', 'edit')
 def stock_take_cancel(request, pk):
@@ -940,12 +834,7 @@ def stock_take_export_pdf(request, pk):
 
 def warehouse_list(request):
     # Nur Lager anzeigen, auf die der Benutzer Zugriff hat
-    warehouses = []
-    all_warehouses = Warehouse.objects.filter(is_active=True)
-
-    for warehouse in all_warehouses:
-        if WarehouseAccess.has_access(request.user, warehouse, 'view'):
-            warehouses.append(warehouse)
+    warehouses = get_accessible_warehouses(request.user)
 
     return render(request, 'inventory/warehouse_list.html', {'warehouses': warehouses})
 
@@ -1298,11 +1187,7 @@ def product_warehouses(request, product_id):
     product = get_object_or_404(Product, pk=product_id)
 
     # Nur Lager anzeigen, auf die der Benutzer Zugriff hat
-    if request.user.is_superuser:
-        accessible_warehouses = Warehouse.objects.filter(is_active=True)
-    else:
-        accessible_warehouses = [w for w in Warehouse.objects.filter(is_active=True)
-                                 if WarehouseAccess.has_access(request.user, w, 'view')]
+    accessible_warehouses = get_accessible_warehouses(request.user)
 
     # Produktbestände in den zugänglichen Lagern abrufen
     product_warehouses = ProductWarehouse.objects.filter(
@@ -1574,12 +1459,6 @@ def product_add_to_warehouse(request, warehouse_id):
                 product_warehouse.quantity = quantity
                 product_warehouse.save()
 
-                # Gesamtbestand aktualisieren
-                total_stock = ProductWarehouse.objects.filter(product=product).aggregate(
-                    total=Sum('quantity'))['total'] or 0
-                product.current_stock = total_stock
-                product.save()
-
                 messages.success(request,
                                  f'Produkt {product.name} wurde erfolgreich zum Lager {warehouse.name} mit einem Anfangsbestand von {quantity} hinzugefügt.')
             else:
@@ -1682,12 +1561,6 @@ def bulk_add_products_to_warehouse(request, warehouse_id):
                     product_warehouse.quantity = initial_quantity
                     product_warehouse.save()
 
-                    # Gesamtbestand des Produkts aktualisieren
-                    total_stock = ProductWarehouse.objects.filter(product=product).aggregate(
-                        total=Sum('quantity'))['total'] or 0
-                    product.current_stock = total_stock
-                    product.save()
-
                 added_products += 1
 
             # Erfolgsmeldung
@@ -1744,15 +1617,7 @@ def bulk_warehouse_transfer(request):
     """Umlagerung von Produkten zwischen Lagern mit Chargenunterstützung."""
 
     # Verfügbare Lager für den Benutzer ermitteln
-    if request.user.is_superuser:
-        managed_warehouses = Warehouse.objects.filter(is_active=True)
-    else:
-        user_departments = request.user.profile.departments.all()
-        warehouse_access = WarehouseAccess.objects.filter(
-            department__in=user_departments,
-            can_manage_stock=True
-        ).values_list('warehouse', flat=True)
-        managed_warehouses = Warehouse.objects.filter(id__in=warehouse_access, is_active=True)
+    managed_warehouses = get_accessible_warehouses(request.user, 'manage_stock')
 
     # Quelllager aus GET-Parameter
     source_warehouse_id = request.GET.get('source')
@@ -2023,51 +1888,9 @@ def stock_take_create_cycle(request, pk):
         return redirect('stock_take_detail', pk=original_stock_take.pk)
 
     if request.method == 'POST':
-        # Neue Zykleninventur erstellen
-        new_stock_take = StockTake.objects.create(
-            name=f"{original_stock_take.name} (Zyklus {timezone.now().strftime('%d.%m.%Y')})",
-            description=original_stock_take.description,
-            warehouse=original_stock_take.warehouse,
-            status='draft',
-            inventory_type='rolling',
-            display_expected_quantity=original_stock_take.display_expected_quantity,
-            cycle_count_category=original_stock_take.cycle_count_category,
-            count_frequency=original_stock_take.count_frequency,
-            last_cycle_date=timezone.now().date(),
-            created_by=request.user
-        )
-
-        # Produkte entsprechend der Kategorie hinzufügen
-        product_warehouses = ProductWarehouse.objects.filter(warehouse=new_stock_take.warehouse)
-
-        if new_stock_take.cycle_count_category:
-            # Vereinfachte ABC-Analyse
-            if new_stock_take.cycle_count_category == 'A':
-                # A-Artikel: Höherwertige Produkte (obere 20% nach Wert)
-                product_warehouses = product_warehouses.order_by('-product__purchase_price')[
-                                     :int(product_warehouses.count() * 0.2)]
-            elif new_stock_take.cycle_count_category == 'B':
-                # B-Artikel: Mittlerer Wert (nächste 30%)
-                sorted_pws = product_warehouses.order_by('-product__purchase_price')
-                start_idx = int(product_warehouses.count() * 0.2)
-                end_idx = int(product_warehouses.count() * 0.5)
-                product_warehouses = sorted_pws[start_idx:end_idx]
-            elif new_stock_take.cycle_count_category == 'C':
-                # C-Artikel: Geringerer Wert (restliche 50%)
-                sorted_pws = product_warehouses.order_by('-product__purchase_price')
-                start_idx = int(product_warehouses.count() * 0.5)
-                product_warehouses = sorted_pws[start_idx:]
-
-        for product_warehouse in product_warehouses:
-            StockTakeItem.objects.create(
-                stock_take=new_stock_take,
-                product=product_warehouse.product,
-                expected_quantity=product_warehouse.quantity
-            )
-
-        # Original aktualisieren
-        original_stock_take.last_cycle_date = timezone.now().date()
-        original_stock_take.save()
+        # Neue Zykleninventur erstellen, Produkte entsprechend der Kategorie hinzufügen
+        # und das Original aktualisieren
+        new_stock_take, _ = create_cycle_stock_take(original_stock_take, request.user)
 
         messages.success(request, f"Neue Zykleninventur '{new_stock_take.name}' wurde erfolgreich erstellt.")
         return redirect('stock_take_detail', pk=new_stock_take.pk)
@@ -2089,11 +1912,7 @@ def stock_adjustment(request, product_id, warehouse_id=None):
     product = get_object_or_404(Product, pk=product_id)
 
     # Lager abrufen, auf die der Benutzer Zugriff hat
-    if request.user.is_superuser:
-        accessible_warehouses = Warehouse.objects.filter(is_active=True)
-    else:
-        accessible_warehouses = [w for w in Warehouse.objects.filter(is_active=True)
-                                 if WarehouseAccess.has_access(request.user, w, 'manage_stock')]
+    accessible_warehouses = get_accessible_warehouses(request.user, 'manage_stock')
 
     if not accessible_warehouses:
         messages.error(request, "Sie haben keine Berechtigung, Bestände in Lagern zu verwalten.")
@@ -0,0 +1,117 @@
+# order/management/commands/benchmark_order_suggestions.py
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Product, ProductWarehouse
+from inventory.models import Warehouse
+from order.models import OrderSuggestion, PurchaseOrder, PurchaseOrderItem
+from order.suggestion_engine import OrderSuggestionEngine
+from suppliers.models import Supplier, SupplierProduct
+
+
+class _Rollback(Exception):
+    """Wird ausgelöst, um die Benchmark-Daten am Ende zu verwerfen."""
+
+
+class Command(BaseCommand):
+    help = 'Misst Abfrageanzahl und Laufzeit der Bestellvorschlags-Berechnung für verschiedene Produktmengen'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[1000, 10000, 100000],
+            help='Anzahl der synthetischen Produkte pro Durchlauf (Standard: 1000 10000 100000)'
+        )
+        parser.add_argument(
+            '--low-stock-ratio', type=float, default=0.3,
+            help='Anteil der Produkte unter Mindestbestand (Standard: 0.3)'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Startwert für den Zufallsgenerator')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Starte Benchmark der Bestellvorschläge...'))
+        self.stdout.write(f"{'Produkte':>10} {'Lauf':>8} {'Abfragen':>9} {'Zeit (s)':>9} "
+                          f"{'neu':>8} {'geändert':>9} {'gelöscht':>9}")
+
+        for size in options['sizes']:
+            random.seed(options['seed'])
+            try:
+                with transaction.atomic():
+                    self._seed(size, options['low_stock_ratio'])
+                    # Erster Lauf: leere Tabelle, alles wird eingefügt
+                    self._measure(size, 'initial')
+                    # Zweiter Lauf: unveränderte Daten, nur Abgleich
+                    self._measure(size, 'steady')
+                    # Dritter Lauf: 1 % der Bestände geändert
+                    changed = max(1, size // 100)
+                    ProductWarehouse.objects.filter(
+                        pk__in=ProductWarehouse.objects.order_by('?').values('pk')[:changed]
+                    ).update(quantity=0)
+                    self._measure(size, 'delta')
+                    raise _Rollback()
+            except _Rollback:
+                pass
+
+        self.stdout.write(self.style.SUCCESS('Benchmark abgeschlossen, Testdaten wurden verworfen.'))
+
+    def _measure(self, size, label):
+        engine = OrderSuggestionEngine()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            stats = engine.run()
+            duration = time.perf_counter() - start
+
+        self.stdout.write(f"{size:>10} {label:>8} {len(queries):>9} {duration:>9.3f} "
+                          f"{stats['created']:>8} {stats['updated']:>9} {stats['deleted']:>9}")
+
+    def _seed(self, size, low_stock_ratio):
+        """Legt synthetische Produkte, Bestände, Lieferanten und offene Bestellungen an."""
+        OrderSuggestion.objects.all().delete()
+
+        user = User.objects.create(username=f'benchmark-{time.time_ns()}')
+        warehouses = Warehouse.objects.bulk_create([
+            Warehouse(name=f'Benchmark-Lager {i}', location='Benchmark') for i in range(3)
+        ])
+        suppliers = Supplier.objects.bulk_create([
+            Supplier(name=f'Benchmark-Lieferant {i}') for i in range(20)
+        ])
+
+        prefix = f'BM{time.time_ns()}-'
+        Product.objects.bulk_create(
+            [Product(name=f'Benchmark {i}', sku=f'{prefix}{i}', minimum_stock=random.randint(5, 100))
+             for i in range(size)],
+            batch_size=1000
+        )
+        products = list(Product.objects.filter(sku__startswith=prefix).values_list('pk', 'minimum_stock'))
+
+        stock_rows = []
+        supplier_rows = []
+        for product_id, minimum_stock in products:
+            low = random.random() < low_stock_ratio
+            for warehouse in random.sample(warehouses, 2):
+                quantity = random.randint(0, minimum_stock // 3) if low else random.randint(minimum_stock, minimum_stock * 3)
+                stock_rows.append(ProductWarehouse(product_id=product_id, warehouse=warehouse,
+                                                   quantity=Decimal(quantity)))
+            for index, supplier in enumerate(random.sample(suppliers, 2)):
+                supplier_rows.append(SupplierProduct(product_id=product_id, supplier=supplier,
+                                                     purchase_price=Decimal('9.99'), is_preferred=index == 0))
+
+        ProductWarehouse.objects.bulk_create(stock_rows, batch_size=1000)
+        SupplierProduct.objects.bulk_create(supplier_rows, batch_size=1000)
+
+        # Offene Bestellungen für ca. 10 % der Produkte
+        orders = PurchaseOrder.objects.bulk_create([
+            PurchaseOrder(order_number=f'{prefix}PO{i}', supplier=supplier, created_by=user, status='sent')
+            for i, supplier in enumerate(suppliers)
+        ])
+        order_items = [
+            PurchaseOrderItem(purchase_order=random.choice(orders), product_id=product_id,
+                              quantity_ordered=Decimal(minimum_stock), unit_price=Decimal('9.99'))
+            for product_id, minimum_stock in random.sample(products, len(products) // 10)
+        ]
+        PurchaseOrderItem.objects.bulk_create(order_items, batch_size=1000)
@@ -0,0 +1,61 @@
+# order/management/commands/process_order_suggestions.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from order.models import OrderSuggestionRefreshState
+from order.services import generate_order_suggestions, refresh_dirty_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Berechnet Bestellvorschläge im Hintergrund für vorgemerkte Produkte neu'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Wartezeit in Sekunden zwischen zwei Durchläufen (Standard: 5)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Anzahl der Produkte pro Berechnungsschritt (Standard: 500)')
+        parser.add_argument('--full-interval', type=int, default=3600,
+                            help='Sekunden zwischen zwei Vollberechnungen, 0 = nur auf Anforderung (Standard: 3600)')
+        parser.add_argument('--once', action='store_true',
+                            help='Nur einen Durchlauf ausführen und dann beenden')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Bestellvorschlags-Worker gestartet.'))
+
+        try:
+            while True:
+                self.run_cycle(options['batch_size'], options['full_interval'])
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Worker wird beendet.')
+
+    def run_cycle(self, batch_size, full_interval):
+        state = OrderSuggestionRefreshState.get_state()
+        full_due = (
+            full_interval > 0 and (
+                state.last_full_refresh_at is None or
+                (timezone.now() - state.last_full_refresh_at).total_seconds() >= full_interval
+            )
+        )
+
+        if state.full_refresh_requested or full_due:
+            start_time = timezone.now()
+            count = generate_order_suggestions()
+            duration = (timezone.now() - start_time).total_seconds()
+            self.stdout.write(self.style.SUCCESS(
+                f'Vollberechnung in {duration:.2f} Sekunden: {count} Bestellvorschläge.'
+            ))
+            return
+
+        start_time = timezone.now()
+        stats = refresh_dirty_suggestions(batch_size=batch_size)
+        if stats['products']:
+            duration = (timezone.now() - start_time).total_seconds()
+            self.stdout.write(
+                f"{stats['products']} Produkte in {duration:.2f} Sekunden neu berechnet "
+                f"({stats['created']} neu, {stats['updated']} geändert, {stats['deleted']} entfernt)."
+            )
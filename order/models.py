@@ -468,6 +468,35 @@ class OrderSuggestion(models.Model):
         return f"Bestellvorschlag: {self.product.name} ({self.suggested_order_quantity})"
 
 
+class OrderSuggestionDirtyProduct(models.Model):
+    """Markiert Produkte, deren Bestellvorschlag im Hintergrund neu berechnet werden muss."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='suggestion_dirty_marker')
+    marked_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Neu berechnen: {self.product_id} ({self.marked_at})"
+
+    class Meta:
+        verbose_name = "Vorgemerktes Produkt (Bestellvorschlag)"
+        verbose_name_plural = "Vorgemerkte Produkte (Bestellvorschläge)"
+
+
+class OrderSuggestionRefreshState(models.Model):
+    """Zustand der Hintergrund-Aktualisierung der Bestellvorschläge (nur eine Zeile)."""
+    last_refreshed_at = models.DateTimeField(null=True, blank=True, verbose_name="Zuletzt aktualisiert")
+    last_full_refresh_at = models.DateTimeField(null=True, blank=True, verbose_name="Letzte Vollberechnung")
+    full_refresh_requested = models.BooleanField(default=False, verbose_name="Vollberechnung angefordert")
+
+    class Meta:
+        verbose_name = "Status Bestellvorschläge"
+        verbose_name_plural = "Status Bestellvorschläge"
+
+    @classmethod
+    def get_state(cls):
+        state, _ = cls.objects.get_or_create(pk=1)
+        return state
+
+
 class OrderTemplate(models.Model):
     """Template for frequently used orders"""
     RECURRENCE_CHOICES = [
@@ -1,126 +1,107 @@
-from django.db.models import Sum, F, Q, Exists, OuterRef
-from decimal import Decimal
-from core.models import Product, ProductWarehouse
-from suppliers.models import SupplierProduct
-from .models import OrderSuggestion, PurchaseOrder, PurchaseOrderItem
+from django.db import transaction
+from django.utils import timezone
 
+from .models import OrderSuggestion, OrderSuggestionDirtyProduct, OrderSuggestionRefreshState
+from .suggestion_engine import CHUNK_SIZE, OrderSuggestionEngine
 
-# Korrigierte Version der generate_order_suggestions-Funktion
 
 def generate_order_suggestions():
     """Generiere Bestellvorschläge für Produkte mit kritischem Bestand,
-    unter Berücksichtigung bestehender Bestellungen."""
-
-
-    # Unterabfrage für Produkte, die bereits in aktiven Bestellungen sind
-    products_in_orders = PurchaseOrderItem.objects.filter(
-        product=OuterRef('pk'),
-        purchase_order__status__in=['draft', 'pending', 'approved', 'sent']
-    )
-
-    # Produkte mit kritischem Bestand identifizieren, die NICHT bereits bestellt sind
-    products_with_low_stock = Product.objects.annotate(
-        computed_total_stock=Sum('productwarehouse__quantity'),
-        has_pending_orders=Exists(products_in_orders)
-    ).filter(
-        (Q(computed_total_stock__lt=F('minimum_stock')) |
-         Q(computed_total_stock__isnull=True, minimum_stock__gt=0)) &
-        Q(has_pending_orders=False)
+    unter Berücksichtigung bestehender Bestellungen.
+
+    Die Berechnung erfolgt mengenbasiert über die OrderSuggestionEngine;
+    bestehende Vorschläge werden nur angepasst, wenn sich etwas geändert hat.
+    Als Vollberechnung erledigt sie auch alle vorgemerkten Produkte.
+
+    Returns:
+        int: Anzahl der aktuell gültigen Bestellvorschläge
+    """
+    started_at = timezone.now()
+    stats = OrderSuggestionEngine().run()
+
+    # Alles, was vor dem Start vorgemerkt wurde, ist in der Vollberechnung enthalten
+    OrderSuggestionDirtyProduct.objects.filter(marked_at__lte=started_at).delete()
+    OrderSuggestionRefreshState.objects.update_or_create(pk=1, defaults={
+        'last_refreshed_at': timezone.now(),
+        'last_full_refresh_at': timezone.now(),
+        'full_refresh_requested': False,
+    })
+    return stats['total']
+
+
+def mark_products_dirty(product_ids):
+    """Merkt Produkte zur Neuberechnung ihrer Bestellvorschläge vor.
+
+    Wird von den Signal-Handlern aufgerufen; die eigentliche Berechnung
+    übernimmt der Hintergrundprozess (process_order_suggestions).
+    """
+    product_ids = {product_id for product_id in product_ids if product_id}
+    if not product_ids:
+        return
+
+    now = timezone.now()
+    OrderSuggestionDirtyProduct.objects.bulk_create(
+        [OrderSuggestionDirtyProduct(product_id=product_id, marked_at=now) for product_id in product_ids],
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=['marked_at'],
     )
 
-    # Alternativ: Produkte mit kritischem Bestand identifizieren und
-    # später die zu bestellende Menge um bereits bestellte Mengen reduzieren
-    # Diese Variante ist besser, wenn vorhandene Bestellungen berücksichtigt
-    # werden sollen, aber möglicherweise weitere Mengen bestellt werden müssen
-
-    # Produkte mit kritischem Bestand, inklusive derer mit laufenden Bestellungen
-    all_low_stock_products = Product.objects.annotate(
-        computed_total_stock=Sum('productwarehouse__quantity')
-    ).filter(
-        Q(computed_total_stock__lt=F('minimum_stock')) |
-        Q(computed_total_stock__isnull=True, minimum_stock__gt=0)
-    )
-
-    # Löschen der alten Vorschläge
-    OrderSuggestion.objects.all().delete()
-
-    # Neue Vorschläge erstellen
-    suggestions = []
-
-    for product in all_low_stock_products:
-        # Aktuellen Bestand abrufen
-        current_stock = product.productwarehouse_set.aggregate(
-            total=Sum('quantity')
-        )['total'] or Decimal('0')
-
-        # Bestehende Bestellungen für dieses Produkt abrufen
-        already_ordered_quantity = PurchaseOrderItem.objects.filter(
-            product=product,
-            purchase_order__status__in=['draft', 'pending', 'approved', 'sent']
-        ).aggregate(
-            total=Sum('quantity_ordered')
-        )['total'] or Decimal('0')
-
-        # Gesamtmenge im System (Bestand + bereits bestellt)
-        total_system_quantity = current_stock + already_ordered_quantity
-
-        # Wenn bereits genug bestellt wurde, kein Vorschlag
-        if total_system_quantity >= product.minimum_stock:
-            continue
-
-        # Optimale Bestellmenge berechnen unter Berücksichtigung bereits bestellter Mengen
-        target_stock = max(
-            product.minimum_stock * Decimal('1.2'),
-            product.minimum_stock * Decimal('2') - current_stock
-        )
-
-        # Bestellmenge = Zielmenge - (aktueller Bestand + bereits bestellt)
-        suggested_quantity = max(target_stock - total_system_quantity, Decimal('0'))
 
-        # Aufrunden auf ganze Einheiten
-        suggested_quantity = suggested_quantity.quantize(Decimal('1'))
+def refresh_dirty_suggestions(batch_size=CHUNK_SIZE, max_batches=None):
+    """Berechnet die Bestellvorschläge nur für vorgemerkte Produkte neu.
 
-        # Wenn nichts zu bestellen ist, überspringe
-        if suggested_quantity <= 0:
-            continue
+    Args:
+        batch_size: Anzahl der Produkte pro Durchgang
+        max_batches: Optionale Obergrenze an Durchgängen pro Aufruf
 
-        # Bevorzugten Lieferanten ermitteln
-        preferred_supplier = None
-        try:
-            # Versuche, den bevorzugten Lieferanten zu finden
-            supplier_product = SupplierProduct.objects.filter(
-                product=product,
-                is_preferred=True
-            ).first()
+    Returns:
+        dict: Summierte Statistik inkl. Anzahl neu berechneter Produkte
+    """
+    totals = {'products': 0, 'created': 0, 'updated': 0, 'deleted': 0}
+    snapshot = timezone.now()
+    batches = 0
 
-            if supplier_product:
-                preferred_supplier = supplier_product.supplier
-            else:
-                # Fallback: Nimm den ersten verfügbaren Lieferanten
-                supplier_product = SupplierProduct.objects.filter(
-                    product=product
-                ).first()
-
-                if supplier_product:
-                    preferred_supplier = supplier_product.supplier
-        except:
-            pass
-
-        # Bestellvorschlag erstellen
-        suggestion = OrderSuggestion(
-            product=product,
-            current_stock=current_stock,
-            minimum_stock=product.minimum_stock,
-            suggested_order_quantity=suggested_quantity,
-            preferred_supplier=preferred_supplier
+    while max_batches is None or batches < max_batches:
+        product_ids = list(
+            OrderSuggestionDirtyProduct.objects.filter(
+                marked_at__lte=snapshot
+            ).order_by('marked_at').values_list('product_id', flat=True)[:batch_size]
         )
-        suggestions.append(suggestion)
-
-    # Bulk-Insert der Vorschläge
-    if suggestions:
-        OrderSuggestion.objects.bulk_create(suggestions)
-
-    return len(suggestions)
+        if not product_ids:
+            break
+
+        with transaction.atomic():
+            stats = OrderSuggestionEngine(product_ids=product_ids, batch_size=batch_size).run()
+            # Nur Markierungen entfernen, die während der Berechnung nicht erneuert wurden
+            OrderSuggestionDirtyProduct.objects.filter(
+                product_id__in=product_ids, marked_at__lte=snapshot
+            ).delete()
+
+        totals['products'] += len(product_ids)
+        for key in ('created', 'updated', 'deleted'):
+            totals[key] += stats[key]
+        batches += 1
+
+    if totals['products']:
+        OrderSuggestionRefreshState.objects.update_or_create(pk=1, defaults={'last_refreshed_at': timezone.now()})
+    return totals
+
+
+def request_full_refresh():
+    """Fordert eine Vollberechnung durch den Hintergrundprozess an."""
+    OrderSuggestionRefreshState.objects.update_or_create(pk=1, defaults={'full_refresh_requested': True})
+
+
+def get_suggestion_status():
+    """Anzahl, Alter und offene Arbeit der vorberechneten Bestellvorschläge."""
+    state = OrderSuggestionRefreshState.get_state()
+    return {
+        'count': OrderSuggestion.objects.count(),
+        'last_refreshed_at': state.last_refreshed_at,
+        'pending_products': OrderSuggestionDirtyProduct.objects.count(),
+        'full_refresh_requested': state.full_refresh_requested,
+    }
 
 
 # In order/services.py - Erstellen Sie eine neue Funktion, die Bestellvorschläge aktualisiert
@@ -1,6 +1,7 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from .models import PurchaseOrder, PurchaseOrderComment
+from .models import PurchaseOrder, PurchaseOrderComment, PurchaseOrderItem
+from .services import mark_products_dirty
 
 
 @receiver(pre_save, sender=PurchaseOrder)
@@ -74,4 +75,31 @@ def track_receipts(sender, instance, created, **kwargs):
             )
         except (IndexError, PurchaseOrder.DoesNotExist):
             # If we can't parse the reference or find the order, skip creating a comment
-            pass
\ No newline at end of file
+            pass
+
+# Vormerken von Produkten für die Hintergrund-Neuberechnung der Bestellvorschläge
+
+@receiver(post_save, sender='core.ProductWarehouse')
+@receiver(post_delete, sender='core.ProductWarehouse')
+@receiver(post_save, sender='suppliers.SupplierProduct')
+@receiver(post_delete, sender='suppliers.SupplierProduct')
+@receiver(post_save, sender=PurchaseOrderItem)
+@receiver(post_delete, sender=PurchaseOrderItem)
+def mark_suggestion_product_dirty(sender, instance, **kwargs):
+    """Bestand, offene Bestellmengen oder Lieferantenzuordnung eines Produkts haben sich geändert."""
+    mark_products_dirty([instance.product_id])
+
+
+@receiver(post_save, sender=PurchaseOrder)
+def mark_order_products_dirty(sender, instance, created, **kwargs):
+    """Statuswechsel einer Bestellung verändern die offenen Bestellmengen aller Positionen."""
+    if created or not instance.tracker.has_changed('status'):
+        return
+    mark_products_dirty(instance.items.values_list('product_id', flat=True))
+
+
+@receiver(post_save, sender='core.Product')
+def mark_minimum_stock_changed(sender, instance, created, **kwargs):
+    """Neue Produkte und geänderte Mindestbestände erfordern eine Neuberechnung."""
+    if created or instance.tracker.has_changed('minimum_stock'):
+        mark_products_dirty([instance.pk])
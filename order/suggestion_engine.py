@@ -0,0 +1,221 @@
+# order/suggestion_engine.py
+"""
+Mengenbasierte Berechnung der Bestellvorschläge.
+
+Statt pro Produkt mehrere Abfragen auszuführen, werden Bestand, offene
+Bestellmengen und bevorzugte Lieferanten für alle betroffenen Produkte in
+wenigen gruppierten Abfragen ermittelt. Das Ergebnis wird mit den bestehenden
+Vorschlägen abgeglichen, sodass nur geänderte Zeilen geschrieben werden.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.models import Product
+from suppliers.models import SupplierProduct
+from .models import OrderSuggestion, PurchaseOrderItem
+
+# Bestellstatus, deren Mengen als "bereits bestellt" gelten
+OPEN_ORDER_STATUSES = ['draft', 'pending', 'approved', 'sent']
+
+# Felder, die beim Abgleich verglichen und ggf. aktualisiert werden
+SUGGESTION_FIELDS = ['current_stock', 'minimum_stock', 'suggested_order_quantity', 'preferred_supplier_id']
+
+# Obergrenze für Parameter pro Abfrage (SQLite erlaubt standardmäßig nur 999)
+CHUNK_SIZE = 500
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def calculate_suggested_quantity(current_stock, already_ordered, minimum_stock):
+    """Berechnet die vorgeschlagene Bestellmenge für ein Produkt.
+
+    Gibt Decimal('0') zurück, wenn Bestand und offene Bestellungen den
+    Mindestbestand bereits abdecken.
+    """
+    minimum_stock = Decimal(minimum_stock)
+    total_system_quantity = current_stock + already_ordered
+
+    if total_system_quantity >= minimum_stock:
+        return Decimal('0')
+
+    target_stock = max(
+        minimum_stock * Decimal('1.2'),
+        minimum_stock * Decimal('2') - current_stock
+    )
+    suggested_quantity = max(target_stock - total_system_quantity, Decimal('0'))
+
+    # Aufrunden auf ganze Einheiten
+    return suggested_quantity.quantize(Decimal('1'))
+
+
+class OrderSuggestionEngine:
+    """Berechnet Bestellvorschläge für alle Produkte mit einer festen Anzahl von Abfragen.
+
+    Ablauf:
+        1. Produkte unter Mindestbestand inkl. aktuellem Bestand (eine gruppierte Abfrage)
+        2. Offene Bestellmengen dieser Produkte (eine gruppierte Abfrage)
+        3. Bevorzugte Lieferanten dieser Produkte (eine Abfrage)
+        4. Bestehende Vorschläge (eine Abfrage)
+        5. Abgleich und Schreiben der Differenz per bulk_create/bulk_update/delete
+    """
+
+    def __init__(self, product_ids=None, batch_size=CHUNK_SIZE):
+        # None = alle Produkte; sonst nur die angegebenen Produkte neu berechnen
+        self.product_ids = list(product_ids) if product_ids is not None else None
+        self.batch_size = batch_size
+        self.stats = {
+            'created': 0,
+            'updated': 0,
+            'deleted': 0,
+            'unchanged': 0,
+            'total': 0,
+        }
+
+    def get_low_stock_products(self):
+        """Produkte, deren Gesamtbestand unter dem Mindestbestand liegt."""
+        products = Product.objects.all()
+        if self.product_ids is not None:
+            products = products.filter(pk__in=self.product_ids)
+
+        return products.annotate(
+            computed_total_stock=Coalesce(
+                Sum('productwarehouse__quantity'),
+                Value(0, output_field=DecimalField(max_digits=10, decimal_places=2))
+            )
+        ).filter(
+            computed_total_stock__lt=F('minimum_stock')
+        )
+
+    def get_open_order_quantities(self, product_queryset):
+        """Summe der offenen Bestellmengen je Produkt."""
+        rows = PurchaseOrderItem.objects.filter(
+            product__in=product_queryset.values('pk'),
+            purchase_order__status__in=OPEN_ORDER_STATUSES
+        ).values('product_id').annotate(
+            total=Sum('quantity_ordered')
+        ).values_list('product_id', 'total')
+
+        return {product_id: Decimal(total or 0) for product_id, total in rows}
+
+    def get_preferred_suppliers(self, product_queryset):
+        """Bevorzugter Lieferant je Produkt, ersatzweise der erste zugeordnete Lieferant."""
+        rows = SupplierProduct.objects.filter(
+            product__in=product_queryset.values('pk')
+        ).order_by(
+            'product_id', '-is_preferred', 'supplier__name', 'pk'
+        ).values_list('product_id', 'supplier_id')
+
+        suppliers = {}
+        for product_id, supplier_id in rows:
+            # Die Sortierung stellt sicher, dass der erste Treffer der bevorzugte ist
+            suppliers.setdefault(product_id, supplier_id)
+        return suppliers
+
+    def compute(self):
+        """Berechnet die Soll-Vorschläge als Dict {product_id: {feld: wert}}."""
+        low_stock_products = self.get_low_stock_products()
+
+        candidates = list(low_stock_products.values_list('pk', 'minimum_stock', 'computed_total_stock'))
+        if not candidates:
+            return {}
+
+        ordered_quantities = self.get_open_order_quantities(low_stock_products)
+        preferred_suppliers = self.get_preferred_suppliers(low_stock_products)
+
+        desired = {}
+        for product_id, minimum_stock, current_stock in candidates:
+            current_stock = Decimal(current_stock or 0)
+            suggested_quantity = calculate_suggested_quantity(
+                current_stock,
+                ordered_quantities.get(product_id, Decimal('0')),
+                minimum_stock
+            )
+            if suggested_quantity <= 0:
+                continue
+
+            desired[product_id] = {
+                'current_stock': current_stock,
+                'minimum_stock': Decimal(minimum_stock),
+                'suggested_order_quantity': suggested_quantity,
+                'preferred_supplier_id': preferred_suppliers.get(product_id),
+            }
+        return desired
+
+    def _load_existing(self):
+        """Bestehende Vorschläge je Produkt; Duplikate werden zum Löschen vorgemerkt."""
+        existing = {}
+        duplicate_ids = []
+        suggestions = OrderSuggestion.objects.all()
+        if self.product_ids is not None:
+            suggestions = suggestions.filter(product_id__in=self.product_ids)
+
+        rows = suggestions.order_by('product_id', 'pk').values_list('pk', 'product_id', *SUGGESTION_FIELDS)
+        for pk, product_id, *values in rows:
+            if product_id in existing:
+                duplicate_ids.append(pk)
+                continue
+            existing[product_id] = (pk, dict(zip(SUGGESTION_FIELDS, values)))
+        return existing, duplicate_ids
+
+    @staticmethod
+    def _has_changed(current, desired):
+        for field in SUGGESTION_FIELDS:
+            old_value = current[field]
+            new_value = desired[field]
+            if isinstance(new_value, Decimal) and old_value is not None:
+                old_value = Decimal(old_value)
+            if old_value != new_value:
+                return True
+        return False
+
+    def run(self):
+        """Gleicht die Tabelle OrderSuggestion mit dem berechneten Sollzustand ab.
+
+        Bei gesetzten product_ids werden nur Vorschläge dieser Produkte angelegt,
+        geändert oder gelöscht.
+
+        Returns:
+            dict: Anzahl erstellter, aktualisierter, gelöschter und unveränderter Vorschläge
+        """
+        desired = self.compute()
+        existing, stale_ids = self._load_existing()
+        now = timezone.now()
+
+        to_create = []
+        to_update = []
+        for product_id, values in desired.items():
+            if product_id not in existing:
+                to_create.append(OrderSuggestion(product_id=product_id, **values))
+                continue
+
+            pk, current = existing[product_id]
+            if self._has_changed(current, values):
+                to_update.append(OrderSuggestion(pk=pk, product_id=product_id, last_calculated=now, **values))
+            else:
+                self.stats['unchanged'] += 1
+
+        stale_ids.extend(pk for product_id, (pk, _) in existing.items() if product_id not in desired)
+
+        with transaction.atomic():
+            for chunk in _chunks(stale_ids, self.batch_size):
+                OrderSuggestion.objects.filter(pk__in=chunk).delete()
+            if to_update:
+                OrderSuggestion.objects.bulk_update(
+                    to_update, SUGGESTION_FIELDS + ['last_calculated'], batch_size=self.batch_size
+                )
+            if to_create:
+                OrderSuggestion.objects.bulk_create(to_create, batch_size=self.batch_size)
+
+        self.stats['created'] = len(to_create)
+        self.stats['updated'] = len(to_update)
+        self.stats['deleted'] = len(stale_ids)
+        self.stats['total'] = len(desired)
+        return self.stats
@@ -1,3 +1,105 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from core.models import Product, ProductWarehouse
+from inventory.models import Warehouse
+from suppliers.models import Supplier, SupplierProduct
+from .models import (OrderSuggestion, OrderSuggestionDirtyProduct, OrderSuggestionRefreshState, PurchaseOrder,
+                     PurchaseOrderItem)
+from .services import generate_order_suggestions, refresh_dirty_suggestions
+from .suggestion_engine import OrderSuggestionEngine
+
+
+class OrderSuggestionEngineTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='planner')
+        self.warehouse = Warehouse.objects.create(name='Hauptlager', location='Berlin')
+        self.supplier = Supplier.objects.create(name='Alpha')
+        self.preferred_supplier = Supplier.objects.create(name='Beta')
+
+        self.low = Product.objects.create(name='Low', sku='LOW', minimum_stock=10)
+        self.ok = Product.objects.create(name='Ok', sku='OK', minimum_stock=10)
+        self.empty = Product.objects.create(name='Empty', sku='EMPTY', minimum_stock=5)
+
+        ProductWarehouse.objects.create(product=self.low, warehouse=self.warehouse, quantity=4)
+        ProductWarehouse.objects.create(product=self.ok, warehouse=self.warehouse, quantity=20)
+
+        SupplierProduct.objects.create(product=self.low, supplier=self.supplier, purchase_price=1)
+        SupplierProduct.objects.create(product=self.low, supplier=self.preferred_supplier, purchase_price=1,
+                                       is_preferred=True)
+
+    def test_creates_suggestions_for_low_stock_products(self):
+        self.assertEqual(generate_order_suggestions(), 2)
+
+        suggestion = OrderSuggestion.objects.get(product=self.low)
+        self.assertEqual(suggestion.current_stock, Decimal('4'))
+        # max(10 * 1.2, 10 * 2 - 4) - 4 = 12
+        self.assertEqual(suggestion.suggested_order_quantity, Decimal('12'))
+        self.assertEqual(suggestion.preferred_supplier, self.preferred_supplier)
+
+        suggestion = OrderSuggestion.objects.get(product=self.empty)
+        self.assertEqual(suggestion.current_stock, Decimal('0'))
+        self.assertIsNone(suggestion.preferred_supplier)
+
+    def test_open_orders_reduce_suggested_quantity(self):
+        order = PurchaseOrder.objects.create(order_number='PO-1', supplier=self.supplier,
+                                             created_by=self.user, status='sent')
+        PurchaseOrderItem.objects.create(purchase_order=order, product=self.low,
+                                         quantity_ordered=5, unit_price=1)
+
+        generate_order_suggestions()
+
+        self.assertEqual(OrderSuggestion.objects.get(product=self.low).suggested_order_quantity, Decimal('7'))
+
+    def test_rerun_only_writes_differences(self):
+        generate_order_suggestions()
+        low_pk = OrderSuggestion.objects.get(product=self.low).pk
+
+        stats = OrderSuggestionEngine().run()
+        self.assertEqual((stats['created'], stats['updated'], stats['deleted']), (0, 0, 0))
+        self.assertEqual(stats['unchanged'], 2)
+
+        ProductWarehouse.objects.filter(product=self.low).update(quantity=2)
+        ProductWarehouse.objects.create(product=self.empty, warehouse=self.warehouse, quantity=50)
+
+        stats = OrderSuggestionEngine().run()
+        self.assertEqual((stats['created'], stats['updated'], stats['deleted']), (0, 1, 1))
+        self.assertEqual(OrderSuggestion.objects.get(product=self.low).pk, low_pk)
+        self.assertFalse(OrderSuggestion.objects.filter(product=self.empty).exists())
+
+
+class OrderSuggestionRefreshTest(TestCase):
+    def setUp(self):
+        self.warehouse = Warehouse.objects.create(name='Hauptlager', location='Berlin')
+        self.product = Product.objects.create(name='Low', sku='LOW', minimum_stock=10)
+        self.stock = ProductWarehouse.objects.create(product=self.product, warehouse=self.warehouse, quantity=4)
+
+    def test_changes_mark_products_dirty(self):
+        self.assertTrue(OrderSuggestionDirtyProduct.objects.filter(product=self.product).exists())
+
+        generate_order_suggestions()
+        self.assertFalse(OrderSuggestionDirtyProduct.objects.exists())
+
+        self.product.name = 'Umbenannt'
+        self.product.save()
+        self.assertFalse(OrderSuggestionDirtyProduct.objects.exists())
+
+        self.product.minimum_stock = 20
+        self.product.save()
+        self.assertTrue(OrderSuggestionDirtyProduct.objects.filter(product=self.product).exists())
+
+    def test_refresh_only_processes_dirty_products(self):
+        generate_order_suggestions()
+        other = Product.objects.create(name='Other', sku='OTHER', minimum_stock=3)
+        OrderSuggestion.objects.filter(product=self.product).update(suggested_order_quantity=1)
+
+        stats = refresh_dirty_suggestions()
+
+        self.assertEqual(stats['products'], 1)
+        self.assertTrue(OrderSuggestion.objects.filter(product=other).exists())
+        # Nicht vorgemerktes Produkt bleibt unangetastet
+        self.assertEqual(OrderSuggestion.objects.get(product=self.product).suggested_order_quantity, Decimal('1'))
+        self.assertFalse(OrderSuggestionDirtyProduct.objects.exists())
+        self.assertIsNotNone(OrderSuggestionRefreshState.get_state().last_refreshed_at)
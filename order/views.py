@@ -23,7 +23,7 @@ from .models import (
     PurchaseOrderReceiptItem, OrderSuggestion, OrderTemplate, OrderTemplateItem, OrderSplit, OrderSplitItem,
     PurchaseOrderComment
 )
-from .services import generate_order_suggestions
+from .services import get_suggestion_status, request_full_refresh
 from .utils.address import get_address_context
 from .workflow import get_initial_order_status, check_auto_approval, can_approve_order
 
@@ -236,42 +236,15 @@ def purchase_order_detail(request, pk):
         interface_id = request.POST.get('interface_id')
         if interface_id:
             try:
-                # Bestellung über die gewählte Schnittstelle senden
-                from interfaces.services import send_order_via_interface
-                result = send_order_via_interface(order.id, interface_id, request.user)
+                # Bestellung in den Postausgang stellen; der Übertragungs-Worker sendet sie
+                # und markiert sie danach als "Bestellt"
+                from interfaces.outbox import enqueue_order
+                enqueue_order(order, interface_id, request.user)
 
-                if result:
-                    # Bestellung als gesendet markieren
-                    order.status = 'sent'
-
-                    # Versuchen, die längste lead_time_days für Produkte in dieser Bestellung zu finden
-                    max_lead_time = 7  # Standardwert, falls keine Lieferantenprodukte gefunden werden
-                    for item in order.items.all():
-                        try:
-                            supplier_product = SupplierProduct.objects.get(
-                                supplier=order.supplier,
-                                product=item.product
-                            )
-                            if supplier_product.lead_time_days and supplier_product.lead_time_days > max_lead_time:
-                                max_lead_time = supplier_product.lead_time_days
-                        except SupplierProduct.DoesNotExist:
-                            continue
-
-                    # soon_date auf heute + längste lead_time_days setzen
-                    soon_date = date.today() + timedelta(days=max_lead_time)
-                    order.soon_date = soon_date
-
-                    # expected_delivery auf soon_date setzen
-                    order.expected_delivery = soon_date
-
-                    # Bestellstatus und Lieferdatum speichern
-                    order.save()
-
-                    messages.success(request,
-                                     f'Bestellung {order.order_number} wurde erfolgreich gesendet und als "Bestellt" markiert.')
-                    return redirect('purchase_order_detail', pk=order.id)
-                else:
-                    messages.warning(request, f'Bestellung {order.order_number} konnte nicht gesendet werden.')
+                messages.success(request,
+                                 f'Bestellung {order.order_number} wurde zum Senden eingereiht und wird '
+                                 f'nach erfolgreicher Übertragung als "Bestellt" markiert.')
+                return redirect('purchase_order_detail', pk=order.id)
             except Exception as e:
                 messages.error(request, f'Fehler beim Senden der Bestellung: {str(e)}')
 
@@ -1121,12 +1094,8 @@ def purchase_order_export(request, pk):
 def order_suggestions(request):
     """Zeigt Bestellvorschläge basierend auf kritischen Beständen."""
 
-    # Automatisch alle Bestellvorschläge aktualisieren
-    # Hierfür können wir direkt die bereits vorhandene Funktion nutzen
-    suggestion_count = generate_order_suggestions()
-
-    if suggestion_count > 0:
-        messages.info(request, f'Bestellvorschläge wurden automatisch aktualisiert: {suggestion_count} Vorschläge.')
+    # Die Vorschläge werden im Hintergrund berechnet; hier nur den vorberechneten Stand lesen
+    suggestion_status = get_suggestion_status()
 
     # Bestellvorschläge abrufen
     suggestions = OrderSuggestion.objects.select_related('product', 'preferred_supplier').order_by(
@@ -1148,6 +1117,7 @@ def order_suggestions(request):
 
     context = {
         'grouped_suggestions': grouped_suggestions,
+        'suggestion_status': suggestion_status,
     }
 
     return render(request, 'order/order_suggestions.html', context)
@@ -1155,16 +1125,24 @@ def order_suggestions(request):
 @login_required
 @permission_required('order', 'edit')
 def refresh_order_suggestions(request):
-    """Aktualisiert die Bestellvorschläge (AJAX-Endpunkt)."""
+    """Fordert eine Vollberechnung der Bestellvorschläge an (AJAX-Endpunkt).
+
+    Die Berechnung selbst erfolgt im Hintergrund; zurückgegeben wird der
+    aktuelle Stand der vorberechneten Tabelle.
+    """
     if request.method == 'POST':
         try:
-            # Bestellvorschläge neu generieren
-            suggestion_count = generate_order_suggestions()
+            request_full_refresh()
+            suggestion_status = get_suggestion_status()
+            refreshed_at = suggestion_status['last_refreshed_at']
 
             return JsonResponse({
                 'success': True,
-                'message': f'{suggestion_count} Bestellvorschläge wurden generiert.',
-                'count': suggestion_count
+                'message': 'Die Aktualisierung der Bestellvorschläge wurde angefordert.',
+                'count': suggestion_status['count'],
+                'pending_products': suggestion_status['pending_products'],
+                'last_refreshed_at': refreshed_at.isoformat() if refreshed_at else None,
+                'age_seconds': int((timezone.now() - refreshed_at).total_seconds()) if refreshed_at else None,
             })
         except Exception as e:
             return JsonResponse({
@@ -1539,31 +1517,23 @@ def bulk_send_orders(request):
         'failed': []
     }
 
-    # Jede Bestellung über ihre Standard-Schnittstelle senden
-    for order in orders:
-        try:
-            from interfaces.services import send_order_via_interface
-
-            # Versuch, die Bestellung über die Standard-Schnittstelle zu senden
-            result = send_order_via_interface(order.id, None, request.user)  # None = use default interface
-
-            if result:  # Nur bei erfolgreichem Versand als gesendet markieren
-                # Bestellung als gesendet markieren
-                order.status = 'sent'
-                order.save(update_fields=['status'])  # Nur das geänderte Feld aktualisieren
-                results['success'].append(order)
-            else:
-                results['failed'].append((order, 'Unbekannter Fehler beim Senden'))
-
-        except Exception as e:
-            results['failed'].append((order, str(e)))
+    # Alle Bestellungen gemeinsam über ihre Standard-Schnittstellen in den Postausgang stellen;
+    # die Worker übertragen sie je Lieferant in Reihenfolge bzw. als Sammelübertragung
+    from interfaces.outbox import enqueue_orders
+    for order, transmission, error in enqueue_orders(
+        orders.select_related('supplier').order_by('order_date', 'pk'), request.user
+    ):
+        if transmission is not None:
+            results['success'].append(order)
+        else:
+            results['failed'].append((order, error))
 
     # Erfolgsmeldungen
     if results['success']:
         order_numbers = ', '.join([o.order_number for o in results['success']])
         messages.success(
             request,
-            f"{len(results['success'])} Bestellung{'en' if len(results['success']) != 1 else ''} erfolgreich gesendet: {order_numbers}"
+            f"{len(results['success'])} Bestellung{'en' if len(results['success']) != 1 else ''} zum Senden eingereiht: {order_numbers}"
         )
 
     # Fehlermeldungen
@@ -1571,7 +1541,7 @@ def bulk_send_orders(request):
         error_messages = '<br>'.join([f"{o[0].order_number}: {o[1]}" for o in results['failed']])
         messages.error(
             request,
-            f"{len(results['failed'])} Bestellung{'en' if len(results['failed']) != 1 else ''} konnten nicht gesendet werden:<br>{error_messages}",
+            f"{len(results['failed'])} Bestellung{'en' if len(results['failed']) != 1 else ''} konnten nicht eingereiht werden:<br>{error_messages}",
             extra_tags='safe'
         )
 